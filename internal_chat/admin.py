@@ -176,7 +176,7 @@ class AttachmentAdmin(admin.ModelAdmin):
     ]
     list_filter = ['content_type', 'created_at']
     search_fields = ['file_name', 'message__content']
-    readonly_fields = ['id', 'size', 'size_mb', 'checksum', 'created_at']
+    readonly_fields = ['id', 'size', 'size_mb', 'checksum', 'storage_name', 'created_at']
     autocomplete_fields = ['message']
     date_hierarchy = 'created_at'
     
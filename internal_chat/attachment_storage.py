@@ -0,0 +1,235 @@
+"""
+File storage for Internal Chat attachments
+
+Attachment content lives in a Django storage backend, not in the database:
+- the backend is configured by INTERNAL_CHAT_ATTACHMENT_STORAGE ({'BACKEND': ...,
+  'OPTIONS': {...}}, same shape as a STORAGES entry), so the local filesystem
+  store can be swapped for any django-storages backend
+- files are content-addressed by their SHA256 checksum, so identical uploads
+  share one stored file; the file is deleted when the last attachment using
+  it is deleted
+- an upload that reuses a file can race with the deletion of its last other
+  attachment. Deletion (release()) and the upload's check after its row is
+  committed (ensure_stored()) hold a per-file cache lock, so either the
+  deletion sees the new row and keeps the file, or the upload sees the file
+  gone and stores its content again
+- downloads are read in chunks (optionally a byte range), never as a whole
+"""
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+LOCK_PREFIX = 'chat:attachment:lock:'
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+
+_storage = None
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header does not overlap the file"""
+
+
+def get_storage():
+    """
+    Get the configured attachment storage backend (instantiated once)
+    """
+    global _storage
+    if _storage is None:
+        config = settings.INTERNAL_CHAT_ATTACHMENT_STORAGE
+        _storage = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _storage
+
+
+@receiver(setting_changed)
+def _reset_storage(setting, **kwargs):
+    global _storage
+    if setting == 'INTERNAL_CHAT_ATTACHMENT_STORAGE':
+        _storage = None
+
+
+def storage_name(checksum):
+    """Content-addressed storage path for a SHA256 checksum"""
+    return f'{checksum[:2]}/{checksum[2:4]}/{checksum}'
+
+
+@contextmanager
+def _file_lock(name):
+    """
+    Hold the cache lock of a stored file
+
+    Yields:
+        bool: Whether the lock was acquired (False after LOCK_WAIT seconds or
+        when the cache is unavailable)
+    """
+    key = f'{LOCK_PREFIX}{name}'
+    deadline = time.monotonic() + LOCK_WAIT
+    acquired = False
+    try:
+        acquired = cache.add(key, 1, LOCK_TIMEOUT)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.05)
+            acquired = cache.add(key, 1, LOCK_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Error locking attachment file {name}: {str(e)}")
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(key)
+
+
+def save(file):
+    """
+    Store file content, reusing an existing copy with the same checksum
+
+    Args:
+        file: File-like object (e.g. an UploadedFile) or bytes
+
+    Returns:
+        tuple: (storage name, SHA256 checksum, size in bytes)
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        file = ContentFile(bytes(file))
+
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    for chunk in file.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    checksum = digest.hexdigest()
+
+    storage = get_storage()
+    name = storage_name(checksum)
+    if storage.exists(name):
+        logger.debug(f"Attachment content {checksum} already stored, reusing")
+        return name, checksum, size
+
+    file.seek(0)
+    # A concurrent upload of the same content may win the race; save() then
+    # picks an alternative name, which is returned and stored on the row
+    name = storage.save(name, file)
+    return name, checksum, size
+
+
+def ensure_stored(attachment, file):
+    """
+    Store an attachment's content again if it was released meanwhile
+
+    Call once the attachment row is committed: a release() that ran before
+    the row was visible may have deleted the file save() reused.
+
+    Args:
+        attachment: Attachment whose storage_name came from save()
+        file: The uploaded content, as passed to save()
+    """
+    storage = get_storage()
+    with _file_lock(attachment.storage_name):
+        if storage.exists(attachment.storage_name):
+            return
+        logger.warning(f"Attachment file {attachment.storage_name} was released during upload, storing it again")
+        if isinstance(file, (bytes, bytearray, memoryview)):
+            file = ContentFile(bytes(file))
+        file.seek(0)
+        name = storage.save(attachment.storage_name, file)
+    if name != attachment.storage_name:
+        attachment.storage_name = name
+        attachment.save(update_fields=['storage_name'])
+
+
+def release(name):
+    """
+    Delete a stored file if no attachment references it any more
+    """
+    from .models import Attachment
+
+    if not name:
+        return
+    with _file_lock(name) as locked:
+        if not locked:
+            # Keeping an unreferenced file is safe, deleting a reused one is not
+            logger.warning(f"Attachment file {name} is locked, not deleting it")
+            return
+        if Attachment.objects.filter(storage_name=name).exists():
+            return
+        try:
+            get_storage().delete(name)
+        except Exception as e:
+            logger.error(f"Error deleting attachment file {name}: {str(e)}")
+
+
+def open_file(name):
+    """Open a stored file for binary reading"""
+    return get_storage().open(name, 'rb')
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range HTTP Range header
+
+    Args:
+        header: Range header value (e.g. 'bytes=0-1023', 'bytes=500-', 'bytes=-500')
+        size: File size in bytes
+
+    Returns:
+        tuple (start, end) with inclusive offsets, or None if the header is
+        missing, malformed or asks for several ranges (serve the whole file)
+
+    Raises:
+        RangeNotSatisfiable: If the range starts beyond the end of the file
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, sep, end = header[len('bytes='):].strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if start == '':
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def iter_file(name, start=0, length=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield a stored file's content (or a byte range of it) in chunks
+
+    Args:
+        name: Storage name
+        start: Offset of the first byte
+        length: Number of bytes to read (default: to the end of the file)
+        chunk_size: Maximum chunk size in bytes
+    """
+    with open_file(name) as f:
+        if start:
+            f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
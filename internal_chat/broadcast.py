@@ -0,0 +1,236 @@
+"""
+Transactional broadcast outbox for Internal Chat WebSocket events
+
+Services call publish() instead of group_send. Events are collected per
+database transaction and handed over once the transaction commits (nothing is
+sent for rolled-back work). Each event has a key, and a later event with the
+same key replaces the earlier one in its place, so duplicates are dropped and
+bursts (reaction toggles, read receipts) collapse into their latest state.
+
+Committed events go to a background sender: one daemon thread running an
+event loop that keeps the channel layer's connection pool open, so the
+request thread never waits on Redis. It sends whatever has accumulated,
+optionally after waiting INTERNAL_CHAT_BROADCAST_COALESCE_MS for more events:
+events for the same group are sent one after another in publish order, and
+only different groups are sent to concurrently. With the in-memory channel layer (development, tests), or
+with INTERNAL_CHAT_BROADCAST_ASYNC off, events are sent inline after commit.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_unkeyed = itertools.count()
+
+
+class _Segment:
+    """
+    Events published at one savepoint depth, sent by their own on_commit hook
+
+    Django drops the hook of a segment when a savepoint that was open while
+    it was registered rolls back, so the segment's events are never sent.
+    """
+
+    def __init__(self, outbox, savepoints):
+        self.outbox = outbox
+        self.savepoints = savepoints
+        self.events = {}
+
+    def flush(self):
+        outbox = self.outbox
+        if getattr(_local, 'outbox', None) is outbox:
+            _local.outbox = None
+        if outbox.delivered:
+            return
+        if outbox.hooks is connection.run_on_commit or not outbox.holds(self):
+            # The hook list the outbox last saw is the one being run (Django
+            # pops hooks off it as they run), so no savepoint rolled back since
+            # and every remaining segment commits: send them all as one batch
+            outbox.delivered = True
+            events = {}
+            for segment in outbox.segments:
+                # A replaced event keeps its position, so it is never sent after later events
+                events.update(segment.events)
+        else:
+            # A savepoint rolled back after the last publish; the segments still
+            # to run are not known, so each one sends its own events
+            events = self.events
+        if events:
+            _deliver(events)
+
+
+class _Outbox:
+    """
+    Events published inside one transaction, in publish order, keyed for deduplication
+
+    Events are grouped into segments, one per run of publishes at the same
+    savepoint depth, so that rolling back a savepoint drops exactly the events
+    published inside it.
+    """
+
+    def __init__(self):
+        self.segments = []
+        self.hooks = None
+        self.delivered = False
+
+    def add(self, key, group, event):
+        savepoints = tuple(connection.savepoint_ids)
+        if not self.segments or self.segments[-1].savepoints != savepoints:
+            self.segments.append(_Segment(self, savepoints))
+            transaction.on_commit(self.segments[-1].flush)
+            self.hooks = connection.run_on_commit
+        self.segments[-1].events[key] = (group, event)
+
+    def holds(self, segment):
+        return any(getattr(func, '__self__', None) is segment for _, func, _ in self.hooks)
+
+    def prune(self):
+        """
+        Forget segments whose on_commit hook Django has dropped
+
+        Returns:
+            True if any segment is still pending, i.e. the transaction is still open
+        """
+        self.hooks = connection.run_on_commit
+        self.segments = [segment for segment in self.segments if self.holds(segment)]
+        return bool(self.segments)
+
+
+def _current_outbox():
+    """
+    Get the outbox of the current transaction, starting one if needed
+
+    The thread's outbox remembers the connection's commit hook list it last
+    joined. Django replaces that list when the transaction commits or rolls
+    back and when a savepoint rolls back, dropping the hooks registered inside
+    it. On a different list the outbox forgets the segments whose hooks were
+    dropped; if none are left it belonged to a finished transaction and a new
+    one is started. A flushed outbox clears itself.
+    """
+    outbox = getattr(_local, 'outbox', None)
+    if outbox is not None and (outbox.hooks is connection.run_on_commit or outbox.prune()):
+        return outbox
+
+    outbox = _local.outbox = _Outbox()
+    return outbox
+
+
+def publish(group, event, key=None):
+    """
+    Queue a channel-layer event for a group, sent after the current transaction commits
+
+    Events published inside a savepoint that rolls back are dropped.
+
+    Args:
+        group: Channel layer group name (e.g. 'thread_<id>')
+        event: Event dict with a 'type' handler name
+        key: Deduplication key; a later event with the same key replaces this one.
+             Events without a key are never merged.
+    """
+    if key is None:
+        key = ('unkeyed', next(_unkeyed))
+    if not connection.in_atomic_block:
+        _deliver({key: (group, event)})
+        return
+    _current_outbox().add(key, group, event)
+
+
+def _deliver(events):
+    """
+    Hand committed events to the background sender, or send them inline
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    if (
+        getattr(settings, 'INTERNAL_CHAT_BROADCAST_ASYNC', True)
+        and not isinstance(channel_layer, InMemoryChannelLayer)
+    ):
+        _sender.submit(events)
+        return
+
+    try:
+        async_to_sync(_send_batch)(channel_layer, list(events.values()))
+    except Exception as e:
+        logger.error(f"Error broadcasting {len(events)} chat events: {str(e)}")
+
+
+async def _send_group(channel_layer, group, events):
+    """
+    Send one group's events one after another, logging failures
+    """
+    for event in events:
+        try:
+            await channel_layer.group_send(group, event)
+        except Exception as e:
+            logger.error(f"Error broadcasting {event.get('type')} to group {group}: {str(e)}")
+
+
+async def _send_batch(channel_layer, batch):
+    """
+    Send (group, event) pairs in order within each group, groups concurrently
+    """
+    by_group = {}
+    for group, event in batch:
+        by_group.setdefault(group, []).append(event)
+    await asyncio.gather(
+        *(_send_group(channel_layer, group, events) for group, events in by_group.items())
+    )
+
+
+class _BackgroundSender:
+    """
+    Daemon thread with its own event loop that drains keyed events in batches
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._loop = None
+        self._wakeup = None
+
+    def submit(self, events):
+        with self._lock:
+            # Replaced events keep their position, like in the outbox
+            self._pending.update(events)
+            if self._loop is None:
+                self._start()
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _start(self):
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._wakeup = asyncio.Event()
+            started.set()
+            self._loop.run_until_complete(self._drain())
+
+        threading.Thread(target=run, name='chat-broadcast', daemon=True).start()
+        started.wait()
+
+    async def _drain(self):
+        channel_layer = get_channel_layer()
+        coalesce_seconds = getattr(settings, 'INTERNAL_CHAT_BROADCAST_COALESCE_MS', 0) / 1000
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if coalesce_seconds:
+                await asyncio.sleep(coalesce_seconds)
+            with self._lock:
+                batch = list(self._pending.values())
+                self._pending = {}
+            if batch:
+                await _send_batch(channel_layer, batch)
+                logger.debug(f"Broadcasted {len(batch)} chat events")
+
+
+_sender = _BackgroundSender()
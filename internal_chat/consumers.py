@@ -1,6 +1,7 @@
 """
 WebSocket Consumers for Internal Chat Real-Time Features
 """
+import asyncio
 import json
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
@@ -9,8 +10,11 @@ from channels.layers import get_channel_layer
 from django.conf import settings
 from .models import Thread, ThreadParticipant, Message, MessageReaction
 from .services import MessageService
-from .security_utils import sanitize_message_content, validate_emoji
-from .rate_limiting import check_rate_limit
+from . import presence, read_receipts
+from .security_utils import validate_emoji
+from .rate_limiting import (
+    check_rate_limit_async, acquire_connection_async, release_connection_async
+)
 
 logger = logging.getLogger(__name__)
 
@@ -34,27 +38,24 @@ class ThreadConsumer(AsyncWebsocketConsumer):
             await self.close(code=4001)  # Unauthorized
             return
         
-        # SECURITY: Limit concurrent connections per user
+        # SECURITY: Limit concurrent connections per user (atomic check + increment)
         max_connections = getattr(settings, 'WEBSOCKET_MAX_CONNECTIONS_PER_USER', 10)
-        conn_key = f"ws_conn_count_{self.user.id}"
         
-        current_connections = await self.get_connection_count(conn_key)
-        
-        if current_connections >= max_connections:
+        self.connection_acquired = await acquire_connection_async(self.user.id, max_connections)
+        if not self.connection_acquired:
             logger.warning(
                 f"Connection limit exceeded for user {self.user.id}: "
-                f"{current_connections}/{max_connections}"
+                f"{max_connections} concurrent connections"
             )
             await self.close(code=4008)  # Policy Violation
             return
         
-        # Increment connection counter
-        await self.increment_connection_count(conn_key)
-        
-        # Check if user is participant
-        is_participant = await self.check_participant()
-        if not is_participant:
-            await self.decrement_connection_count(conn_key)  # Decrement on failure
+        # Check if user is participant (kept for the connection; membership
+        # events from MessageService/ThreadService refresh or revoke it)
+        self.participant = await self.load_participant()
+        if self.participant is None:
+            self.connection_acquired = False
+            await release_connection_async(self.user.id)  # Release on failure
             await self.close(code=4003)  # Forbidden
             return
         
@@ -101,10 +102,9 @@ class ThreadConsumer(AsyncWebsocketConsumer):
         """
         Called when WebSocket connection is closed
         """
-        # SECURITY: Decrement connection counter
-        if hasattr(self, 'user') and not self.user.is_anonymous:
-            conn_key = f"ws_conn_count_{self.user.id}"
-            await self.decrement_connection_count(conn_key)
+        # SECURITY: Release connection slot (only if this connection took one)
+        if getattr(self, 'connection_acquired', False):
+            await release_connection_async(self.user.id)
         
         # Stop typing indicator if active
         if hasattr(self, 'thread_group_name'):
@@ -184,7 +184,7 @@ class ThreadConsumer(AsyncWebsocketConsumer):
         rate_limit = getattr(settings, 'WEBSOCKET_MESSAGE_RATE_LIMIT', 60)
         rate_window = getattr(settings, 'WEBSOCKET_MESSAGE_RATE_WINDOW', 60)
         
-        is_allowed = await self.check_rate_limit_async(
+        is_allowed = await check_rate_limit_async(
             self.user.id,
             'message_send',
             limit=rate_limit,
@@ -222,11 +222,6 @@ class ThreadConsumer(AsyncWebsocketConsumer):
             )
             return
         
-        # SECURITY: Sanitize content at WebSocket level to prevent XSS
-        if content:
-            content = await self.sanitize_content(content)
-        
-        # Validate content not empty after sanitization
         if not content and not attachment_ids:
             await self.send(text_data=json.dumps({
                 'type': 'error',
@@ -234,27 +229,11 @@ class ThreadConsumer(AsyncWebsocketConsumer):
             }))
             return
         
-        # Create message in database
+        # Sanitize and create in one database hop (MessageService sanitizes the
+        # content and broadcasts message.new on commit)
         message = await self.create_message(content, reply_to_id, attachment_ids)
         
-        if message:
-            # Serialize message
-            message_data = await self.serialize_message(message)
-            
-            logger.info(f"Broadcasting message.new to thread {self.thread_id}")
-            logger.debug(f"Message data: {message_data}")
-            
-            # Broadcast to all participants in thread
-            await self.channel_layer.group_send(
-                self.thread_group_name,
-                {
-                    'type': 'message_new',
-                    'message': message_data,
-                }
-            )
-            
-            logger.info(f"Broadcast complete for message {message.id}")
-        else:
+        if not message:
             logger.error(f"Failed to create message for user {self.user.id} in thread {self.thread_id}")
             await self.send(text_data=json.dumps({
                 'type': 'error',
@@ -267,7 +246,7 @@ class ThreadConsumer(AsyncWebsocketConsumer):
         rate_limit = getattr(settings, 'WEBSOCKET_TYPING_RATE_LIMIT', 30)
         rate_window = getattr(settings, 'WEBSOCKET_TYPING_RATE_WINDOW', 60)
         
-        is_allowed = await self.check_rate_limit_async(
+        is_allowed = await check_rate_limit_async(
             self.user.id,
             'typing_indicator',
             limit=rate_limit,
@@ -306,17 +285,8 @@ class ThreadConsumer(AsyncWebsocketConsumer):
         if not message_id:
             return
         
+        # Reads are debounced; the aggregator broadcasts one receipt per window
         await self.mark_messages_read(message_id)
-        
-        # Broadcast read receipt
-        await self.channel_layer.group_send(
-            self.thread_group_name,
-            {
-                'type': 'receipt_read',
-                'user_id': self.user.id,
-                'message_id': message_id,
-            }
-        )
     
     async def handle_reaction_add(self, data):
         """User added reaction to message"""
@@ -324,7 +294,7 @@ class ThreadConsumer(AsyncWebsocketConsumer):
         rate_limit = getattr(settings, 'WEBSOCKET_REACTION_RATE_LIMIT', 120)
         rate_window = getattr(settings, 'WEBSOCKET_REACTION_RATE_WINDOW', 60)
         
-        is_allowed = await self.check_rate_limit_async(
+        is_allowed = await check_rate_limit_async(
             self.user.id,
             'reaction_add',
             limit=rate_limit,
@@ -348,9 +318,9 @@ class ThreadConsumer(AsyncWebsocketConsumer):
         if not message_id or not emoji:
             return
         
-        # SECURITY: Validate emoji before processing
+        # SECURITY: Validate emoji before processing (pure check, no database hop)
         try:
-            await self.validate_emoji_async(emoji)
+            validate_emoji(emoji)
         except ValueError as e:
             await self.send(text_data=json.dumps({
                 'type': 'error',
@@ -358,19 +328,8 @@ class ThreadConsumer(AsyncWebsocketConsumer):
             }))
             return
         
-        # Add reaction in database
+        # Add reaction in database (MessageService broadcasts it on commit)
         await self.add_reaction(message_id, emoji)
-        
-        # Broadcast
-        await self.channel_layer.group_send(
-            self.thread_group_name,
-            {
-                'type': 'reaction_added',
-                'message_id': message_id,
-                'user_id': self.user.id,
-                'emoji': emoji,
-            }
-        )
     
     async def handle_reaction_remove(self, data):
         """User removed reaction from message"""
@@ -380,19 +339,8 @@ class ThreadConsumer(AsyncWebsocketConsumer):
         if not message_id or not emoji:
             return
         
-        # Remove reaction in database
+        # Remove reaction in database (MessageService broadcasts it on commit)
         await self.remove_reaction(message_id, emoji)
-        
-        # Broadcast
-        await self.channel_layer.group_send(
-            self.thread_group_name,
-            {
-                'type': 'reaction_removed',
-                'message_id': message_id,
-                'user_id': self.user.id,
-                'emoji': emoji,
-            }
-        )
     
     # Channel layer event handlers (broadcast to WebSocket)
     async def message_new(self, event):
@@ -474,6 +422,18 @@ class ThreadConsumer(AsyncWebsocketConsumer):
             'type': 'member.removed',
             'user_id': event['user_id'],
         }))
+        
+        # The cached membership is no longer valid for the removed user's sockets
+        if event['user_id'] == self.user.id:
+            self.participant = None
+            await self.close(code=4003)  # Forbidden
+    
+    async def participant_changed(self, event):
+        """A participant's role changed (internal, not forwarded to the client)"""
+        if event['user_id'] == self.user.id:
+            self.participant = await self.load_participant()
+            if self.participant is None:
+                await self.close(code=4003)
     
     async def thread_updated(self, event):
         """Thread settings/title changed"""
@@ -504,50 +464,56 @@ class ThreadConsumer(AsyncWebsocketConsumer):
             'unread_count': event['unread_count'],
         }))
     
+    async def unread_counts_update(self, event):
+        """Batched unread count update for this thread (one count per participant)"""
+        unread_count = event['counts'].get(str(self.user.id))
+        if unread_count is None:
+            return  # No count for this user (e.g. the sender)
+        
+        await self.send(text_data=json.dumps({
+            'type': 'unread.count.update',
+            'thread_id': event['thread_id'],
+            'unread_count': unread_count,
+        }))
+    
     # Database operations (async wrappers)
     @database_sync_to_async
-    def check_participant(self):
-        """Check if user is a participant in the thread"""
+    def load_participant(self):
+        """Get the user's active participation in the thread (None if not a participant)"""
         return ThreadParticipant.objects.filter(
             thread_id=self.thread_id,
             user=self.user,
             left_at__isnull=True
-        ).exists()
+        ).first()
     
     @database_sync_to_async
     def create_message(self, content, reply_to_id, attachment_ids):
-        """Create a new message"""
+        """Create a new message (sanitize, permission check and insert in one hop)"""
         try:
+            thread = Thread.objects.select_related('group_settings').get(id=self.thread_id)
             return MessageService.create_message(
-                thread_id=self.thread_id,
+                thread=thread,
                 sender=self.user,
                 content=content,
                 reply_to_id=reply_to_id,
-                attachment_ids=attachment_ids or []
+                attachment_ids=attachment_ids or [],
+                participant=self.participant
             )
         except Exception as e:
             logger.error(f"Error creating message: {str(e)}")
             return None
     
-    @database_sync_to_async
-    def serialize_message(self, message):
-        """Serialize message to dict with user context"""
-        from .serializers import MessageSerializer
-        
-        # Create a mock request object with current user for context
-        class MockRequest:
-            def __init__(self, user):
-                self.user = user
-        
-        return MessageSerializer(message, context={'request': MockRequest(self.user)}).data
-    
     @database_sync_to_async
     def mark_messages_read(self, message_id):
-        """Mark messages as read up to this point"""
+        """Mark messages as read up to this point (debounced by the receipt aggregator)"""
         try:
-            thread = Thread.objects.get(id=self.thread_id)
-            message = Message.objects.get(id=message_id)
-            MessageService.mark_as_read(thread, self.user, message)
+            created_at = Message.objects.filter(
+                id=message_id,
+                thread_id=self.thread_id
+            ).values_list('created_at', flat=True).first()
+            if created_at is None:
+                return
+            read_receipts.record(self.thread_id, self.user.id, created_at, message_id)
         except Exception as e:
             logger.error(f"Error marking messages read: {str(e)}")
     
@@ -555,8 +521,11 @@ class ThreadConsumer(AsyncWebsocketConsumer):
     def add_reaction(self, message_id, emoji):
         """Add reaction to message"""
         try:
-            message = Message.objects.get(id=message_id, thread_id=self.thread_id)
-            MessageService.add_reaction(message, self.user, emoji)
+            message = Message.objects.select_related('thread__group_settings').get(
+                id=message_id,
+                thread_id=self.thread_id
+            )
+            MessageService.add_reaction(message, self.user, emoji, participant=self.participant)
         except Exception as e:
             logger.error(f"Error adding reaction: {str(e)}")
     
@@ -569,73 +538,6 @@ class ThreadConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error removing reaction: {str(e)}")
     
-    @database_sync_to_async
-    def sanitize_content(self, content):
-        """Sanitize message content (async wrapper)"""
-        return sanitize_message_content(content)
-    
-    @database_sync_to_async
-    def validate_emoji_async(self, emoji):
-        """Validate emoji (async wrapper)"""
-        return validate_emoji(emoji)
-    
-    @database_sync_to_async
-    def check_rate_limit_async(self, user_id, action, limit, window):
-        """
-        Async wrapper for rate limit check
-        
-        Args:
-            user_id: User ID to check
-            action: Action type (message_send, reaction_add, typing_indicator)
-            limit: Maximum actions per window
-            window: Time window in seconds
-            
-        Returns:
-            bool: True if allowed, False if rate limit exceeded
-        """
-        return check_rate_limit(user_id, action, limit, window)
-    
-    @database_sync_to_async
-    def get_connection_count(self, key):
-        """
-        Get current connection count from cache
-        
-        Args:
-            key: Cache key for connection counter
-            
-        Returns:
-            int: Current connection count
-        """
-        from django.core.cache import cache
-        return cache.get(key, 0)
-    
-    @database_sync_to_async
-    def increment_connection_count(self, key):
-        """
-        Increment connection count with 1-hour expiry
-        
-        Args:
-            key: Cache key for connection counter
-        """
-        from django.core.cache import cache
-        count = cache.get(key, 0)
-        cache.set(key, count + 1, 3600)  # 1 hour expiry
-        logger.debug(f"Connection count incremented for {key}: {count + 1}")
-    
-    @database_sync_to_async
-    def decrement_connection_count(self, key):
-        """
-        Decrement connection count
-        
-        Args:
-            key: Cache key for connection counter
-        """
-        from django.core.cache import cache
-        count = cache.get(key, 0)
-        if count > 0:
-            cache.set(key, count - 1, 3600)
-            logger.debug(f"Connection count decremented for {key}: {count - 1}")
-    
     @staticmethod
     async def send_unread_count_update(thread_id, user_id, unread_count):
         """
@@ -656,7 +558,11 @@ class ThreadConsumer(AsyncWebsocketConsumer):
 
 class PresenceConsumer(AsyncWebsocketConsumer):
     """
-    Global presence consumer for online/offline status tracking
+    Presence consumer for online/offline status tracking
+    
+    Status lives in the presence store (see internal_chat.presence). Clients send
+    {"type": "heartbeat"} periodically and only receive changes for their
+    contacts (users sharing an active thread).
     """
     
     async def connect(self):
@@ -669,53 +575,73 @@ class PresenceConsumer(AsyncWebsocketConsumer):
             await self.close(code=4001)
             return
         
-        self.presence_group_name = 'presence_global'
-        
-        # Join presence group
-        await self.channel_layer.group_add(
-            self.presence_group_name,
-            self.channel_name
-        )
-        
         await self.accept()
         
-        # Mark user as online
-        await self.set_user_online(True)
+        # Subscribe to contacts' presence groups only
+        self.contact_ids = await self.get_contact_ids()
+        await asyncio.gather(*(
+            self.channel_layer.group_add(presence.presence_group(contact_id), self.channel_name)
+            for contact_id in self.contact_ids
+        ))
         
-        # Broadcast online status
-        await self.channel_layer.group_send(
-            self.presence_group_name,
-            {
-                'type': 'user_online',
-                'user_id': self.user.id,
-            }
-        )
+        # Mark user as online and tell contacts if this is their first socket
+        came_online = await self.record_heartbeat()
+        if came_online:
+            await self.broadcast_status('user_online')
         
-        logger.info(f"User {self.user.id} is now online")
+        # Send current status of contacts
+        online_ids = await self.get_online_ids(self.contact_ids)
+        await self.send(text_data=json.dumps({
+            'type': 'presence.snapshot',
+            'online_user_ids': sorted(online_ids),
+            'heartbeat_interval': max(1, presence.presence_ttl() // 3),
+        }))
+        
+        logger.info(f"User {self.user.id} connected to presence")
     
     async def disconnect(self, close_code):
         """
         Called when WebSocket connection is closed
         """
-        # Mark user as offline
-        await self.set_user_online(False)
+        if not hasattr(self, 'contact_ids'):
+            return
+        
+        # Mark user as offline once their last socket closes
+        went_offline = await self.record_disconnect()
+        if went_offline:
+            await self.broadcast_status('user_offline')
+        
+        # Leave contacts' presence groups
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(presence.presence_group(contact_id), self.channel_name)
+            for contact_id in self.contact_ids
+        ))
+        
+        logger.info(f"User {self.user.id} disconnected from presence")
+    
+    async def receive(self, text_data):
+        """
+        Handle heartbeats from the client
+        """
+        try:
+            data = json.loads(text_data)
+        except (TypeError, ValueError):
+            return
         
-        # Broadcast offline status
+        if isinstance(data, dict) and data.get('type') == 'heartbeat':
+            came_online = await self.record_heartbeat()
+            if came_online:
+                await self.broadcast_status('user_online')
+    
+    async def broadcast_status(self, event_type):
+        """Send this user's status change to their contacts"""
         await self.channel_layer.group_send(
-            self.presence_group_name,
+            presence.presence_group(self.user.id),
             {
-                'type': 'user_offline',
+                'type': event_type,
                 'user_id': self.user.id,
             }
         )
-        
-        # Leave presence group
-        await self.channel_layer.group_discard(
-            self.presence_group_name,
-            self.channel_name
-        )
-        
-        logger.info(f"User {self.user.id} is now offline")
     
     async def user_online(self, event):
         """User came online"""
@@ -734,14 +660,24 @@ class PresenceConsumer(AsyncWebsocketConsumer):
             }))
     
     @database_sync_to_async
-    def set_user_online(self, is_online):
-        """
-        Update user's online status
-        """
-        from django.utils import timezone
-        self.user.is_online = is_online
-        self.user.last_seen = timezone.now()
-        self.user.save(update_fields=['is_online', 'last_seen'])
+    def get_contact_ids(self):
+        """Users sharing an active thread with this user"""
+        return presence.contact_ids(self.user.id)
+    
+    @database_sync_to_async
+    def get_online_ids(self, user_ids):
+        """Which of the given users are online"""
+        return presence.online_user_ids(user_ids)
+    
+    @database_sync_to_async
+    def record_heartbeat(self):
+        """Refresh this socket in the presence store"""
+        return presence.heartbeat(self.user.id, self.channel_name)
+    
+    @database_sync_to_async
+    def record_disconnect(self):
+        """Remove this socket from the presence store"""
+        return presence.disconnect(self.user.id, self.channel_name)
 
 
 class UserNotificationConsumer(AsyncWebsocketConsumer):
@@ -815,11 +751,5 @@ class UserNotificationConsumer(AsyncWebsocketConsumer):
         """
         Get total unread count across all threads
         """
-        from django.db.models import Sum
-        total = ThreadParticipant.objects.filter(
-            user=self.user,
-            left_at__isnull=True
-        ).aggregate(
-            total=Sum('unread_count')
-        )['total'] or 0
-        return total
+        from . import unread_counters
+        return unread_counters.get_total(self.user.id)
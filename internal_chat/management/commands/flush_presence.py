@@ -0,0 +1,56 @@
+"""
+Management command to sweep expired presence and write it to the database.
+
+Run periodically (cron, or --interval for a long-running process). Users
+whose sockets stopped heartbeating are taken offline and their contacts are
+notified; batched online/offline changes are written to User.is_online and
+User.last_seen.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+from internal_chat import presence
+
+
+class Command(BaseCommand):
+    help = 'Sweep expired chat presence and flush online status to the database'
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and flush every N seconds (default: flush once and exit)'
+        )
+
+    def _notify_offline(self, user_ids):
+        """Tell contacts of swept users that they went offline."""
+        channel_layer = get_channel_layer()
+
+        async def send_all():
+            await asyncio.gather(*(
+                channel_layer.group_send(
+                    presence.presence_group(user_id),
+                    {'type': 'user_offline', 'user_id': user_id}
+                )
+                for user_id in user_ids
+            ))
+
+        async_to_sync(send_all)()
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        while True:
+            offline = presence.sweep()
+            if offline:
+                self._notify_offline(offline)
+            updated = presence.flush()
+            self.stdout.write(f'Swept {len(offline)} expired users, flushed presence for {updated} users')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,62 @@
+"""
+Management command to write Redis unread counters back to the database.
+
+Run periodically (cron, or --interval for a long-running process) so that
+ThreadParticipant.unread_count follows the Redis counters, and with
+--reconcile on startup to flush everything and reload counters from the
+database.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from internal_chat import unread_counters
+
+
+class Command(BaseCommand):
+    help = 'Flush Redis-backed chat unread counters to the database'
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Users flushed per batch (default: 500)'
+        )
+
+        parser.add_argument(
+            '--reconcile',
+            action='store_true',
+            help='Flush, then reset all counters so they reload from the database (run on startup)'
+        )
+
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and flush every N seconds (default: flush once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        batch_size = options['batch_size']
+
+        if not unread_counters.enabled():
+            self.stdout.write(
+                self.style.WARNING('Unread counters are stored in the database; nothing to flush')
+            )
+            return
+
+        if options['reconcile']:
+            updated = unread_counters.reconcile(batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Reconciled unread counters ({updated} rows flushed)'))
+            if not options['interval']:
+                return
+
+        while True:
+            updated = unread_counters.flush(batch_size)
+            self.stdout.write(f'Flushed {updated} unread counters')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
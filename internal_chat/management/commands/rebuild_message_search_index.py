@@ -0,0 +1,39 @@
+"""
+Management command to rebuild the chat message search index.
+
+MessageService keeps the index current as messages are created, edited and
+deleted; run this after deploying the index (to cover existing messages), after
+changing tokenization, or with --thread to repair a single thread. Each thread
+is rebuilt in its own transaction, so searches keep working during the run.
+"""
+
+from django.core.management.base import BaseCommand
+from internal_chat import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the internal chat message search index'
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--thread',
+            type=str,
+            default=None,
+            help='Only rebuild this thread ID (default: all threads)'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Messages indexed per batch (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        indexed = search.rebuild(
+            thread_id=options['thread'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} messages'))
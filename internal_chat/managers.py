@@ -14,24 +14,20 @@ class ThreadManager(models.Manager):
     def for_user(self, user):
         """
         Get all threads where user is an active participant
+        
+        (thread, user) is unique on ThreadParticipant, so the join yields at
+        most one row per thread and needs no DISTINCT.
         """
         return self.filter(
             participants__user=user,
             participants__left_at__isnull=True
-        ).distinct()
+        )
     
     def with_last_message(self):
         """
-        Prefetch last message for each thread
+        Join the denormalized last message and its sender
         """
-        from .models import Message
-        return self.prefetch_related(
-            Prefetch(
-                'messages',
-                queryset=Message.objects.filter(deleted_at__isnull=True).order_by('-created_at')[:1],
-                to_attr='last_message_list'
-            )
-        )
+        return self.select_related('last_message__sender')
     
     def with_participant_info(self):
         """
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-15 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internal_chat', '0009_add_group_settings_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='storage_name',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+    ]
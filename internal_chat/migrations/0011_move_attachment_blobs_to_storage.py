@@ -0,0 +1,64 @@
+# Generated migration to move attachment blobs out of the database into the
+# attachment storage backend
+
+from django.db import migrations
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def move_blobs_to_storage(apps, schema_editor):
+    """
+    Write each attachment blob to content-addressed storage and clear it.
+    Rows are loaded one at a time so only one blob is held in memory.
+    """
+    from internal_chat import attachment_storage
+    
+    Attachment = apps.get_model('internal_chat', 'Attachment')
+    
+    migrated_count = 0
+    ids = list(
+        Attachment.objects.filter(storage_name__isnull=True, file_data__isnull=False)
+        .values_list('id', flat=True)
+    )
+    
+    for attachment_id in ids:
+        file_data = Attachment.objects.filter(id=attachment_id).values_list('file_data', flat=True).first()
+        if not file_data:
+            continue
+        
+        name, checksum, size = attachment_storage.save(file_data)
+        Attachment.objects.filter(id=attachment_id).update(
+            storage_name=name,
+            checksum=checksum,
+            size=size,
+            file_data=None
+        )
+        migrated_count += 1
+    
+    logger.info(f"Moved {migrated_count} attachment blobs to storage")
+
+
+def move_storage_to_blobs(apps, schema_editor):
+    """
+    Reverse: load stored files back into the blob column.
+    """
+    from internal_chat import attachment_storage
+    
+    Attachment = apps.get_model('internal_chat', 'Attachment')
+    
+    for attachment in Attachment.objects.filter(storage_name__isnull=False).only('id', 'storage_name'):
+        with attachment_storage.open_file(attachment.storage_name) as f:
+            file_data = f.read()
+        Attachment.objects.filter(id=attachment.id).update(file_data=file_data, storage_name=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internal_chat', '0010_attachment_storage_name'),
+    ]
+    
+    operations = [
+        migrations.RunPython(move_blobs_to_storage, move_storage_to_blobs),
+    ]
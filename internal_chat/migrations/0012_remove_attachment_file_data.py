@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-15 10:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internal_chat', '0011_move_attachment_blobs_to_storage'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='attachment',
+            name='file_data',
+        ),
+    ]
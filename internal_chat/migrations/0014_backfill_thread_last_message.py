@@ -0,0 +1,43 @@
+# Generated migration to backfill the denormalized last message of existing threads
+
+from django.db import migrations
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_last_message(apps, schema_editor):
+    """
+    Point every thread at its latest non-deleted message.
+    """
+    Thread = apps.get_model('internal_chat', 'Thread')
+    Message = apps.get_model('internal_chat', 'Message')
+    
+    updated_count = 0
+    for thread_id in Thread.objects.values_list('id', flat=True).iterator():
+        message = Message.objects.filter(
+            thread_id=thread_id,
+            deleted_at__isnull=True
+        ).order_by('-created_at').only('id', 'content', 'created_at').first()
+        if message is None:
+            continue
+        
+        Thread.objects.filter(id=thread_id).update(
+            last_message=message,
+            last_message_preview=message.content[:100],
+            last_message_at=message.created_at
+        )
+        updated_count += 1
+    
+    logger.info(f"Backfilled last message for {updated_count} threads")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internal_chat', '0013_thread_last_message'),
+    ]
+    
+    operations = [
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
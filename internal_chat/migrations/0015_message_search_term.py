@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-15 21:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internal_chat', '0014_backfill_thread_last_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.PositiveIntegerField(default=1)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='internal_chat.message')),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='internal_chat.thread')),
+            ],
+            options={
+                'db_table': 'internal_chat_search_term',
+                'indexes': [models.Index(fields=['thread', 'term'], name='internal_ch_thread__b461c6_idx')],
+                'unique_together': {('message', 'term')},
+            },
+        ),
+    ]
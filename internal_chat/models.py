@@ -39,6 +39,16 @@ class Thread(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized latest non-deleted message, kept current by MessageService
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_preview = models.CharField(max_length=100, blank=True, default='')
+    last_message_at = models.DateTimeField(null=True, blank=True)
     
     objects = ThreadManager()
     
@@ -48,6 +58,7 @@ class Thread(models.Model):
         indexes = [
             models.Index(fields=['type', 'created_at']),
             models.Index(fields=['created_by', 'created_at']),
+            models.Index(fields=['updated_at', 'id']),  # Inbox keyset pagination
         ]
     
     def __str__(self):
@@ -101,6 +112,7 @@ class ThreadParticipant(models.Model):
             models.Index(fields=['user', 'joined_at']),
             models.Index(fields=['thread', 'role']),
             models.Index(fields=['user', 'unread_count']),
+            models.Index(fields=['user', 'left_at', 'thread']),  # Inbox lookup
         ]
     
     def __str__(self):
@@ -165,6 +177,35 @@ class Message(models.Model):
         self.save(update_fields=['deleted_at'])
 
 
+class MessageSearchTerm(models.Model):
+    """
+    Inverted index entry: a normalized term occurring in a message (see search.py)
+    """
+    id = models.BigAutoField(primary_key=True)
+    thread = models.ForeignKey(
+        Thread,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    term = models.CharField(max_length=64)
+    frequency = models.PositiveIntegerField(default=1)
+    
+    class Meta:
+        db_table = 'internal_chat_search_term'
+        unique_together = [['message', 'term']]
+        indexes = [
+            models.Index(fields=['thread', 'term']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} in message {self.message_id}"
+
+
 class MessageReaction(models.Model):
     """
     Emoji reactions to messages
@@ -243,7 +284,8 @@ class GroupSettings(models.Model):
 
 class Attachment(models.Model):
     """
-    File attachments for messages - stored as blobs in database
+    File attachments for messages - content lives in the attachment storage
+    backend (see attachment_storage), shared between attachments with the same checksum
     """
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -254,8 +296,8 @@ class Attachment(models.Model):
         null=True,
         blank=True
     )
-    # Store file content as blob in database
-    file_data = models.BinaryField(null=True, blank=True)
+    # Content-addressed path in the attachment storage backend
+    storage_name = models.CharField(max_length=255, null=True, blank=True, db_index=True)
     file_name = models.CharField(max_length=255)  # Stores sanitized original filename
     content_type = models.CharField(max_length=100)
     size = models.BigIntegerField()  # Size in bytes
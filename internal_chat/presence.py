@@ -0,0 +1,301 @@
+"""
+Presence tracking for Internal Chat
+
+Online status lives in Redis, not in the users table:
+- every presence socket heartbeats; a user is online while any of their
+  sockets has heartbeated within INTERNAL_CHAT_PRESENCE_TTL seconds
+- a global sorted set (user ID -> expiry) answers bulk "who is online" queries
+- changes are recorded in a dirty hash and written to User.is_online /
+  User.last_seen in batches by flush() (the flush_presence command), which also
+  sweeps users whose sockets stopped heartbeating without disconnecting
+
+Online/offline events go to the per-user group presence_<user_id>, which only
+the user's contacts (people sharing an active thread) subscribe to.
+
+Without a django_redis cache (development, tests) the same state is kept in
+process memory.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = 'chat:presence'
+DIRTY_KEY = 'chat:presence:dirty'
+SOCKETS_KEY_PREFIX = 'chat:presence:sockets:'
+
+# KEYS = user sockets, global set, dirty hash; ARGV = now, ttl, channel name, user ID
+# Returns 1 if the user came online
+_HEARTBEAT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local expiry = now + tonumber(ARGV[2])
+local live = redis.call('ZCOUNT', KEYS[1], '(' .. now, '+inf')
+redis.call('ZADD', KEYS[1], expiry, ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])) + 1)
+redis.call('ZADD', KEYS[2], expiry, ARGV[4])
+if live == 0 then
+    redis.call('HSET', KEYS[3], ARGV[4], now)
+    return 1
+end
+return 0
+"""
+
+# KEYS = user sockets, global set, dirty hash; ARGV = now, channel name, user ID
+# Returns 1 if the user went offline
+_DISCONNECT_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREM', KEYS[1], ARGV[2])
+if redis.call('ZCOUNT', KEYS[1], '(' .. now, '+inf') > 0 then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+if redis.call('ZREM', KEYS[2], ARGV[3]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[3], ARGV[3], now)
+return 1
+"""
+
+# KEYS = global set, dirty hash; ARGV = now, ttl, socket key prefix
+# Removes users whose heartbeats expired; returns their IDs
+_SWEEP_SCRIPT = """
+local now = tonumber(ARGV[1])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'WITHSCORES')
+local offline = {}
+for i = 1, #expired, 2 do
+    local user_id = expired[i]
+    redis.call('ZREM', KEYS[1], user_id)
+    redis.call('DEL', ARGV[3] .. user_id)
+    redis.call('HSET', KEYS[2], user_id, tonumber(expired[i + 1]) - tonumber(ARGV[2]))
+    offline[#offline + 1] = user_id
+end
+return offline
+"""
+
+# KEYS = dirty hash. Returns and clears it
+_TAKE_DIRTY_SCRIPT = """
+local dirty = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return dirty
+"""
+
+
+def presence_ttl():
+    """Seconds a heartbeat keeps a socket online"""
+    return getattr(settings, 'INTERNAL_CHAT_PRESENCE_TTL', 90)
+
+
+def presence_group(user_id):
+    """Channel layer group that receives a user's online/offline events"""
+    return f'presence_{user_id}'
+
+
+class RedisPresenceStore:
+    """
+    Presence state in Redis, shared by every worker
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def _keys(self, user_id):
+        return [f'{SOCKETS_KEY_PREFIX}{user_id}', GLOBAL_KEY, DIRTY_KEY]
+
+    def heartbeat(self, user_id, channel_name, now):
+        return bool(self.redis.eval(
+            _HEARTBEAT_SCRIPT, 3, *self._keys(user_id), now, presence_ttl(), channel_name, user_id
+        ))
+
+    def disconnect(self, user_id, channel_name, now):
+        return bool(self.redis.eval(
+            _DISCONNECT_SCRIPT, 3, *self._keys(user_id), now, channel_name, user_id
+        ))
+
+    def online_user_ids(self, user_ids, now):
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zscore(GLOBAL_KEY, user_id)
+        return {
+            user_id for user_id, expiry in zip(user_ids, pipe.execute())
+            if expiry is not None and expiry > now
+        }
+
+    def sweep(self, now):
+        return [int(user_id) for user_id in self.redis.eval(
+            _SWEEP_SCRIPT, 2, GLOBAL_KEY, DIRTY_KEY, now, presence_ttl(), SOCKETS_KEY_PREFIX
+        )]
+
+    def take_dirty(self):
+        values = self.redis.eval(_TAKE_DIRTY_SCRIPT, 1, DIRTY_KEY)
+        return {int(values[i]): float(values[i + 1]) for i in range(0, len(values), 2)}
+
+    def restore_dirty(self, dirty):
+        if dirty:
+            self.redis.hset(DIRTY_KEY, mapping=dirty)
+
+
+class LocalPresenceStore:
+    """
+    Presence state in process memory (single-process development and tests)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sockets = {}  # user_id -> {channel_name: expiry}
+        self._dirty = {}
+
+    def _live(self, user_id, now):
+        sockets = self._sockets.get(user_id, {})
+        return {channel: expiry for channel, expiry in sockets.items() if expiry > now}
+
+    def heartbeat(self, user_id, channel_name, now):
+        with self._lock:
+            sockets = self._live(user_id, now)
+            came_online = not sockets
+            sockets[channel_name] = now + presence_ttl()
+            self._sockets[user_id] = sockets
+            if came_online:
+                self._dirty[user_id] = now
+            return came_online
+
+    def disconnect(self, user_id, channel_name, now):
+        with self._lock:
+            was_online = user_id in self._sockets
+            sockets = self._live(user_id, now)
+            sockets.pop(channel_name, None)
+            if sockets:
+                self._sockets[user_id] = sockets
+                return False
+            self._sockets.pop(user_id, None)
+            if was_online:
+                self._dirty[user_id] = now
+            return was_online
+
+    def online_user_ids(self, user_ids, now):
+        with self._lock:
+            return {user_id for user_id in user_ids if self._live(user_id, now)}
+
+    def sweep(self, now):
+        with self._lock:
+            offline = []
+            for user_id, sockets in list(self._sockets.items()):
+                if not any(expiry > now for expiry in sockets.values()):
+                    del self._sockets[user_id]
+                    self._dirty[user_id] = max(sockets.values()) - presence_ttl()
+                    offline.append(user_id)
+            return offline
+
+    def take_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            return dirty
+
+    def restore_dirty(self, dirty):
+        with self._lock:
+            for user_id, seen in dirty.items():
+                self._dirty.setdefault(user_id, seen)
+
+
+_local_store = LocalPresenceStore()
+
+
+def _store():
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if 'django_redis' in backend:
+        from django_redis import get_redis_connection
+        return RedisPresenceStore(get_redis_connection('default'))
+    return _local_store
+
+
+def heartbeat(user_id, channel_name):
+    """
+    Record that a presence socket is alive (call on connect and on every heartbeat)
+
+    Returns:
+        bool: True if the user just came online
+    """
+    return _store().heartbeat(user_id, channel_name, time.time())
+
+
+def disconnect(user_id, channel_name):
+    """
+    Record that a presence socket closed
+
+    Returns:
+        bool: True if it was the user's last live socket (user went offline)
+    """
+    return _store().disconnect(user_id, channel_name, time.time())
+
+
+def online_user_ids(user_ids):
+    """
+    Bulk "who is online" query
+
+    Args:
+        user_ids: Iterable of user IDs
+
+    Returns:
+        set of the given user IDs that are online
+    """
+    return _store().online_user_ids(list(user_ids), time.time())
+
+
+def contact_ids(user_id):
+    """
+    IDs of users sharing at least one active thread with the user
+    """
+    from .models import ThreadParticipant
+    threads = ThreadParticipant.objects.filter(user_id=user_id, left_at__isnull=True).values('thread_id')
+    return set(
+        ThreadParticipant.objects.filter(thread_id__in=threads, left_at__isnull=True)
+        .exclude(user_id=user_id)
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+
+
+def sweep():
+    """
+    Take users whose sockets stopped heartbeating offline
+
+    Returns:
+        list of user IDs that went offline
+    """
+    return _store().sweep(time.time())
+
+
+def flush():
+    """
+    Write batched presence changes to User.is_online and User.last_seen
+
+    Returns:
+        int: Number of users updated
+    """
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+
+    store = _store()
+    dirty = store.take_dirty()
+    if not dirty:
+        return 0
+    try:
+        online = store.online_user_ids(list(dirty), time.time())
+        users = [
+            User(
+                id=user_id,
+                is_online=user_id in online,
+                last_seen=datetime.fromtimestamp(seen, tz=dt_timezone.utc),
+            )
+            for user_id, seen in dirty.items()
+        ]
+        User.objects.bulk_update(users, ['is_online', 'last_seen'], batch_size=500)
+    except Exception:
+        # Keep the changes for the next flush
+        store.restore_dirty(dirty)
+        raise
+    logger.info(f"Flushed presence for {len(users)} users")
+    return len(users)
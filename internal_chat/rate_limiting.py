@@ -2,20 +2,120 @@
 Rate limiting utilities for WebSocket connections
 
 Provides WebSocketRateLimiter class for preventing DoS attacks via
-message flooding. Uses Django cache backend (Redis or LocMemCache).
+message flooding, and atomic per-user WebSocket connection counters.
+
+With a django_redis cache, each limit is a sliding log in a Redis sorted set
+that one Lua script checks and records atomically, so concurrent Daphne
+workers cannot race past a limit. The *_async functions run the same scripts
+on a native asyncio Redis client, so consumers call them directly instead of
+occupying a thread-pool slot through database_sync_to_async.
+
+Without Redis (LocMemCache in development and tests) the sliding window is
+approximated from two fixed buckets in the Django cache, updated with atomic
+add/incr.
 """
+import asyncio
 import logging
+import math
+import time
+import uuid
+import weakref
+from django.conf import settings
 from django.core.cache import cache
-from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+CONNECTION_COUNT_TTL = 3600  # 1 hour expiry for connection counters
+
+# KEYS[1] = log key; ARGV = window (ms), limit, record (1/0), unique member
+# Returns {allowed, count}: count includes this action when it was recorded
+_SLIDING_WINDOW_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local window = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now_ms - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= tonumber(ARGV[2]) then
+    return {0, count}
+end
+if ARGV[3] == '1' then
+    redis.call('ZADD', KEYS[1], now_ms, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    count = count + 1
+end
+return {1, count}
+"""
+
+# KEYS[1] = counter; ARGV = limit, ttl (s). Returns 1 if a slot was taken, 0 if at the limit
+_ACQUIRE_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count > tonumber(ARGV[1]) then
+    redis.call('DECR', KEYS[1])
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS[1] = counter. Decrements without going below zero
+_RELEASE_SCRIPT = """
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+if count > 0 then
+    return redis.call('DECR', KEYS[1])
+end
+return 0
+"""
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _redis_url():
+    """
+    Get the Redis URL of the default cache, or None when it is not django_redis
+    """
+    config = settings.CACHES.get('default', {})
+    if 'django_redis' not in config.get('BACKEND', ''):
+        return None
+    location = config.get('LOCATION')
+    if isinstance(location, (list, tuple)):
+        location = location[0] if location else None
+    return location
+
+
+def _redis():
+    """
+    Get the synchronous Redis connection, or None without a django_redis cache
+    """
+    if _redis_url() is None:
+        return None
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def _async_redis():
+    """
+    Get a native asyncio Redis client for the running event loop, or None without Redis
+    
+    Clients are pooled per event loop (one per Daphne worker in production).
+    """
+    url = _redis_url()
+    if url is None:
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(url, socket_connect_timeout=5, socket_timeout=5)
+        _async_clients[loop] = client
+    return client
+
 
 class WebSocketRateLimiter:
     """
-    Rate limiter for WebSocket events
+    Sliding-window rate limiter for WebSocket events
     
-    Uses Django cache to track action counts per user within a time window.
+    Uses a Redis sorted set per user and action (exact sliding window), or two
+    fixed buckets in the Django cache (weighted approximation) without Redis.
     Supports distributed rate limiting when using Redis backend.
     """
     
@@ -35,6 +135,65 @@ class WebSocketRateLimiter:
         self.window = window
         self.cache_key = f"ws_rate_{action}_{user_id}"
     
+    # Redis sliding log
+    def _script_args(self, limit, record):
+        return [self.window * 1000, limit, '1' if record else '0', uuid.uuid4().hex]
+    
+    def _run_script(self, limit, record):
+        """Run the sliding-window script; returns (allowed, count) or None without Redis"""
+        redis = _redis()
+        if redis is None:
+            return None
+        try:
+            allowed, count = redis.eval(
+                _SLIDING_WINDOW_SCRIPT, 1, self.cache_key, *self._script_args(limit, record)
+            )
+            return bool(allowed), int(count)
+        except Exception as e:
+            logger.error(f"Rate limit check failed for user {self.user_id} on {self.action}: {str(e)}")
+            return True, 0  # Fail open: Redis outage should not block chat
+    
+    async def _run_script_async(self, limit, record):
+        """Async version of _run_script"""
+        redis = _async_redis()
+        if redis is None:
+            return None
+        try:
+            allowed, count = await redis.eval(
+                _SLIDING_WINDOW_SCRIPT, 1, self.cache_key, *self._script_args(limit, record)
+            )
+            return bool(allowed), int(count)
+        except Exception as e:
+            logger.error(f"Rate limit check failed for user {self.user_id} on {self.action}: {str(e)}")
+            return True, 0
+    
+    # Django cache buckets
+    def _bucket_keys(self):
+        """Return (current key, previous key, fraction of the current bucket elapsed)"""
+        now = time.time()
+        bucket, offset = divmod(now, self.window)
+        return (
+            f"{self.cache_key}:{int(bucket)}",
+            f"{self.cache_key}:{int(bucket) - 1}",
+            offset / self.window,
+        )
+    
+    def _cache_count(self):
+        current_key, previous_key, elapsed = self._bucket_keys()
+        counts = cache.get_many([current_key, previous_key])
+        weighted = counts.get(current_key, 0) + counts.get(previous_key, 0) * (1 - elapsed)
+        return int(math.floor(weighted))
+    
+    def _cache_increment(self):
+        current_key, _, _ = self._bucket_keys()
+        # Buckets live for two windows so the previous one is still readable
+        cache.add(current_key, 0, self.window * 2)
+        try:
+            cache.incr(current_key)
+        except ValueError:
+            # Evicted between add and incr
+            cache.set(current_key, 1, self.window * 2)
+    
     def is_allowed(self):
         """
         Check if action is allowed under rate limit.
@@ -42,7 +201,7 @@ class WebSocketRateLimiter:
         Returns:
             bool: True if allowed, False if rate limit exceeded
         """
-        current_count = cache.get(self.cache_key, 0)
+        current_count = self.get_current_count()
         
         if current_count >= self.limit:
             logger.warning(
@@ -55,12 +214,47 @@ class WebSocketRateLimiter:
     
     def increment(self):
         """
-        Increment the rate limit counter.
+        Record one action, regardless of the limit.
+        
+        Prefer hit(), which checks and records atomically.
+        """
+        if self._run_script(limit=2 ** 31, record=True) is None:
+            self._cache_increment()
+    
+    def hit(self):
+        """
+        Atomically check the limit and record the action if allowed.
         
-        Sets TTL to window duration on first increment to ensure automatic reset.
+        Returns:
+            bool: True if allowed (and recorded), False if rate limit exceeded
+        """
+        result = self._run_script(limit=self.limit, record=True)
+        if result is not None:
+            return result[0]
+        
+        # Increment first, then check: concurrent callers can never both slip under the limit
+        self._cache_increment()
+        if self._cache_count() > self.limit:
+            current_key, _, _ = self._bucket_keys()
+            try:
+                cache.decr(current_key)
+            except ValueError:
+                pass
+            return False
+        return True
+    
+    async def ahit(self):
         """
-        current_count = cache.get(self.cache_key, 0)
-        cache.set(self.cache_key, current_count + 1, self.window)
+        Async hit() using the native asyncio Redis client (no thread-pool hop).
+        
+        Returns:
+            bool: True if allowed (and recorded), False if rate limit exceeded
+        """
+        result = await self._run_script_async(limit=self.limit, record=True)
+        if result is not None:
+            return result[0]
+        # In-process LocMemCache: cheap enough to call from the event loop
+        return self.hit()
     
     def get_remaining(self):
         """
@@ -69,8 +263,7 @@ class WebSocketRateLimiter:
         Returns:
             int: Number of actions remaining
         """
-        current_count = cache.get(self.cache_key, 0)
-        return max(0, self.limit - current_count)
+        return max(0, self.limit - self.get_current_count())
     
     def get_current_count(self):
         """
@@ -79,7 +272,10 @@ class WebSocketRateLimiter:
         Returns:
             int: Current number of actions in window
         """
-        return cache.get(self.cache_key, 0)
+        result = self._run_script(limit=2 ** 31, record=False)
+        if result is not None:
+            return result[1]
+        return self._cache_count()
     
     def reset(self):
         """
@@ -87,7 +283,12 @@ class WebSocketRateLimiter:
         
         This should only be used in testing or administrative actions.
         """
-        cache.delete(self.cache_key)
+        redis = _redis()
+        if redis is not None:
+            redis.delete(self.cache_key)
+        else:
+            current_key, previous_key, _ = self._bucket_keys()
+            cache.delete_many([current_key, previous_key])
         logger.info(f"Rate limit reset for user {self.user_id} on {self.action}")
 
 
@@ -103,24 +304,35 @@ def check_rate_limit(user_id, action, limit=60, window=60):
         action: Action type (e.g., 'message_send', 'reaction_add')
         limit: Max actions per window (default: 60)
         window: Time window in seconds (default: 60)
-        
+    
     Returns:
         bool: True if allowed (and incremented), False if exceeded
     """
-    limiter = WebSocketRateLimiter(user_id, action, limit, window)
+    if WebSocketRateLimiter(user_id, action, limit, window).hit():
+        logger.debug(f"Rate limit check passed for user {user_id} on {action}")
+        return True
     
-    if limiter.is_allowed():
-        limiter.increment()
-        logger.debug(
-            f"Rate limit check passed for user {user_id} on {action}: "
-            f"{limiter.get_current_count()}/{limit}"
-        )
+    logger.warning(f"Rate limit check failed for user {user_id} on {action} (limit {limit}/{window}s)")
+    return False
+
+
+async def check_rate_limit_async(user_id, action, limit=60, window=60):
+    """
+    Async check_rate_limit for consumers, using the native asyncio Redis client.
+    
+    Args:
+        user_id: User ID
+        action: Action type (e.g., 'message_send', 'reaction_add')
+        limit: Max actions per window (default: 60)
+        window: Time window in seconds (default: 60)
+    
+    Returns:
+        bool: True if allowed (and incremented), False if exceeded
+    """
+    if await WebSocketRateLimiter(user_id, action, limit, window).ahit():
         return True
     
-    logger.warning(
-        f"Rate limit check failed for user {user_id} on {action}: "
-        f"{limiter.get_current_count()}/{limit}"
-    )
+    logger.warning(f"Rate limit check failed for user {user_id} on {action} (limit {limit}/{window}s)")
     return False
 
 
@@ -135,7 +347,7 @@ def get_rate_limit_info(user_id, action, limit=60, window=60):
         action: Action type
         limit: Max actions per window
         window: Time window in seconds
-        
+    
     Returns:
         dict: Rate limit information with keys:
             - current: Current action count
@@ -146,7 +358,7 @@ def get_rate_limit_info(user_id, action, limit=60, window=60):
     """
     limiter = WebSocketRateLimiter(user_id, action, limit, window)
     current = limiter.get_current_count()
-    remaining = limiter.get_remaining()
+    remaining = max(0, limit - current)
     
     return {
         'current': current,
@@ -155,3 +367,91 @@ def get_rate_limit_info(user_id, action, limit=60, window=60):
         'window': window,
         'allowed': remaining > 0
     }
+
+
+def _connection_key(user_id):
+    return f"ws_conn_count_{user_id}"
+
+
+def acquire_connection(user_id, limit):
+    """
+    Atomically take one of a user's concurrent WebSocket connection slots.
+    
+    Args:
+        user_id: User ID
+        limit: Maximum concurrent connections
+    
+    Returns:
+        bool: True if a slot was taken, False if the user is at the limit
+    """
+    key = _connection_key(user_id)
+    redis = _redis()
+    if redis is not None:
+        try:
+            return bool(redis.eval(_ACQUIRE_SCRIPT, 1, key, limit, CONNECTION_COUNT_TTL))
+        except Exception as e:
+            logger.error(f"Connection count update failed for user {user_id}: {str(e)}")
+            return True
+    
+    cache.add(key, 0, CONNECTION_COUNT_TTL)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, CONNECTION_COUNT_TTL)
+        count = 1
+    if count > limit:
+        cache.decr(key)
+        return False
+    cache.touch(key, CONNECTION_COUNT_TTL)
+    return True
+
+
+def release_connection(user_id):
+    """
+    Release a connection slot taken by acquire_connection (never below zero).
+    
+    Args:
+        user_id: User ID
+    """
+    key = _connection_key(user_id)
+    redis = _redis()
+    if redis is not None:
+        try:
+            redis.eval(_RELEASE_SCRIPT, 1, key)
+        except Exception as e:
+            logger.error(f"Connection count update failed for user {user_id}: {str(e)}")
+        return
+    
+    try:
+        if cache.decr(key) < 0:
+            cache.set(key, 0, CONNECTION_COUNT_TTL)
+    except ValueError:
+        pass  # Counter expired
+
+
+async def acquire_connection_async(user_id, limit):
+    """
+    Async acquire_connection using the native asyncio Redis client.
+    """
+    redis = _async_redis()
+    if redis is None:
+        return acquire_connection(user_id, limit)
+    try:
+        return bool(await redis.eval(_ACQUIRE_SCRIPT, 1, _connection_key(user_id), limit, CONNECTION_COUNT_TTL))
+    except Exception as e:
+        logger.error(f"Connection count update failed for user {user_id}: {str(e)}")
+        return True
+
+
+async def release_connection_async(user_id):
+    """
+    Async release_connection using the native asyncio Redis client.
+    """
+    redis = _async_redis()
+    if redis is None:
+        release_connection(user_id)
+        return
+    try:
+        await redis.eval(_RELEASE_SCRIPT, 1, _connection_key(user_id))
+    except Exception as e:
+        logger.error(f"Connection count update failed for user {user_id}: {str(e)}")
@@ -0,0 +1,132 @@
+"""
+Read receipt aggregator for Internal Chat
+
+Clients report reads over the WebSocket (message.read events) as the user
+scrolls, often several per second for the same thread. The first read for a
+(thread, user) is applied immediately; further reads within
+INTERNAL_CHAT_READ_RECEIPT_WINDOW_MS are merged, keeping only the furthest
+position, and applied together when the window ends. A background thread
+flushes pending reads with MessageService.mark_as_read_bulk: one participant
+query, one bulk_update, and one coalesced receipt_read event per user.
+Explicit REST reads (mark-read, messages/<id>/read) bypass the aggregator and
+are applied at once.
+
+Read positions only move forward, so reads handled by different worker
+processes can be applied in any order.
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = {}  # (thread_id, user_id) -> (read_at, message_id)
+_last_applied = {}  # (thread_id, user_id) -> monotonic time of the last write
+_flusher = None
+
+
+def window():
+    """Debounce window in seconds (0 applies every read immediately)"""
+    return getattr(settings, 'INTERNAL_CHAT_READ_RECEIPT_WINDOW_MS', 2000) / 1000
+
+
+def record(thread_id, user_id, read_at, message_id=None):
+    """
+    Record that a user has read a thread up to a point
+
+    Args:
+        thread_id: Thread ID
+        user_id: Reader's user ID
+        read_at: Read position (the message's created_at, or now for "read all")
+        message_id: Message read up to, for the receipt event (optional)
+
+    Returns:
+        bool: True if applied immediately, False if deferred to the next flush
+    """
+    from .models import Thread
+    from .services import MessageService
+
+    thread_id = Thread._meta.pk.to_python(thread_id)
+    key = (thread_id, user_id)
+    now = time.monotonic()
+    debounce = window()
+    with _lock:
+        last = _last_applied.get(key)
+        if debounce <= 0 or (key not in _pending and (last is None or now - last >= debounce)):
+            _last_applied[key] = now
+            if len(_last_applied) > 10000:
+                _prune(now, debounce)
+            apply_now = True
+        else:
+            current = _pending.get(key)
+            if current is None or read_at > current[0]:
+                _pending[key] = (read_at, message_id)
+            _ensure_flusher()
+            apply_now = False
+
+    if apply_now:
+        MessageService.mark_as_read_bulk([(thread_id, user_id, read_at, message_id)])
+    return apply_now
+
+
+def flush():
+    """
+    Apply all pending reads in one batch
+
+    Returns:
+        int: Number of (thread, user) read positions applied
+    """
+    from .services import MessageService
+
+    with _lock:
+        pending = _pending.copy()
+        _pending.clear()
+        now = time.monotonic()
+        for key in pending:
+            _last_applied[key] = now
+        _prune(now, window())
+
+    if not pending:
+        return 0
+    try:
+        MessageService.mark_as_read_bulk([
+            (thread_id, user_id, read_at, message_id)
+            for (thread_id, user_id), (read_at, message_id) in pending.items()
+        ])
+    except Exception:
+        # Put the reads back (unless newer ones arrived) for the next flush
+        with _lock:
+            for key, value in pending.items():
+                if key not in _pending or value[0] > _pending[key][0]:
+                    _pending[key] = value
+        raise
+    return len(pending)
+
+
+def _prune(now, debounce):
+    """Forget keys whose window has passed (caller holds the lock)"""
+    for key in [key for key, last in _last_applied.items() if now - last >= debounce]:
+        del _last_applied[key]
+
+
+def _ensure_flusher():
+    """Start the background flush thread (caller holds the lock)"""
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_run_flusher, name='chat-read-receipts', daemon=True)
+        _flusher.start()
+
+
+def _run_flusher():
+    while True:
+        time.sleep(max(window(), 0.05))
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Error flushing read receipts: {str(e)}")
+        finally:
+            # This thread's DB connection must not outlive the database's timeout
+            connections.close_all()
@@ -0,0 +1,186 @@
+"""
+Message search for Internal Chat
+
+A per-thread inverted index in the database (MessageSearchTerm rows of
+thread, term, message, frequency), maintained by MessageService on create,
+edit and delete, replaces LIKE scans over Message.content.
+
+Terms are produced by tokenize(): HTML is stripped, each word is normalized
+with surveys.arabic_text.normalize_arabic (diacritics, hamza/alef/yaa/taa
+marbuta forms, digits) and the Arabic definite article is removed, so
+"الكتاب", "كتاب" and "كِتَاب" all index and query as the same term.
+
+Results are ranked by the number of distinct query terms matched, then by
+total term frequency, then by recency.
+"""
+import logging
+import re
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils.html import strip_tags
+from surveys.arabic_text import normalize_arabic
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 10
+
+# Definite article forms, longest first ("and the", "with the", "for the", "the")
+ARABIC_ARTICLES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+
+
+def _stem(token):
+    """Strip a leading Arabic definite article when enough of the word remains"""
+    for article in ARABIC_ARTICLES:
+        if token.startswith(article) and len(token) - len(article) >= 3:
+            return token[len(article):]
+    return token
+
+
+def tokenize(text):
+    """
+    Split message text into normalized search terms
+
+    Args:
+        text: Message content (may contain sanitized HTML)
+
+    Returns:
+        Counter of term -> occurrences
+    """
+    terms = Counter()
+    if not text:
+        return terms
+    # Normalize word by word: words repeat across messages, so the
+    # normalize_arabic LRU stays useful instead of filling with whole messages
+    for word in strip_tags(text).split():
+        for token in TOKEN.findall(normalize_arabic(word)):
+            if len(token) < 2 and not token.isdigit():
+                continue
+            terms[_stem(token)[:MAX_TERM_LENGTH]] += 1
+    return terms
+
+
+def index_message(message):
+    """
+    (Re)build the index rows of one message; deleted messages are removed
+    """
+    from .models import MessageSearchTerm
+
+    MessageSearchTerm.objects.filter(message_id=message.id).delete()
+    if message.deleted_at is not None:
+        return
+    MessageSearchTerm.objects.bulk_create([
+        MessageSearchTerm(
+            thread_id=message.thread_id,
+            message_id=message.id,
+            term=term,
+            frequency=frequency
+        )
+        for term, frequency in tokenize(message.content).items()
+    ])
+
+
+def remove_message(message_id):
+    """Drop a message from the index"""
+    from .models import MessageSearchTerm
+
+    MessageSearchTerm.objects.filter(message_id=message_id).delete()
+
+
+def search_messages(user, query, thread_id=None):
+    """
+    Ranked message hits in threads the user actively participates in
+
+    Args:
+        user: Searching user
+        query: Free-text query
+        thread_id: Optionally restrict to one thread
+
+    Returns:
+        Values queryset of {'message_id', 'matched', 'hits'} in rank order
+        (empty if the query has no searchable terms)
+    """
+    from .models import MessageSearchTerm, ThreadParticipant
+
+    terms = list(tokenize(query))[:MAX_QUERY_TERMS]
+    if not terms:
+        return MessageSearchTerm.objects.none().values('message_id')
+
+    thread_ids = ThreadParticipant.objects.filter(
+        user=user,
+        left_at__isnull=True
+    ).values('thread_id')
+    hits = MessageSearchTerm.objects.filter(
+        thread_id__in=thread_ids,
+        term__in=terms,
+        message__deleted_at__isnull=True
+    )
+    if thread_id:
+        hits = hits.filter(thread_id=thread_id)
+
+    return hits.values('message_id', 'message__created_at').annotate(
+        matched=Count('term'),
+        hits=Sum('frequency')
+    ).order_by('-matched', '-hits', '-message__created_at')
+
+
+def _rebuild_thread(thread_id, batch_size):
+    """
+    Replace one thread's index rows in a single transaction
+
+    Searches keep seeing the old rows until the new ones commit. A message
+    indexed concurrently by MessageService may already have its rows, which
+    ignore_conflicts skips instead of failing on the (message, term) key.
+    """
+    from .models import Message, MessageSearchTerm
+
+    messages = Message.objects.filter(thread_id=thread_id, deleted_at__isnull=True)
+    indexed = 0
+    with transaction.atomic():
+        MessageSearchTerm.objects.filter(thread_id=thread_id).delete()
+        batch = []
+        for message in messages.only('id', 'thread_id', 'content').iterator(chunk_size=batch_size):
+            batch.extend(
+                MessageSearchTerm(
+                    thread_id=message.thread_id,
+                    message_id=message.id,
+                    term=term,
+                    frequency=frequency
+                )
+                for term, frequency in tokenize(message.content).items()
+            )
+            indexed += 1
+            if indexed % batch_size == 0:
+                MessageSearchTerm.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+                batch = []
+        if batch:
+            MessageSearchTerm.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+    return indexed
+
+
+def rebuild(thread_id=None, batch_size=500):
+    """
+    Rebuild the index from Message.content, one thread (and transaction) at a time
+
+    Args:
+        thread_id: Only rebuild this thread (default: all threads)
+        batch_size: Messages read and indexed per batch
+
+    Returns:
+        int: Number of messages indexed
+    """
+    from .models import Thread
+
+    if thread_id:
+        thread_ids = [thread_id]
+    else:
+        thread_ids = list(Thread.objects.order_by('id').values_list('id', flat=True))
+
+    indexed = 0
+    for current_id in thread_ids:
+        indexed += _rebuild_thread(current_id, batch_size)
+
+    logger.info(f"Indexed {indexed} messages in {len(thread_ids)} threads for search")
+    return indexed
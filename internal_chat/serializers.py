@@ -4,11 +4,14 @@ DRF Serializers for Internal Chat
 from rest_framework import serializers
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 from .models import (
     Thread, ThreadParticipant, Message, GroupSettings,
     Attachment, MessageReaction, AuditLog
 )
 from .services import ThreadService
+from . import unread_counters
 from weaponpowercloud_backend.utils import build_absolute_uri_https, force_https
 
 User = get_user_model()
@@ -50,11 +53,11 @@ class AttachmentSerializer(serializers.ModelSerializer):
     
     def get_url(self, obj):
         """
-        Return download URL for blob-stored attachment
+        Return download URL for the attachment
         """
         request = self.context.get('request')
         if request:
-            # Build download URL for blob storage using the router-generated URL
+            # Build download URL using the router-generated URL
             try:
                 from django.urls import reverse
                 download_path = reverse('internal_chat:attachment-download', kwargs={'pk': obj.pk})
@@ -138,17 +141,14 @@ class AttachmentUploadSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         """
-        Create attachment with file data stored as blob in database.
+        Create attachment, streaming the file into content-addressed storage.
         """
-        import hashlib
+        from . import attachment_storage
         
         file = validated_data['file']
         
-        # Read file content into memory
-        file_content = file.read()
-        
-        # Calculate SHA256 checksum
-        checksum = hashlib.sha256(file_content).hexdigest()
+        # Hash and store the file in chunks (identical content is stored once)
+        storage_name, checksum, size = attachment_storage.save(file)
         
         # Use sanitized filename from validation (already cleaned)
         sanitized_name = self.context.get('sanitized_filename', file.name)
@@ -156,17 +156,19 @@ class AttachmentUploadSerializer(serializers.ModelSerializer):
         # Use detected MIME type (from magic bytes) instead of client-provided Content-Type
         detected_mime = self.context.get('detected_mime', file.content_type)
         
-        # Create attachment with blob data stored in database
         attachment = Attachment.objects.create(
             message=None,  # Will be set when message is created
-            file_data=file_content,
+            storage_name=storage_name,
             file_name=sanitized_name,  # Store sanitized original name for display
             caption=validated_data.get('caption', ''),
             content_type=detected_mime,  # Use validated MIME type, not header
-            size=len(file_content),
+            size=size,
             checksum=checksum
         )
         
+        # The reused file may have been released before the row was visible
+        transaction.on_commit(lambda: attachment_storage.ensure_stored(attachment, file))
+        
         return attachment
 
 
@@ -242,6 +244,104 @@ class MessageSerializer(serializers.ModelSerializer):
             return False
 
 
+def _iso(value):
+    """Format a datetime the way DRF's DateTimeField does (ISO 8601, 'Z' for UTC)"""
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _user_event_data(user):
+    if user is None:
+        return None
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+    }
+
+
+def _related(message, name, queryset):
+    """Use a prefetched relation when the caller loaded one, else query it"""
+    prefetched = getattr(message, '_prefetched_objects_cache', {})
+    if name in prefetched:
+        return list(prefetched[name])
+    return list(queryset)
+
+
+def message_event_data(message, attachments=None, reactions=None):
+    """
+    Build a WebSocket message payload without DRF
+    
+    Produces the same JSON as MessageSerializer without a request (is_read is
+    False and attachment URLs are None; clients resolve both over REST), from
+    already-loaded objects. Broadcasting a just-created message needs no
+    queries beyond its attachments; pass attachments/reactions when known.
+    
+    Args:
+        message: Message with sender (and reply_to, if any) loaded
+        attachments: Attachments of the message (default: prefetched or queried)
+        reactions: Reactions of the message (default: prefetched or queried with users)
+    
+    Returns:
+        dict of JSON-safe values
+    """
+    if attachments is None:
+        attachments = _related(message, 'attachments', message.attachments.all())
+    if reactions is None:
+        reactions = _related(message, 'reactions', message.reactions.select_related('user'))
+    
+    reply_to = None
+    if message.reply_to_id and message.reply_to and not message.reply_to.is_deleted():
+        reply_to = {
+            'id': str(message.reply_to.id),
+            'content': message.reply_to.content[:100],
+            'sender': _user_event_data(message.reply_to.sender),
+        }
+    
+    return {
+        'id': str(message.id),
+        'thread_id': str(message.thread_id),
+        'sender': _user_event_data(message.sender),
+        'content': message.content,
+        'reply_to': reply_to,
+        'has_attachments': message.has_attachments,
+        'attachments': [
+            {
+                'id': str(attachment.id),
+                'file_name': attachment.file_name,
+                'content_type': attachment.content_type,
+                'size': attachment.size,
+                'size_mb': attachment.size_mb,
+                'url': None,
+                'caption': attachment.caption,
+                'created_at': _iso(attachment.created_at),
+            }
+            for attachment in attachments
+        ],
+        'reactions': [
+            {
+                'id': reaction.id,
+                'emoji': reaction.emoji,
+                'user': _user_event_data(reaction.user),
+                'created_at': _iso(reaction.created_at),
+            }
+            for reaction in reactions
+        ],
+        'is_edited': message.edited_at is not None,
+        'is_deleted': message.deleted_at is not None,
+        'is_read': False,
+        'created_at': _iso(message.created_at),
+        'updated_at': _iso(message.edited_at),
+        'edited_at': _iso(message.edited_at),
+    }
+
+
 class MessageCreateSerializer(serializers.Serializer):
     """
     Serializer for creating messages
@@ -341,7 +441,7 @@ class ThreadSerializer(serializers.ModelSerializer):
     chat_name = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
-    participant_count = serializers.ReadOnlyField()
+    participant_count = serializers.SerializerMethodField()
     my_role = serializers.SerializerMethodField()
     participants = ThreadParticipantSerializer(many=True, read_only=True)
     group_settings = GroupSettingsSerializer(read_only=True)
@@ -361,49 +461,48 @@ class ThreadSerializer(serializers.ModelSerializer):
         ]
     
     def get_last_message(self, obj):
-        # Get from prefetched last_message_list if available
-        if hasattr(obj, 'last_message_list') and obj.last_message_list:
-            message = obj.last_message_list[0]
-            return {
-                'id': message.id,
-                'sender': UserBasicSerializer(message.sender).data,
-                'content': message.content[:100],
-                'created_at': message.created_at
-            }
-        
-        # Fallback query
-        last_msg = obj.messages.filter(deleted_at__isnull=True).order_by('-created_at').first()
-        if last_msg:
-            return {
-                'id': last_msg.id,
-                'sender': UserBasicSerializer(last_msg.sender).data,
-                'content': last_msg.content[:100],
-                'created_at': last_msg.created_at
-            }
-        return None
+        """
+        Latest message from the thread's denormalized pointer (no per-thread query)
+        """
+        if not obj.last_message_id:
+            return None
+        return {
+            'id': obj.last_message_id,
+            'sender': UserBasicSerializer(obj.last_message.sender).data,
+            'content': obj.last_message_preview,
+            'created_at': obj.last_message_at
+        }
+    
+    def _active_participants(self, obj):
+        """
+        Active participants, using the view's prefetch when present
+        """
+        return [p for p in obj.participants.all() if p.left_at is None]
     
     def get_unread_count(self, obj):
         """
         Get unread count for current user from stored field
         """
         user = self.context['request'].user
-        try:
-            participant = ThreadParticipant.objects.get(
-                thread=obj,
-                user=user,
-                left_at__isnull=True
-            )
-            return participant.unread_count
-        except ThreadParticipant.DoesNotExist:
-            return 0
+        if unread_counters.enabled():
+            # One HGETALL per serializer run instead of a query per thread
+            if '_unread_counts' not in self.context:
+                self.context['_unread_counts'] = unread_counters.get_counts(user.id)
+            return self.context['_unread_counts'].get(str(obj.id), 0)
+        for participant in self._active_participants(obj):
+            if participant.user_id == user.id:
+                return participant.unread_count
+        return 0
+    
+    def get_participant_count(self, obj):
+        return len(self._active_participants(obj))
     
     def get_my_role(self, obj):
         user = self.context['request'].user
-        try:
-            participant = obj.participants.get(user=user, left_at__isnull=True)
-            return participant.role
-        except ThreadParticipant.DoesNotExist:
-            return None
+        for participant in self._active_participants(obj):
+            if participant.user_id == user.id:
+                return participant.role
+        return None
     
     def get_chat_name(self, obj):
         """
@@ -420,9 +519,10 @@ class ThreadSerializer(serializers.ModelSerializer):
             user = self.context['request'].user
             
             # Get the other participant (not the current user)
-            other_participant = obj.participants.filter(
-                left_at__isnull=True
-            ).exclude(user=user).select_related('user').first()
+            other_participant = next(
+                (p for p in self._active_participants(obj) if p.user_id != user.id),
+                None
+            )
             
             if other_participant:
                 other_user = other_participant.user
@@ -3,15 +3,15 @@ Business Logic Services for Internal Chat
 """
 import logging
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.core.exceptions import PermissionDenied, ValidationError
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from .models import (
     Thread, ThreadParticipant, Message, GroupSettings,
     Attachment, DirectThreadKey, AuditLog, MessageReaction
 )
 from .security_utils import sanitize_message_content, sanitize_caption, validate_emoji
+from . import broadcast, search, unread_counters
 
 logger = logging.getLogger(__name__)
 
@@ -175,6 +175,7 @@ class ThreadService:
                 existing.left_at = None
                 existing.joined_at = timezone.now()
                 existing.save()
+                unread_counters.set_count(user.id, thread.id, existing.unread_count)
                 added_users.append(user)
             else:
                 # New participant
@@ -222,6 +223,8 @@ class ThreadService:
         # Soft delete
         participant.left_at = timezone.now()
         participant.save()
+        unread_counters.forget(participant.user_id, thread.id)
+        MessageService._broadcast_member_removed(thread.id, participant.user_id)
         
         # Audit log
         AuditLog.objects.create(
@@ -256,6 +259,16 @@ class ThreadService:
         participant.role = new_role
         participant.save()
         
+        # Open sockets of this user cache their membership; have them reload it
+        broadcast.publish(
+            f'thread_{thread.id}',
+            {
+                'type': 'participant_changed',
+                'user_id': participant.user_id,
+            },
+            key=('participant_changed', thread.id, participant.user_id)
+        )
+        
         # Audit log
         AuditLog.objects.create(
             actor=changed_by,
@@ -285,6 +298,8 @@ class ThreadService:
         
         participant.left_at = timezone.now()
         participant.save()
+        unread_counters.forget(user.id, thread.id)
+        MessageService._broadcast_member_removed(thread.id, user.id)
         
         logger.info(f"User {user.id} left thread {thread.id}")
     
@@ -304,12 +319,15 @@ class MessageService:
     
     @staticmethod
     @transaction.atomic
-    def create_message(thread, sender, content, reply_to_id=None, attachment_ids=None):
+    def create_message(thread, sender, content, reply_to_id=None, attachment_ids=None, participant=None):
         """
         Create a new message
+        
+        participant: The sender's ThreadParticipant, when the caller already holds
+        it (e.g. a WebSocket connection), to skip the membership query
         """
         # Check if user can post
-        if not ValidationService.can_post_in_thread(sender, thread):
+        if not ValidationService.can_post_in_thread(sender, thread, participant=participant):
             raise PermissionDenied("You don't have permission to post in this thread")
         
         # SECURITY: Sanitize content before saving to prevent XSS attacks
@@ -343,31 +361,32 @@ class MessageService:
         if attachment_ids:
             Attachment.objects.filter(id__in=attachment_ids).update(message=message)
         
-        # Update thread timestamp
-        thread.updated_at = timezone.now()
-        thread.save(update_fields=['updated_at'])
+        # Add to the thread's search index
+        search.index_message(message)
         
-        # Increment unread count for all participants except sender
-        participants = ThreadParticipant.objects.filter(
+        # Update thread timestamp and denormalized last message (one UPDATE)
+        thread.updated_at = timezone.now()
+        thread.last_message = message
+        thread.last_message_preview = message.content[:100]
+        thread.last_message_at = message.created_at
+        thread.save(update_fields=['updated_at', 'last_message', 'last_message_preview', 'last_message_at'])
+        
+        # Increment unread count for all participants except sender (Redis counters,
+        # or one UPDATE when they live in the database), then a single batched broadcast
+        recipient_ids = list(ThreadParticipant.objects.filter(
             thread=thread,
             left_at__isnull=True
-        ).exclude(user=sender)
+        ).exclude(user=sender).values_list('user_id', flat=True))
         
-        for participant in participants:
-            # Use F() expression to prevent race conditions
-            from django.db.models import F
-            ThreadParticipant.objects.filter(id=participant.id).update(
-                unread_count=F('unread_count') + 1
-            )
-            # Refresh to get updated count
-            participant.refresh_from_db()
-            
-            # Broadcast unread count update to the user's WebSocket
-            MessageService._broadcast_unread_count_update(
-                thread.id,
-                participant.user.id,
-                participant.unread_count
-            )
+        def count_unread():
+            unread_counts = unread_counters.increment(thread.id, recipient_ids)
+            MessageService._broadcast_unread_counts(thread.id, unread_counts)
+        
+        if unread_counters.enabled():
+            # Redis does not roll back with the transaction: count once the message is committed
+            transaction.on_commit(count_unread)
+        else:
+            count_unread()
         
         # Broadcast to WebSocket clients (Phase 2 real-time)
         MessageService._broadcast_message_new(message)
@@ -398,6 +417,13 @@ class MessageService:
         message.edited_at = timezone.now()
         message.save()
         
+        search.index_message(message)
+        
+        # Keep the inbox preview in sync when the thread's latest message is edited
+        Thread.objects.filter(id=message.thread_id, last_message=message).update(
+            last_message_preview=new_content[:100]
+        )
+        
         # Broadcast update to WebSocket clients (Phase 2 real-time)
         MessageService._broadcast_message_updated(message)
         
@@ -414,6 +440,11 @@ class MessageService:
             raise PermissionDenied("You don't have permission to delete this message")
         
         message.soft_delete()
+        search.remove_message(message.id)
+        
+        # Point the thread at the previous message if this one was its latest
+        if Thread.objects.filter(id=message.thread_id, last_message=message).exists():
+            MessageService.refresh_last_message(message.thread_id)
         
         # Broadcast deletion to WebSocket clients (Phase 2 real-time)
         MessageService._broadcast_message_deleted(message)
@@ -428,6 +459,22 @@ class MessageService:
         
         logger.info(f"Deleted message {message.id} by user {deleter.id}")
     
+    @staticmethod
+    def refresh_last_message(thread_id):
+        """
+        Recompute a thread's denormalized last message from its messages
+        """
+        last_message = Message.objects.filter(
+            thread_id=thread_id,
+            deleted_at__isnull=True
+        ).order_by('-created_at').only('id', 'content', 'created_at').first()
+        
+        Thread.objects.filter(id=thread_id).update(
+            last_message=last_message,
+            last_message_preview=last_message.content[:100] if last_message else '',
+            last_message_at=last_message.created_at if last_message else None
+        )
+    
     @staticmethod
     @transaction.atomic
     def mark_as_read(thread, user, up_to_message=None):
@@ -448,22 +495,103 @@ class MessageService:
         # Reset unread count to 0
         participant.unread_count = 0
         participant.save(update_fields=['last_read_at', 'unread_count'])
+        total_unread = unread_counters.set_count(user.id, thread.id, 0)
         
         # Broadcast unread count update
-        MessageService._broadcast_unread_count_update(
-            thread.id,
-            user.id,
-            0
-        )
+        MessageService._broadcast_unread_counts(thread.id, [(user.id, 0, total_unread)])
+        
+        # Broadcast read receipt (only the furthest read position per user matters)
+        if up_to_message:
+            broadcast.publish(
+                f'thread_{thread.id}',
+                {
+                    'type': 'receipt_read',
+                    'user_id': user.id,
+                    'message_id': str(up_to_message.id),
+                },
+                key=('receipt_read', thread.id, user.id)
+            )
         
         logger.info(f"User {user.id} marked thread {thread.id} as read")
     
     @staticmethod
     @transaction.atomic
-    def add_reaction(message, user, emoji):
+    def mark_as_read_bulk(reads):
+        """
+        Apply many read positions at once (used by the read receipt aggregator)
+        
+        Reads only move forward: a position older than the stored last_read_at
+        is ignored. Participants are loaded in one query and written with one
+        bulk_update, then each thread gets one batched unread update and one
+        receipt per user.
+        
+        Args:
+            reads: list of (thread_id, user_id, read_at, message_id or None)
+        
+        Returns:
+            int: Number of participants updated
+        """
+        if not reads:
+            return 0
+        
+        latest = {}
+        for thread_id, user_id, read_at, message_id in reads:
+            key = (Thread._meta.pk.to_python(thread_id), user_id)
+            current = latest.get(key)
+            if current is None or read_at > current[0]:
+                latest[key] = (read_at, message_id)
+        
+        lookup = Q()
+        for thread_id, user_id in latest:
+            lookup |= Q(thread_id=thread_id, user_id=user_id)
+        participants = ThreadParticipant.objects.filter(lookup, left_at__isnull=True).only(
+            'id', 'thread_id', 'user_id', 'last_read_at', 'unread_count'
+        )
+        
+        changed = []
+        unread_by_thread = {}
+        receipts = []
+        for participant in participants:
+            read_at, message_id = latest[(participant.thread_id, participant.user_id)]
+            if participant.last_read_at and participant.last_read_at >= read_at and participant.unread_count == 0:
+                continue
+            if not participant.last_read_at or read_at > participant.last_read_at:
+                participant.last_read_at = read_at
+            participant.unread_count = 0
+            changed.append(participant)
+            
+            total_unread = unread_counters.set_count(participant.user_id, participant.thread_id, 0)
+            unread_by_thread.setdefault(participant.thread_id, []).append((participant.user_id, 0, total_unread))
+            if message_id:
+                receipts.append((participant.thread_id, participant.user_id, message_id))
+        
+        ThreadParticipant.objects.bulk_update(changed, ['last_read_at', 'unread_count'], batch_size=500)
+        
+        for thread_id, unread_counts in unread_by_thread.items():
+            MessageService._broadcast_unread_counts(thread_id, unread_counts)
+        
+        for thread_id, user_id, message_id in receipts:
+            broadcast.publish(
+                f'thread_{thread_id}',
+                {
+                    'type': 'receipt_read',
+                    'user_id': user_id,
+                    'message_id': str(message_id),
+                },
+                key=('receipt_read', thread_id, user_id)
+            )
+        
+        logger.info(f"Applied {len(changed)} read positions from {len(reads)} read events")
+        return len(changed)
+    
+    @staticmethod
+    @transaction.atomic
+    def add_reaction(message, user, emoji, participant=None):
         """
         Add emoji reaction to message
         User can only have one reaction per message - old reaction is deleted if exists
+        
+        participant: The user's ThreadParticipant if already loaded, to skip the membership query
         """
         # SECURITY: Validate emoji to prevent injection
         try:
@@ -481,11 +609,15 @@ class MessageService:
                 pass
         
         # Check if user is participant
-        if not ThreadParticipant.objects.filter(
-            thread=message.thread,
-            user=user,
-            left_at__isnull=True
-        ).exists():
+        if participant is not None:
+            is_participant = participant.thread_id == message.thread_id and participant.left_at is None
+        else:
+            is_participant = ThreadParticipant.objects.filter(
+                thread=message.thread,
+                user=user,
+                left_at__isnull=True
+            ).exists()
+        if not is_participant:
             raise PermissionDenied("You must be a participant to react")
         
         # Delete existing reaction if any (user can only have one reaction per message)
@@ -532,30 +664,27 @@ class MessageService:
     def _broadcast_message_new(message):
         """
         Broadcast new message to WebSocket clients
+        
+        The payload is built from the objects create_message already holds: a
+        new message has no reactions, and only its attachments are loaded.
         """
         try:
-            channel_layer = get_channel_layer()
             thread_group_name = f'thread_{message.thread_id}'
             
-            # Reload message with all relationships to ensure attachments are included
-            from .models import Message
-            message = Message.objects.select_related(
-                'sender', 'reply_to', 'thread'
-            ).prefetch_related('attachments', 'reactions__user').get(id=message.id)
-            
-            # Serialize message
-            from .serializers import MessageSerializer
-            message_data = MessageSerializer(message).data
+            from .serializers import message_event_data
+            attachments = list(Attachment.objects.filter(message=message)) if message.has_attachments else []
+            message_data = message_event_data(message, attachments=attachments, reactions=[])
             
-            # Send to all clients in thread group
-            async_to_sync(channel_layer.group_send)(
+            # Send to all clients in thread group once the message is committed
+            broadcast.publish(
                 thread_group_name,
                 {
                     'type': 'message_new',
                     'message': message_data,
-                }
+                },
+                key=('message', message.id)
             )
-            logger.debug(f"Broadcasted new message {message.id} to group {thread_group_name}")
+            logger.debug(f"Queued broadcast of new message {message.id} to group {thread_group_name}")
         except Exception as e:
             logger.error(f"Error broadcasting new message: {str(e)}")
     
@@ -565,93 +694,100 @@ class MessageService:
         Broadcast message update to WebSocket clients
         """
         try:
-            channel_layer = get_channel_layer()
             thread_group_name = f'thread_{message.thread_id}'
             
-            # Serialize message
-            from .serializers import MessageSerializer
-            message_data = MessageSerializer(message).data
+            # Serialize message (uses the caller's prefetched relations when present)
+            from .serializers import message_event_data
+            message_data = message_event_data(message)
             
             # Send to all clients in thread group
-            async_to_sync(channel_layer.group_send)(
+            broadcast.publish(
                 thread_group_name,
                 {
                     'type': 'message_updated',
                     'message': message_data,
-                }
+                },
+                key=('message_updated', message.id)
             )
-            logger.debug(f"Broadcasted message update {message.id} to group {thread_group_name}")
+            logger.debug(f"Queued broadcast of message update {message.id} to group {thread_group_name}")
         except Exception as e:
             logger.error(f"Error broadcasting message update: {str(e)}")
     
+    @staticmethod
+    def _broadcast_member_removed(thread_id, user_id):
+        """
+        Broadcast that a participant left or was removed (their sockets disconnect)
+        """
+        broadcast.publish(
+            f'thread_{thread_id}',
+            {
+                'type': 'member_removed',
+                'user_id': user_id,
+            },
+            key=('member_removed', thread_id, user_id)
+        )
+    
     @staticmethod
     def _broadcast_message_deleted(message):
         """
         Broadcast message deletion to WebSocket clients
         """
         try:
-            channel_layer = get_channel_layer()
             thread_group_name = f'thread_{message.thread_id}'
             
             # Send to all clients in thread group
-            async_to_sync(channel_layer.group_send)(
+            broadcast.publish(
                 thread_group_name,
                 {
                     'type': 'message_deleted',
                     'message_id': str(message.id),
-                }
+                },
+                key=('message_deleted', message.id)
             )
-            logger.debug(f"Broadcasted message deletion {message.id} to group {thread_group_name}")
+            logger.debug(f"Queued broadcast of message deletion {message.id} to group {thread_group_name}")
         except Exception as e:
             logger.error(f"Error broadcasting message deletion: {str(e)}")
     
     @staticmethod
-    def _broadcast_unread_count_update(thread_id, user_id, unread_count):
-        """
-        Broadcast unread count update to a specific user's WebSocket connection
-        Sends to both thread-specific and global notification channels
+    def _broadcast_unread_counts(thread_id, unread_counts):
         """
-        try:
-            from django.db.models import Sum
-            channel_layer = get_channel_layer()
-            thread_group_name = f'thread_{thread_id}'
-            # Use the same group name as NotificationCountConsumer
-            notifications_group_name = f'notifications_{user_id}'
-            
-            # Send to thread group (for users currently viewing the thread)
-            async_to_sync(channel_layer.group_send)(
-                thread_group_name,
-                {
-                    'type': 'unread_count_update',
-                    'thread_id': str(thread_id),
-                    'unread_count': unread_count,
-                    'user_id': user_id,
-                }
-            )
-            
-            # Calculate total unread for sidebar badge
-            total_unread = ThreadParticipant.objects.filter(
-                user_id=user_id,
-                left_at__isnull=True
-            ).aggregate(
-                total=Sum('unread_count')
-            )['total'] or 0
-            
-            # Send to user's notification WebSocket channel (for cross-page updates)
-            # This is the same channel used for notification.count events
-            async_to_sync(channel_layer.group_send)(
-                notifications_group_name,
+        Broadcast unread count updates for many users in one batch
+        
+        The thread group gets a single event carrying every user's count (each
+        socket picks its own), and each user's notification channel gets its
+        thread and total counts. Events go out through the broadcast outbox.
+        
+        Args:
+            thread_id: Thread the counts belong to
+            unread_counts: list of (user_id, thread_unread, total_unread)
+        """
+        if not unread_counts:
+            return
+        thread_group_name = f'thread_{thread_id}'
+        
+        # Send to thread group (for users currently viewing the thread)
+        broadcast.publish(thread_group_name, {
+            'type': 'unread_counts_update',
+            'thread_id': str(thread_id),
+            'counts': {str(user_id): unread for user_id, unread, _ in unread_counts},
+        })
+        
+        # Send to each user's notification WebSocket channel (for cross-page updates)
+        # Use the same group name as NotificationCountConsumer. Counts are absolute,
+        # so only the latest update per user and thread needs to go out.
+        for user_id, unread, total_unread in unread_counts:
+            broadcast.publish(
+                f'notifications_{user_id}',
                 {
                     'type': 'chat_unread_update',
                     'thread_id': str(thread_id),
-                    'unread_count': unread_count,
+                    'unread_count': unread,
                     'total_unread': total_unread,
-                }
+                },
+                key=('chat_unread', user_id, thread_id)
             )
-            
-            logger.info(f"Broadcasted chat unread update for thread {thread_id} to user {user_id}: {unread_count} (total: {total_unread})")
-        except Exception as e:
-            logger.error(f"Error broadcasting unread count update: {str(e)}")
+        
+        logger.info(f"Queued chat unread updates for thread {thread_id} to {len(unread_counts)} users")
     
     @staticmethod
     def _broadcast_reaction_added(message, user, emoji):
@@ -659,19 +795,20 @@ class MessageService:
         Broadcast reaction added via WebSocket
         """
         try:
-            channel_layer = get_channel_layer()
             thread_group_name = f'thread_{message.thread_id}'
             
-            async_to_sync(channel_layer.group_send)(
+            # Keyed per reaction so quick add/remove toggles collapse to the final state
+            broadcast.publish(
                 thread_group_name,
                 {
                     'type': 'reaction_added',
                     'message_id': str(message.id),
                     'user_id': user.id,
                     'emoji': emoji,
-                }
+                },
+                key=('reaction', message.id, user.id, emoji)
             )
-            logger.info(f"Broadcasted reaction added: {emoji} by user {user.id} to message {message.id}")
+            logger.info(f"Queued broadcast of reaction added: {emoji} by user {user.id} to message {message.id}")
         except Exception as e:
             logger.error(f"Error broadcasting reaction added: {str(e)}")
     
@@ -681,19 +818,20 @@ class MessageService:
         Broadcast reaction removed via WebSocket
         """
         try:
-            channel_layer = get_channel_layer()
             thread_group_name = f'thread_{message.thread_id}'
             
-            async_to_sync(channel_layer.group_send)(
+            # Keyed per reaction so quick add/remove toggles collapse to the final state
+            broadcast.publish(
                 thread_group_name,
                 {
                     'type': 'reaction_removed',
                     'message_id': str(message.id),
                     'user_id': user.id,
                     'emoji': emoji,
-                }
+                },
+                key=('reaction', message.id, user.id, emoji)
             )
-            logger.info(f"Broadcasted reaction removed: {emoji} by user {user.id} from message {message.id}")
+            logger.info(f"Queued broadcast of reaction removed: {emoji} by user {user.id} from message {message.id}")
         except Exception as e:
             logger.error(f"Error broadcasting reaction removed: {str(e)}")
 
@@ -705,18 +843,23 @@ class ValidationService:
     """
     
     @staticmethod
-    def can_post_in_thread(user, thread):
+    def can_post_in_thread(user, thread, participant=None):
         """
         Check if user can post messages in thread
         Returns False if user is not participant or if posting is restricted to admins only
+        
+        participant: The user's active ThreadParticipant if already loaded
         """
-        try:
-            participant = ThreadParticipant.objects.get(
-                thread=thread,
-                user=user,
-                left_at__isnull=True
-            )
-        except ThreadParticipant.DoesNotExist:
+        if participant is None:
+            try:
+                participant = ThreadParticipant.objects.get(
+                    thread=thread,
+                    user=user,
+                    left_at__isnull=True
+                )
+            except ThreadParticipant.DoesNotExist:
+                return False
+        elif participant.thread_id != thread.id or participant.user_id != user.id or participant.left_at:
             return False
         
         # Direct threads: always allowed
@@ -829,7 +972,6 @@ class GroupSettingsService:
             updated_by: User who updated the settings
         """
         try:
-            channel_layer = get_channel_layer()
             thread_group_name = f'thread_{thread.id}'
             
             # Prepare payload
@@ -849,10 +991,7 @@ class GroupSettingsService:
             }
             
             # Send to all clients in thread group
-            async_to_sync(channel_layer.group_send)(
-                thread_group_name,
-                payload
-            )
+            broadcast.publish(thread_group_name, payload, key=('group_settings', thread.id))
             
             logger.info(f"Broadcasted group settings update for thread {thread.id} by user {updated_by.id}")
         except Exception as e:
@@ -2,9 +2,10 @@
 Django Signals for Internal Chat
 """
 import logging
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Message, ThreadParticipant, AuditLog
+from .models import Message, ThreadParticipant, AuditLog, Attachment
 
 logger = logging.getLogger(__name__)
 
@@ -134,3 +135,15 @@ def notify_audit_actions(sender, instance, created, **kwargs):
         logger.warning("NotificationService not available, skipping notifications")
     except Exception as e:
         logger.error(f"Error sending audit action notifications: {str(e)}")
+
+
+@receiver(post_delete, sender=Attachment)
+def release_attachment_file(sender, instance, **kwargs):
+    """
+    Delete the stored file once no attachment references it (after commit)
+    """
+    if not instance.storage_name:
+        return
+    
+    from . import attachment_storage
+    transaction.on_commit(lambda: attachment_storage.release(instance.storage_name))
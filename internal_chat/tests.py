@@ -1,7 +1,11 @@
 """
 Comprehensive Tests for Internal Chat
 """
-from django.test import TestCase
+import asyncio
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
@@ -11,6 +15,7 @@ from internal_chat.models import (
     Attachment, MessageReaction, DirectThreadKey, AuditLog
 )
 from internal_chat.services import ThreadService, MessageService, ValidationService
+from internal_chat import unread_counters
 
 User = get_user_model()
 
@@ -135,6 +140,93 @@ class MessageServiceTest(TestCase):
         
         message.refresh_from_db()
         self.assertIsNotNone(message.deleted_at)
+    
+    def _group_with_members(self, count):
+        members = [
+            User.objects.create_user(
+                username=f'member{count}_{i}@test.com',
+                email=f'member{count}_{i}@test.com',
+                password='testpass123'
+            )
+            for i in range(count)
+        ]
+        thread = ThreadService.create_thread(
+            creator=self.user,
+            thread_type=Thread.TYPE_GROUP,
+            title=f'Group of {count}',
+            participant_ids=[member.id for member in members]
+        )
+        return thread, members
+    
+    def test_create_message_increments_unread_for_recipients(self):
+        """Test unread counts are incremented for every participant except the sender"""
+        thread, members = self._group_with_members(3)
+        
+        MessageService.create_message(thread=thread, sender=self.user, content='One')
+        MessageService.create_message(thread=thread, sender=members[0], content='Two')
+        
+        unread = dict(ThreadParticipant.objects.filter(thread=thread).values_list('user_id', 'unread_count'))
+        self.assertEqual(unread[self.user.id], 1)
+        self.assertEqual(unread[members[0].id], 1)
+        self.assertEqual(unread[members[1].id], 2)
+        self.assertEqual(unread[members[2].id], 2)
+        
+        self.assertEqual(unread_counters.get_total(members[1].id), 2)
+        self.assertEqual(unread_counters.get_counts(members[1].id), {str(thread.id): 2})
+        
+        MessageService.mark_as_read(thread, members[1])
+        self.assertEqual(unread_counters.get_total(members[1].id), 0)
+    
+    def test_create_message_query_count_independent_of_group_size(self):
+        """Test unread fan-out does not issue queries per participant"""
+        small_thread, _ = self._group_with_members(2)
+        large_thread, _ = self._group_with_members(12)
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as small:
+            MessageService.create_message(thread=small_thread, sender=self.user, content='Hi')
+        with CaptureQueriesContext(connection) as large:
+            MessageService.create_message(thread=large_thread, sender=self.user, content='Hi')
+        
+        def participant_queries(context):
+            return [q for q in context.captured_queries if 'internal_chat_participant' in q['sql']]
+        
+        self.assertEqual(len(participant_queries(small)), len(participant_queries(large)))
+    
+    def test_redis_unread_counts_wait_for_commit(self):
+        """Test Redis counters are only incremented once the message is committed"""
+        from unittest import mock
+        thread, members = self._group_with_members(2)
+        
+        with mock.patch.object(unread_counters, 'enabled', return_value=True), \
+                mock.patch.object(unread_counters, 'increment', return_value={}) as increment:
+            with self.captureOnCommitCallbacks(execute=True):
+                MessageService.create_message(thread=thread, sender=self.user, content='Hi')
+                increment.assert_not_called()
+        
+        increment.assert_called_once()
+        self.assertEqual(sorted(increment.call_args[0][1]), sorted(member.id for member in members))
+    
+    def test_thread_tracks_last_message(self):
+        """Test the denormalized last message follows creates and deletes"""
+        thread, _ = self._group_with_members(1)
+        
+        first = MessageService.create_message(thread=thread, sender=self.user, content='First')
+        second = MessageService.create_message(thread=thread, sender=self.user, content='Second')
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message_id, second.id)
+        self.assertEqual(thread.last_message_preview, 'Second')
+        
+        MessageService.delete_message(second, self.user)
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message_id, first.id)
+        self.assertEqual(thread.last_message_preview, 'First')
+        
+        MessageService.delete_message(first, self.user)
+        thread.refresh_from_db()
+        self.assertIsNone(thread.last_message_id)
+        self.assertIsNone(thread.last_message_at)
 
 
 class ThreadAPITest(APITestCase):
@@ -209,6 +301,42 @@ class ThreadAPITest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreater(len(response.data['results']), 0)
+    
+    def test_list_threads_cursor_pages(self):
+        """Test the inbox pages by cursor, newest activity first, with a fixed query count"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        threads = []
+        for i in range(5):
+            thread = ThreadService.create_thread(
+                creator=self.user1,
+                thread_type=Thread.TYPE_GROUP,
+                title=f'Group {i}',
+                participant_ids=[self.user2.id]
+            )
+            MessageService.create_message(thread=thread, sender=self.user2, content=f'Hello {i}')
+            threads.append(thread)
+        
+        url = '/api/internal-chat/threads/'
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(url, {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [str(threads[4].id), str(threads[3].id)]
+        )
+        self.assertEqual(response.data['results'][0]['last_message']['content'], 'Hello 4')
+        
+        response = self.client.get(response.data['next'])
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [str(threads[2].id), str(threads[1].id)]
+        )
+        
+        with CaptureQueriesContext(connection) as large_page:
+            self.client.get(url, {'limit': 5})
+        self.assertEqual(len(small_page), len(large_page))
 
 
 class MessageAPITest(APITestCase):
@@ -598,6 +726,32 @@ class RateLimiterUnitTests(TestCase):
         self.assertEqual(info['limit'], 10)
         self.assertEqual(info['remaining'], 7)
         self.assertEqual(info['window'], 60)
+    
+    def test_async_check_shares_counter(self):
+        """Async check should count against the same limit as the sync check"""
+        from .rate_limiting import check_rate_limit, check_rate_limit_async
+        
+        for i in range(4):
+            check_rate_limit(1, 'test', limit=5, window=60)
+        
+        self.assertTrue(async_to_sync(check_rate_limit_async)(1, 'test', limit=5, window=60))
+        self.assertFalse(async_to_sync(check_rate_limit_async)(1, 'test', limit=5, window=60))
+    
+    def test_connection_slots_acquire_and_release(self):
+        """Connection slots should stop at the limit and never go below zero"""
+        from .rate_limiting import acquire_connection, release_connection
+        
+        self.assertTrue(acquire_connection(1, limit=2))
+        self.assertTrue(acquire_connection(1, limit=2))
+        self.assertFalse(acquire_connection(1, limit=2))
+        
+        release_connection(1)
+        self.assertTrue(acquire_connection(1, limit=2))
+        
+        for i in range(5):
+            release_connection(1)
+        self.assertTrue(acquire_connection(1, limit=1))
+        self.assertFalse(acquire_connection(1, limit=1))
 
 
 class RateLimitingIntegrationTests(TestCase):
@@ -1138,3 +1292,666 @@ class UserEnumerationTests(APITestCase):
         ])
 
 
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class BroadcastOutboxTest(TestCase):
+    """Test chat events are sent once, after commit, with keyed coalescing"""
+    
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='owner@test.com',
+            email='owner@test.com',
+            password='testpass123'
+        )
+        self.member = User.objects.create_user(
+            username='member@test.com',
+            email='member@test.com',
+            password='testpass123'
+        )
+        self.thread = ThreadService.create_thread(
+            creator=self.owner,
+            thread_type=Thread.TYPE_GROUP,
+            title='Outbox',
+            participant_ids=[self.member.id]
+        )
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(f'thread_{self.thread.id}', self.channel)
+    
+    def _received_types(self):
+        async def drain():
+            types = []
+            while True:
+                try:
+                    event = await asyncio.wait_for(self.layer.receive(self.channel), timeout=0.1)
+                except asyncio.TimeoutError:
+                    return types
+                types.append(event['type'])
+        return async_to_sync(drain)()
+    
+    def test_message_broadcast_once_after_commit(self):
+        """Test a new message produces a single message_new event"""
+        with self.captureOnCommitCallbacks(execute=True):
+            MessageService.create_message(thread=self.thread, sender=self.owner, content='Hello')
+        
+        self.assertEqual(sorted(self._received_types()), ['message_new', 'unread_counts_update'])
+    
+    def test_rolled_back_events_are_dropped(self):
+        """Test nothing is sent for a rolled-back transaction"""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    MessageService.create_message(thread=self.thread, sender=self.owner, content='Hello')
+                    raise RuntimeError('abort')
+            except RuntimeError:
+                pass
+        
+        self.assertEqual(self._received_types(), [])
+        
+        # The next transaction gets a fresh outbox
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                MessageService.create_message(thread=self.thread, sender=self.owner, content='Again')
+        
+        self.assertEqual(sorted(self._received_types()), ['message_new', 'unread_counts_update'])
+    
+    def test_group_events_keep_publish_order(self):
+        """Test events for one group arrive in publish order, replaced events in their place"""
+        from internal_chat import broadcast
+        group = f'thread_{self.thread.id}'
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                broadcast.publish(group, {'type': 'first'}, key='state')
+                for i in range(5):
+                    broadcast.publish(group, {'type': f'event_{i}'})
+                broadcast.publish(group, {'type': 'latest'}, key='state')
+        
+        self.assertEqual(
+            self._received_types(),
+            ['latest', 'event_0', 'event_1', 'event_2', 'event_3', 'event_4']
+        )
+    
+    def test_rolled_back_savepoint_events_are_dropped(self):
+        """Test events published inside a rolled-back savepoint are not sent, nor replace earlier ones"""
+        from internal_chat import broadcast
+        group = f'thread_{self.thread.id}'
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                broadcast.publish(group, {'type': 'before'}, key='state')
+                try:
+                    with transaction.atomic():
+                        broadcast.publish(group, {'type': 'inside'})
+                        broadcast.publish(group, {'type': 'rolled_back'}, key='state')
+                        raise RuntimeError('abort')
+                except RuntimeError:
+                    pass
+                broadcast.publish(group, {'type': 'after'})
+        
+        self.assertEqual(self._received_types(), ['before', 'after'])
+    
+    def test_savepoint_rolled_back_after_last_publish(self):
+        """Test a savepoint rolled back after the last publish keeps the earlier event"""
+        from internal_chat import broadcast
+        group = f'thread_{self.thread.id}'
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                broadcast.publish(group, {'type': 'before'}, key='state')
+                try:
+                    with transaction.atomic():
+                        broadcast.publish(group, {'type': 'rolled_back'}, key='state')
+                        raise RuntimeError('abort')
+                except RuntimeError:
+                    pass
+        
+        self.assertEqual(self._received_types(), ['before'])
+    
+    def test_released_savepoint_events_are_replaced(self):
+        """Test a later event replaces one published inside a released savepoint"""
+        from internal_chat import broadcast
+        group = f'thread_{self.thread.id}'
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                with transaction.atomic():
+                    broadcast.publish(group, {'type': 'inner'}, key='state')
+                broadcast.publish(group, {'type': 'other'})
+                broadcast.publish(group, {'type': 'latest'}, key='state')
+        
+        self.assertEqual(self._received_types(), ['latest', 'other'])
+    
+    def test_reaction_toggle_coalesced(self):
+        """Test adding and removing a reaction in one transaction sends only the final state"""
+        with self.captureOnCommitCallbacks(execute=True):
+            message = MessageService.create_message(thread=self.thread, sender=self.owner, content='Hello')
+        self._received_types()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                MessageService.add_reaction(message, self.member, '👍')
+                MessageService.remove_reaction(message, self.member, '👍')
+        
+        self.assertEqual(self._received_types(), ['reaction_removed'])
+
+
+class PresenceTest(TestCase):
+    """Test presence tracking with the in-process store"""
+    
+    def setUp(self):
+        from internal_chat import presence
+        presence._local_store.__init__()
+        self.alice = User.objects.create_user(
+            username='alice@test.com',
+            email='alice@test.com',
+            password='testpass123'
+        )
+        self.bob = User.objects.create_user(
+            username='bob@test.com',
+            email='bob@test.com',
+            password='testpass123'
+        )
+        self.carol = User.objects.create_user(
+            username='carol@test.com',
+            email='carol@test.com',
+            password='testpass123'
+        )
+        ThreadService.create_thread(
+            creator=self.alice,
+            thread_type=Thread.TYPE_GROUP,
+            title='Presence',
+            participant_ids=[self.bob.id]
+        )
+    
+    def test_online_until_last_socket_disconnects(self):
+        """Test a user stays online while any socket is connected"""
+        from internal_chat import presence
+        
+        self.assertTrue(presence.heartbeat(self.alice.id, 'socket-1'))
+        self.assertFalse(presence.heartbeat(self.alice.id, 'socket-2'))
+        self.assertEqual(presence.online_user_ids([self.alice.id, self.bob.id]), {self.alice.id})
+        
+        self.assertFalse(presence.disconnect(self.alice.id, 'socket-1'))
+        self.assertTrue(presence.disconnect(self.alice.id, 'socket-2'))
+        self.assertEqual(presence.online_user_ids([self.alice.id]), set())
+    
+    @override_settings(INTERNAL_CHAT_PRESENCE_TTL=0)
+    def test_sweep_expires_missing_heartbeats(self):
+        """Test users whose heartbeats expired are swept offline"""
+        from internal_chat import presence
+        
+        presence.heartbeat(self.bob.id, 'socket-1')
+        self.assertEqual(presence.sweep(), [self.bob.id])
+        self.assertEqual(presence.sweep(), [])
+    
+    def test_flush_writes_batched_status(self):
+        """Test flush writes is_online and last_seen in one batch"""
+        from internal_chat import presence
+        
+        presence.heartbeat(self.alice.id, 'socket-1')
+        presence.heartbeat(self.bob.id, 'socket-1')
+        presence.disconnect(self.bob.id, 'socket-1')
+        
+        self.assertEqual(presence.flush(), 2)
+        self.assertEqual(presence.flush(), 0)
+        
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertTrue(self.alice.is_online)
+        self.assertFalse(self.bob.is_online)
+        self.assertIsNotNone(self.bob.last_seen)
+    
+    def test_contacts_limited_to_shared_threads(self):
+        """Test presence contacts are users sharing an active thread"""
+        from internal_chat import presence
+        
+        self.assertEqual(presence.contact_ids(self.alice.id), {self.bob.id})
+        self.assertEqual(presence.contact_ids(self.carol.id), set())
+    
+    def test_online_users_endpoint(self):
+        """Test the bulk online status endpoint"""
+        from internal_chat import presence
+        client = APIClient()
+        client.force_authenticate(user=self.alice)
+        presence.heartbeat(self.bob.id, 'socket-1')
+        
+        response = client.get('/api/internal-chat/presence/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['online_user_ids'], [self.bob.id])
+        
+        response = client.get('/api/internal-chat/presence/', {'user_ids': f'{self.bob.id},{self.carol.id}'})
+        self.assertEqual(response.data['online_user_ids'], [self.bob.id])
+        
+        response = client.get('/api/internal-chat/presence/', {'user_ids': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AttachmentStorageTest(APITestCase):
+    """Test content-addressed attachment storage and streamed downloads"""
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        storage_override = override_settings(INTERNAL_CHAT_ATTACHMENT_STORAGE={
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': location},
+        })
+        storage_override.enable()
+        self.addCleanup(storage_override.disable)
+        
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='files@test.com',
+            email='files@test.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.thread = ThreadService.create_thread(
+            creator=self.user,
+            thread_type=Thread.TYPE_GROUP,
+            title='Files',
+            participant_ids=[]
+        )
+        self.content = b'0123456789' * 1000
+    
+    def _upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        file = SimpleUploadedFile('notes.txt', self.content, content_type='text/plain')
+        response = self.client.post('/api/internal-chat/attachments/', {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        attachment = Attachment.objects.get(id=response.data['id'])
+        MessageService.create_message(
+            thread=self.thread,
+            sender=self.user,
+            content='See attached',
+            attachment_ids=[attachment.id]
+        )
+        return attachment
+    
+    def _download_url(self, attachment):
+        return f'/api/internal-chat/attachments/{attachment.id}/download/'
+    
+    def test_identical_uploads_share_stored_file(self):
+        """Test identical content is stored once and deleted with its last attachment"""
+        from internal_chat import attachment_storage
+        
+        first = self._upload()
+        second = self._upload()
+        self.assertEqual(first.storage_name, second.storage_name)
+        self.assertEqual(first.storage_name, attachment_storage.storage_name(first.checksum))
+        
+        storage = attachment_storage.get_storage()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.storage_name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(second.storage_name))
+    
+    def test_ensure_stored_restores_released_file(self):
+        """Test an upload whose reused file was released before its row was committed stores it again"""
+        from internal_chat import attachment_storage
+        
+        attachment = self._upload()
+        storage = attachment_storage.get_storage()
+        storage.delete(attachment.storage_name)
+        
+        attachment_storage.ensure_stored(attachment, self.content)
+        self.assertEqual(b''.join(attachment_storage.iter_file(attachment.storage_name)), self.content)
+    
+    def test_release_keeps_locked_file(self):
+        """Test a file is not deleted while an upload holds its lock"""
+        from unittest import mock
+        from internal_chat import attachment_storage
+        
+        attachment = self._upload()
+        storage = attachment_storage.get_storage()
+        with attachment_storage._file_lock(attachment.storage_name), \
+                mock.patch.object(attachment_storage, 'LOCK_WAIT', 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                attachment.delete()
+        self.assertTrue(storage.exists(attachment.storage_name))
+    
+    def test_download_streams_with_etag(self):
+        """Test full downloads stream the file and honour If-None-Match"""
+        attachment = self._upload()
+        
+        response = self.client.get(self._download_url(attachment))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        
+        response = self.client.get(self._download_url(attachment), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_download_byte_ranges(self):
+        """Test Range requests return partial content or 416"""
+        attachment = self._upload()
+        
+        response = self.client.get(self._download_url(attachment), HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        
+        response = self.client.get(self._download_url(attachment), HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+        
+        response = self.client.get(self._download_url(attachment), HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+    
+    def test_base64_download_is_streamed_json(self):
+        """Test format=base64 streams a JSON document with the encoded file"""
+        import base64
+        import json
+        
+        attachment = self._upload()
+        
+        response = self.client.get(self._download_url(attachment), {'format': 'base64'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['file_name'], 'notes.txt')
+        self.assertEqual(base64.b64decode(data['base64']), self.content)
+
+
+class MessageSearchTest(APITestCase):
+    """Test the message search index and endpoint"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='searcher@test.com',
+            email='searcher@test.com',
+            password='testpass123'
+        )
+        self.outsider = User.objects.create_user(
+            username='outsider@test.com',
+            email='outsider@test.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.thread = ThreadService.create_thread(
+            creator=self.user,
+            thread_type=Thread.TYPE_GROUP,
+            title='Search',
+            participant_ids=[]
+        )
+    
+    def _search(self, query, **params):
+        response = self.client.get('/api/internal-chat/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['content'] for item in response.data['results']]
+    
+    def test_tokenize_normalizes_arabic(self):
+        """Test diacritics, hamza forms and the definite article are normalized away"""
+        from internal_chat.search import tokenize
+        
+        self.assertEqual(tokenize('الكِتَاب'), tokenize('كتاب'))
+        self.assertEqual(tokenize('<b>أحمد</b> احمد'), {'احمد': 2})
+    
+    def test_search_ranks_and_follows_edits(self):
+        """Test results rank by matched terms and the index follows edits and deletes"""
+        one = MessageService.create_message(thread=self.thread, sender=self.user, content='Quarterly report')
+        both = MessageService.create_message(thread=self.thread, sender=self.user, content='Quarterly budget report')
+        MessageService.create_message(thread=self.thread, sender=self.user, content='Budget only')
+        
+        self.assertEqual(self._search('report budget')[0], 'Quarterly budget report')
+        self.assertEqual(len(self._search('report budget')), 3)
+        
+        MessageService.update_message(one, 'Weekly summary', self.user)
+        self.assertEqual(self._search('quarterly'), ['Quarterly budget report'])
+        
+        MessageService.delete_message(both, self.user)
+        self.assertEqual(self._search('quarterly'), [])
+    
+    def test_search_limited_to_own_threads(self):
+        """Test messages in threads the user is not part of are never returned"""
+        other = ThreadService.create_thread(
+            creator=self.outsider,
+            thread_type=Thread.TYPE_GROUP,
+            title='Private',
+            participant_ids=[]
+        )
+        MessageService.create_message(thread=other, sender=self.outsider, content='Secret plan')
+        MessageService.create_message(thread=self.thread, sender=self.user, content='Public plan')
+        
+        self.assertEqual(self._search('plan'), ['Public plan'])
+        self.assertEqual(self._search('plan', thread_id=str(other.id)), [])
+    
+    def test_rebuild_command(self):
+        """Test the rebuild command re-indexes existing messages"""
+        from io import StringIO
+        from django.core.management import call_command
+        from internal_chat.models import MessageSearchTerm
+        
+        MessageService.create_message(thread=self.thread, sender=self.user, content='Rebuild me')
+        MessageSearchTerm.objects.all().delete()
+        self.assertEqual(self._search('rebuild'), [])
+        
+        call_command('rebuild_message_search_index', stdout=StringIO())
+        self.assertEqual(self._search('rebuild'), ['Rebuild me'])
+    
+    def test_rebuild_skips_rows_indexed_concurrently(self):
+        """Test a message indexed while its thread is rebuilt does not break the rebuild"""
+        from unittest import mock
+        from internal_chat import search
+        
+        message = MessageService.create_message(thread=self.thread, sender=self.user, content='Rebuild me')
+        tokenize = search.tokenize
+        indexing = []
+        
+        def index_meanwhile(text):
+            # MessageService re-indexes the message while the rebuild reads it
+            if not indexing:
+                indexing.append(message.id)
+                search.index_message(message)
+            return tokenize(text)
+        
+        with mock.patch.object(search, 'tokenize', side_effect=index_meanwhile):
+            self.assertEqual(search.rebuild(thread_id=self.thread.id), 1)
+        self.assertEqual(self._search('rebuild'), ['Rebuild me'])
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    INTERNAL_CHAT_READ_RECEIPT_WINDOW_MS=60000
+)
+class ReadReceiptAggregatorTest(TestCase):
+    """Test debounced read receipts"""
+    
+    def setUp(self):
+        from internal_chat import read_receipts
+        read_receipts._pending.clear()
+        read_receipts._last_applied.clear()
+        self.reader = User.objects.create_user(
+            username='reader@test.com',
+            email='reader@test.com',
+            password='testpass123'
+        )
+        self.sender = User.objects.create_user(
+            username='writer@test.com',
+            email='writer@test.com',
+            password='testpass123'
+        )
+        self.thread = ThreadService.create_thread(
+            creator=self.sender,
+            thread_type=Thread.TYPE_GROUP,
+            title='Receipts',
+            participant_ids=[self.reader.id]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.messages = [
+                MessageService.create_message(thread=self.thread, sender=self.sender, content=f'Message {i}')
+                for i in range(3)
+            ]
+    
+    def test_reads_within_window_are_merged(self):
+        """Test only the first read is written immediately and the furthest position wins"""
+        from internal_chat import read_receipts
+        
+        first, second, third = self.messages
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'thread_{self.thread.id}', channel_name)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(read_receipts.record(self.thread.id, self.reader.id, first.created_at, first.id))
+            self.assertFalse(read_receipts.record(self.thread.id, self.reader.id, third.created_at, third.id))
+            self.assertFalse(read_receipts.record(str(self.thread.id), self.reader.id, second.created_at, second.id))
+            
+            participant = ThreadParticipant.objects.get(thread=self.thread, user=self.reader)
+            self.assertEqual(participant.last_read_at, first.created_at)
+            
+            self.assertEqual(read_receipts.flush(), 1)
+        
+        participant.refresh_from_db()
+        self.assertEqual(participant.last_read_at, third.created_at)
+        self.assertEqual(participant.unread_count, 0)
+        
+        receipts = []
+        while True:
+            try:
+                event = async_to_sync(asyncio.wait_for)(channel_layer.receive(channel_name), 0.1)
+            except asyncio.TimeoutError:
+                break
+            if event['type'] == 'receipt_read':
+                receipts.append(event['message_id'])
+        self.assertEqual(receipts, [str(third.id)])
+    
+    def test_read_position_never_moves_backwards(self):
+        """Test an older read applied after a newer one is ignored"""
+        first, _, third = self.messages
+        
+        MessageService.mark_as_read_bulk([(self.thread.id, self.reader.id, third.created_at, third.id)])
+        updated = MessageService.mark_as_read_bulk([(self.thread.id, self.reader.id, first.created_at, first.id)])
+        
+        self.assertEqual(updated, 0)
+        participant = ThreadParticipant.objects.get(thread=self.thread, user=self.reader)
+        self.assertEqual(participant.last_read_at, third.created_at)
+    
+    def test_rest_reads_apply_immediately(self):
+        """Test REST reads are not debounced and are refused to non-participants"""
+        from internal_chat import read_receipts
+        
+        first, _, third = self.messages
+        client = APIClient()
+        client.force_authenticate(user=self.reader)
+        self.assertTrue(read_receipts.record(self.thread.id, self.reader.id, first.created_at, first.id))
+        
+        response = client.post(f'/api/internal-chat/messages/{third.id}/read/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        participant = ThreadParticipant.objects.get(thread=self.thread, user=self.reader)
+        self.assertEqual(participant.last_read_at, third.created_at)
+        
+        response = client.post(f'/api/internal-chat/threads/{self.thread.id}/mark-read/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        participant.refresh_from_db()
+        self.assertGreater(participant.last_read_at, third.created_at)
+        
+        ThreadParticipant.objects.filter(thread=self.thread, user=self.reader).update(left_at=timezone.now())
+        response = client.post(f'/api/internal-chat/threads/{self.thread.id}/mark-read/')
+        self.assertIn(response.status_code, [status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ThreadConsumerTest(TestCase):
+    """Test the thread WebSocket consumer and its event payloads"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='socket@test.com',
+            email='socket@test.com',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='peer@test.com',
+            email='peer@test.com',
+            password='testpass123'
+        )
+        self.thread = ThreadService.create_thread(
+            creator=self.user,
+            thread_type=Thread.TYPE_GROUP,
+            title='Sockets',
+            participant_ids=[self.other.id]
+        )
+    
+    def test_event_payload_matches_message_serializer(self):
+        """Test the lean event payload renders exactly like MessageSerializer"""
+        import json
+        from rest_framework.renderers import JSONRenderer
+        from internal_chat.serializers import MessageSerializer, message_event_data
+        
+        original = MessageService.create_message(thread=self.thread, sender=self.other, content='Original')
+        attachment = Attachment.objects.create(file_name='a.txt', content_type='text/plain', size=3)
+        reply = MessageService.create_message(
+            thread=self.thread,
+            sender=self.user,
+            content='Reply',
+            reply_to_id=original.id,
+            attachment_ids=[attachment.id]
+        )
+        MessageService.add_reaction(reply, self.other, '👍')
+        reply = Message.objects.get(id=reply.id)
+        
+        expected = json.loads(JSONRenderer().render(MessageSerializer(reply).data))
+        self.assertEqual(message_event_data(reply), expected)
+    
+    def test_known_participant_skips_membership_query(self):
+        """Test create_message does not re-check membership when given the participant"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        participant = ThreadParticipant.objects.get(thread=self.thread, user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            MessageService.create_message(
+                thread=self.thread,
+                sender=self.user,
+                content='Hi',
+                participant=participant
+            )
+        membership_lookups = [
+            q for q in queries.captured_queries
+            if q['sql'].startswith('SELECT "internal_chat_participant"')
+            and f'"internal_chat_participant"."user_id" = {self.user.id}' in q['sql']
+            and 'NOT (' not in q['sql']
+        ]
+        self.assertEqual(membership_lookups, [])
+    
+    def test_send_over_socket_and_removal_closes_it(self):
+        """Test a socket message is created in one hop and a removal event disconnects the member"""
+        from channels.db import database_sync_to_async
+        from channels.testing import WebsocketCommunicator
+        from internal_chat.consumers import ThreadConsumer
+        
+        async def scenario():
+            communicator = WebsocketCommunicator(
+                ThreadConsumer.as_asgi(),
+                f'/ws/internal-chat/threads/{self.thread.id}/'
+            )
+            communicator.scope['user'] = self.other
+            communicator.scope['url_route'] = {'kwargs': {'thread_id': str(self.thread.id)}}
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()  # connection.established
+            
+            await communicator.send_json_to({'type': 'message.send', 'content': 'Over the <b>socket</b>'})
+            self.assertTrue(await communicator.receive_nothing(timeout=0.5))
+            content = await database_sync_to_async(
+                lambda: Message.objects.get(thread=self.thread, sender=self.other).content
+            )()
+            self.assertEqual(content, 'Over the <b>socket</b>')
+            
+            await get_channel_layer().group_send(
+                f'thread_{self.thread.id}',
+                {'type': 'member_removed', 'user_id': self.other.id}
+            )
+            self.assertEqual((await communicator.receive_json_from())['type'], 'member.removed')
+            output = await communicator.receive_output()
+            self.assertEqual(output, {'type': 'websocket.close', 'code': 4003})
+            await communicator.disconnect()
+        
+        async_to_sync(scenario)()
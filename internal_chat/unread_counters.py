@@ -0,0 +1,376 @@
+"""
+Redis-backed unread counters for Internal Chat
+
+Each user has one Redis hash, chat:unread:<user_id>, that maps thread IDs to
+that user's unread count. A '_total' field holds the sum, so the sidebar badge
+costs one HGET. Lua scripts update a thread count and the total together.
+
+When Redis is in use it is authoritative. ThreadParticipant.unread_count is
+written lazily:
+- users whose counters changed are tracked in a dirty set
+- flush() (the flush_unread_counters command, run periodically) copies their
+  counters to the database
+- reconcile() (flush_unread_counters --reconcile, run on startup) flushes
+  everything and drops the hashes that are still clean, so they are reloaded
+  from the database on first use
+
+A missing hash (cold start, eviction) is loaded from the database on demand.
+Without a django_redis cache, or with INTERNAL_CHAT_REDIS_UNREAD_COUNTERS off,
+every function works directly on the database.
+"""
+import logging
+from django.conf import settings
+from django.db.models import F, Q, Sum
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'chat:unread:'
+DIRTY_KEY = 'chat:unread:dirty'
+TOTAL_FIELD = '_total'
+
+# KEYS[1] = dirty set, KEYS[2..] = user hashes; ARGV[1] = thread ID, ARGV[2..] = user IDs
+# Returns thread count and total per user, or -1, -1 for users whose hash is not loaded
+_INCREMENT_SCRIPT = """
+local result = {}
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        result[#result + 1] = redis.call('HINCRBY', KEYS[i], ARGV[1], 1)
+        result[#result + 1] = redis.call('HINCRBY', KEYS[i], '_total', 1)
+        redis.call('SADD', KEYS[1], ARGV[i])
+    else
+        result[#result + 1] = -1
+        result[#result + 1] = -1
+    end
+end
+return result
+"""
+
+# KEYS[1] = dirty set, KEYS[2] = user hash; ARGV = user ID, thread ID, new count ('' removes the thread)
+# Returns the new total, or nil if the hash is not loaded
+_SET_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return nil
+end
+local old = tonumber(redis.call('HGET', KEYS[2], ARGV[2]) or '0')
+local new = 0
+if ARGV[3] == '' then
+    redis.call('HDEL', KEYS[2], ARGV[2])
+else
+    new = tonumber(ARGV[3])
+    redis.call('HSET', KEYS[2], ARGV[2], new)
+end
+redis.call('SADD', KEYS[1], ARGV[1])
+return redis.call('HINCRBY', KEYS[2], '_total', new - old)
+"""
+
+# KEYS[1] = dirty set, KEYS[2..] = user hashes; ARGV = user IDs
+# Deletes the hashes of users that are not dirty (changed since their last flush)
+_DELETE_CLEAN_SCRIPT = """
+local deleted = 0
+for i = 2, #KEYS do
+    if redis.call('SISMEMBER', KEYS[1], ARGV[i - 1]) == 0 then
+        deleted = deleted + redis.call('DEL', KEYS[i])
+    end
+end
+return deleted
+"""
+
+# KEYS[1] = user hash; ARGV = field/value pairs. Loads only if nobody else did first.
+_LOAD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV))
+    return 1
+end
+return 0
+"""
+
+
+def _redis():
+    """
+    Get the raw Redis connection, or None when counters live in the database
+    """
+    if not getattr(settings, 'INTERNAL_CHAT_REDIS_UNREAD_COUNTERS', True):
+        return None
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if 'django_redis' not in backend:
+        return None
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def enabled():
+    """
+    Whether unread counters are kept in Redis
+    """
+    return _redis() is not None
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}{user_id}'
+
+
+def _participants(user_ids):
+    from .models import ThreadParticipant
+    return ThreadParticipant.objects.filter(user_id__in=user_ids, left_at__isnull=True)
+
+
+def _db_counts(user_id):
+    """
+    Get {thread_id: unread_count} for a user's active threads from the database
+    """
+    return {
+        str(thread_id): unread_count
+        for thread_id, unread_count in _participants([user_id]).values_list('thread_id', 'unread_count')
+    }
+
+
+def _db_total(user_id):
+    return _participants([user_id]).aggregate(total=Sum('unread_count'))['total'] or 0
+
+
+def _load(redis, user_ids):
+    """
+    Load users' counters from the database into Redis (skipping hashes that already exist)
+    """
+    counts_by_user = {user_id: {} for user_id in user_ids}
+    for user_id, thread_id, unread_count in _participants(user_ids).values_list(
+        'user_id', 'thread_id', 'unread_count'
+    ):
+        counts_by_user[user_id][str(thread_id)] = unread_count
+
+    pipe = redis.pipeline(transaction=False)
+    for user_id, counts in counts_by_user.items():
+        args = [TOTAL_FIELD, sum(counts.values())]
+        for thread_id, unread_count in counts.items():
+            args.extend([thread_id, unread_count])
+        pipe.eval(_LOAD_SCRIPT, 1, _key(user_id), *args)
+    pipe.execute()
+
+
+def increment(thread_id, user_ids):
+    """
+    Add one unread message in a thread for each user
+
+    Args:
+        thread_id: Thread that received the message
+        user_ids: Recipients (active participants except the sender)
+
+    Returns:
+        list of (user_id, thread_unread, total_unread) tuples
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+
+    counts = {}
+    redis = _redis()
+    if redis is not None:
+        try:
+            pending = user_ids
+            for attempt in range(2):
+                result = redis.eval(
+                    _INCREMENT_SCRIPT, len(pending) + 1, DIRTY_KEY,
+                    *[_key(user_id) for user_id in pending],
+                    str(thread_id), *pending
+                )
+                missing = []
+                for i, user_id in enumerate(pending):
+                    thread_unread, total_unread = int(result[2 * i]), int(result[2 * i + 1])
+                    if thread_unread < 0:
+                        missing.append(user_id)
+                    else:
+                        counts[user_id] = (user_id, thread_unread, total_unread)
+                if not missing:
+                    break
+                # Cold hashes: load them from the database, then increment again
+                _load(redis, missing)
+                pending = missing
+        except Exception as e:
+            logger.error(f"Error incrementing unread counters in Redis: {str(e)}")
+
+    remaining = [user_id for user_id in user_ids if user_id not in counts]
+    if not remaining:
+        return [counts[user_id] for user_id in user_ids]
+    if redis is not None:
+        logger.warning(f"Incrementing unread counters for {len(remaining)} users in the database")
+
+    from .models import ThreadParticipant
+    ThreadParticipant.objects.filter(
+        thread_id=thread_id,
+        user_id__in=remaining,
+        left_at__isnull=True
+    ).update(unread_count=F('unread_count') + 1)
+    return list(counts.values()) + _db_thread_and_total(thread_id, remaining)
+
+
+def _db_thread_and_total(thread_id, user_ids):
+    """
+    Get (user_id, thread_unread, total_unread) for several users in one query
+    """
+    rows = _participants(user_ids).values('user_id').annotate(
+        thread_unread=Sum('unread_count', filter=Q(thread_id=thread_id)),
+        total_unread=Sum('unread_count')
+    ).values_list('user_id', 'thread_unread', 'total_unread')
+    return [
+        (user_id, thread_unread or 0, total_unread or 0)
+        for user_id, thread_unread, total_unread in rows
+    ]
+
+
+def _set(user_id, thread_id, value):
+    """
+    Set (or with value '' remove) a user's counter for a thread in Redis
+
+    Returns:
+        New total, or None when Redis is not in use or the hash is not loaded
+    """
+    redis = _redis()
+    if redis is None:
+        return None
+    try:
+        total = redis.eval(_SET_SCRIPT, 2, DIRTY_KEY, _key(user_id), user_id, str(thread_id), value)
+        return int(total) if total is not None else None
+    except Exception as e:
+        logger.error(f"Error updating unread counter for user {user_id} in Redis: {str(e)}")
+        return None
+
+
+def set_count(user_id, thread_id, unread_count):
+    """
+    Set a user's unread count for a thread (e.g. 0 after marking it read)
+
+    The caller updates ThreadParticipant itself; this keeps Redis in step.
+
+    Returns:
+        The user's new total unread count
+    """
+    total = _set(user_id, thread_id, unread_count)
+    return total if total is not None else get_total(user_id)
+
+
+def forget(user_id, thread_id):
+    """
+    Drop a thread from a user's counters after they leave it
+    """
+    _set(user_id, thread_id, '')
+
+
+def get_total(user_id):
+    """
+    Get a user's total unread count across active threads (sidebar badge)
+    """
+    redis = _redis()
+    if redis is not None:
+        try:
+            total = redis.hget(_key(user_id), TOTAL_FIELD)
+            if total is None:
+                _load(redis, [user_id])
+                total = redis.hget(_key(user_id), TOTAL_FIELD)
+            if total is not None:
+                return int(total)
+        except Exception as e:
+            logger.error(f"Error reading unread total for user {user_id} from Redis: {str(e)}")
+    return _db_total(user_id)
+
+
+def get_counts(user_id):
+    """
+    Get {thread_id (str): unread_count} for a user's active threads
+    """
+    redis = _redis()
+    if redis is not None:
+        try:
+            counts = redis.hgetall(_key(user_id))
+            if not counts:
+                _load(redis, [user_id])
+                counts = redis.hgetall(_key(user_id))
+            if counts:
+                return {
+                    field.decode(): int(value)
+                    for field, value in counts.items()
+                    if field.decode() != TOTAL_FIELD
+                }
+        except Exception as e:
+            logger.error(f"Error reading unread counters for user {user_id} from Redis: {str(e)}")
+    return _db_counts(user_id)
+
+
+def flush(batch_size=500):
+    """
+    Write changed Redis counters to ThreadParticipant.unread_count
+
+    Args:
+        batch_size: Number of users flushed per round trip
+
+    Returns:
+        int: Number of participant rows updated
+    """
+    redis = _redis()
+    if redis is None:
+        return 0
+
+    from .models import ThreadParticipant
+    updated = 0
+    while True:
+        user_ids = redis.spop(DIRTY_KEY, batch_size)
+        if not user_ids:
+            break
+        user_ids = [int(user_id) for user_id in user_ids]
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.hgetall(_key(user_id))
+            counts_by_user = {}
+            for user_id, counts in zip(user_ids, pipe.execute()):
+                counts_by_user[user_id] = {
+                    field.decode(): int(value)
+                    for field, value in counts.items()
+                    if field.decode() != TOTAL_FIELD
+                }
+
+            changed = []
+            for participant in _participants(user_ids).only('id', 'thread_id', 'user_id', 'unread_count'):
+                unread_count = counts_by_user[participant.user_id].get(str(participant.thread_id))
+                if unread_count is not None and unread_count != participant.unread_count:
+                    participant.unread_count = unread_count
+                    changed.append(participant)
+            ThreadParticipant.objects.bulk_update(changed, ['unread_count'], batch_size=batch_size)
+            updated += len(changed)
+        except Exception:
+            # Put the users back so the next flush retries them
+            redis.sadd(DIRTY_KEY, *user_ids)
+            raise
+
+    if updated:
+        logger.info(f"Flushed {updated} unread counters to the database")
+    return updated
+
+
+def reconcile(batch_size=500):
+    """
+    Flush all pending counters, then drop the hashes so they are reloaded from the database
+
+    Run on startup to repair drift left by crashes or Redis failover. A hash
+    is dropped only if it is still clean, atomically with the check, so an
+    increment that lands after the flush is never lost: its hash stays dirty
+    and is written by the next flush.
+
+    Returns:
+        int: Number of participant rows updated by the flush
+    """
+    redis = _redis()
+    if redis is None:
+        return 0
+
+    updated = flush(batch_size)
+    keys = [key for key in redis.scan_iter(match=f'{KEY_PREFIX}*', count=batch_size) if key != DIRTY_KEY.encode()]
+    reset = 0
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        user_ids = [key.decode()[len(KEY_PREFIX):] for key in batch]
+        reset += redis.eval(_DELETE_CLEAN_SCRIPT, len(batch) + 1, DIRTY_KEY, *batch, *user_ids)
+    logger.info(
+        f"Reconciled unread counters: {updated} rows flushed, {reset} hashes reset, "
+        f"{len(keys) - reset} changed meanwhile and kept"
+    )
+    return updated
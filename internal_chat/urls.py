@@ -23,6 +23,20 @@ urlpatterns = [
         name='total-unread-count'
     ),
     
+    # Bulk online status endpoint
+    path(
+        'presence/',
+        views.get_online_users,
+        name='online-users'
+    ),
+    
+    # Ranked message search across the user's threads
+    path(
+        'search/',
+        views.search_messages,
+        name='message-search'
+    ),
+    
     # Messages endpoints
     path(
         'threads/<uuid:thread_id>/messages/',
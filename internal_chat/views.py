@@ -7,8 +7,9 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import CursorPagination, PageNumberPagination
-from django.db.models import Q, Prefetch, Sum
+from django.db.models import Q, Prefetch
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from .models import (
     Thread, ThreadParticipant, Message, GroupSettings,
@@ -26,6 +27,7 @@ from .permissions import (
     CanPostInThread, IsMessageSenderOrAdmin, CanChangeSettings
 )
 from .services import ThreadService, MessageService, ValidationService
+from . import attachment_storage, presence, search, unread_counters
 
 logger = logging.getLogger(__name__)
 
@@ -40,12 +42,23 @@ class MessageCursorPagination(CursorPagination):
     ordering = '-created_at'
 
 
+class ThreadCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the inbox, newest activity first
+    """
+    page_size = 30
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-updated_at', '-id')
+
+
 class ThreadViewSet(viewsets.ModelViewSet):
     """
     ViewSet for thread operations
     """
     permission_classes = [IsAuthenticated]
     serializer_class = ThreadSerializer
+    pagination_class = ThreadCursorPagination
     filter_backends = [filters.SearchFilter]
     search_fields = ['title']
     
@@ -54,26 +67,16 @@ class ThreadViewSet(viewsets.ModelViewSet):
         Get threads for current user with optimizations
         """
         user = self.request.user
-        queryset = Thread.objects.filter(
-            participants__user=user,
-            participants__left_at__isnull=True
-        ).distinct()
+        queryset = Thread.objects.for_user(user)
         
-        # Prefetch related data for performance
-        queryset = queryset.select_related('created_by')
+        # Last message is denormalized on the thread; join it instead of prefetching
+        queryset = queryset.select_related('created_by', 'last_message__sender', 'group_settings')
         queryset = queryset.prefetch_related(
             Prefetch(
                 'participants',
                 queryset=ThreadParticipant.objects.filter(
                     left_at__isnull=True
                 ).select_related('user')
-            ),
-            Prefetch(
-                'messages',
-                queryset=Message.objects.filter(
-                    deleted_at__isnull=True
-                ).select_related('sender').order_by('-created_at')[:1],
-                to_attr='last_message_list'
             )
         )
         
@@ -87,7 +90,7 @@ class ThreadViewSet(viewsets.ModelViewSet):
         if not show_archived:
             queryset = queryset.filter(is_archived=False)
         
-        return queryset.order_by('-updated_at')
+        return queryset.order_by('-updated_at', '-id')
     
     def get_permissions(self):
         """
@@ -295,14 +298,16 @@ class ThreadViewSet(viewsets.ModelViewSet):
         """
         thread = self.get_object()
         
-        try:
-            MessageService.mark_as_read(thread, request.user)
-            return Response({'message': 'Thread marked as read'})
-        except ThreadParticipant.DoesNotExist:
+        if not ThreadParticipant.objects.filter(thread=thread, user=request.user, left_at__isnull=True).exists():
             return Response(
                 {'error': 'You are not a participant in this thread'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        try:
+            # Explicit REST reads apply immediately; only WebSocket reads are debounced
+            MessageService.mark_as_read_bulk([(thread.id, request.user.id, timezone.now(), None)])
+            return Response({'message': 'Thread marked as read'})
         except Exception as e:
             logger.error(f"Error marking thread as read: {str(e)}")
             return Response(
@@ -533,8 +538,14 @@ class MessageViewSet(viewsets.ModelViewSet):
         message = self.get_object()
         thread = message.thread if not thread_id else get_object_or_404(Thread, id=thread_id)
         
+        if not ThreadParticipant.objects.filter(thread=thread, user=request.user, left_at__isnull=True).exists():
+            return Response(
+                {'error': 'You are not a participant in this thread'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
-            MessageService.mark_as_read(thread, request.user, message)
+            MessageService.mark_as_read_bulk([(thread.id, request.user.id, message.created_at, message.id)])
             return Response({'message': 'Marked as read'})
         except Exception as e:
             return Response(
@@ -607,6 +618,13 @@ class AttachmentViewSet(viewsets.ModelViewSet):
             message__thread__participants__left_at__isnull=True
         ).distinct()
     
+    def perform_content_negotiation(self, request, force=False):
+        """
+        The download action reads ?format= itself (file/base64), so it must not
+        be treated as a DRF renderer format (which would 404 on 'base64')
+        """
+        return super().perform_content_negotiation(request, force=force or self.action == 'download')
+    
     def create(self, request, *args, **kwargs):
         """
         Upload an attachment
@@ -629,14 +647,18 @@ class AttachmentViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='download')
     def download(self, request, pk=None):
         """
-        Download attachment with proper headers and optional base64 encoding
+        Download attachment, streamed from storage in chunks
         
         Query params:
-        - format=base64: Return file as base64 encoded JSON
+        - format=base64: Return file as base64 encoded JSON (streamed)
         - format=file: Return raw file (default)
+        
+        Responses carry an ETag derived from the content checksum and honour
+        If-None-Match (304). Raw downloads also support a single byte range
+        (Range / If-Range -> 206, or 416 if it lies outside the file).
         """
-        import base64
-        from django.http import FileResponse, HttpResponse
+        from django.http import HttpResponse, StreamingHttpResponse
+        from django.utils.http import content_disposition_header
         
         attachment = self.get_object()
         
@@ -658,47 +680,121 @@ class AttachmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        if not attachment.storage_name:
+            return Response(
+                {'error': 'Attachment content is not available'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
         # Get format parameter
         response_format = request.query_params.get('format', 'file')
         
+        # Content never changes for a given checksum; base64 is a separate representation
+        etag = None
+        if attachment.checksum:
+            suffix = '-base64' if response_format == 'base64' else ''
+            etag = f'"{attachment.checksum}{suffix}"'
+        
+        if etag and _etag_matches(request.headers.get('If-None-Match'), etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        
         if response_format == 'base64':
-            # Return base64 encoded file from blob
-            try:
-                base64_content = base64.b64encode(attachment.file_data).decode('utf-8')
-                
-                return Response({
-                    'id': str(attachment.id),
-                    'file_name': attachment.file_name,
-                    'content_type': attachment.content_type,
-                    'size': attachment.size,
-                    'size_mb': attachment.size_mb,
-                    'caption': attachment.caption,
-                    'base64': base64_content,
-                    'created_at': attachment.created_at
-                })
-            except Exception as e:
-                return Response(
-                    {'error': f'Failed to read file: {str(e)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-        else:
-            # Return raw file from blob with proper headers
+            response = StreamingHttpResponse(
+                _stream_base64_json(attachment),
+                content_type='application/json'
+            )
+            if etag:
+                response['ETag'] = etag
+            return response
+        
+        size = attachment.size
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if range_header and (not if_range or if_range == etag):
             try:
-                from io import BytesIO
-                # Create a file-like object from blob data
-                file_obj = BytesIO(attachment.file_data)
-                response = FileResponse(
-                    file_obj,
-                    as_attachment=True,
-                    filename=attachment.file_name,
-                    content_type=attachment.content_type
-                )
+                byte_range = attachment_storage.parse_range(range_header, size)
+            except attachment_storage.RangeNotSatisfiable:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = f'bytes */{size}'
                 return response
-            except Exception as e:
-                return Response(
-                    {'error': f'Failed to download file: {str(e)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+        
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                attachment_storage.iter_file(attachment.storage_name, start, end - start + 1),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                content_type=attachment.content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = StreamingHttpResponse(
+                attachment_storage.iter_file(attachment.storage_name),
+                content_type=attachment.content_type
+            )
+            response['Content-Length'] = str(size)
+        
+        response['Content-Disposition'] = content_disposition_header(True, attachment.file_name)
+        response['Accept-Ranges'] = 'bytes'
+        if etag:
+            response['ETag'] = etag
+        return response
+
+
+def _etag_matches(if_none_match, etag):
+    """
+    Check an If-None-Match header against an ETag (weak comparison)
+    """
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or any(
+        candidate.removeprefix('W/') == etag for candidate in candidates
+    )
+
+
+def _stream_base64_json(attachment):
+    """
+    Yield the base64 download JSON document, encoding the file chunk by chunk
+    """
+    import base64
+    import json
+    from django.core.serializers.json import DjangoJSONEncoder
+    
+    header = json.dumps({
+        'id': str(attachment.id),
+        'file_name': attachment.file_name,
+        'content_type': attachment.content_type,
+        'size': attachment.size,
+        'size_mb': attachment.size_mb,
+        'caption': attachment.caption,
+        'created_at': attachment.created_at,
+    }, cls=DjangoJSONEncoder)
+    yield header[:-1] + ', "base64": "'
+    
+    # base64 must be fed multiples of 3 bytes to concatenate cleanly
+    carry = b''
+    for chunk in attachment_storage.iter_file(attachment.storage_name, chunk_size=48 * 1024):
+        data = carry + chunk
+        cut = len(data) - len(data) % 3
+        carry = data[cut:]
+        if cut:
+            yield base64.b64encode(data[:cut]).decode('ascii')
+    if carry:
+        yield base64.b64encode(carry).decode('ascii')
+    yield '"}'
+
+
+class MessageSearchPagination(PageNumberPagination):
+    """
+    Pagination for ranked message search results
+    """
+    page_size = 20
+    max_page_size = 50
+    page_size_query_param = 'limit'
 
 
 class UserListPagination(PageNumberPagination):
@@ -803,14 +899,93 @@ def get_total_unread_count(request):
     """
     user = request.user
     
-    # Sum all unread counts from user's thread participations
-    total_unread = ThreadParticipant.objects.filter(
-        user=user,
-        left_at__isnull=True
-    ).aggregate(
-        total=Sum('unread_count')
-    )['total'] or 0
+    # Kept as a running total (Redis hash field, or a Sum over the user's participations)
+    total_unread = unread_counters.get_total(user.id)
     
     return Response({
         'total_unread_count': total_unread
     })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_online_users(request):
+    """
+    Bulk "who is online" lookup
+    
+    Query params:
+        user_ids: Comma-separated user IDs (max 500). Defaults to the
+                  current user's contacts (users sharing an active thread).
+    """
+    raw_ids = request.query_params.get('user_ids')
+    if raw_ids:
+        try:
+            user_ids = {int(user_id) for user_id in raw_ids.split(',') if user_id.strip()}
+        except ValueError:
+            return Response({
+                'error': 'user_ids must be a comma-separated list of integers',
+                'code': 'INVALID_USER_IDS'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > 500:
+            return Response({
+                'error': 'Too many user_ids (maximum 500)',
+                'code': 'TOO_MANY_USER_IDS'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        user_ids = presence.contact_ids(request.user.id)
+    
+    return Response({
+        'online_user_ids': sorted(presence.online_user_ids(user_ids))
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_messages(request):
+    """
+    Search messages in the current user's threads, best matches first
+    
+    Query params:
+        q: Search text (minimum 2 characters); Arabic is matched regardless
+           of diacritics, hamza/alef variants and the definite article
+        thread_id (optional): Only search this thread
+        page, limit (optional): Pagination (max 50 per page)
+    """
+    import uuid
+    
+    query = request.query_params.get('q', '').strip()
+    if len(query) < 2:
+        return Response({
+            'error': 'Search query too short (minimum 2 characters)',
+            'code': 'SEARCH_TOO_SHORT'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    thread_id = request.query_params.get('thread_id')
+    if thread_id:
+        try:
+            thread_id = uuid.UUID(thread_id)
+        except ValueError:
+            return Response({
+                'error': 'Invalid thread_id',
+                'code': 'INVALID_THREAD_ID'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    hits = search.search_messages(request.user, query, thread_id=thread_id)
+    
+    paginator = MessageSearchPagination()
+    page = paginator.paginate_queryset(hits, request)
+    message_ids = [hit['message_id'] for hit in page]
+    
+    # Load the page's messages in one query, then restore rank order
+    messages = Message.objects.filter(id__in=message_ids).select_related(
+        'sender', 'reply_to__sender', 'thread'
+    ).prefetch_related(
+        'attachments',
+        Prefetch('reactions', queryset=MessageReaction.objects.select_related('user'))
+    ).in_bulk()
+    ordered = [messages[message_id] for message_id in message_ids if message_id in messages]
+    
+    logger.debug(f"Message search: user={request.user.id}, terms='{query[:50]}', hits on page={len(ordered)}")
+    
+    serializer = MessageSerializer(ordered, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
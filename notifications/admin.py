@@ -8,7 +8,9 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
-from .models import Notification, NotificationPreference
+from django.db.models import F
+from . import stats, unread_counters
+from .models import Notification, NotificationPreference, BackgroundJob, DeferredNotification
 
 
 @admin.register(Notification)
@@ -139,10 +141,13 @@ class NotificationAdmin(admin.ModelAdmin):
     
     def mark_as_unread(self, request, queryset):
         """Mark selected notifications as unread."""
+        recipient_ids = set(queryset.filter(is_read=True).values_list('recipient_id', flat=True))
         updated = queryset.filter(is_read=True).update(
             is_read=False,
             read_at=None
         )
+        unread_counters.invalidate(recipient_ids)
+        stats.invalidate(recipient_ids)
         
         self.message_user(
             request,
@@ -244,3 +249,53 @@ class NotificationPreferenceAdmin(admin.ModelAdmin):
             return ', '.join(enabled_types)
         return format_html('<span style="color: orange;">None enabled</span>')
     enabled_types_summary.short_description = 'Enabled Types'
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    """Admin interface for BackgroundJob model."""
+    
+    list_display = [
+        'id', 'name', 'status', 'attempts', 'max_attempts',
+        'run_after', 'duration_ms', 'created_at', 'finished_at'
+    ]
+    
+    list_filter = ['status', 'name', 'created_at']
+    
+    search_fields = ['name', 'idempotency_key', 'last_error']
+    
+    readonly_fields = [
+        'name', 'payload', 'idempotency_key', 'attempts', 'locked_by',
+        'last_error', 'created_at', 'started_at', 'finished_at', 'duration_ms'
+    ]
+    
+    actions = ['retry_jobs']
+    
+    def retry_jobs(self, request, queryset):
+        """Queue selected failed jobs to run again."""
+        updated = queryset.filter(status=BackgroundJob.STATUS_FAILED).update(
+            status=BackgroundJob.STATUS_PENDING,
+            run_after=timezone.now(),
+            max_attempts=F('attempts') + 1
+        )
+        
+        self.message_user(
+            request,
+            f'Queued {updated} failed jobs to run again.'
+        )
+    retry_jobs.short_description = 'Retry selected failed jobs'
+
+
+@admin.register(DeferredNotification)
+class DeferredNotificationAdmin(admin.ModelAdmin):
+    """Admin interface for DeferredNotification model."""
+    
+    list_display = ['id', 'recipient', 'notification_type', 'priority', 'release_at', 'created_at']
+    
+    list_filter = ['notification_type', 'priority', 'release_at']
+    
+    search_fields = ['recipient__email']
+    
+    raw_id_fields = ['recipient', 'sender']
+    
+    ordering = ['release_at']
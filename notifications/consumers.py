@@ -22,6 +22,7 @@ from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 import jwt
 from django.conf import settings
+from . import stats, unread_counters
 from .models import Notification, NotificationPreference
 
 User = get_user_model()
@@ -185,10 +186,7 @@ class NotificationCountConsumer(AsyncJsonWebsocketConsumer):
     @database_sync_to_async
     def get_unread_count(self):
         """Get the number of unread notifications for the user."""
-        return Notification.objects.filter(
-            recipient=self.user,
-            is_read=False
-        ).count()
+        return unread_counters.get(self.user.id)
 
 
 # Helper function to send notification count update from anywhere in the app
@@ -209,10 +207,7 @@ def send_notification_count_update(user_id: int):
             return
         
         # Get the current unread count
-        count = Notification.objects.filter(
-            recipient_id=user_id,
-            is_read=False
-        ).count()
+        count = unread_counters.get(user_id)
         
         # Send to user's notification group
         async_to_sync(channel_layer.group_send)(
@@ -244,14 +239,7 @@ async def async_send_notification_count_update(user_id: int):
             return
         
         # Get the current unread count
-        @database_sync_to_async
-        def get_count():
-            return Notification.objects.filter(
-                recipient_id=user_id,
-                is_read=False
-            ).count()
-        
-        count = await get_count()
+        count = await database_sync_to_async(unread_counters.get)(user_id)
         
         # Send to user's notification group
         await channel_layer.group_send(
@@ -522,16 +510,15 @@ class NotificationsConsumer(AsyncJsonWebsocketConsumer):
             is_read=True,
             read_at=timezone.now()
         )
+        unread_counters.reset(self.user.id)
+        stats.invalidate([self.user.id])
         
         return count
     
     @database_sync_to_async
     def get_unread_count(self):
         """Get the number of unread notifications for the user."""
-        return Notification.objects.filter(
-            recipient=self.user,
-            is_read=False
-        ).count()
+        return unread_counters.get(self.user.id)
     
     @database_sync_to_async
     def get_user_preferred_language(self):
@@ -0,0 +1,120 @@
+"""
+Delivery of notifications deferred by quiet hours.
+
+NotificationService stores a DeferredNotification (with release_at set to
+the end of the recipient's quiet hours) instead of dropping the
+notification. release_due(), run by the run_jobs worker, turns due rows
+into notifications in batches:
+- each batch locks its rows (skipping rows another worker holds), so
+  concurrent workers never deliver the same notification twice
+- preferences are checked again for the whole batch at once: rows whose
+  type was disabled meanwhile are dropped, rows whose recipient is back in
+  quiet hours are moved to the new end
+- expired rows are dropped
+- delivered notifications are counted and pushed like any new notification
+"""
+
+import logging
+from typing import Optional
+from django.db import transaction
+from django.utils import timezone
+from .models import DeferredNotification, Notification
+from .services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def release_batch(batch_size: int = BATCH_SIZE, now=None) -> Optional[int]:
+    """
+    Deliver one batch of due deferred notifications.
+    
+    Args:
+        batch_size: Maximum number of deferred notifications handled
+        now: Current time (default: now)
+    
+    Returns:
+        Number of notifications delivered, or None when nothing was left to release
+    """
+    now = now or timezone.now()
+    candidates = list(
+        DeferredNotification.objects.filter(release_at__lte=now)
+        .order_by('release_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not candidates:
+        return None
+    
+    with transaction.atomic():
+        rows = list(
+            DeferredNotification.objects.select_for_update(skip_locked=True)
+            .filter(id__in=candidates, release_at__lte=now)
+        )
+        if not rows:
+            # Taken by another worker
+            return None
+        user_ids = list({row.recipient_id for row in rows})
+        preferences = NotificationService._get_or_create_preferences(user_ids)
+        
+        # Check preferences once per notification type for the whole batch
+        by_type = {}
+        for row in rows:
+            if not (row.expires_at and row.expires_at <= now):
+                by_type.setdefault(row.notification_type, []).append(row)
+        
+        delivered = []
+        postponed = []
+        for notification_type, typed_rows in by_type.items():
+            deliver, deferred = NotificationService._route(
+                preferences, list({row.recipient_id for row in typed_rows}), notification_type, now=now
+            )
+            deliver = set(deliver)
+            for row in typed_rows:
+                if row.recipient_id in deferred:
+                    row.release_at = deferred[row.recipient_id]
+                    postponed.append(row)
+                elif row.recipient_id in deliver:
+                    delivered.append(row.to_notification())
+        
+        Notification.objects.bulk_create(delivered, batch_size=batch_size)
+        if postponed:
+            DeferredNotification.objects.bulk_update(postponed, ['release_at'], batch_size=batch_size)
+        postponed_ids = {row.id for row in postponed}
+        DeferredNotification.objects.filter(
+            id__in=[row.id for row in rows if row.id not in postponed_ids]
+        ).delete()
+        
+        NotificationService.count_new_notifications(
+            notification.recipient_id for notification in delivered
+        )
+    
+    dropped = len(rows) - len(delivered) - len(postponed)
+    logger.info(
+        f"Released {len(delivered)} deferred notifications "
+        f"({len(postponed)} postponed, {dropped} dropped)"
+    )
+    return len(delivered)
+
+
+def release_due(batch_size: int = BATCH_SIZE, max_batches: Optional[int] = None) -> int:
+    """
+    Deliver all due deferred notifications, batch by batch.
+    
+    Args:
+        batch_size: Deferred notifications handled per batch
+        max_batches: Stop after this many batches
+    
+    Returns:
+        Number of notifications delivered
+    """
+    now = timezone.now()
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        released = release_batch(batch_size, now=now)
+        if released is None:
+            break
+        total += released
+        batches += 1
+    return total
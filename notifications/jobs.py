@@ -0,0 +1,279 @@
+"""
+Durable background job queue.
+
+Work that does not have to finish inside a request (notification fan-out
+for survey shares, publications and responses) is enqueued as a
+BackgroundJob row and executed by the run_jobs management command.
+
+- Handlers are registered by name with @register('name') and called with the
+  job's payload as keyword arguments, inside a transaction, so a failed
+  attempt leaves nothing behind and can simply be retried.
+- enqueue() writes the row in the caller's transaction: the job becomes
+  visible to workers when that transaction commits, and disappears with it
+  if it rolls back.
+- An idempotency key makes enqueue() return the existing job instead of
+  adding a duplicate.
+- Failures are retried with exponential backoff up to max_attempts; jobs
+  left running by a dead worker are requeued after a lock timeout.
+- Each attempt records its start, finish and duration; metrics() aggregates
+  them per job name.
+
+With NOTIFICATION_JOBS_EAGER (development without a worker) jobs run in
+process right after the enqueueing transaction commits.
+"""
+
+import logging
+import os
+import random
+import socket
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Max
+from django.utils import timezone
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 3600
+
+_handlers: Dict[str, Callable] = {}
+
+
+def register(name: str):
+    """
+    Register a function as the handler of a job name.
+    
+    Args:
+        name: Job name used by enqueue()
+    
+    Returns:
+        Decorator that registers and returns the function unchanged
+    """
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(
+    name: str,
+    payload: Optional[Dict[str, Any]] = None,
+    idempotency_key: Optional[str] = None,
+    delay: Optional[timedelta] = None,
+    max_attempts: Optional[int] = None
+) -> BackgroundJob:
+    """
+    Add a job to the queue (visible to workers once the current transaction commits).
+    
+    Args:
+        name: Registered handler name
+        payload: JSON-serializable keyword arguments for the handler
+        idempotency_key: Optional key; if a job with this key exists it is returned instead
+        delay: Optional delay before the job may run
+        max_attempts: Attempts before the job is marked failed (default: NOTIFICATION_JOB_MAX_ATTEMPTS)
+    
+    Returns:
+        The enqueued (or existing) job
+    """
+    if name not in _handlers:
+        raise ValueError(f"No job handler registered for '{name}'")
+    
+    job = BackgroundJob(
+        name=name,
+        payload=payload or {},
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts or getattr(settings, 'NOTIFICATION_JOB_MAX_ATTEMPTS', 5),
+        run_after=timezone.now() + (delay or timedelta())
+    )
+    if idempotency_key:
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            logger.info(f"Job with idempotency key {idempotency_key} already exists, not enqueued again")
+            return BackgroundJob.objects.get(idempotency_key=idempotency_key)
+    else:
+        job.save()
+    
+    logger.debug(f"Enqueued job {job.id} {name}")
+    if getattr(settings, 'NOTIFICATION_JOBS_EAGER', False) and not delay:
+        transaction.on_commit(lambda: run_pending(job_ids=[job.id]))
+    return job
+
+
+def worker_name() -> str:
+    """Identify this worker process in locked_by."""
+    return f"{socket.gethostname()}:{os.getpid()}"[:100]
+
+
+def claim(worker: str, limit: int = 10, job_ids: Optional[List[int]] = None) -> List[BackgroundJob]:
+    """
+    Claim due pending jobs for a worker.
+    
+    Each job is taken with a conditional UPDATE on its pending status, so
+    concurrent workers never run the same job.
+    
+    Args:
+        worker: Worker name recorded in locked_by
+        limit: Maximum number of jobs to claim
+        job_ids: Only consider these jobs (eager execution)
+    
+    Returns:
+        Claimed jobs in due order
+    """
+    now = timezone.now()
+    due = BackgroundJob.objects.filter(status=BackgroundJob.STATUS_PENDING, run_after__lte=now)
+    if job_ids is not None:
+        due = due.filter(id__in=job_ids)
+    candidates = list(due.order_by('run_after', 'id').values_list('id', flat=True)[:limit])
+    
+    claimed = [
+        job_id for job_id in candidates
+        if BackgroundJob.objects.filter(id=job_id, status=BackgroundJob.STATUS_PENDING).update(
+            status=BackgroundJob.STATUS_RUNNING,
+            locked_by=worker,
+            started_at=now,
+            attempts=F('attempts') + 1
+        )
+    ]
+    return list(BackgroundJob.objects.filter(id__in=claimed).order_by('run_after', 'id'))
+
+
+def backoff(attempts: int) -> timedelta:
+    """Delay before the next attempt: exponential in the attempts made, with jitter."""
+    base = getattr(settings, 'NOTIFICATION_JOB_RETRY_BACKOFF_SECONDS', 30)
+    seconds = min(base * 2 ** max(attempts - 1, 0), MAX_BACKOFF_SECONDS)
+    return timedelta(seconds=seconds * random.uniform(1, 1.2))
+
+
+def execute(job: BackgroundJob) -> bool:
+    """
+    Run a claimed job and record the outcome.
+    
+    Args:
+        job: Job in running status (from claim())
+    
+    Returns:
+        True if the handler succeeded
+    """
+    started = time.monotonic()
+    try:
+        handler = _handlers.get(job.name)
+        if handler is None:
+            raise LookupError(f"No job handler registered for '{job.name}'")
+        with transaction.atomic():
+            handler(**job.payload)
+    except Exception as e:
+        duration_ms = int((time.monotonic() - started) * 1000)
+        job.finished_at = timezone.now()
+        job.duration_ms = duration_ms
+        job.last_error = f"{type(e).__name__}: {e}"
+        job.locked_by = ''
+        if job.attempts < job.max_attempts:
+            job.status = BackgroundJob.STATUS_PENDING
+            job.run_after = job.finished_at + backoff(job.attempts)
+            logger.warning(
+                f"Job {job.id} {job.name} failed (attempt {job.attempts}/{job.max_attempts}) "
+                f"in {duration_ms} ms, retrying at {job.run_after}: {e}"
+            )
+        else:
+            job.status = BackgroundJob.STATUS_FAILED
+            logger.error(f"Job {job.id} {job.name} failed permanently after {job.attempts} attempts: {e}")
+        job.save(update_fields=['status', 'run_after', 'finished_at', 'duration_ms', 'last_error', 'locked_by'])
+        return False
+    
+    job.finished_at = timezone.now()
+    job.duration_ms = int((time.monotonic() - started) * 1000)
+    job.status = BackgroundJob.STATUS_SUCCEEDED
+    job.locked_by = ''
+    job.save(update_fields=['status', 'finished_at', 'duration_ms', 'locked_by'])
+    wait_ms = int((job.started_at - job.created_at).total_seconds() * 1000)
+    logger.info(
+        f"Job {job.id} {job.name} succeeded in {job.duration_ms} ms "
+        f"(attempt {job.attempts}, waited {wait_ms} ms)"
+    )
+    return True
+
+
+def run_pending(limit: int = 10, worker: Optional[str] = None, job_ids: Optional[List[int]] = None) -> int:
+    """
+    Claim and run one batch of due jobs.
+    
+    Args:
+        limit: Maximum number of jobs to run
+        worker: Worker name (default: host and process ID)
+        job_ids: Only run these jobs
+    
+    Returns:
+        Number of jobs run (successful or not)
+    """
+    jobs = claim(worker or worker_name(), limit=limit, job_ids=job_ids)
+    for job in jobs:
+        execute(job)
+    return len(jobs)
+
+
+def requeue_stale(timeout: Optional[int] = None) -> int:
+    """
+    Requeue jobs whose worker died while running them.
+    
+    Args:
+        timeout: Seconds a job may run before it is considered abandoned
+                 (default: NOTIFICATION_JOB_LOCK_TIMEOUT_SECONDS)
+    
+    Returns:
+        Number of jobs requeued or failed
+    """
+    timeout = timeout or getattr(settings, 'NOTIFICATION_JOB_LOCK_TIMEOUT_SECONDS', 900)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = BackgroundJob.objects.filter(status=BackgroundJob.STATUS_RUNNING, started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=BackgroundJob.STATUS_FAILED,
+        locked_by='',
+        last_error='Worker lock timed out'
+    )
+    requeued = stale.update(
+        status=BackgroundJob.STATUS_PENDING,
+        locked_by='',
+        run_after=timezone.now(),
+        last_error='Worker lock timed out'
+    )
+    if failed or requeued:
+        logger.warning(f"Requeued {requeued} and failed {failed} abandoned jobs")
+    return failed + requeued
+
+
+def purge(older_than: timedelta) -> int:
+    """
+    Delete succeeded jobs finished before a cutoff (failed jobs are kept for inspection).
+    
+    Returns:
+        Number of jobs deleted
+    """
+    cutoff = timezone.now() - older_than
+    deleted, _ = BackgroundJob.objects.filter(
+        status=BackgroundJob.STATUS_SUCCEEDED,
+        finished_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+def metrics() -> List[Dict[str, Any]]:
+    """
+    Per-job-name counts by status and run-time statistics.
+    
+    Returns:
+        List of dicts with name, status, count, avg_duration_ms and max_duration_ms
+    """
+    return list(
+        BackgroundJob.objects.values('name', 'status')
+        .annotate(
+            count=Count('id'),
+            avg_duration_ms=Avg('duration_ms'),
+            max_duration_ms=Max('duration_ms')
+        )
+        .order_by('name', 'status')
+    )
@@ -1,13 +1,16 @@
 """
 Management command to clean up old notifications.
 
-This command removes expired notifications and old read notifications
-to keep the database clean and performant.
+Applies the retention tiers of notifications.retention (old read and, when
+configured, old unread notifications; expired ones with --expired) with
+batched deletes. Each batch commits on
+its own, so the command can be limited to a maintenance window with
+--time-limit or --max-batches and the next run continues where it stopped.
 """
 
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
+from django.db.models import Count, Q
+from notifications import retention
 from notifications.models import Notification
 
 
@@ -19,14 +22,60 @@ class Command(BaseCommand):
         parser.add_argument(
             '--days',
             type=int,
-            default=30,
-            help='Remove read notifications older than X days (default: 30)'
+            default=None,
+            help='Remove read notifications read more than X days ago '
+                 '(default: NOTIFICATION_RETENTION_READ_DAYS, 0 keeps them)'
+        )
+        
+        parser.add_argument(
+            '--unread-days',
+            type=int,
+            default=None,
+            help='Remove unread notifications older than X days '
+                 '(default: NOTIFICATION_RETENTION_UNREAD_DAYS, 0 keeps them)'
+        )
+        
+        parser.add_argument(
+            '--tier',
+            action='append',
+            choices=retention.TIERS,
+            help='Only apply this tier (repeatable; default: read and unread, '
+                 'plus expired with --expired)'
         )
         
         parser.add_argument(
             '--expired',
             action='store_true',
-            help='Remove all expired notifications'
+            help='Also remove all expired notifications'
+        )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=retention.BATCH_SIZE,
+            help=f'Notifications deleted per batch (default: {retention.BATCH_SIZE}, '
+                 f'max: {retention.MAX_BATCH_SIZE})'
+        )
+        
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after X batches'
+        )
+        
+        parser.add_argument(
+            '--time-limit',
+            type=float,
+            default=None,
+            help='Stop starting new batches after X seconds'
+        )
+        
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between batches (default: 0)'
         )
         
         parser.add_argument(
@@ -37,56 +86,40 @@ class Command(BaseCommand):
     
     def handle(self, *args, **options):
         """Execute the command."""
-        days = options['days']
-        remove_expired = options['expired']
+        tiers = options['tier'] or retention.DEFAULT_TIERS
+        if options['expired'] and retention.TIER_EXPIRED not in tiers:
+            tiers = (retention.TIER_EXPIRED, *tiers)
         dry_run = options['dry_run']
         
         if dry_run:
             self.stdout.write(
                 self.style.WARNING('DRY RUN MODE - No notifications will be deleted')
             )
-        
-        total_deleted = 0
-        
-        # Remove expired notifications
-        if remove_expired:
-            expired_notifications = Notification.objects.filter(
-                expires_at__isnull=False,
-                expires_at__lt=timezone.now()
+            counts = retention.pending(
+                tiers,
+                read_days=options['days'],
+                unread_days=options['unread_days']
+            )
+        else:
+            counts = retention.run(
+                tiers,
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+                time_limit=options['time_limit'],
+                pause=options['pause'],
+                read_days=options['days'],
+                unread_days=options['unread_days']
             )
-            
-            expired_count = expired_notifications.count()
-            if expired_count > 0:
-                if not dry_run:
-                    deleted_count, _ = expired_notifications.delete()
-                    total_deleted += deleted_count
-                
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'{"Would delete" if dry_run else "Deleted"} {expired_count} expired notifications'
-                    )
-                )
-        
-        # Remove old read notifications
-        cutoff_date = timezone.now() - timedelta(days=days)
-        old_read_notifications = Notification.objects.filter(
-            is_read=True,
-            read_at__lt=cutoff_date
-        )
         
-        old_read_count = old_read_notifications.count()
-        if old_read_count > 0:
-            if not dry_run:
-                deleted_count, _ = old_read_notifications.delete()
-                total_deleted += deleted_count
-            
+        for tier, count in counts.items():
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'{"Would delete" if dry_run else "Deleted"} {old_read_count} old read notifications (>{days} days)'
+                    f'{"Would delete" if dry_run else "Deleted"} {count} notifications ({tier} tier)'
                 )
             )
         
         # Summary
+        total_deleted = sum(counts.values())
         if not dry_run and total_deleted > 0:
             self.stdout.write(
                 self.style.SUCCESS(f'Successfully deleted {total_deleted} notifications total')
@@ -97,11 +130,13 @@ class Command(BaseCommand):
             )
         
         # Show current statistics
-        total_notifications = Notification.objects.count()
-        unread_notifications = Notification.objects.filter(is_read=False).count()
+        current = Notification.objects.aggregate(
+            total=Count('id'),
+            unread=Count('id', filter=Q(is_read=False))
+        )
         
         self.stdout.write(
             self.style.SUCCESS(
-                f'Current statistics: {total_notifications} total, {unread_notifications} unread'
+                f'Current statistics: {current["total"]} total, {current["unread"]} unread'
             )
         )
@@ -0,0 +1,47 @@
+"""
+Management command to reconcile Redis unread notification counters.
+
+Run periodically (cron, or --interval for a long-running process) to
+correct counters that drifted from the database, e.g. after notifications
+were deleted by retention or changed outside the API.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from notifications import unread_counters
+
+
+class Command(BaseCommand):
+    help = 'Correct Redis-backed unread notification counters against the database'
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Counters checked per batch (default: 500)'
+        )
+
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and reconcile every N seconds (default: reconcile once and exit)'
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        if not unread_counters.enabled():
+            self.stdout.write(
+                self.style.WARNING('Unread notification counts come from the database; nothing to reconcile')
+            )
+            return
+
+        while True:
+            corrected = unread_counters.reconcile(options['batch_size'])
+            self.stdout.write(f'Corrected {corrected} unread notification counters')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,94 @@
+"""
+Management command to run background jobs.
+
+Runs as a long-lived worker: claims due jobs in batches, requeues jobs
+abandoned by dead workers, purges old succeeded jobs and delivers
+notifications deferred by quiet hours once they are due. Several workers
+can run side by side.
+"""
+
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from notifications import deferred, jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (notification delivery and survey side-effects)'
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs that are due now and exit'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Jobs claimed per batch (default: 10)'
+        )
+
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when no job is due (default: 1)'
+        )
+
+        parser.add_argument(
+            '--purge-days',
+            type=int,
+            default=7,
+            help='Delete succeeded jobs older than X days (default: 7, 0 keeps them)'
+        )
+
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print job counts and timings per job name and exit'
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        if options['stats']:
+            for row in jobs.metrics():
+                avg = row['avg_duration_ms']
+                self.stdout.write(
+                    f"{row['name']:<40} {row['status']:<10} {row['count']:>8} "
+                    f"avg {avg or 0:.0f} ms  max {row['max_duration_ms'] or 0} ms"
+                )
+            return
+
+        worker = jobs.worker_name()
+        batch_size = options['batch_size']
+        purge_after = timedelta(days=options['purge_days']) if options['purge_days'] else None
+        last_maintenance = 0
+
+        self.stdout.write(f'Job worker {worker} started')
+        try:
+            while True:
+                close_old_connections()
+
+                # Requeue abandoned jobs, purge old ones and release deferred
+                # notifications at most once a minute
+                if time.monotonic() - last_maintenance >= 60:
+                    jobs.requeue_stale()
+                    if purge_after:
+                        jobs.purge(purge_after)
+                    deferred.release_due()
+                    last_maintenance = time.monotonic()
+
+                ran = jobs.run_pending(limit=batch_size, worker=worker)
+                if options['once']:
+                    if not ran:
+                        break
+                elif not ran:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Job worker {worker} stopped'))
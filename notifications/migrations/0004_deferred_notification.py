@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-15 22:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_retention_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeferredNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.JSONField()),
+                ('body', models.JSONField()),
+                ('notification_type', models.CharField(choices=[('survey_assigned', 'Survey Assigned'), ('survey_completed', 'Survey Completed'), ('survey_shared', 'Survey Shared'), ('survey_updated', 'Survey Updated'), ('survey_deleted', 'Survey Deleted'), ('admin_message', 'Admin Message'), ('system_alert', 'System Alert'), ('user_mention', 'User Mention'), ('group_invitation', 'Group Invitation'), ('response_received', 'Response Received')], default='admin_message', max_length=50)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('normal', 'Normal'), ('high', 'High'), ('urgent', 'Urgent')], default='normal', max_length=20)),
+                ('action_url', models.URLField(blank=True, null=True)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('release_at', models.DateTimeField(help_text="When the recipient's quiet hours end")),
+                ('recipient', models.ForeignKey(help_text='User who will receive this notification', on_delete=django.db.models.deletion.CASCADE, related_name='deferred_notifications', to=settings.AUTH_USER_MODEL)),
+                ('sender', models.ForeignKey(blank=True, help_text='User who triggered this notification (optional)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Deferred Notification',
+                'verbose_name_plural': 'Deferred Notifications',
+                'indexes': [models.Index(fields=['release_at'], name='notificatio_release_117fdc_idx')],
+            },
+        ),
+    ]
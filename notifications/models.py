@@ -8,6 +8,7 @@ with multi-language support.
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from datetime import datetime, timedelta
 import hashlib
 import json
 import uuid
@@ -153,6 +154,9 @@ class Notification(models.Model):
             models.Index(fields=['recipient', 'created_at']),
             models.Index(fields=['notification_type']),
             models.Index(fields=['expires_at']),
+            # Retention tiers (notifications.retention)
+            models.Index(fields=['is_read', 'read_at']),
+            models.Index(fields=['is_read', 'created_at']),
         ]
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
@@ -176,9 +180,13 @@ class Notification(models.Model):
     def mark_as_read(self):
         """Mark notification as read."""
         if not self.is_read:
+            from . import stats, unread_counters
+            
             self.is_read = True
             self.read_at = timezone.now()
             self.save(update_fields=['is_read', 'read_at'])
+            unread_counters.decrement(self.recipient_id)
+            stats.invalidate([self.recipient_id])
     
     def is_expired(self) -> bool:
         """Check if notification has expired."""
@@ -301,21 +309,194 @@ class NotificationPreference(models.Model):
         }
         return type_mapping.get(notification_type, True)
     
-    def is_in_quiet_hours(self) -> bool:
+    def is_in_quiet_hours(self, now=None) -> bool:
         """Check if current time is within user's quiet hours."""
+        return self.quiet_hours_end_at(now) is not None
+    
+    def quiet_hours_end_at(self, now=None):
+        """
+        Get when the user's current quiet hours end.
+        
+        Args:
+            now: Current time (pass one value when checking many users)
+        
+        Returns:
+            Aware datetime just after quiet hours end, or None outside quiet hours
+        """
         if not self.quiet_hours_enabled or not self.quiet_hours_start or not self.quiet_hours_end:
-            return False
+            return None
         
         # Get current UAE time
         from django.utils import timezone as django_timezone
         import pytz
         
         uae_tz = pytz.timezone('Asia/Dubai')
-        current_time = django_timezone.now().astimezone(uae_tz).time()
+        local_now = (now or django_timezone.now()).astimezone(uae_tz)
+        current_time = local_now.time()
         
         if self.quiet_hours_start <= self.quiet_hours_end:
-            # Same day range (e.g., 22:00 - 06:00 next day)
-            return self.quiet_hours_start <= current_time <= self.quiet_hours_end
+            # Same day range (e.g., 13:00 - 15:00)
+            in_quiet_hours = self.quiet_hours_start <= current_time <= self.quiet_hours_end
         else:
             # Overnight range (e.g., 22:00 - 06:00 next day)
-            return current_time >= self.quiet_hours_start or current_time <= self.quiet_hours_end
+            in_quiet_hours = current_time >= self.quiet_hours_start or current_time <= self.quiet_hours_end
+        if not in_quiet_hours:
+            return None
+        
+        end_date = local_now.date()
+        if current_time > self.quiet_hours_end:
+            # Overnight range before midnight: quiet hours end tomorrow
+            end_date += timedelta(days=1)
+        end = uae_tz.localize(datetime.combine(end_date, self.quiet_hours_end))
+        return end + timedelta(seconds=1)
+
+
+class BackgroundJob(models.Model):
+    """
+    Durable background job (notification fan-out and other request side-effects).
+    
+    Rows are written in the caller's transaction, so a job becomes visible to
+    workers only when that transaction commits. Workers claim pending jobs
+    with a conditional update, retry failures with exponential backoff and
+    record timing for each run.
+    """
+    
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    name = models.CharField(
+        max_length=100,
+        help_text='Registered job handler name'
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Keyword arguments for the handler'
+    )
+    idempotency_key = models.CharField(
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text='Jobs enqueued again with the same key are not duplicated'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        help_text='Earliest time the job may run (pushed back on retries)'
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Worker running the job'
+    )
+    last_error = models.TextField(blank=True)
+    
+    # Timing
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the latest attempt started'
+    )
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Run time of the latest attempt in milliseconds'
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['name', 'status']),
+        ]
+        verbose_name = 'Background Job'
+        verbose_name_plural = 'Background Jobs'
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class DeferredNotification(models.Model):
+    """
+    Notification held back by the recipient's quiet hours.
+    
+    Created instead of a Notification while the recipient is in quiet hours
+    and turned into one (counted and pushed like any new notification) by
+    notifications.deferred.release_due() once release_at has passed.
+    """
+    
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='deferred_notifications',
+        help_text='User who will receive this notification'
+    )
+    sender = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text='User who triggered this notification (optional)'
+    )
+    title = models.JSONField()
+    body = models.JSONField()
+    notification_type = models.CharField(
+        max_length=50,
+        choices=Notification.NOTIFICATION_TYPES,
+        default=Notification.TYPE_ADMIN_MESSAGE
+    )
+    priority = models.CharField(
+        max_length=20,
+        choices=Notification.PRIORITY_CHOICES,
+        default=Notification.PRIORITY_NORMAL
+    )
+    action_url = models.URLField(blank=True, null=True)
+    metadata = models.JSONField(default=dict, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    release_at = models.DateTimeField(
+        help_text='When the recipient\'s quiet hours end'
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['release_at']),
+        ]
+        verbose_name = 'Deferred Notification'
+        verbose_name_plural = 'Deferred Notifications'
+    
+    def __str__(self):
+        return f"Deferred notification for user {self.recipient_id} until {self.release_at}"
+    
+    def to_notification(self) -> Notification:
+        """Build the notification to deliver (unsaved)."""
+        return Notification(
+            recipient_id=self.recipient_id,
+            sender_id=self.sender_id,
+            title=self.title,
+            body=self.body,
+            notification_type=self.notification_type,
+            priority=self.priority,
+            action_url=self.action_url,
+            metadata=self.metadata,
+            expires_at=self.expires_at
+        )
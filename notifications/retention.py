@@ -0,0 +1,197 @@
+"""
+Tiered notification expiry and retention.
+
+Notifications are removed in three tiers, each selected through an index
+on the notifications table:
+- expired: expires_at has passed (index on expires_at); opt-in
+- read: read more than NOTIFICATION_RETENTION_READ_DAYS ago
+  (index on is_read, read_at)
+- unread: created more than NOTIFICATION_RETENTION_UNREAD_DAYS ago and never
+  read (index on is_read, created_at); 0 (the default) keeps unread
+  notifications
+
+Each tier is deleted in batches: the IDs of the oldest matching rows are
+read in index order, then deleted by primary key in their own transaction.
+Every batch commits on its own, so a run can stop at any point (batch or
+time limit, interrupt) and the next run simply continues with what is
+left. Batches stay below Oracle's 1000-item IN list limit.
+
+Deleting unread notifications updates the recipients' unread counters
+and pushes the new counts; all affected users' cached stats are dropped.
+"""
+
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from . import stats, unread_counters
+from .models import Notification
+from .services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+TIER_EXPIRED = 'expired'
+TIER_READ = 'read'
+TIER_UNREAD = 'unread'
+TIERS = (TIER_EXPIRED, TIER_READ, TIER_UNREAD)
+DEFAULT_TIERS = (TIER_READ, TIER_UNREAD)
+
+BATCH_SIZE = 500
+MAX_BATCH_SIZE = 1000
+
+
+def tier_queryset(
+    tier: str,
+    read_days: Optional[int] = None,
+    unread_days: Optional[int] = None
+) -> Optional[Tuple[QuerySet, str]]:
+    """
+    Get the notifications a tier removes and the indexed field to walk them by.
+    
+    Args:
+        tier: One of TIERS
+        read_days: Read retention in days (default: NOTIFICATION_RETENTION_READ_DAYS)
+        unread_days: Unread retention in days (default: NOTIFICATION_RETENTION_UNREAD_DAYS)
+    
+    Returns:
+        (queryset, order field), or None when the tier is disabled
+    """
+    now = timezone.now()
+    if tier == TIER_EXPIRED:
+        return Notification.objects.filter(expires_at__lt=now), 'expires_at'
+    
+    if tier == TIER_READ:
+        if read_days is None:
+            read_days = getattr(settings, 'NOTIFICATION_RETENTION_READ_DAYS', 30)
+        if not read_days:
+            return None
+        return Notification.objects.filter(
+            is_read=True,
+            read_at__lt=now - timedelta(days=read_days)
+        ), 'read_at'
+    
+    if tier == TIER_UNREAD:
+        if unread_days is None:
+            unread_days = getattr(settings, 'NOTIFICATION_RETENTION_UNREAD_DAYS', 0)
+        if not unread_days:
+            return None
+        return Notification.objects.filter(
+            is_read=False,
+            created_at__lt=now - timedelta(days=unread_days)
+        ), 'created_at'
+    
+    raise ValueError(f"Unknown retention tier '{tier}'")
+
+
+def delete_batch(queryset: QuerySet, order_field: str, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Delete the oldest batch of a tier's notifications.
+    
+    Args:
+        queryset: Notifications to remove (from tier_queryset())
+        order_field: Indexed field to take the oldest rows by
+        batch_size: Maximum number of rows to delete
+    
+    Returns:
+        Number of notifications deleted (0 when the tier is done)
+    """
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    rows = list(
+        queryset.order_by(order_field, 'id')
+        .values_list('id', 'recipient_id', 'is_read')[:batch_size]
+    )
+    if not rows:
+        return 0
+    
+    with transaction.atomic():
+        deleted, _ = Notification.objects.filter(id__in=[row[0] for row in rows]).delete()
+    
+    # Rows marked read between the select and the delete are over-counted
+    # here; reconcile_notification_counters corrects that
+    unread = Counter(recipient_id for _, recipient_id, is_read in rows if not is_read)
+    stats.invalidate(recipient_id for _, recipient_id, _ in rows)
+    if unread:
+        counts = unread_counters.add({user_id: -count for user_id, count in unread.items()})
+        NotificationService.send_notification_count_updates(counts, counts=counts)
+    return deleted
+
+
+def run(
+    tiers: Iterable[str] = DEFAULT_TIERS,
+    batch_size: int = BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    pause: float = 0,
+    read_days: Optional[int] = None,
+    unread_days: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Apply the retention tiers in batches.
+    
+    Args:
+        tiers: Tiers to apply, in order (default: read and unread; expired is opt-in)
+        batch_size: Rows deleted per batch (at most MAX_BATCH_SIZE)
+        max_batches: Stop after this many batches in total
+        time_limit: Stop starting new batches after this many seconds
+        pause: Seconds to sleep between batches to spread the load
+        read_days: Read retention override in days
+        unread_days: Unread retention override in days
+    
+    Returns:
+        Dictionary of tier to number of notifications deleted
+    """
+    started = time.monotonic()
+    batches = 0
+    deleted = {}
+    
+    for tier in tiers:
+        deleted[tier] = 0
+        selection = tier_queryset(tier, read_days=read_days, unread_days=unread_days)
+        if selection is None:
+            continue
+        queryset, order_field = selection
+        
+        while True:
+            if max_batches is not None and batches >= max_batches:
+                break
+            if time_limit is not None and time.monotonic() - started >= time_limit:
+                break
+            count = delete_batch(queryset, order_field, batch_size)
+            if not count:
+                break
+            deleted[tier] += count
+            batches += 1
+            if pause:
+                time.sleep(pause)
+        
+        if deleted[tier]:
+            logger.info(f"Retention tier {tier}: deleted {deleted[tier]} notifications")
+    
+    logger.info(
+        f"Notification retention deleted {sum(deleted.values())} notifications in {batches} batches "
+        f"({time.monotonic() - started:.1f}s)"
+    )
+    return deleted
+
+
+def pending(
+    tiers: Iterable[str] = DEFAULT_TIERS,
+    read_days: Optional[int] = None,
+    unread_days: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Count the notifications each tier would delete.
+    
+    Returns:
+        Dictionary of tier to number of notifications (0 for disabled tiers)
+    """
+    counts = {}
+    for tier in tiers:
+        selection = tier_queryset(tier, read_days=read_days, unread_days=unread_days)
+        counts[tier] = selection[0].count() if selection else 0
+    return counts
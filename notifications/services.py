@@ -5,17 +5,26 @@ This module provides utilities for creating notifications and sending them
 via WebSocket with multi-language support.
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List, Union
+from itertools import islice
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Union, Iterable
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet
 from django.utils import timezone
-from .models import Notification, NotificationPreference
+from . import stats, unread_counters
+from .models import DeferredNotification, Notification, NotificationPreference
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Recipients per batch in bulk sends (also keeps IN lists under Oracle's 1000 limit)
+BULK_BATCH_SIZE = 500
+
 
 def translate_message(messages: Dict[str, str], lang: str = "en") -> str:
     """
@@ -65,7 +74,9 @@ class NotificationService:
             expires_at: Expiration datetime (optional)
         
         Returns:
-            Created notification or None if creation failed
+            Created notification, or None if the type is disabled, the
+            notification was deferred until the recipient's quiet hours end,
+            or creation failed
         """
         try:
             # Convert string titles/bodies to multi-language format
@@ -74,37 +85,44 @@ class NotificationService:
             if isinstance(body, str):
                 body = {"en": body, "ar": body}
             
-            # Check user preferences
-            try:
-                preferences = NotificationPreference.objects.get(user=recipient)
-                if not preferences.should_receive_notification(notification_type):
-                    logger.info(f"User {recipient.email} has disabled {notification_type} notifications")
-                    return None
-                
-                if preferences.is_in_quiet_hours():
-                    logger.info(f"User {recipient.email} is in quiet hours, skipping notification")
-                    return None
-            except NotificationPreference.DoesNotExist:
-                # Create default preferences for user
-                NotificationPreference.objects.create(user=recipient)
+            fields = {
+                'sender': sender,
+                'title': title,
+                'body': body,
+                'notification_type': notification_type,
+                'priority': priority,
+                'action_url': action_url,
+                'metadata': metadata or {},
+                'expires_at': expires_at
+            }
+            
+            # Check user preferences (the same batch check bulk sends use)
+            preferences = NotificationService._get_or_create_preferences([recipient.id])
+            deliver, deferred = NotificationService._route(preferences, [recipient.id], notification_type)
+            
+            if recipient.id in deferred:
+                DeferredNotification.objects.create(
+                    recipient=recipient,
+                    release_at=deferred[recipient.id],
+                    **fields
+                )
+                logger.info(
+                    f"User {recipient.email} is in quiet hours, "
+                    f"notification deferred until {deferred[recipient.id]}"
+                )
+                return None
+            
+            if not deliver:
+                logger.info(f"User {recipient.email} has disabled {notification_type} notifications")
+                return None
             
             # Create notification
-            notification = Notification.objects.create(
-                recipient=recipient,
-                sender=sender,
-                title=title,
-                body=body,
-                notification_type=notification_type,
-                priority=priority,
-                action_url=action_url,
-                metadata=metadata or {},
-                expires_at=expires_at
-            )
+            notification = Notification.objects.create(recipient=recipient, **fields)
             
             logger.info(f"Created notification {notification.id} for user {recipient.email}")
             
-            # Send notification count update via WebSocket
-            NotificationService.send_notification_count_update(notification.recipient_id)
+            # Count it and send the new count via WebSocket once committed
+            NotificationService.count_new_notifications([notification.recipient_id])
             
             return notification
             
@@ -113,7 +131,7 @@ class NotificationService:
             return None
     
     @staticmethod
-    def send_notification_count_update(user_id: int):
+    def send_notification_count_update(user_id: int, count: Optional[int] = None):
         """
         Send updated notification count to user's WebSocket.
         
@@ -121,6 +139,7 @@ class NotificationService:
         
         Args:
             user_id: ID of the user to send the count update to
+            count: New unread count if already known (default: read the user's counter)
         """
         try:
             channel_layer = get_channel_layer()
@@ -129,10 +148,8 @@ class NotificationService:
                 return
             
             # Get the current unread count
-            count = Notification.objects.filter(
-                recipient_id=user_id,
-                is_read=False
-            ).count()
+            if count is None:
+                count = unread_counters.get(user_id)
             
             # Send to user's notification group
             async_to_sync(channel_layer.group_send)(
@@ -148,6 +165,32 @@ class NotificationService:
         except Exception as e:
             logger.error(f"Failed to send notification count update to user {user_id}: {e}")
     
+    @staticmethod
+    def count_new_notifications(recipient_ids: Iterable[int]):
+        """
+        Add new notifications to the recipients' unread counters and push the new counts.
+        
+        Runs when the current transaction commits, so rolled-back
+        notifications are never counted.
+        
+        Args:
+            recipient_ids: Recipient user ID of each new notification
+        """
+        recipient_ids = list(recipient_ids)
+        if not recipient_ids:
+            return
+        
+        def count_and_send():
+            stats.invalidate(recipient_ids)
+            try:
+                counts = unread_counters.increment(recipient_ids)
+            except Exception as e:
+                logger.error(f"Failed to count {len(recipient_ids)} new notifications: {e}")
+                return
+            NotificationService.send_notification_count_updates(counts, counts=counts)
+        
+        transaction.on_commit(count_and_send)
+    
     @staticmethod
     def send_websocket_notification(notification: Notification):
         """
@@ -181,6 +224,34 @@ class NotificationService:
         Returns:
             Created notification or None
         """
+        title, body, metadata = NotificationService.survey_assigned_content(
+            survey_title, sender, survey_id
+        )
+        
+        return NotificationService.create_notification(
+            recipient=recipient,
+            title=title,
+            body=body,
+            notification_type=Notification.TYPE_SURVEY_ASSIGNED,
+            priority=Notification.PRIORITY_NORMAL,
+            sender=sender,
+            action_url=survey_url,
+            metadata=metadata
+        )
+    
+    @staticmethod
+    def survey_assigned_content(survey_title: str, sender: User, survey_id: str):
+        """
+        Build the title, body and metadata of a survey assignment notification.
+        
+        Args:
+            survey_title: Title of the survey
+            sender: User who assigned the survey
+            survey_id: UUID of the survey
+        
+        Returns:
+            Tuple of (title, body, metadata)
+        """
         title = {
             "en": "New Survey Assigned",
             "ar": "تم تعيين استبيان جديد"
@@ -197,17 +268,7 @@ class NotificationService:
             "assigner_id": sender.id,
             "assigner_name": f"{sender.first_name} {sender.last_name}".strip()
         }
-        
-        return NotificationService.create_notification(
-            recipient=recipient,
-            title=title,
-            body=body,
-            notification_type=Notification.TYPE_SURVEY_ASSIGNED,
-            priority=Notification.PRIORITY_NORMAL,
-            sender=sender,
-            action_url=survey_url,
-            metadata=metadata
-        )
+        return title, body, metadata
     
     @staticmethod
     def create_survey_completed_notification(
@@ -230,6 +291,33 @@ class NotificationService:
         Returns:
             Created notification or None
         """
+        title, body, metadata = NotificationService.survey_completed_content(
+            survey_title, respondent_name, survey_id
+        )
+        
+        return NotificationService.create_notification(
+            recipient=recipient,
+            title=title,
+            body=body,
+            notification_type=Notification.TYPE_SURVEY_COMPLETED,
+            priority=Notification.PRIORITY_HIGH,
+            action_url=survey_url,
+            metadata=metadata
+        )
+    
+    @staticmethod
+    def survey_completed_content(survey_title: str, respondent_name: str, survey_id: str):
+        """
+        Build the title, body and metadata of a survey completion notification.
+        
+        Args:
+            survey_title: Title of the survey
+            respondent_name: Name of the person who completed the survey
+            survey_id: UUID of the survey
+        
+        Returns:
+            Tuple of (title, body, metadata)
+        """
         title = {
             "en": "Survey Completed",
             "ar": "تم إكمال الاستبيان"
@@ -245,16 +333,7 @@ class NotificationService:
             "survey_title": survey_title,
             "respondent_name": respondent_name
         }
-        
-        return NotificationService.create_notification(
-            recipient=recipient,
-            title=title,
-            body=body,
-            notification_type=Notification.TYPE_SURVEY_COMPLETED,
-            priority=Notification.PRIORITY_HIGH,
-            action_url=survey_url,
-            metadata=metadata
-        )
+        return title, body, metadata
     
     @staticmethod
     def create_survey_shared_notification(
@@ -328,6 +407,40 @@ class NotificationService:
         Returns:
             Created notification or None
         """
+        title, body, metadata = NotificationService.survey_available_content(
+            survey_title, sender, survey_id, survey_visibility
+        )
+        
+        return NotificationService.create_notification(
+            recipient=recipient,
+            title=title,
+            body=body,
+            notification_type=Notification.TYPE_SURVEY_ASSIGNED,
+            priority=Notification.PRIORITY_NORMAL,
+            sender=sender,
+            action_url=survey_url,
+            metadata=metadata
+        )
+    
+    @staticmethod
+    def survey_available_content(
+        survey_title: str,
+        sender: User,
+        survey_id: str,
+        survey_visibility: str
+    ):
+        """
+        Build the title, body and metadata of a survey availability notification.
+        
+        Args:
+            survey_title: Title of the survey
+            sender: User who created/published the survey
+            survey_id: UUID of the survey
+            survey_visibility: Visibility level of the survey
+        
+        Returns:
+            Tuple of (title, body, metadata)
+        """
         visibility_text = {
             "PUBLIC": {"en": "public", "ar": "عام"},
             "AUTH": {"en": "authenticated users", "ar": "المستخدمين المسجلين"},
@@ -354,17 +467,7 @@ class NotificationService:
             "creator_name": f"{sender.first_name} {sender.last_name}".strip(),
             "survey_visibility": survey_visibility
         }
-        
-        return NotificationService.create_notification(
-            recipient=recipient,
-            title=title,
-            body=body,
-            notification_type=Notification.TYPE_SURVEY_ASSIGNED,
-            priority=Notification.PRIORITY_NORMAL,
-            sender=sender,
-            action_url=survey_url,
-            metadata=metadata
-        )
+        return title, body, metadata
     
     @staticmethod
     def create_survey_deactivated_notification(
@@ -447,50 +550,242 @@ class NotificationService:
     
     @staticmethod
     def bulk_notify_users(
-        recipients: List[User],
+        recipients: Iterable[User],
         title: Union[str, Dict[str, str]],
         body: Union[str, Dict[str, str]],
         notification_type: str = Notification.TYPE_ADMIN_MESSAGE,
         priority: str = Notification.PRIORITY_NORMAL,
         sender: Optional[User] = None,
         action_url: Optional[str] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        expires_at: Optional[timezone.datetime] = None,
+        batch_size: int = BULK_BATCH_SIZE
     ) -> List[Notification]:
         """
-        Send notifications to multiple users.
+        Send the same notification to many users.
+        
+        Recipients are processed in batches: each batch loads preferences in one
+        query, creates missing preferences with bulk_create, applies type and
+        quiet-hours preferences in memory and inserts its notifications with one
+        bulk_create. Recipients in quiet hours get a DeferredNotification
+        instead (one bulk_create per batch), delivered when their quiet hours
+        end. Once the transaction commits, the recipients' unread counters are
+        incremented and the new counts go out in one batched channel-layer send.
+        
+        Each batch runs in its own savepoint. A failing batch is rolled back,
+        logged with its recipient IDs and re-raised, so the caller's transaction
+        stays usable and a background job running this is retried rather than
+        recorded as succeeded; the job's transaction also rolls back the earlier
+        batches, so the retry notifies every recipient exactly once.
         
         Args:
-            recipients: List of users to notify
-            title: Notification title
-            body: Notification body
+            recipients: Users to notify (list or queryset; duplicates are notified once)
+            title: Notification title (string or dict with language keys)
+            body: Notification body (string or dict with language keys)
             notification_type: Type of notification
             priority: Priority level
             sender: User who triggered the notification
             action_url: Optional action URL
             metadata: Additional metadata
+            expires_at: Expiration datetime (optional)
+            batch_size: Recipients handled per batch
         
         Returns:
-            List of created notifications
+            List of created notifications (deferred ones are not included)
         """
-        notifications = []
+        if isinstance(title, str):
+            title = {"en": title, "ar": title}
+        if isinstance(body, str):
+            body = {"en": body, "ar": body}
+        
+        if isinstance(recipients, QuerySet):
+            recipients = recipients.iterator(chunk_size=batch_size)
+        
+        fields = {
+            'sender': sender,
+            'title': title,
+            'body': body,
+            'notification_type': notification_type,
+            'priority': priority,
+            'action_url': action_url,
+            'metadata': metadata or {},
+            'expires_at': expires_at
+        }
         
-        for recipient in recipients:
-            notification = NotificationService.create_notification(
-                recipient=recipient,
-                title=title,
-                body=body,
-                notification_type=notification_type,
-                priority=priority,
-                sender=sender,
-                action_url=action_url,
-                metadata=metadata
-            )
+        notifications = []
+        seen = set()
+        total = 0
+        deferred_total = 0
+        recipients = iter(recipients)
+        while True:
+            batch = []
+            for recipient in islice(recipients, batch_size):
+                if recipient.id not in seen:
+                    seen.add(recipient.id)
+                    batch.append(recipient)
+            if not batch:
+                break
+            total += len(batch)
             
-            if notification:
-                notifications.append(notification)
+            try:
+                with transaction.atomic():
+                    recipients_by_id = {recipient.id: recipient for recipient in batch}
+                    user_ids = list(recipients_by_id)
+                    preferences = NotificationService._get_or_create_preferences(user_ids)
+                    deliver, deferred = NotificationService._route(preferences, user_ids, notification_type)
+                    
+                    batch_notifications = [
+                        Notification(recipient=recipients_by_id[user_id], **fields)
+                        for user_id in deliver
+                    ]
+                    Notification.objects.bulk_create(batch_notifications, batch_size=batch_size)
+                    notifications.extend(batch_notifications)
+                    
+                    if deferred:
+                        DeferredNotification.objects.bulk_create([
+                            DeferredNotification(recipient_id=user_id, release_at=release_at, **fields)
+                            for user_id, release_at in deferred.items()
+                        ], batch_size=batch_size)
+                        deferred_total += len(deferred)
+            except Exception as e:
+                logger.error(
+                    f"Failed to create notifications for a batch of {len(batch)} users "
+                    f"({[recipient.id for recipient in batch]}): {e}"
+                )
+                raise
+        
+        NotificationService.count_new_notifications(
+            notification.recipient_id for notification in notifications
+        )
         
-        logger.info(f"Bulk created {len(notifications)} notifications for {len(recipients)} users")
+        logger.info(
+            f"Bulk created {len(notifications)} notifications for {total} users "
+            f"({deferred_total} deferred for quiet hours)"
+        )
         return notifications
+    
+    @staticmethod
+    def _get_or_create_preferences(user_ids: List[int]) -> Dict[int, NotificationPreference]:
+        """
+        Load the preferences of many users, creating defaults for users without any.
+        
+        Args:
+            user_ids: IDs of the users
+        
+        Returns:
+            Dictionary of user ID to preferences
+        """
+        preferences = {
+            preference.user_id: preference
+            for preference in NotificationPreference.objects.filter(user_id__in=user_ids)
+        }
+        missing = [
+            NotificationPreference(user_id=user_id)
+            for user_id in user_ids
+            if user_id not in preferences
+        ]
+        if missing:
+            try:
+                with transaction.atomic():
+                    NotificationPreference.objects.bulk_create(missing)
+            except IntegrityError:
+                # Created concurrently; the defaults deliver everything either way
+                logger.debug(f"Some of {len(missing)} default notification preferences already existed")
+            for preference in missing:
+                preferences[preference.user_id] = preference
+        return preferences
+    
+    @staticmethod
+    def _route(
+        preferences: Dict[int, NotificationPreference],
+        user_ids: List[int],
+        notification_type: str,
+        now: Optional[datetime] = None
+    ) -> Tuple[List[int], Dict[int, datetime]]:
+        """
+        Apply type and quiet-hours preferences to a batch of recipients.
+        
+        The whole batch is checked against one clock reading, without queries.
+        
+        Args:
+            preferences: Dictionary of user ID to preferences (missing means defaults)
+            user_ids: IDs of the recipients
+            notification_type: Type of notification
+            now: Current time (default: now)
+        
+        Returns:
+            (IDs of users to notify now, dictionary of user ID to quiet hours end
+            for users to notify later); users who disabled the type are in neither
+        """
+        now = now or timezone.now()
+        deliver = []
+        deferred = {}
+        for user_id in user_ids:
+            preference = preferences.get(user_id)
+            if preference is None:
+                deliver.append(user_id)
+                continue
+            if not preference.should_receive_notification(notification_type):
+                continue
+            quiet_until = preference.quiet_hours_end_at(now)
+            if quiet_until:
+                deferred[user_id] = quiet_until
+            else:
+                deliver.append(user_id)
+        return deliver, deferred
+    
+    @staticmethod
+    def send_notification_count_updates(user_ids: Iterable[int], counts: Optional[Dict[int, int]] = None):
+        """
+        Send updated notification counts to many users' WebSockets.
+        
+        All group sends are issued concurrently from a single event loop hop,
+        so the sends share the channel layer's connections instead of paying a
+        round trip (and a blocking async_to_sync call) per user.
+        
+        Args:
+            user_ids: IDs of the users to send count updates to
+            counts: New unread counts if already known (default: read the users' counters)
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return
+        
+        try:
+            channel_layer = get_channel_layer()
+            if not channel_layer:
+                logger.debug("Channel layer not configured, skipping WebSocket notifications")
+                return
+            
+            if counts is None:
+                counts = unread_counters.get_many(user_ids)
+            
+            async_to_sync(_send_counts)(channel_layer, {user_id: counts[user_id] for user_id in user_ids})
+            logger.debug(f"Sent notification count updates to {len(user_ids)} users")
+            
+        except Exception as e:
+            logger.error(f"Failed to send notification count updates to {len(user_ids)} users: {e}")
+
+
+async def _send_counts(channel_layer, counts: Dict[int, int]):
+    """Send notification counts to users' groups concurrently, logging failures."""
+    user_ids = list(counts)
+    results = await asyncio.gather(
+        *(
+            channel_layer.group_send(
+                f"notifications_{user_id}",
+                {
+                    "type": "send_notification_count",
+                    "count": counts[user_id]
+                }
+            )
+            for user_id in user_ids
+        ),
+        return_exceptions=True
+    )
+    for user_id, result in zip(user_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to send notification count update to user {user_id}: {result}")
 
 
 class SurveyNotificationService:
@@ -554,7 +849,7 @@ class SurveyNotificationService:
         return queryset
     
     @staticmethod
-    def notify_users_of_new_survey(survey, request=None, force_send=False):
+    def notify_users_of_new_survey(survey, request=None, force_send=False, base_url=None):
         """
         Send notifications to all eligible users about a new survey.
         
@@ -562,6 +857,7 @@ class SurveyNotificationService:
             survey: Survey instance that was just made available
             request: Django request object (optional, for building URLs)
             force_send: If True, force sending notifications even for PUBLIC surveys
+            base_url: Domain URL for the survey link when there is no request (optional)
         """
         if survey.status != 'submitted' or not survey.is_active:
             logger.debug(f"Skipping notification for survey {survey.id} - not active/submitted")
@@ -581,30 +877,25 @@ class SurveyNotificationService:
             logger.debug(f"No eligible users to notify for survey {survey.id}")
             return
         
-        # Additional safety check for AUTH surveys which also notify all users
-        if survey.visibility == 'AUTH' and not force_send and eligible_users.count() > 100:
-            logger.warning(f"Skipping notifications for AUTH survey {survey.id} - would notify {eligible_users.count()} users. Use force_send=True if needed.")
-            return []
-        
         # Build survey URL
-        survey_url = f"/surveys/{survey.id}/"
         if request:
             base_url = get_domain_url(request)
-            survey_url = f"{base_url}/surveys/{survey.id}/"
+        survey_url = f"{base_url or ''}/surveys/{survey.id}/"
         
-        # Send notifications to all eligible users
-        notifications = []
-        for user in eligible_users:
-            notification = NotificationService.create_survey_available_notification(
-                recipient=user,
-                survey_title=survey.title,
-                sender=survey.creator,
-                survey_id=str(survey.id),
-                survey_url=survey_url,
-                survey_visibility=survey.visibility
-            )
-            if notification:
-                notifications.append(notification)
+        # Send notifications to all eligible users in bulk
+        title, body, metadata = NotificationService.survey_available_content(
+            survey.title, survey.creator, str(survey.id), survey.visibility
+        )
+        notifications = NotificationService.bulk_notify_users(
+            recipients=eligible_users,
+            title=title,
+            body=body,
+            notification_type=Notification.TYPE_SURVEY_ASSIGNED,
+            priority=Notification.PRIORITY_NORMAL,
+            sender=survey.creator,
+            action_url=survey_url,
+            metadata=metadata
+        )
         
         logger.info(f"Sent {len(notifications)} survey availability notifications for survey {survey.id}")
         return notifications
@@ -0,0 +1,113 @@
+"""
+Per-user notification statistics.
+
+The statistics come from one grouped query: the user's notifications are
+grouped by (type, priority) and each group carries conditional counts
+(unread, recent, expired), so totals and the per-type and per-priority
+breakdowns are summed from the same rows.
+
+Results are cached for NOTIFICATION_STATS_CACHE_TTL seconds under
+notifications:stats:<user_id>. The notification write paths call
+invalidate() so a user's next request recomputes them; the short TTL
+covers the time-based counts (recent, expired).
+"""
+
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Iterable
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'notifications:stats:'
+RECENT_DAYS = 7
+
+
+def _key(user_id) -> str:
+    return f'{KEY_PREFIX}{user_id}'
+
+
+def compute(user_id: int) -> Dict[str, Any]:
+    """
+    Compute a user's notification statistics with a single query.
+    
+    Args:
+        user_id: ID of the user
+    
+    Returns:
+        Dictionary in the shape of NotificationStatsSerializer
+    """
+    from .models import Notification
+    
+    now = timezone.now()
+    rows = (
+        Notification.objects.filter(recipient_id=user_id)
+        .values('notification_type', 'priority')
+        .annotate(
+            total=Count('id'),
+            unread=Count('id', filter=Q(is_read=False)),
+            recent=Count('id', filter=Q(created_at__gte=now - timedelta(days=RECENT_DAYS))),
+            expired=Count('id', filter=Q(expires_at__lt=now))
+        )
+        .order_by()
+    )
+    
+    stats = {
+        'total_notifications': 0,
+        'unread_notifications': 0,
+        'read_notifications': 0,
+        'notifications_by_type': {},
+        'notifications_by_priority': {},
+        'recent_notifications_count': 0,
+        'expired_notifications_count': 0,
+    }
+    by_type = stats['notifications_by_type']
+    by_priority = stats['notifications_by_priority']
+    for row in rows:
+        stats['total_notifications'] += row['total']
+        stats['unread_notifications'] += row['unread']
+        stats['recent_notifications_count'] += row['recent']
+        stats['expired_notifications_count'] += row['expired']
+        by_type[row['notification_type']] = by_type.get(row['notification_type'], 0) + row['total']
+        by_priority[row['priority']] = by_priority.get(row['priority'], 0) + row['total']
+    stats['read_notifications'] = stats['total_notifications'] - stats['unread_notifications']
+    return stats
+
+
+def get(user_id: int) -> Dict[str, Any]:
+    """
+    Get a user's notification statistics, from the cache when possible.
+    
+    Args:
+        user_id: ID of the user
+    
+    Returns:
+        Dictionary in the shape of NotificationStatsSerializer
+    """
+    try:
+        stats = cache.get(_key(user_id))
+    except Exception as e:
+        logger.error(f"Failed to read notification stats cache for user {user_id}: {e}")
+        return compute(user_id)
+    
+    if stats is None:
+        stats = compute(user_id)
+        try:
+            cache.set(_key(user_id), stats, getattr(settings, 'NOTIFICATION_STATS_CACHE_TTL', 60))
+        except Exception as e:
+            logger.error(f"Failed to cache notification stats for user {user_id}: {e}")
+    return stats
+
+
+def invalidate(user_ids: Iterable[int]):
+    """Drop cached statistics so they are recomputed on next use."""
+    keys = [_key(user_id) for user_id in set(user_ids)]
+    if not keys:
+        return
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.error(f"Failed to invalidate notification stats cache: {e}")
@@ -1,3 +1,497 @@
-from django.test import TestCase
+"""
+Tests for Notifications
+"""
+import asyncio
+from io import StringIO
+from unittest import mock
+from datetime import time, timedelta
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from notifications import deferred, jobs, retention, stats, unread_counters
+from notifications.models import BackgroundJob, DeferredNotification, Notification, NotificationPreference
+from notifications.services import NotificationService
+from surveys.models import Survey
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class BulkNotifyTest(TestCase):
+    """Test the bulk notification pipeline"""
+    
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'bulk{i}@test.com',
+                email=f'bulk{i}@test.com',
+                password='testpass123'
+            )
+            for i in range(6)
+        ]
+        NotificationPreference.objects.filter(user__in=self.users).delete()
+        NotificationPreference.objects.create(user=self.users[0], admin_messages_enabled=False)
+        NotificationPreference.objects.create(
+            user=self.users[1],
+            quiet_hours_enabled=True,
+            quiet_hours_start=time(0, 0),
+            quiet_hours_end=time(23, 59, 59)
+        )
+    
+    def test_bulk_notify_applies_preferences(self):
+        """Disabled types are skipped, quiet hours deferred; missing preferences are created"""
+        existing = Notification.objects.filter(recipient__in=self.users).count()
+        notifications = NotificationService.bulk_notify_users(
+            User.objects.filter(id__in=[user.id for user in self.users]),
+            title='Hello',
+            body='World'
+        )
+        
+        self.assertEqual(
+            {notification.recipient_id for notification in notifications},
+            {user.id for user in self.users[2:]}
+        )
+        self.assertEqual(Notification.objects.filter(recipient__in=self.users).count(), existing + 4)
+        self.assertEqual(NotificationPreference.objects.filter(user__in=self.users).count(), 6)
+        self.assertEqual(
+            list(DeferredNotification.objects.values_list('recipient_id', flat=True)),
+            [self.users[1].id]
+        )
+        self.assertEqual(notifications[0].title, {'en': 'Hello', 'ar': 'Hello'})
+    
+    def test_bulk_notify_query_count_is_constant(self):
+        """Query count does not grow with the number of recipients"""
+        # batch savepoint, preferences, bulk_create preferences (in a savepoint),
+        # notifications, deferred, release
+        with self.assertNumQueries(8):
+            NotificationService.bulk_notify_users(self.users, title='Hello', body='World')
+    
+    def test_bulk_notify_raises_failed_batch(self):
+        """A failing batch is rolled back to its savepoint and re-raised"""
+        create = Notification.objects.bulk_create
+        calls = []
+        
+        def fail_second_batch(objs, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise DatabaseError('insert failed')
+            return create(objs, **kwargs)
+        
+        existing = Notification.objects.filter(recipient__in=self.users).count()
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=fail_second_batch):
+            with self.assertRaises(DatabaseError):
+                NotificationService.bulk_notify_users(
+                    self.users[2:], title='Hello', body='World', batch_size=2
+                )
+        
+        # The outer transaction is still usable and only the first batch was written
+        self.assertEqual(Notification.objects.filter(recipient__in=self.users).count(), existing + 2)
+    
+    def test_bulk_notify_sends_counts(self):
+        """Each notified user's group receives its unread count"""
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'notifications_{self.users[3].id}', channel)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.bulk_notify_users(self.users, title='Hello', body='World')
+        
+        event = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(event['type'], 'send_notification_count')
+        self.assertEqual(
+            event['count'],
+            Notification.objects.filter(recipient=self.users[3], is_read=False).count()
+        )
+
+
+_calls = []
+
+
+@jobs.register('tests.record')
+def _record_job(value, fail=False):
+    _calls.append(value)
+    if fail:
+        raise RuntimeError('boom')
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    NOTIFICATION_JOB_MAX_ATTEMPTS=2,
+    NOTIFICATION_JOB_RETRY_BACKOFF_SECONDS=10
+)
+class BackgroundJobTest(TestCase):
+    """Test the background job queue"""
+    
+    def setUp(self):
+        _calls.clear()
+    
+    def test_job_runs_and_records_timing(self):
+        """A due job is claimed once, run with its payload and timed"""
+        job = jobs.enqueue('tests.record', {'value': 1})
+        
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(jobs.run_pending(), 0)
+        
+        job.refresh_from_db()
+        self.assertEqual(_calls, [1])
+        self.assertEqual(job.status, BackgroundJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.duration_ms)
+        self.assertIsNotNone(job.finished_at)
+    
+    def test_failed_job_retries_with_backoff(self):
+        """Failures are rescheduled until max_attempts, then marked failed"""
+        job = jobs.enqueue('tests.record', {'value': 1, 'fail': True})
+        
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_PENDING)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+        self.assertIn('boom', job.last_error)
+        
+        # Not due yet
+        self.assertEqual(jobs.run_pending(), 0)
+        
+        BackgroundJob.objects.filter(id=job.id).update(run_after=timezone.now())
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+    
+    def test_idempotency_key_deduplicates(self):
+        """Enqueueing with an existing key returns the existing job"""
+        first = jobs.enqueue('tests.record', {'value': 1}, idempotency_key='once')
+        second = jobs.enqueue('tests.record', {'value': 2}, idempotency_key='once')
+        
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(BackgroundJob.objects.filter(name='tests.record').count(), 1)
+    
+    def test_stale_running_job_is_requeued(self):
+        """Jobs left running by a dead worker go back to pending"""
+        job = jobs.enqueue('tests.record', {'value': 1})
+        BackgroundJob.objects.filter(id=job.id).update(
+            status=BackgroundJob.STATUS_RUNNING,
+            attempts=1,
+            started_at=timezone.now() - timedelta(hours=1)
+        )
+        
+        self.assertEqual(jobs.requeue_stale(timeout=60), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_PENDING)
+    
+    def test_survey_share_notifies_through_job(self):
+        """Sharing a survey queues one job that notifies the shared users"""
+        creator = User.objects.create_user(
+            username='creator@test.com',
+            email='creator@test.com',
+            password='testpass123'
+        )
+        users = [
+            User.objects.create_user(
+                username=f'shared{i}@test.com',
+                email=f'shared{i}@test.com',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+        survey = Survey.objects.create(
+            title='Shared Survey',
+            creator=creator,
+            visibility='PRIVATE',
+            status='submitted'
+        )
+        
+        survey.shared_with.add(*users)
+        
+        self.assertEqual(
+            Notification.objects.filter(notification_type=Notification.TYPE_SURVEY_ASSIGNED).count(), 0
+        )
+        job = BackgroundJob.objects.get(name='surveys.notify_shared_users')
+        self.assertEqual(job.payload['user_ids'], sorted(user.id for user in users))
+        
+        jobs.run_pending()
+        
+        self.assertEqual(
+            set(Notification.objects.filter(
+                notification_type=Notification.TYPE_SURVEY_ASSIGNED
+            ).values_list('recipient_id', flat=True)),
+            {user.id for user in users}
+        )
+    
+    def test_failed_notify_job_is_retried(self):
+        """A failing notification batch fails the job run so it is retried"""
+        creator = User.objects.create_user(
+            username='retry@test.com',
+            email='retry@test.com',
+            password='testpass123'
+        )
+        users = [
+            User.objects.create_user(
+                username=f'retry{i}@test.com',
+                email=f'retry{i}@test.com',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+        survey = Survey.objects.create(
+            title='Retried Survey',
+            creator=creator,
+            visibility='PRIVATE',
+            status='submitted'
+        )
+        survey.shared_with.add(*users)
+        job = BackgroundJob.objects.get(name='surveys.notify_shared_users')
+        
+        with mock.patch.object(
+            Notification.objects, 'bulk_create', side_effect=DatabaseError('insert failed')
+        ):
+            jobs.run_pending()
+        
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_PENDING)
+        self.assertIn('insert failed', job.last_error)
+        self.assertFalse(Notification.objects.filter(
+            notification_type=Notification.TYPE_SURVEY_ASSIGNED
+        ).exists())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class UnreadCounterTest(TestCase):
+    """Test unread count pushes from the notification write paths"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='counter@test.com',
+            email='counter@test.com',
+            password='testpass123'
+        )
+        Notification.objects.filter(recipient=self.user).delete()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.channel_layer = get_channel_layer()
+        self.channel = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)(f'notifications_{self.user.id}', self.channel)
+    
+    def next_count(self):
+        receive = self.channel_layer.receive(self.channel)
+        return async_to_sync(asyncio.wait_for)(receive, timeout=1)['count']
+    
+    def test_create_pushes_count_on_commit(self):
+        """New notifications are counted and pushed once committed"""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            NotificationService.create_notification(self.user, 'One', 'Body')
+        self.assertEqual(len(callbacks), 1)
+        
+        callbacks[0]()
+        self.assertEqual(self.next_count(), 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.bulk_notify_users([self.user], title='Two', body='Body')
+        self.assertEqual(self.next_count(), 2)
+        self.assertEqual(unread_counters.get(self.user.id), 2)
+    
+    def test_read_paths_push_new_count(self):
+        """Marking read, deleting and mark-all-read push the updated count"""
+        notifications = [
+            Notification.objects.create(recipient=self.user, title={'en': 'T'}, body={'en': 'B'})
+            for _ in range(4)
+        ]
+        
+        response = self.client.patch(
+            reverse('notifications:notification-detail', args=[notifications[0].id]),
+            {'is_read': True},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.next_count(), 3)
+        
+        response = self.client.post(reverse('notifications:bulk-notification-action'), {
+            'notification_ids': [str(notifications[0].id), str(notifications[1].id)],
+            'action': 'delete'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.next_count(), 2)
+        
+        response = self.client.post(reverse('notifications:mark-all-read'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.next_count(), 0)
+        self.assertEqual(unread_counters.get(self.user.id), 0)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationStatsTest(TestCase):
+    """Test the cached single-query notification stats"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='stats@test.com',
+            email='stats@test.com',
+            password='testpass123'
+        )
+        Notification.objects.filter(recipient=self.user).delete()
+        stats.invalidate([self.user.id])
+        Notification.objects.create(
+            recipient=self.user, title={'en': 'T'}, body={'en': 'B'},
+            priority=Notification.PRIORITY_HIGH
+        )
+        Notification.objects.create(
+            recipient=self.user, title={'en': 'T'}, body={'en': 'B'},
+            is_read=True, read_at=timezone.now()
+        )
+        Notification.objects.create(
+            recipient=self.user, title={'en': 'T'}, body={'en': 'B'},
+            notification_type=Notification.TYPE_SYSTEM_ALERT,
+            expires_at=timezone.now() - timedelta(days=1)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def test_stats_use_one_query_and_cache(self):
+        """Stats come from one grouped query and are then served from the cache"""
+        with self.assertNumQueries(1):
+            data = stats.get(self.user.id)
+        
+        self.assertEqual(data['total_notifications'], 3)
+        self.assertEqual(data['unread_notifications'], 2)
+        self.assertEqual(data['read_notifications'], 1)
+        self.assertEqual(data['recent_notifications_count'], 3)
+        self.assertEqual(data['expired_notifications_count'], 1)
+        self.assertEqual(data['notifications_by_type'], {
+            Notification.TYPE_ADMIN_MESSAGE: 2,
+            Notification.TYPE_SYSTEM_ALERT: 1
+        })
+        self.assertEqual(data['notifications_by_priority'], {
+            Notification.PRIORITY_HIGH: 1,
+            Notification.PRIORITY_NORMAL: 2
+        })
+        
+        with self.assertNumQueries(0):
+            stats.get(self.user.id)
+    
+    def test_write_paths_invalidate_stats(self):
+        """Marking all read drops the cached stats"""
+        stats.get(self.user.id)
+        
+        response = self.client.post(reverse('notifications:mark-all-read'))
+        self.assertEqual(response.status_code, 200)
+        
+        response = self.client.get(reverse('notifications:notification-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['unread_notifications'], 0)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    NOTIFICATION_RETENTION_READ_DAYS=30,
+    NOTIFICATION_RETENTION_UNREAD_DAYS=180
+)
+class RetentionTest(TestCase):
+    """Test the tiered notification retention"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='retention@test.com',
+            email='retention@test.com',
+            password='testpass123'
+        )
+        Notification.objects.filter(recipient=self.user).delete()
+        now = timezone.now()
+        
+        def create(**fields):
+            return Notification.objects.create(
+                recipient=self.user, title={'en': 'T'}, body={'en': 'B'}, **fields
+            )
+        
+        self.expired = create(expires_at=now - timedelta(hours=1))
+        self.old_read = create(is_read=True, read_at=now - timedelta(days=31))
+        self.recent_read = create(is_read=True, read_at=now - timedelta(days=1))
+        self.old_unread = create()
+        Notification.objects.filter(id=self.old_unread.id).update(created_at=now - timedelta(days=181))
+        self.kept = create()
+    
+    def test_tiers_delete_in_batches(self):
+        """Each tier deletes its notifications in batches and keeps the rest"""
+        self.assertEqual(retention.pending(retention.TIERS), {'expired': 1, 'read': 1, 'unread': 1})
+        
+        deleted = retention.run(retention.TIERS, batch_size=1)
+        
+        self.assertEqual(deleted, {'expired': 1, 'read': 1, 'unread': 1})
+        self.assertEqual(
+            set(Notification.objects.filter(recipient=self.user).values_list('id', flat=True)),
+            {self.recent_read.id, self.kept.id}
+        )
+        self.assertEqual(unread_counters.get(self.user.id), 1)
+    
+    def test_run_stops_and_resumes(self):
+        """A run limited to one batch leaves the rest for the next run"""
+        self.assertEqual(
+            retention.run(retention.TIERS, max_batches=1, batch_size=1),
+            {'expired': 1, 'read': 0, 'unread': 0}
+        )
+        self.assertEqual(retention.run(retention.TIERS), {'expired': 0, 'read': 1, 'unread': 1})
+    
+    @override_settings(NOTIFICATION_RETENTION_UNREAD_DAYS=0)
+    def test_command_defaults_keep_unread_and_expired(self):
+        """Without --expired and an unread retention, only old read notifications go"""
+        call_command('cleanup_notifications', '--days', '30', stdout=StringIO())
+        self.assertFalse(Notification.objects.filter(id=self.old_read.id).exists())
+        self.assertEqual(Notification.objects.filter(id__in=[self.expired.id, self.old_unread.id]).count(), 2)
+        
+        call_command('cleanup_notifications', '--expired', stdout=StringIO())
+        self.assertFalse(Notification.objects.filter(id=self.expired.id).exists())
+        self.assertTrue(Notification.objects.filter(id=self.old_unread.id).exists())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class QuietHoursDeferralTest(TestCase):
+    """Test notifications deferred by quiet hours"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='quiet@test.com',
+            email='quiet@test.com',
+            password='testpass123'
+        )
+        Notification.objects.filter(recipient=self.user).delete()
+        self.preferences, _ = NotificationPreference.objects.update_or_create(
+            user=self.user,
+            defaults={
+                'quiet_hours_enabled': True,
+                'quiet_hours_start': time(0, 0),
+                'quiet_hours_end': time(23, 59, 59)
+            }
+        )
+    
+    def test_quiet_hours_defer_instead_of_drop(self):
+        """A notification created in quiet hours is stored until they end"""
+        notification = NotificationService.create_notification(self.user, 'Later', 'Body')
+        
+        self.assertIsNone(notification)
+        self.assertFalse(Notification.objects.filter(recipient=self.user).exists())
+        held = DeferredNotification.objects.get(recipient=self.user)
+        self.assertEqual(held.title, {'en': 'Later', 'ar': 'Later'})
+        self.assertEqual(held.release_at, self.preferences.quiet_hours_end_at())
+    
+    def test_release_delivers_due_notifications(self):
+        """Due notifications are delivered once quiet hours are over, postponed while they last"""
+        NotificationService.create_notification(self.user, 'Later', 'Body')
+        DeferredNotification.objects.update(release_at=timezone.now() - timedelta(minutes=1))
+        
+        # Still in quiet hours: moved to the new end
+        self.assertEqual(deferred.release_due(), 0)
+        self.assertGreater(DeferredNotification.objects.get().release_at, timezone.now())
+        
+        DeferredNotification.objects.update(release_at=timezone.now() - timedelta(minutes=1))
+        NotificationPreference.objects.filter(user=self.user).update(quiet_hours_enabled=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(deferred.release_due(), 1)
+        
+        self.assertFalse(DeferredNotification.objects.exists())
+        self.assertEqual(Notification.objects.get(recipient=self.user).get_title(), 'Later')
+        self.assertEqual(unread_counters.get(self.user.id), 1)
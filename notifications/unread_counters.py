@@ -0,0 +1,289 @@
+"""
+Redis-backed unread notification counters.
+
+Each user has one Redis key, notifications:unread:<user_id>, holding their
+unread notification count, so badge pushes and WebSocket connects read a
+counter instead of counting rows.
+
+The database stays authoritative; the counters are a cache kept in step
+by the write paths:
+- increment() after notifications are created (on commit)
+- decrement() when notifications are marked read or unread ones deleted
+- reset() when everything is marked read
+- invalidate() when a change can't be expressed as a delta
+
+Updates only apply to counters that exist; a missing counter is loaded
+from the database on the next read. Counters expire after
+NOTIFICATION_UNREAD_COUNTER_TTL seconds, and reconcile() (the
+reconcile_notification_counters command, run periodically) corrects any
+drift against the database.
+
+Without a django_redis cache, or with NOTIFICATION_REDIS_UNREAD_COUNTERS
+off, every function works directly on the database.
+"""
+
+import logging
+from typing import Dict, Iterable, List
+from django.conf import settings
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'notifications:unread:'
+BATCH_SIZE = 500
+
+# KEYS = user counters; ARGV = ttl, then one delta per key
+# Returns the new counts (never below 0), or -1 for counters that are not loaded
+_ADD_SCRIPT = """
+local result = {}
+for i = 1, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        local value = redis.call('INCRBY', KEYS[i], ARGV[i + 1])
+        if value < 0 then
+            value = 0
+            redis.call('SET', KEYS[i], 0)
+        end
+        redis.call('EXPIRE', KEYS[i], ARGV[1])
+        result[i] = value
+    else
+        result[i] = -1
+    end
+end
+return result
+"""
+
+# KEYS[1] = user counter; ARGV = expected current value ('' for missing), new value, ttl
+# Replaces the value only if nobody changed it since it was read
+_COMPARE_AND_SET_SCRIPT = """
+local current = redis.call('GET', KEYS[1]) or ''
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def _redis():
+    """
+    Get the raw Redis connection, or None when counts come from the database
+    """
+    if not getattr(settings, 'NOTIFICATION_REDIS_UNREAD_COUNTERS', True):
+        return None
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if 'django_redis' not in backend:
+        return None
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def enabled() -> bool:
+    """Whether unread counters are kept in Redis."""
+    return _redis() is not None
+
+
+def _ttl() -> int:
+    return getattr(settings, 'NOTIFICATION_UNREAD_COUNTER_TTL', 3600)
+
+
+def _key(user_id) -> str:
+    return f'{KEY_PREFIX}{user_id}'
+
+
+def _db_counts(user_ids: List[int]) -> Dict[int, int]:
+    """Count unread notifications per user with one grouped query per batch."""
+    from .models import Notification
+    
+    counts = dict.fromkeys(user_ids, 0)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        counts.update(
+            Notification.objects.filter(
+                recipient_id__in=user_ids[start:start + BATCH_SIZE],
+                is_read=False
+            ).values_list('recipient_id').annotate(count=Count('id'))
+        )
+    return counts
+
+
+def _load(redis, user_ids: List[int]) -> Dict[int, int]:
+    """Load counters from the database (keeping any that appeared meanwhile)."""
+    counts = _db_counts(user_ids)
+    pipe = redis.pipeline(transaction=False)
+    for user_id, count in counts.items():
+        pipe.set(_key(user_id), count, ex=_ttl(), nx=True)
+    pipe.execute()
+    return counts
+
+
+def get_many(user_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Get several users' unread counts.
+    
+    Args:
+        user_ids: IDs of the users
+    
+    Returns:
+        Dictionary of user ID to unread count
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    
+    redis = _redis()
+    if redis is not None:
+        try:
+            values = redis.mget([_key(user_id) for user_id in user_ids])
+            counts = {
+                user_id: int(value)
+                for user_id, value in zip(user_ids, values)
+                if value is not None
+            }
+            missing = [user_id for user_id in user_ids if user_id not in counts]
+            if missing:
+                counts.update(_load(redis, missing))
+            return counts
+        except Exception as e:
+            logger.error(f"Failed to read unread notification counters from Redis: {e}")
+    return _db_counts(user_ids)
+
+
+def get(user_id: int) -> int:
+    """Get a user's unread notification count."""
+    return get_many([user_id])[user_id]
+
+
+def add(deltas: Dict[int, int]) -> Dict[int, int]:
+    """
+    Apply count changes and return the new counts.
+    
+    Call after the change has been committed, so counters loaded from the
+    database already include it.
+    
+    Args:
+        deltas: Dictionary of user ID to change (positive or negative)
+    
+    Returns:
+        Dictionary of user ID to new unread count
+    """
+    user_ids = list(deltas)
+    if not user_ids:
+        return {}
+    
+    redis = _redis()
+    if redis is not None:
+        try:
+            counts = {}
+            for start in range(0, len(user_ids), BATCH_SIZE):
+                batch = user_ids[start:start + BATCH_SIZE]
+                result = redis.eval(
+                    _ADD_SCRIPT, len(batch),
+                    *[_key(user_id) for user_id in batch],
+                    _ttl(), *[deltas[user_id] for user_id in batch]
+                )
+                counts.update(
+                    (user_id, int(value))
+                    for user_id, value in zip(batch, result)
+                    if int(value) >= 0
+                )
+            missing = [user_id for user_id in user_ids if user_id not in counts]
+            if missing:
+                counts.update(_load(redis, missing))
+            return counts
+        except Exception as e:
+            logger.error(f"Failed to update unread notification counters in Redis: {e}")
+            invalidate(user_ids)
+    return _db_counts(user_ids)
+
+
+def increment(user_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Count one new notification per listed user ID (repeated IDs count again).
+    
+    Returns:
+        Dictionary of user ID to new unread count
+    """
+    deltas = {}
+    for user_id in user_ids:
+        deltas[user_id] = deltas.get(user_id, 0) + 1
+    return add(deltas)
+
+
+def decrement(user_id: int, amount: int = 1) -> int:
+    """
+    Count notifications of a user that were read or deleted while unread.
+    
+    Returns:
+        The user's new unread count
+    """
+    return add({user_id: -amount})[user_id]
+
+
+def reset(user_id: int) -> int:
+    """
+    Set a user's count to zero after all their notifications were marked read.
+    
+    Returns:
+        The user's new unread count (0)
+    """
+    redis = _redis()
+    if redis is None:
+        return get(user_id)
+    try:
+        redis.set(_key(user_id), 0, ex=_ttl())
+        return 0
+    except Exception as e:
+        logger.error(f"Failed to reset unread notification counter for user {user_id}: {e}")
+        invalidate([user_id])
+        return get(user_id)
+
+
+def invalidate(user_ids: Iterable[int]):
+    """Drop counters so they are reloaded from the database on next use."""
+    user_ids = list(user_ids)
+    redis = _redis()
+    if redis is None or not user_ids:
+        return
+    try:
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            redis.delete(*[_key(user_id) for user_id in user_ids[start:start + BATCH_SIZE]])
+    except Exception as e:
+        logger.error(f"Failed to invalidate unread notification counters: {e}")
+
+
+def reconcile(batch_size: int = BATCH_SIZE) -> int:
+    """
+    Correct every loaded counter against the database.
+    
+    A counter changed while it is being checked is left alone (it is
+    checked again on the next run).
+    
+    Args:
+        batch_size: Counters checked per round trip
+    
+    Returns:
+        Number of counters corrected
+    """
+    redis = _redis()
+    if redis is None:
+        return 0
+    
+    keys = list(redis.scan_iter(match=f'{KEY_PREFIX}*', count=batch_size))
+    corrected = 0
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        user_ids = [int(key.decode()[len(KEY_PREFIX):]) for key in batch]
+        cached = redis.mget(batch)
+        counts = _db_counts(user_ids)
+        
+        pipe = redis.pipeline(transaction=False)
+        checked = []
+        for key, user_id, value in zip(batch, user_ids, cached):
+            if value is not None and int(value) != counts[user_id]:
+                pipe.eval(_COMPARE_AND_SET_SCRIPT, 1, key, value, counts[user_id], _ttl())
+                checked.append(user_id)
+        corrected += sum(pipe.execute()) if checked else 0
+    
+    if corrected:
+        logger.warning(f"Reconciled {corrected} drifted unread notification counters")
+    logger.info(f"Checked {len(keys)} unread notification counters")
+    return corrected
@@ -9,12 +9,12 @@ from rest_framework import generics, permissions, status, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q, Count
+from django.db.models import Q
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from datetime import timedelta
 import logging
 
+from . import stats, unread_counters
 from .models import Notification, NotificationPreference
 from .serializers import (
     NotificationSerializer, 
@@ -136,6 +136,7 @@ class NotificationDetailView(generics.RetrieveUpdateAPIView):
     
     def perform_update(self, serializer):
         """Handle notification update."""
+        was_read = serializer.instance.is_read
         notification = serializer.save()
         
         # If marking as read and wasn't read before, update read_at timestamp
@@ -143,8 +144,13 @@ class NotificationDetailView(generics.RetrieveUpdateAPIView):
             notification.read_at = timezone.now()
             notification.save(update_fields=['read_at'])
         
-        # Send WebSocket count update
-        NotificationService.send_notification_count_update(notification.recipient_id)
+        # Update the unread counter and send the new count via WebSocket
+        if notification.is_read != was_read:
+            stats.invalidate([notification.recipient_id])
+            count = unread_counters.add({notification.recipient_id: -1 if notification.is_read else 1})
+            NotificationService.send_notification_count_update(
+                notification.recipient_id, count[notification.recipient_id]
+            )
         
         logger.info(f"Updated notification {notification.id} for user {self.request.user.email}")
 
@@ -211,8 +217,11 @@ def bulk_notification_action(request):
                 read_at=timezone.now()
             )
             
-            # Send WebSocket count update
-            NotificationService.send_notification_count_update(request.user.id)
+            # Update the unread counter and send the new count via WebSocket
+            if updated_count:
+                stats.invalidate([request.user.id])
+                count = unread_counters.decrement(request.user.id, updated_count)
+                NotificationService.send_notification_count_update(request.user.id, count)
             
             return Response({
                 'status': 'success',
@@ -225,11 +234,17 @@ def bulk_notification_action(request):
             })
         
         elif action == BulkNotificationActionSerializer.ACTION_DELETE:
-            # Delete notifications
-            deleted_count, _ = notifications.delete()
+            # Delete notifications (unread ones first, to know how many to uncount)
+            unread_deleted, _ = notifications.filter(is_read=False).delete()
+            read_deleted, _ = notifications.delete()
+            deleted_count = unread_deleted + read_deleted
+            if deleted_count:
+                stats.invalidate([request.user.id])
             
-            # Send WebSocket count update
-            NotificationService.send_notification_count_update(request.user.id)
+            # Update the unread counter and send the new count via WebSocket
+            if unread_deleted:
+                count = unread_counters.decrement(request.user.id, unread_deleted)
+                NotificationService.send_notification_count_update(request.user.id, count)
             
             return Response({
                 'status': 'success',
@@ -261,47 +276,8 @@ def notification_stats(request):
     lang = request.query_params.get('lang', 'en')
     
     try:
-        # Get all notifications for the user
-        all_notifications = Notification.objects.filter(recipient=user)
-        
-        # Basic counts
-        total_count = all_notifications.count()
-        unread_count = all_notifications.filter(is_read=False).count()
-        read_count = total_count - unread_count
-        
-        # Count by notification type
-        type_counts = dict(
-            all_notifications.values('notification_type')
-            .annotate(count=Count('id'))
-            .values_list('notification_type', 'count')
-        )
-        
-        # Count by priority
-        priority_counts = dict(
-            all_notifications.values('priority')
-            .annotate(count=Count('id'))
-            .values_list('priority', 'count')
-        )
-        
-        # Recent notifications (last 7 days)
-        week_ago = timezone.now() - timedelta(days=7)
-        recent_count = all_notifications.filter(created_at__gte=week_ago).count()
-        
-        # Expired notifications
-        expired_count = all_notifications.filter(
-            expires_at__isnull=False,
-            expires_at__lt=timezone.now()
-        ).count()
-        
-        stats_data = {
-            'total_notifications': total_count,
-            'unread_notifications': unread_count,
-            'read_notifications': read_count,
-            'notifications_by_type': type_counts,
-            'notifications_by_priority': priority_counts,
-            'recent_notifications_count': recent_count,
-            'expired_notifications_count': expired_count,
-        }
+        # Grouped conditional counts, cached per user (see notifications.stats)
+        stats_data = stats.get(user.id)
         
         serializer = NotificationStatsSerializer(stats_data)
         
@@ -355,8 +331,12 @@ def mark_all_read(request):
             read_at=timezone.now()
         )
         
-        # Send WebSocket count update (count is now 0)
-        NotificationService.send_notification_count_update(request.user.id)
+        if updated_count:
+            stats.invalidate([request.user.id])
+        
+        # Reset the unread counter and send the new count (now 0) via WebSocket
+        count = unread_counters.reset(request.user.id)
+        NotificationService.send_notification_count_update(request.user.id, count)
         
         lang = request.query_params.get('lang', 'en')
         messages = {
@@ -407,8 +387,8 @@ class AdminNotificationCreateView(generics.CreateAPIView):
         """Create and send notification."""
         notification = serializer.save()
         
-        # Send via WebSocket
-        NotificationService.send_websocket_notification(notification)
+        # Count it and send the new count via WebSocket
+        NotificationService.count_new_notifications([notification.recipient_id])
         
         logger.info(
             f"Admin {self.request.user.email} created notification {notification.id} "
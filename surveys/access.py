@@ -0,0 +1,173 @@
+# surveys/access.py
+"""
+Cached per-user sets of accessible survey IDs.
+
+The survey list endpoints used to filter with a five-way OR across the
+sharing tables plus DISTINCT on every request. Instead, each user's
+accessible survey IDs are computed once with a UNION of simple per-rule
+queries and cached; the list endpoints then only do a primary-key IN lookup
+and paginate.
+
+Invalidation:
+- sharing changes (shared_with / shared_with_groups m2m) and group membership
+  changes (UserGroup save/delete) drop the affected users' sets
+- any survey save or delete bumps a global generation, which retires every
+  cached set at once (visibility, status and activation changes can affect
+  all users)
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Survey
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'surveys:access:generation'
+
+# Scopes of cached sets
+SCOPE_LIST = 'list'        # SurveyViewSet for regular users
+SCOPE_SHARED = 'shared'    # MySharedSurveysView
+SCOPES = (SCOPE_LIST, SCOPE_SHARED)
+
+
+def _cache_ttl():
+    return getattr(settings, 'SURVEYS_ACCESS_CACHE_TTL', 300)
+
+
+def _generation():
+    """Current cache generation (initialized from the clock so it never repeats after eviction)."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = int(time.time() * 1000)
+        if not cache.add(GENERATION_KEY, generation, timeout=None):
+            generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def _cache_key(scope, user_id, generation=None):
+    if generation is None:
+        generation = _generation()
+    return f'surveys:access:{generation}:{scope}:{user_id}'
+
+
+def _list_ids(user):
+    """
+    Surveys a regular user sees in the survey list.
+
+    Own surveys (including drafts), plus submitted surveys that are shared with
+    the user directly or through a group, or that are PUBLIC/AUTH.
+    """
+    live = Survey.objects.filter(deleted_at__isnull=True)
+    submitted = live.filter(status='submitted')
+    return live.filter(creator=user).order_by().values_list('id', flat=True).union(
+        submitted.filter(shared_with=user).order_by().values_list('id', flat=True),
+        submitted.filter(shared_with_groups__user_groups__user=user).order_by().values_list('id', flat=True),
+        submitted.filter(visibility__in=['PUBLIC', 'AUTH']).order_by().values_list('id', flat=True),
+    )
+
+
+def _shared_ids(user):
+    """
+    Active submitted surveys shared with the user (see MySharedSurveysView).
+
+    All PUBLIC/AUTH surveys, plus PRIVATE surveys shared with the user and
+    GROUPS surveys shared with one of the user's groups, excluding their own.
+    """
+    available = Survey.objects.filter(deleted_at__isnull=True, is_active=True, status='submitted')
+    others = available.exclude(creator=user)
+    return available.filter(visibility__in=['PUBLIC', 'AUTH']).order_by().values_list('id', flat=True).union(
+        others.filter(visibility='PRIVATE', shared_with=user).order_by().values_list('id', flat=True),
+        others.filter(visibility='GROUPS', shared_with_groups__user_groups__user=user).order_by().values_list('id', flat=True),
+    )
+
+
+_SCOPE_QUERIES = {
+    SCOPE_LIST: _list_ids,
+    SCOPE_SHARED: _shared_ids,
+}
+
+
+def accessible_survey_ids(user, scope=SCOPE_LIST):
+    """
+    Return the frozenset of survey IDs the user can access in a list scope.
+
+    Args:
+        user: Authenticated user
+        scope: SCOPE_LIST or SCOPE_SHARED
+
+    Returns:
+        frozenset of survey UUIDs
+    """
+    key = _cache_key(scope, user.pk)
+    try:
+        survey_ids = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Survey access cache unavailable: {e}")
+        survey_ids = None
+    if survey_ids is not None:
+        return survey_ids
+
+    survey_ids = frozenset(_SCOPE_QUERIES[scope](user))
+    try:
+        cache.set(key, survey_ids, timeout=_cache_ttl())
+    except Exception as e:
+        logger.warning(f"Could not cache accessible surveys for user {user.pk}: {e}")
+    return survey_ids
+
+
+def _invalidate_now_and_on_commit(func):
+    """
+    Run an invalidation immediately and again after the surrounding transaction commits.
+
+    The second pass drops any set another request cached from pre-commit data.
+    """
+    func()
+    transaction.on_commit(func)
+
+
+def invalidate_users(user_ids):
+    """Drop the cached sets of the given users."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def delete_keys():
+        try:
+            generation = _generation()
+            cache.delete_many([
+                _cache_key(scope, user_id, generation)
+                for user_id in user_ids
+                for scope in SCOPES
+            ])
+        except Exception as e:
+            logger.warning(f"Could not invalidate survey access cache for {len(user_ids)} users: {e}")
+
+    _invalidate_now_and_on_commit(delete_keys)
+
+
+def invalidate_groups(group_ids):
+    """Drop the cached sets of every member of the given groups."""
+    from authentication.models import UserGroup
+    invalidate_users(
+        UserGroup.objects.filter(group_id__in=list(group_ids)).values_list('user_id', flat=True).distinct()
+    )
+
+
+def _bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Generation key missing (never set or evicted): a fresh clock value is new
+        cache.set(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+    except Exception as e:
+        logger.warning(f"Could not invalidate survey access cache: {e}")
+
+
+def invalidate_all():
+    """Retire every cached set by bumping the generation."""
+    _invalidate_now_and_on_commit(_bump_generation)
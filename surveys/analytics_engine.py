@@ -0,0 +1,367 @@
+# surveys/analytics_engine.py
+"""
+Single-pass columnar analytics engine for survey dashboards.
+
+Loads a survey's responses and answers once into compact NumPy columns
+(timestamps, respondent kind, completion flag, per-question answers) and
+derives heatmaps, question summaries, NPS and CSAT from those arrays.
+A dashboard request then costs one bulk fetch plus array math instead of a
+separate query (and decryption pass) per metric.
+"""
+
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytz
+
+from .encryption import surveys_data_encryption
+from .models import Answer, Response
+
+logger = logging.getLogger(__name__)
+
+# Day 0 of the epoch (1970-01-01) was a Thursday
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+EPOCH_SUNDAY_OFFSET = 4
+
+# Every IANA zone changes its UTC offset on a quarter-hour boundary, so one
+# offset lookup per 15-minute slot is exact
+OFFSET_SLOT_SECONDS = 900
+
+ANONYMOUS_RESPONDENT = -1
+
+# Free-text answers are profiled by length: short below SHORT_TEXT_CHARS,
+# long above LONG_TEXT_CHARS characters, medium in between
+TEXT_LENGTH_CLASSES = ('short', 'medium', 'long')
+SHORT_TEXT_CHARS = 50
+LONG_TEXT_CHARS = 200
+
+
+def resolve_timezone(tz_str):
+    """Return a pytz timezone, falling back to Asia/Dubai for unknown names."""
+    try:
+        return pytz.timezone(tz_str) if tz_str else pytz.timezone('Asia/Dubai')
+    except pytz.exceptions.UnknownTimeZoneError:
+        logger.warning(f"Invalid timezone '{tz_str}', using fallback 'Asia/Dubai'")
+        return pytz.timezone('Asia/Dubai')
+
+
+def csat_period_label(day, group_by):
+    """Period label used by CSAT tracking (weeks start on Sunday, UAE standard)."""
+    if group_by == 'week':
+        week_start = day - timedelta(days=(day.weekday() + 1) % 7)
+        return week_start.strftime('%Y-W%U')
+    if group_by == 'month':
+        return day.strftime('%Y-%m')
+    return day.strftime('%Y-%m-%d')
+
+
+def text_length_class(text):
+    """Length class of a free-text answer, or '' when it is blank."""
+    if not text or not text.strip():
+        return ''
+    if len(text) < SHORT_TEXT_CHARS:
+        return 'short'
+    if len(text) > LONG_TEXT_CHARS:
+        return 'long'
+    return 'medium'
+
+
+class QuestionAnswers:
+    """
+    Answers to a single question as row positions into the frame plus decrypted texts.
+
+    Frames built from rollups carry one entry per distinct value with a count in
+    ``weights``; free-text tallies carry their length class as text and their
+    summed ``word_totals`` and ``char_totals``.
+    """
+
+    __slots__ = ('rows', 'texts', 'weights', 'word_totals', 'char_totals')
+
+    def __init__(self, rows, texts, weights=None, word_totals=None, char_totals=None):
+        self.rows = rows
+        self.texts = texts
+        self.weights = weights
+        self.word_totals = word_totals
+        self.char_totals = char_totals
+
+    @property
+    def counts(self):
+        """Number of answers each entry stands for."""
+        if self.weights is None:
+            return np.ones(len(self.rows), dtype=np.int64)
+        return self.weights
+
+    def __len__(self):
+        if self.weights is None:
+            return len(self.rows)
+        return int(self.weights.sum())
+
+    def __bool__(self):
+        return len(self.rows) > 0
+
+    def subset(self, keep):
+        """Return the entries selected by a boolean mask."""
+        return QuestionAnswers(
+            self.rows[keep],
+            self.texts[keep],
+            None if self.weights is None else self.weights[keep],
+            None if self.word_totals is None else self.word_totals[keep],
+            None if self.char_totals is None else self.char_totals[keep],
+        )
+
+    def total_words(self):
+        """Total whitespace-separated words across all answers."""
+        if self.word_totals is not None:
+            return int(self.word_totals.sum())
+        return sum(len(text.split()) for text in self.texts if text)
+
+    def value_counts(self):
+        """
+        Distinct answer texts with the number of answers for each.
+
+        Returns:
+            list of (text, count) pairs in order of first appearance
+        """
+        totals = {}
+        for text, count in zip(self.texts.tolist(), self.counts.tolist()):
+            totals[text] = totals.get(text, 0) + count
+        return list(totals.items())
+
+    def text_profile(self):
+        """
+        Length profile of the non-blank free-text answers.
+
+        Returns:
+            dict with 'count', 'words' and 'chars' totals and a count per
+            TEXT_LENGTH_CLASSES entry
+        """
+        profile = dict.fromkeys(('count', 'words', 'chars') + TEXT_LENGTH_CLASSES, 0)
+        if self.char_totals is not None:
+            entries = zip(self.texts.tolist(), self.counts.tolist(),
+                          self.word_totals.tolist(), self.char_totals.tolist())
+        else:
+            entries = (
+                (text_length_class(text), 1, len(text.split()), len(text)) for text in self.texts
+            )
+        for length_class, count, words, chars in entries:
+            if length_class not in TEXT_LENGTH_CLASSES:
+                continue
+            profile['count'] += count
+            profile['words'] += words
+            profile['chars'] += chars
+            profile[length_class] += count
+        return profile
+
+
+class SurveyResponseFrame:
+    """
+    Columnar snapshot of a survey's responses and their answers.
+
+    Rows are ordered by submission time. Every column is a NumPy array of the
+    same length; answers are grouped per question and point back into the rows.
+    A row normally is one response; ``weights`` lets a row stand for several
+    (see surveys.rollups).
+    """
+
+    def __init__(self, survey, questions, response_ids, submitted_at, respondent_ids,
+                 is_complete, emails, phones, answers, weights=None):
+        self.survey = survey
+        self.questions = questions
+        self.response_ids = response_ids
+        self.submitted_at = submitted_at
+        self.epoch = np.array([dt.timestamp() for dt in submitted_at], dtype=np.float64)
+        self.respondent_ids = respondent_ids
+        self.is_complete = is_complete
+        self.emails = emails
+        self.phones = phones
+        self._answers = answers
+        self.weights = weights if weights is not None else np.ones(len(submitted_at), dtype=np.int64)
+        self._local_parts = {}
+
+    @classmethod
+    def load(cls, survey, start=None, end=None):
+        """
+        Load responses and answers for a survey with one query each.
+
+        The range is half-open, [start, end), like the hourly rollup buckets,
+        so a frame covers the same responses whichever way it is built.
+
+        Args:
+            survey: Survey instance
+            start: Optional lower bound for submitted_at (inclusive)
+            end: Optional upper bound for submitted_at (exclusive)
+        """
+        responses = Response.objects.filter(survey=survey)
+        answers = Answer.objects.filter(response__survey=survey)
+        if start:
+            responses = responses.filter(submitted_at__gte=start)
+            answers = answers.filter(response__submitted_at__gte=start)
+        if end:
+            responses = responses.filter(submitted_at__lt=end)
+            answers = answers.filter(response__submitted_at__lt=end)
+
+        started = time.perf_counter()
+        rows = list(responses.order_by('submitted_at', 'id').values_list(
+            'id', 'submitted_at', 'respondent_id', 'is_complete',
+            'respondent_email', 'respondent_phone'
+        ))
+        position = {row[0]: idx for idx, row in enumerate(rows)}
+
+        grouped = {}
+        with surveys_data_encryption.measure_decryption() as decryption:
+            for response_id, question_id, answer_text in answers.order_by('id').decrypted_values(
+                'response_id', 'question_id', 'answer_text'
+            ):
+                row = position.get(response_id)
+                if row is None:
+                    continue
+                rows_list, texts = grouped.setdefault(question_id, ([], []))
+                rows_list.append(row)
+                texts.append(answer_text if answer_text is not None else '')
+        logger.info(
+            f"Loaded analytics frame for survey {survey.id}: {len(rows)} responses, "
+            f"{decryption['values']} answers decrypted in {decryption['seconds'] * 1000:.1f}ms "
+            f"of {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+
+        answer_columns = {
+            question_id: QuestionAnswers(
+                np.array(rows_list, dtype=np.int64),
+                np.array(texts, dtype=object)
+            )
+            for question_id, (rows_list, texts) in grouped.items()
+        }
+
+        return cls(
+            survey=survey,
+            questions=list(survey.questions.all().order_by('order')),
+            response_ids=[row[0] for row in rows],
+            submitted_at=[row[1] for row in rows],
+            respondent_ids=np.array(
+                [row[2] if row[2] is not None else ANONYMOUS_RESPONDENT for row in rows],
+                dtype=np.int64
+            ),
+            is_complete=np.array([bool(row[3]) for row in rows], dtype=bool),
+            emails=np.array([row[4] for row in rows], dtype=object),
+            phones=np.array([row[5] for row in rows], dtype=object),
+            answers=answer_columns,
+        )
+
+    # ------------------------------------------------------------------
+    # Basic columns
+    # ------------------------------------------------------------------
+
+    @property
+    def total(self):
+        return int(self.weights.sum())
+
+    @property
+    def complete_count(self):
+        return int(self.weights[self.is_complete].sum())
+
+    @property
+    def authenticated(self):
+        return self.respondent_ids != ANONYMOUS_RESPONDENT
+
+    @property
+    def authenticated_count(self):
+        return int(self.weights[self.authenticated].sum())
+
+    def answers(self, question_id, complete_only=False):
+        """Return QuestionAnswers for a question, optionally limited to complete responses."""
+        column = self._answers.get(question_id)
+        if column is None:
+            return QuestionAnswers(np.empty(0, dtype=np.int64), np.empty(0, dtype=object))
+        if not complete_only:
+            return column
+        return column.subset(self.is_complete[column.rows])
+
+    def sample_texts(self, question_id, limit):
+        """First non-blank answer texts to a question, in answer order."""
+        texts = self.answers(question_id).texts[:limit]
+        return [text for text in texts if text.strip()]
+
+    # ------------------------------------------------------------------
+    # Time helpers
+    # ------------------------------------------------------------------
+
+    def local_parts(self, tz):
+        """
+        Convert submission timestamps to a timezone.
+
+        Returns (local_days, seconds_of_day) as int64 arrays where local_days
+        counts days since 1970-01-01 in the given timezone.
+        """
+        cached = self._local_parts.get(tz.zone)
+        if cached is not None:
+            return cached
+
+        if len(self.epoch) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            self._local_parts[tz.zone] = (empty, empty)
+            return self._local_parts[tz.zone]
+
+        slots = np.floor_divide(self.epoch, OFFSET_SLOT_SECONDS).astype(np.int64)
+        unique_slots, inverse = np.unique(slots, return_inverse=True)
+        offsets = np.array([
+            datetime.fromtimestamp(int(slot) * OFFSET_SLOT_SECONDS, tz).utcoffset().total_seconds()
+            for slot in unique_slots
+        ], dtype=np.float64)
+
+        local_seconds = np.floor(self.epoch + offsets[inverse]).astype(np.int64)
+        local_days = np.floor_divide(local_seconds, 86400)
+        seconds_of_day = local_seconds - local_days * 86400
+
+        self._local_parts[tz.zone] = (local_days, seconds_of_day)
+        return self._local_parts[tz.zone]
+
+    def period_codes(self, tz, group_by, label_for_day):
+        """
+        Assign each row to a labelled period.
+
+        Returns (codes, labels): codes is an int64 array of indexes into labels.
+        """
+        local_days, _ = self.local_parts(tz)
+        if len(local_days) == 0:
+            return np.empty(0, dtype=np.int64), []
+
+        unique_days, day_inverse = np.unique(local_days, return_inverse=True)
+        day_labels = [
+            label_for_day(date.fromordinal(EPOCH_ORDINAL + int(day)), group_by)
+            for day in unique_days
+        ]
+        labels = sorted(set(day_labels))
+        label_index = {label: idx for idx, label in enumerate(labels)}
+        day_codes = np.array([label_index[label] for label in day_labels], dtype=np.int64)
+        return day_codes[day_inverse], labels
+
+    # ------------------------------------------------------------------
+    # Aggregates
+    # ------------------------------------------------------------------
+
+    def heatmap(self, tz):
+        """7 x 24 counts of complete responses (rows: Sunday=0, columns: hour)."""
+        local_days, seconds_of_day = self.local_parts(tz)
+        complete = self.is_complete
+        weekday = (local_days[complete] + EPOCH_SUNDAY_OFFSET) % 7
+        hour = seconds_of_day[complete] // 3600
+        counts = np.bincount(
+            weekday * 24 + hour, weights=self.weights[complete], minlength=7 * 24
+        ).astype(np.int64).reshape(7, 24)
+        return counts
+
+    def unique_respondents(self, contact_method):
+        """Distinct authenticated respondents plus distinct anonymous contacts."""
+        auth_count = len(np.unique(self.respondent_ids[self.authenticated]))
+
+        anonymous = ~self.authenticated
+        if contact_method == 'email':
+            contacts = self.emails[anonymous]
+        elif contact_method == 'phone':
+            contacts = self.phones[anonymous]
+        else:
+            return auth_count
+
+        return auth_count + len({value for value in contacts if value is not None})
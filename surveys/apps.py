@@ -7,5 +7,6 @@ class SurveysConfig(AppConfig):
     verbose_name = 'Surveys'
     
     def ready(self):
-        """Initialize signals when the app is ready."""
+        """Initialize signals and background job handlers when the app is ready."""
         import surveys.signals  # noqa
+        import surveys.tasks  # noqa
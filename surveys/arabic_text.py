@@ -8,8 +8,14 @@ Provides robust Arabic language support for survey analytics:
 - Mixed language handling (Arabic + English)
 - Multi-format number parsing (Arabic/Persian/English digits)
 - Intent matching for NPS/CSAT classification
+
+Survey answers repeat a small set of values, so the public parsing and
+classification functions memoize their results per distinct string in a
+bounded LRU (SURVEYS_ARABIC_TEXT_CACHE_SIZE entries per function), and
+keyword sets are matched with one precompiled alternation regex each.
 """
 
+import functools
 import re
 import unicodedata
 from typing import Literal
@@ -28,7 +34,78 @@ TATWEEL = '\u0640'
 # Zero-width characters that can cause matching issues
 ZERO_WIDTH = re.compile(r'[\u200B-\u200D\uFEFF]')
 
+WHITESPACE = re.compile(r'\s+')
+NUMBER = re.compile(r'-?\d+\.?\d*')
+
+DEFAULT_TEXT_CACHE_SIZE = 65536
+
+
+def _configured_cache_size():
+    """Cache bound from Django settings, or the default outside a configured project."""
+    try:
+        from django.conf import settings
+        return getattr(settings, 'SURVEYS_ARABIC_TEXT_CACHE_SIZE', DEFAULT_TEXT_CACHE_SIZE)
+    except Exception:
+        return DEFAULT_TEXT_CACHE_SIZE
+
+
+_memoized_functions = []
+
+
+def _memoize_text(func):
+    """
+    Memoize a text function in a bounded LRU keyed by its arguments.
+    
+    The cache is created on first use so the bound comes from settings.
+    Non-string text (unhashable or not worth caching) bypasses the cache.
+    """
+    @functools.wraps(func)
+    def wrapper(text, *args, **kwargs):
+        if not isinstance(text, str):
+            return func(text, *args, **kwargs)
+        if wrapper.cached is None:
+            wrapper.cached = functools.lru_cache(maxsize=_configured_cache_size())(func)
+        return wrapper.cached(text, *args, **kwargs)
+    
+    wrapper.cached = None
+    _memoized_functions.append(wrapper)
+    return wrapper
+
+
+def configure_text_cache(maxsize=None):
+    """
+    Reset the memoized text functions with a new bound.
+    
+    Args:
+        maxsize: Entries per function (None re-reads settings, 0 disables caching)
+    """
+    size = _configured_cache_size() if maxsize is None else maxsize
+    for wrapper in _memoized_functions:
+        wrapper.cached = functools.lru_cache(maxsize=size)(wrapper.__wrapped__)
+
+
+def text_cache_info():
+    """Return {function name: functools cache info} for the memoized text functions."""
+    return {
+        wrapper.__name__: wrapper.cached.cache_info() if wrapper.cached is not None else None
+        for wrapper in _memoized_functions
+    }
+
 
+def compile_keywords(keywords) -> re.Pattern:
+    """
+    Compile a keyword collection into one alternation regex.
+    
+    Longer keywords come first so the automaton prefers the most specific
+    match; searching the pattern is equivalent to any(k in text for k in keywords).
+    """
+    alternatives = sorted(set(keywords), key=lambda keyword: (-len(keyword), keyword))
+    if not alternatives:
+        return re.compile(r'(?!)')
+    return re.compile('|'.join(re.escape(keyword) for keyword in alternatives))
+
+
+@_memoize_text
 def normalize_arabic(text: str, preserve_numbers: bool = False) -> str:
     """
     Comprehensive Arabic text normalization for robust matching.
@@ -100,7 +177,7 @@ def normalize_arabic(text: str, preserve_numbers: bool = False) -> str:
     t = t.replace('؛', ';')  # Arabic semicolon
     
     # Collapse multiple spaces to single space
-    t = re.sub(r'\s+', ' ', t).strip()
+    t = WHITESPACE.sub(' ', t).strip()
     
     # Remove leading/trailing punctuation
     t = t.strip('.,;:!?؟،؛')
@@ -108,6 +185,7 @@ def normalize_arabic(text: str, preserve_numbers: bool = False) -> str:
     return t
 
 
+@_memoize_text
 def extract_number(text: str) -> float | None:
     """
     Extract numeric value from text, supporting Arabic, Persian, and English digits.
@@ -135,7 +213,7 @@ def extract_number(text: str) -> float | None:
     
     # Try to find decimal or integer number
     # Pattern: optional minus, digits, optional decimal point and more digits
-    match = re.search(r'-?\d+\.?\d*', normalized)
+    match = NUMBER.search(normalized)
     
     if match:
         try:
@@ -144,23 +222,62 @@ def extract_number(text: str) -> float | None:
             pass
     
     # Try spelled-out Arabic numbers (basic 0-10)
-    # Normalized to handle various spellings
-    number_words = {
+    normalized_text = normalize_arabic(text)
+    for word, num in NUMBER_WORDS:
+        if word in normalized_text:
+            return float(num)
+    
+    return None
+
+
+# Spelled-out Arabic numbers (basic 0-10), pre-normalized
+NUMBER_WORDS = tuple(
+    (normalize_arabic.__wrapped__(word), num) for word, num in {
         'صفر': 0, 'واحد': 1, 'اثنان': 2, 'اثنين': 2, 
         'ثلاثه': 3, 'ثلاثة': 3, 'اربعه': 4, 'اربعة': 4,
         'خمسه': 5, 'خمسة': 5, 'سته': 6, 'ستة': 6,
         'سبعه': 7, 'سبعة': 7, 'ثمانيه': 8, 'ثمانية': 8,
         'تسعه': 9, 'تسعة': 9, 'عشره': 10, 'عشرة': 10
-    }
-    
-    normalized_text = normalize_arabic(text)
-    for word, num in number_words.items():
-        if normalize_arabic(word) in normalized_text:
-            return float(num)
-    
-    return None
+    }.items()
+)
 
+# Comprehensive YES patterns
+YES_PATTERNS = frozenset({
+    # Arabic formal
+    'نعم', 'اجل', 'بلى',
+    # Arabic informal/dialectal
+    'اي', 'ايه', 'ايوا', 'اكيد', 'طبعا', 'طبع',
+    # Affirmative phrases
+    'بكل تاكيد', 'بالتاكيد', 'موافق', 'حسنا', 'تمام', 'صحيح',
+    # English
+    'yes', 'yeah', 'yep', 'ok', 'okay', 'sure', 'true',
+    # Numeric
+    '1'
+})
+
+# Comprehensive NO patterns
+NO_PATTERNS = frozenset({
+    # Arabic formal
+    'لا', 'كلا', 'ليس',
+    # Arabic negative
+    'ابدا', 'مستحيل', 'رفض', 'خطا',
+    # Phrases
+    'غير موافق', 'لست متاكد',
+    # English
+    'no', 'nope', 'nah', 'false',
+    # Numeric
+    '0'
+})
+
+# Normalized answers never contain NUL, so joining on it keeps
+# "answer inside some pattern" equivalent to a single substring test
+_YES_REGEX = compile_keywords(YES_PATTERNS)
+_NO_REGEX = compile_keywords(NO_PATTERNS)
+_YES_JOINED = '\x00'.join(sorted(YES_PATTERNS))
+_NO_JOINED = '\x00'.join(sorted(NO_PATTERNS))
 
+
+@_memoize_text
 def yes_no_normalize(text: str) -> Literal['yes', 'no'] | None:
     """
     Normalize yes/no answers with comprehensive Arabic support.
@@ -184,42 +301,13 @@ def yes_no_normalize(text: str) -> Literal['yes', 'no'] | None:
     
     normalized = normalize_arabic(text)
     
-    # Comprehensive YES patterns
-    yes_patterns = {
-        # Arabic formal
-        'نعم', 'اجل', 'بلى',
-        # Arabic informal/dialectal
-        'اي', 'ايه', 'ايوا', 'اكيد', 'طبعا', 'طبع',
-        # Affirmative phrases
-        'بكل تاكيد', 'بالتاكيد', 'موافق', 'حسنا', 'تمام', 'صحيح',
-        # English
-        'yes', 'yeah', 'yep', 'ok', 'okay', 'sure', 'true',
-        # Numeric
-        '1'
-    }
+    # Check for matches (both exact and contains): a pattern inside the
+    # answer, or the whole answer inside a pattern
+    if _YES_REGEX.search(normalized) or normalized in _YES_JOINED:
+        return 'yes'
     
-    # Comprehensive NO patterns
-    no_patterns = {
-        # Arabic formal
-        'لا', 'كلا', 'ليس',
-        # Arabic negative
-        'ابدا', 'مستحيل', 'رفض', 'خطا',
-        # Phrases
-        'غير موافق', 'لست متاكد',
-        # English
-        'no', 'nope', 'nah', 'false',
-        # Numeric
-        '0'
-    }
-    
-    # Check for matches (both exact and contains)
-    for pattern in yes_patterns:
-        if pattern in normalized or normalized in pattern:
-            return 'yes'
-    
-    for pattern in no_patterns:
-        if pattern in normalized or normalized in pattern:
-            return 'no'
+    if _NO_REGEX.search(normalized) or normalized in _NO_JOINED:
+        return 'no'
     
     return None
 
@@ -358,15 +446,48 @@ CSAT_DISSATISFIED = {
 }
 
 
+# Precompiled CSAT choice automata
+_CSAT_SATISFIED_REGEX = compile_keywords(CSAT_SATISFIED)
+_CSAT_DISSATISFIED_REGEX = compile_keywords(CSAT_DISSATISFIED)
+_CSAT_NEUTRAL_REGEX = compile_keywords(CSAT_NEUTRAL)
+
+
+_keyword_patterns = {}
+
+
+def _keyword_pattern(keywords) -> re.Pattern:
+    """
+    Compiled alternation regex for a keyword collection.
+    
+    Keyword sets are module constants, so patterns are cached by object
+    identity (and recompiled if the collection's size changes).
+    """
+    entry = _keyword_patterns.get(id(keywords))
+    if entry is None or entry[0] is not keywords or entry[1] != len(keywords):
+        entry = (keywords, len(keywords), compile_keywords(keywords))
+        if len(_keyword_patterns) >= 128:
+            _keyword_patterns.clear()
+        _keyword_patterns[id(keywords)] = entry
+    return entry[2]
+
+
+@_memoize_text
+def _search_normalized(text: str, pattern: re.Pattern) -> bool:
+    """Whether pattern occurs in the normalized text (memoized per text and pattern)."""
+    return pattern.search(normalize_arabic(text)) is not None
+
+
 def match_intent(text: str, keywords: set[str]) -> bool:
     """
     Check if normalized text matches any keyword from the set.
     
-    Uses partial matching (substring) for flexibility.
+    Uses partial matching (substring) for flexibility. The keyword set is
+    compiled once into a single regex; a pattern from compile_keywords()
+    may be passed directly.
     
     Args:
         text: Text to check
-        keywords: Set of normalized keywords to match against
+        keywords: Set of normalized keywords (or a compiled pattern) to match against
     
     Returns:
         True if any keyword found in text
@@ -374,10 +495,12 @@ def match_intent(text: str, keywords: set[str]) -> bool:
     if not text:
         return False
     
-    normalized = normalize_arabic(text)
-    return any(keyword in normalized for keyword in keywords)
+    if not isinstance(keywords, re.Pattern):
+        keywords = _keyword_pattern(keywords)
+    return _search_normalized(text, keywords)
 
 
+@_memoize_text
 def classify_csat_choice(answer_text: str) -> Literal['satisfied', 'neutral', 'dissatisfied', 'unknown']:
     """
     Classify a choice answer as satisfied, neutral, or dissatisfied.
@@ -396,11 +519,11 @@ def classify_csat_choice(answer_text: str) -> Literal['satisfied', 'neutral', 'd
     normalized = normalize_arabic(answer_text)
     
     # Check in order: satisfied, dissatisfied, neutral (most specific first)
-    if any(keyword in normalized for keyword in CSAT_SATISFIED):
+    if _CSAT_SATISFIED_REGEX.search(normalized):
         return 'satisfied'
-    if any(keyword in normalized for keyword in CSAT_DISSATISFIED):
+    if _CSAT_DISSATISFIED_REGEX.search(normalized):
         return 'dissatisfied'
-    if any(keyword in normalized for keyword in CSAT_NEUTRAL):
+    if _CSAT_NEUTRAL_REGEX.search(normalized):
         return 'neutral'
     
     return 'unknown'
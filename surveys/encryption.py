@@ -6,12 +6,151 @@ using the same encryption standards as news_service and Files_Endpoints.
 """
 
 import os
+import hashlib
 import logging
-from cryptography.fernet import Fernet
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from cryptography.fernet import Fernet, InvalidToken
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+# Every Fernet token is base64url of a 0x80 version byte followed by a 64-bit
+# big-endian timestamp, so real tokens always start with this prefix
+FERNET_TOKEN_PREFIX = 'gAAAAA'
+
+# Batches smaller than this are decrypted inline even when a thread pool is configured
+DEFAULT_PARALLEL_THRESHOLD = 2000
+
+# Default memory bound for the in-process plaintext cache (UTF-8 bytes of ciphertext + plaintext)
+DEFAULT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+REDIS_CACHE_KEY_PREFIX = 'surveys:plaintext:'
+
+
+class DecryptionCache:
+    """
+    Bounded LRU mapping ciphertext to plaintext.
+    
+    Survey titles, question text and option text are decrypted on every
+    serializer pass but rarely change; since each Fernet token is unique to
+    one encryption, the token itself is a safe cache key. Entries are evicted
+    least-recently-used first once the stored size (UTF-8 bytes of token and
+    plaintext) exceeds max_bytes.
+    
+    Only fields that opt in with cache_plaintext=True (survey and question
+    text) are cached. Answers and respondent data are never passed to the
+    cache, so they are not kept in process memory or in the shared tier.
+    
+    An optional second tier keeps entries in the django_redis cache for
+    redis_ttl seconds so that every worker process shares recent results.
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_BYTES, redis_ttl=0):
+        self.max_bytes = max_bytes
+        self.redis_ttl = redis_ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+    
+    def get(self, token):
+        """Return the cached plaintext for a token, or None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        
+        plaintext = self._redis_get(token)
+        if plaintext is not None:
+            self.redis_hits += 1
+            self._store(token, plaintext)
+        return plaintext
+    
+    def put(self, token, plaintext):
+        """Remember a decrypted token in both tiers."""
+        self._store(token, plaintext)
+        self._redis_set(token, plaintext)
+    
+    def _store(self, token, plaintext):
+        # Tokens are ASCII; Arabic plaintext takes 2 bytes per character
+        size = len(token) + len(plaintext.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(token, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[token] = (plaintext, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+    
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'redis_hits': self.redis_hits,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+    
+    def _redis_backend(self):
+        if not self.redis_ttl:
+            return None
+        backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+        if 'django_redis' not in backend:
+            return None
+        from django.core.cache import cache
+        return cache
+    
+    @staticmethod
+    def _redis_key(token):
+        return REDIS_CACHE_KEY_PREFIX + hashlib.sha256(token.encode()).hexdigest()
+    
+    def _redis_get(self, token):
+        backend = self._redis_backend()
+        if backend is None:
+            return None
+        try:
+            return backend.get(self._redis_key(token))
+        except Exception as e:
+            logger.warning(f"Decryption cache Redis lookup failed: {e}")
+            return None
+    
+    def _redis_set(self, token, plaintext):
+        backend = self._redis_backend()
+        if backend is None:
+            return
+        try:
+            backend.set(self._redis_key(token), plaintext, self.redis_ttl)
+        except Exception as e:
+            logger.warning(f"Decryption cache Redis store failed: {e}")
+
 
 class SurveysDataEncryption:
     """
@@ -22,6 +161,13 @@ class SurveysDataEncryption:
         """Initialize encryption with key from environment or settings."""
         self.key = self._get_encryption_key()
         self.cipher_suite = Fernet(self.key) if self.key else None
+        self._stats_lock = threading.Lock()
+        self._stats = {'batches': 0, 'values': 0, 'plaintext': 0, 'failures': 0, 'seconds': 0.0}
+        self._measurement = threading.local()
+        self.cache = DecryptionCache(
+            max_bytes=getattr(settings, 'SURVEYS_DECRYPTION_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES),
+            redis_ttl=getattr(settings, 'SURVEYS_DECRYPTION_CACHE_REDIS_TTL', 0),
+        )
         
         if not self.cipher_suite:
             logger.warning("Surveys encryption not initialized - key not found")
@@ -74,12 +220,18 @@ class SurveysDataEncryption:
             logger.error(f"Encryption failed: {e}")
             return data
     
-    def decrypt(self, encrypted_data):
+    def decrypt(self, encrypted_data, cache=False):
         """
         Decrypt data using AES-256.
         
+        With cache=True the result is kept in a bounded LRU keyed by the
+        ciphertext (see DecryptionCache), so hot survey and question text is
+        decrypted once. Only pass it for survey structure text, never for
+        answers or respondent data.
+        
         Args:
             encrypted_data: Encrypted data to decrypt (will be converted to string)
+            cache: Look the plaintext up in, and add it to, the decryption cache
             
         Returns:
             str: Decrypted data
@@ -98,12 +250,129 @@ class SurveysDataEncryption:
             else:
                 encrypted_data_str = encrypted_data
             
-            decrypted_data = self.cipher_suite.decrypt(encrypted_data_str.encode())
-            return decrypted_data.decode()
+            use_cache = cache and self.cache.enabled
+            if use_cache:
+                cached = self.cache.get(encrypted_data_str)
+                if cached is not None:
+                    return cached
+            
+            decrypted_data = self.cipher_suite.decrypt(encrypted_data_str.encode()).decode()
+            if use_cache:
+                self.cache.put(encrypted_data_str, decrypted_data)
+            return decrypted_data
         except Exception as e:
             logger.error(f"Decryption failed: {e}")
             return encrypted_data
 
+    
+    @staticmethod
+    def is_encrypted(value):
+        """
+        Check whether a value looks like a Fernet token.
+        
+        Used to skip decryption of plaintext (legacy rows, values that were
+        already decrypted) without paying for a failed decrypt attempt.
+        """
+        return isinstance(value, str) and value.startswith(FERNET_TOKEN_PREFIX)
+    
+    def decrypt_many(self, values, workers=None):
+        """
+        Decrypt a batch of values with the shared cipher.
+        
+        Empty values and values that are not Fernet tokens are returned
+        unchanged. Batches are typically bulk answer reads, so they bypass the
+        LRU cache rather than evicting hot survey and question text. Large
+        batches can be split across a thread pool (OpenSSL releases the GIL
+        while decrypting); the pool size defaults to the
+        SURVEYS_DECRYPTION_WORKERS setting and is off by default. Time spent
+        here is added to the calling thread's measure_decryption() block.
+        
+        Args:
+            values: Sequence of encrypted (or plaintext) values
+            workers: Optional thread count overriding the setting
+            
+        Returns:
+            list: Decrypted values in the same order
+        """
+        values = list(values)
+        if not self.cipher_suite:
+            logger.error("Decryption not available")
+            return values
+        
+        started = time.perf_counter()
+        positions = [idx for idx, value in enumerate(values) if value and self.is_encrypted(value)]
+        tokens = [values[idx] for idx in positions]
+        
+        if workers is None:
+            workers = getattr(settings, 'SURVEYS_DECRYPTION_WORKERS', 0)
+        threshold = getattr(settings, 'SURVEYS_DECRYPTION_PARALLEL_THRESHOLD', DEFAULT_PARALLEL_THRESHOLD)
+        
+        if workers and workers > 1 and len(tokens) >= threshold:
+            size = -(-len(tokens) // workers)
+            slices = [tokens[start:start + size] for start in range(0, len(tokens), size)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self._decrypt_tokens, slices))
+        else:
+            results = [self._decrypt_tokens(tokens)]
+        
+        failures = 0
+        flat = (item for result in results for item in result)
+        for idx, (plaintext, ok) in zip(positions, flat):
+            values[idx] = plaintext
+            failures += not ok
+        
+        elapsed = time.perf_counter() - started
+        measurement = getattr(self._measurement, 'current', None)
+        if measurement is not None:
+            measurement['values'] += len(tokens)
+            measurement['seconds'] += elapsed
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['values'] += len(values)
+            self._stats['plaintext'] += len(values) - len(positions)
+            self._stats['failures'] += failures
+            self._stats['seconds'] += elapsed
+        
+        if failures:
+            logger.error(f"Decryption failed for {failures} of {len(tokens)} values in batch")
+        logger.debug(f"Decrypted {len(tokens)} of {len(values)} values in {elapsed * 1000:.1f}ms")
+        return values
+    
+    def _decrypt_tokens(self, tokens):
+        """Decrypt tokens, returning (value, ok) pairs; failed tokens are passed through."""
+        decrypt = self.cipher_suite.decrypt
+        results = []
+        for token in tokens:
+            try:
+                results.append((decrypt(token.encode()).decode(), True))
+            except (InvalidToken, ValueError, UnicodeDecodeError):
+                results.append((token, False))
+        return results
+    
+    def decryption_stats(self):
+        """Cumulative batch decryption counters for this process."""
+        with self._stats_lock:
+            return dict(self._stats)
+    
+    @contextmanager
+    def measure_decryption(self):
+        """
+        Measure the batch decryption done by the current thread in a block.
+        
+        Yields:
+            dict: 'values' decrypted and 'seconds' spent, filled in as the block runs
+        """
+        outer = getattr(self._measurement, 'current', None)
+        measurement = {'values': 0, 'seconds': 0.0}
+        self._measurement.current = measurement
+        try:
+            yield measurement
+        finally:
+            self._measurement.current = outer
+            if outer is not None:
+                outer['values'] += measurement['values']
+                outer['seconds'] += measurement['seconds']
+
 
 # Global instance
 surveys_data_encryption = SurveysDataEncryption()
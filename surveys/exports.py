@@ -0,0 +1,151 @@
+# surveys/exports.py
+"""
+Streaming survey response exports.
+
+Responses are read in keyset-paginated chunks (newest first) together with
+their answers, and CSV rows / JSON fragments are yielded as each chunk is
+decrypted, so memory stays flat and the first bytes reach the client
+immediately no matter how many responses a survey has.
+"""
+
+import csv
+import json
+import logging
+import textwrap
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Answer, Response
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 500
+
+
+class _EchoBuffer:
+    """File-like object whose write() hands the value back, for csv.writer streaming."""
+
+    def write(self, value):
+        return value
+
+
+def iter_response_chunks(survey, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield a survey's responses chunk by chunk with their answers attached.
+
+    Each chunk is a list of (response_row, answers) where response_row is
+    (id, submitted_at, is_complete, respondent_email) and answers maps
+    question_id to the decrypted answer text. Pages are keyed on
+    (submitted_at, id) so every chunk is a bounded index range scan, and each
+    chunk's answers are decrypted in one batch.
+    """
+    responses = Response.objects.filter(survey=survey).order_by('-submitted_at', '-id')
+    last = None
+
+    while True:
+        page = responses
+        if last is not None:
+            page = page.filter(
+                Q(submitted_at__lt=last[1]) | Q(submitted_at=last[1], id__lt=last[0])
+            )
+        rows = list(page.values_list('id', 'submitted_at', 'is_complete', 'respondent__email')[:chunk_size])
+        if not rows:
+            return
+
+        answers = {row[0]: {} for row in rows}
+        for response_id, question_id, answer_text in Answer.objects.filter(
+            response_id__in=list(answers)
+        ).order_by('id').decrypted_values('response_id', 'question_id', 'answer_text'):
+            answers[response_id][question_id] = answer_text
+
+        yield [(row, answers[row[0]]) for row in rows]
+
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+
+
+def stream_csv(survey, questions, include_personal, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the CSV export line by line."""
+    writer = csv.writer(_EchoBuffer())
+
+    headers = ['Response ID', 'Submitted At', 'Is Complete']
+    if include_personal:
+        headers.append('Respondent Email')
+    for question in questions:
+        headers.append(f"Q{question.order}: {question.text[:50]}")
+    yield writer.writerow(headers)
+
+    try:
+        for chunk in iter_response_chunks(survey, chunk_size):
+            lines = []
+            for (response_id, submitted_at, is_complete, respondent_email), answers in chunk:
+                row = [
+                    str(response_id),
+                    submitted_at.strftime('%Y-%m-%d %H:%M:%S'),
+                    'Yes' if is_complete else 'No'
+                ]
+                if include_personal:
+                    row.append(respondent_email or 'Anonymous')
+                for question in questions:
+                    row.append(answers.get(question.id, ''))
+                lines.append(writer.writerow(row))
+            yield ''.join(lines)
+    except Exception as e:
+        # Headers are already sent: log and re-raise so the server aborts the
+        # chunked response and the client sees a broken transfer
+        logger.error(f"Error streaming CSV export for survey {survey.id}: {e}")
+        raise
+
+
+def stream_json(survey, questions, include_personal, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the JSON export as a sequence of fragments forming one document."""
+    question_info = {
+        question.id: (str(question.id), question.text, question.question_type)
+        for question in questions
+    }
+    survey_info = json.dumps({
+        'id': str(survey.id),
+        'title': survey.title,
+        'description': survey.description,
+        'exported_at': timezone.now().isoformat(),
+        'total_responses': Response.objects.filter(survey=survey).count()
+    }, indent=2)
+
+    yield '{\n  "survey": ' + textwrap.indent(survey_info, '  ').lstrip() + ',\n  "responses": ['
+
+    first = True
+    try:
+        for chunk in iter_response_chunks(survey, chunk_size):
+            fragments = []
+            for (response_id, submitted_at, is_complete, respondent_email), answers in chunk:
+                response_data = {
+                    'id': str(response_id),
+                    'submitted_at': submitted_at.isoformat(),
+                    'is_complete': is_complete,
+                    'answers': []
+                }
+                if include_personal and respondent_email:
+                    response_data['respondent_email'] = respondent_email
+
+                for question_id, answer_text in answers.items():
+                    info = question_info.get(question_id)
+                    if info is None:
+                        continue
+                    response_data['answers'].append({
+                        'question_id': info[0],
+                        'question_text': info[1],
+                        'question_type': info[2],
+                        'answer_text': answer_text
+                    })
+
+                fragments.append(('\n' if first else ',\n') + textwrap.indent(json.dumps(response_data, indent=2), '    '))
+                first = False
+            yield ''.join(fragments)
+    except Exception as e:
+        # Never close the document over a failure: re-raise so the transfer breaks
+        logger.error(f"Error streaming JSON export for survey {survey.id}: {e}")
+        raise
+
+    yield ('\n  ]\n}' if not first else ']\n}')
@@ -0,0 +1,65 @@
+"""
+Management command to backfill respondent contact hashes on survey responses.
+
+Duplicate-submission checks look responses up by respondent_email_hash and
+respondent_phone_hash. Migration 0023 hashes the responses that existed when
+it ran; this command covers rows saved without hashes afterwards (e.g. by
+servers still running the previous release, which the checks match on the
+plaintext columns meanwhile). After the hash key changes, every hash must be
+recomputed with --all, otherwise existing responses stop matching.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from surveys.models import Response, contact_hash
+
+
+class Command(BaseCommand):
+    help = 'Compute HMAC hashes for respondent email/phone on existing survey responses'
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Responses updated per bulk update (default: 1000)'
+        )
+
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every hash, e.g. after changing SURVEYS_CONTACT_HASH_KEY'
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        batch_size = options['batch_size']
+
+        responses = Response.objects.filter(
+            Q(respondent_email__isnull=False) | Q(respondent_phone__isnull=False)
+        )
+        if not options['all']:
+            responses = responses.filter(
+                Q(respondent_email__isnull=False, respondent_email_hash__isnull=True) |
+                Q(respondent_phone__isnull=False, respondent_phone_hash__isnull=True)
+            )
+
+        pending = []
+        updated = 0
+        for response in responses.only('id', 'respondent_email', 'respondent_phone').iterator(chunk_size=batch_size):
+            response.respondent_email_hash = contact_hash(response.respondent_email)
+            response.respondent_phone_hash = contact_hash(response.respondent_phone)
+            pending.append(response)
+            if len(pending) >= batch_size:
+                Response.objects.bulk_update(pending, ['respondent_email_hash', 'respondent_phone_hash'])
+                updated += len(pending)
+                pending = []
+
+        if pending:
+            Response.objects.bulk_update(pending, ['respondent_email_hash', 'respondent_phone_hash'])
+            updated += len(pending)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated contact hashes for {updated} responses')
+        )
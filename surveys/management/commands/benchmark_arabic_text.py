@@ -0,0 +1,111 @@
+"""
+Management command to micro-benchmark Arabic text parsing and classification.
+
+Builds a synthetic corpus shaped like real survey answers (ratings in
+Arabic/Persian/English digits, yes/no replies, satisfaction choices with
+diacritics and tatweel, some free text) and times the surveys.arabic_text
+functions with their memoization caches disabled and enabled.
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from surveys import arabic_text
+
+
+RATING_ANSWERS = ['1', '2', '3', '4', '5', '٥', '٤', '٣', '۵', '10', '٩ من ١٠', '9/10', 'خمسة', 'ثلاثه']
+YES_NO_ANSWERS = ['نعم', 'لا', 'Yes', 'No', 'أكيد', 'ايه', 'كلا', 'true', 'نعم، بالتأكيد']
+CHOICE_ANSWERS = [
+    'ممتاز', 'مُمْتَاز', 'ممتـــاز', 'جيد جداً', 'جيد', 'راضٍ', 'راضي تماما', 'عادي', 'محايد',
+    'مقبول', 'سيء', 'سيئ جداً', 'غير راضٍ', 'Very satisfied', 'Satisfied', 'Neutral', 'Dissatisfied',
+]
+FREE_TEXT_WORDS = [
+    'الخدمة', 'كانت', 'ممتازة', 'والموظفين', 'متعاونين', 'لكن', 'الانتظار', 'طويل',
+    'service', 'was', 'slow', 'great', 'staff', 'the', 'تجربة', 'رائعة', 'أوصي', 'بها',
+]
+
+
+def build_corpus(size, seed=0):
+    """Return a list of answer strings with a realistic mix and repetition rate."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        kind = rng.random()
+        if kind < 0.4:
+            corpus.append(rng.choice(RATING_ANSWERS))
+        elif kind < 0.6:
+            corpus.append(rng.choice(YES_NO_ANSWERS))
+        elif kind < 0.9:
+            corpus.append(rng.choice(CHOICE_ANSWERS))
+        else:
+            corpus.append(' '.join(rng.choice(FREE_TEXT_WORDS) for _ in range(rng.randint(3, 12))))
+    return corpus
+
+
+class Command(BaseCommand):
+    help = 'Time surveys.arabic_text parsing over a synthetic answer corpus, uncached vs memoized'
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--answers',
+            type=int,
+            default=100000,
+            help='Number of answers in the corpus (default: 100000)'
+        )
+
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the corpus (default: 0)'
+        )
+
+    def _run(self, corpus):
+        """Run every benchmarked function over the corpus; return seconds per function."""
+        functions = [
+            ('normalize_arabic', arabic_text.normalize_arabic),
+            ('extract_number', arabic_text.extract_number),
+            ('yes_no_normalize', arabic_text.yes_no_normalize),
+            ('classify_csat_choice', arabic_text.classify_csat_choice),
+            ('match_intent', lambda text: arabic_text.match_intent(text, arabic_text.CSAT_KEYWORDS_AR)),
+        ]
+        timings = {}
+        for name, func in functions:
+            started = time.perf_counter()
+            for text in corpus:
+                func(text)
+            timings[name] = time.perf_counter() - started
+        return timings
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        corpus = build_corpus(options['answers'], options['seed'])
+        self.stdout.write(
+            f'Corpus: {len(corpus)} answers, {len(set(corpus))} distinct'
+        )
+
+        try:
+            arabic_text.configure_text_cache(0)
+            uncached = self._run(corpus)
+            arabic_text.configure_text_cache()
+            cached = self._run(corpus)
+        finally:
+            arabic_text.configure_text_cache()
+
+        self.stdout.write(f'{"function":<24}{"uncached (s)":>14}{"memoized (s)":>14}{"speedup":>10}')
+        for name in uncached:
+            speedup = uncached[name] / cached[name] if cached[name] else float('inf')
+            self.stdout.write(
+                f'{name:<24}{uncached[name]:>14.3f}{cached[name]:>14.3f}{speedup:>9.1f}x'
+            )
+
+        total_uncached = sum(uncached.values())
+        total_cached = sum(cached.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Total: {total_uncached:.3f}s -> {total_cached:.3f}s '
+                f'({total_uncached / total_cached if total_cached else float("inf"):.1f}x)'
+            )
+        )
@@ -0,0 +1,85 @@
+"""
+Management command to backfill or verify survey analytics rollups.
+
+Rollups are normally maintained on every submission, and surveys whose
+rollups were marked stale are rebuilt by a background job. This command
+rebuilds them from the raw responses (after a deploy, or when a write path
+bypassed them); --stale limits it to surveys that are stale or were never
+built, and --verify checks stored rollups without writing anything.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from surveys.models import Survey
+from surveys.rollups import rebuild_survey_rollups, verify_survey_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or verify) per-survey analytics rollups from raw responses'
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--survey-id',
+            type=str,
+            help='Process a specific survey ID only'
+        )
+
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare stored rollups with the raw responses without rewriting them'
+        )
+
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='Only rebuild surveys whose rollups are stale or were never built'
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        survey_id = options['survey_id']
+        verify = options['verify']
+
+        surveys = Survey.objects.filter(deleted_at__isnull=True)
+        if survey_id:
+            try:
+                surveys = surveys.filter(id=survey_id)
+            except ValueError:
+                self.stdout.write(
+                    self.style.ERROR(f'Invalid survey ID: {survey_id}')
+                )
+                return
+        if options['stale']:
+            surveys = surveys.filter(Q(rollup_state__isnull=True) | Q(rollup_state__stale_at__isnull=False))
+
+        processed = 0
+        inconsistent = 0
+
+        for survey in surveys.iterator():
+            processed += 1
+            if verify:
+                mismatches = verify_survey_rollups(survey)
+                if mismatches:
+                    inconsistent += 1
+                    self.stdout.write(
+                        self.style.WARNING(f'Survey {survey.id}: {len(mismatches)} mismatched rollup rows')
+                    )
+                    for mismatch in mismatches[:20]:
+                        self.stdout.write(f'  {mismatch}')
+            else:
+                response_rows, answer_rows = rebuild_survey_rollups(survey)
+                self.stdout.write(
+                    f'Survey {survey.id}: {response_rows} response buckets, {answer_rows} answer tallies'
+                )
+
+        if verify:
+            style = self.style.SUCCESS if not inconsistent else self.style.WARNING
+            self.stdout.write(
+                style(f'Verified {processed} surveys, {inconsistent} with mismatched rollups')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Rebuilt rollups for {processed} surveys')
+            )
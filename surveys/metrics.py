@@ -2,12 +2,25 @@
 """
 Metrics calculation helpers for NPS and CSAT analytics.
 
-Provides reusable functions for dynamic threshold calculation and distribution analysis.
+Provides reusable functions for dynamic threshold calculation and distribution analysis,
+plus NumPy batch functions that classify and tally a whole column of answers at once.
 """
 
 import math
 from decimal import Decimal, ROUND_HALF_UP
-from typing import List, Dict, Tuple
+from fractions import Fraction
+from typing import Callable, List, Dict, Optional, Tuple
+
+import numpy as np
+
+# Index of each CSAT class in count arrays returned by the batch functions
+CSAT_CLASSES = ('satisfied', 'neutral', 'dissatisfied')
+CSAT_SATISFIED, CSAT_NEUTRAL, CSAT_DISSATISFIED = range(3)
+# Marks answers that could not be classified (excluded from counts)
+CSAT_UNCLASSIFIED = -1
+
+# Two-sided 95% normal quantile
+Z_95 = 1.959963984540054
 
 
 def nps_thresholds(min_scale: int, max_scale: int) -> Tuple[int, int]:
@@ -71,7 +84,8 @@ def nps_thresholds(min_scale: int, max_scale: int) -> Tuple[int, int]:
     return det_max, pas_max
 
 
-def nps_distribution(values: List[float], min_scale: int, max_scale: int) -> List[Dict]:
+def nps_distribution(values: List[float], min_scale: int, max_scale: int,
+                     weights: Optional[List[int]] = None) -> List[Dict]:
     """
     Calculate distribution of NPS scores across entire scale range.
     
@@ -82,6 +96,7 @@ def nps_distribution(values: List[float], min_scale: int, max_scale: int) -> Lis
         values: List of numeric score values from survey responses
         min_scale: Minimum value of the rating scale
         max_scale: Maximum value of the rating scale
+        weights: Optional number of answers each value stands for
     
     Returns:
         List of dictionaries with score, count, and percentage for each scale value
@@ -98,26 +113,26 @@ def nps_distribution(values: List[float], min_scale: int, max_scale: int) -> Lis
             {"score": 5, "count": 3, "pct": 42.9}
         ]
     """
-    # Initialize bins for each score value
-    bins = {s: 0 for s in range(min_scale, max_scale + 1)}
-    
-    # Count occurrences of each score
-    for v in values:
-        # Round to nearest integer and ensure within range
-        rounded_val = int(round(v))
-        if min_scale <= rounded_val <= max_scale:
-            bins[rounded_val] += 1
+    # Round to nearest integer and keep values within range
+    scores = np.rint(np.asarray(values, dtype=np.float64))
+    in_range = (scores >= min_scale) & (scores <= max_scale)
+    bin_weights = None if weights is None else np.asarray(weights, dtype=np.int64)[in_range]
+    bins = np.bincount(
+        (scores[in_range] - min_scale).astype(np.int64),
+        weights=bin_weights,
+        minlength=max_scale - min_scale + 1
+    ).astype(np.int64)
     
     # Calculate total (avoid division by zero)
-    total = sum(bins.values()) or 1
+    total = int(bins.sum()) or 1
     
     # Build distribution with percentages
     distribution = []
-    for score, count in bins.items():
+    for offset, count in enumerate(bins.tolist()):
         # Use Decimal for precise percentage calculation
         pct = float(Decimal(100 * count / total).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP))
         distribution.append({
-            "score": score,
+            "score": min_scale + offset,
             "count": count,
             "pct": pct
         })
@@ -201,3 +216,272 @@ def csat_interpretation(score: float) -> str:
         return "Fair - Room for improvement"
     else:
         return "Poor - Action required"
+
+
+# ----------------------------------------------------------------------
+# Batch (NumPy) helpers
+# ----------------------------------------------------------------------
+
+def map_distinct(texts, func: Callable, dtype=np.float64, missing=np.nan) -> np.ndarray:
+    """
+    Apply func once per distinct answer string and broadcast the results.
+    
+    Survey answers repeat heavily ("5", "راضٍ", "Yes"), so parsing every
+    distinct string once and gathering by inverse index replaces a per-answer
+    Python call with a per-value one.
+    
+    Args:
+        texts: Sequence or array of answer strings (None is treated as '')
+        func: Parser/classifier taking one string
+        dtype: dtype of the returned array
+        missing: Value stored where func returns None
+    
+    Returns:
+        Array of len(texts) with func's result for each text
+    """
+    if len(texts) == 0:
+        return np.empty(0, dtype=dtype)
+    
+    values = np.asarray([text if text is not None else '' for text in texts], dtype=object)
+    distinct, inverse = np.unique(values, return_inverse=True)
+    results = [func(text) for text in distinct]
+    mapped = np.array([missing if result is None else result for result in results], dtype=dtype)
+    return mapped[inverse.reshape(-1)]
+
+
+def nps_counts(scores, min_scale: int, max_scale: int, weights=None) -> Tuple[int, int, int]:
+    """
+    Bucket an array of parsed scores into NPS groups.
+    
+    NaN and out-of-scale scores are ignored.
+    
+    Args:
+        scores: Array of numeric scores (NaN for unparseable answers)
+        min_scale: Minimum value of the rating scale
+        max_scale: Maximum value of the rating scale
+        weights: Optional number of answers each score stands for
+    
+    Returns:
+        Tuple of (detractors, passives, promoters)
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    weights = np.ones(len(scores), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+    det_max, pas_max = nps_thresholds(min_scale, max_scale)
+    
+    valid = (scores >= min_scale) & (scores <= max_scale)
+    buckets = np.where(scores <= det_max, 0, np.where(scores <= pas_max, 1, 2))
+    counts = np.bincount(buckets[valid], weights=weights[valid], minlength=3).astype(np.int64)
+    return int(counts[0]), int(counts[1]), int(counts[2])
+
+
+def nps_score(detractors: int, passives: int, promoters: int) -> float:
+    """
+    Calculate NPS (% promoters - % detractors) from bucket counts.
+    
+    Returns:
+        NPS score (-100 to 100), 0.0 when there are no responses
+    """
+    total = detractors + passives + promoters
+    if total == 0:
+        return 0.0
+    return 100.0 * (promoters - detractors) / total
+
+
+def nps_confidence_interval(detractors: int, passives: int, promoters: int,
+                            z: float = Z_95) -> Tuple[float, float]:
+    """
+    Normal-approximation confidence interval for an NPS score.
+    
+    Treats each response as +1 (promoter), 0 (passive) or -1 (detractor);
+    the NPS is 100 × the mean of that variable.
+    
+    Args:
+        detractors: Count of detractors
+        passives: Count of passives
+        promoters: Count of promoters
+        z: Normal quantile (default: 95% two-sided)
+    
+    Returns:
+        Tuple of (lower, upper) clipped to [-100, 100]
+    """
+    total = detractors + passives + promoters
+    if total == 0:
+        return 0.0, 0.0
+    p_pro = promoters / total
+    p_det = detractors / total
+    mean = p_pro - p_det
+    variance = max(p_pro + p_det - mean * mean, 0.0)
+    margin = z * math.sqrt(variance / total)
+    return max(-100.0, 100.0 * (mean - margin)), min(100.0, 100.0 * (mean + margin))
+
+
+def csat_rating_classes(scores, min_scale: Optional[int] = None,
+                        max_scale: Optional[int] = None) -> np.ndarray:
+    """
+    Classify an array of rating scores as satisfied / neutral / dissatisfied.
+    
+    With explicit scale metadata the thresholds scale with the span:
+    up to 5 points satisfied >= 60% and neutral >= 40%, up to 10 points
+    satisfied >= 70% and neutral >= 50%, otherwise 80% / 40%. Without
+    metadata each score picks 1-5 (<= 5) or 1-10 (<= 10); larger scores
+    and NaN are left unclassified.
+    
+    Args:
+        scores: Array of numeric scores (NaN for unparseable answers)
+        min_scale: Minimum value of the rating scale, or None to auto-detect
+        max_scale: Maximum value of the rating scale, or None to auto-detect
+    
+    Returns:
+        int64 array of CSAT class indexes (CSAT_UNCLASSIFIED where unknown)
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if min_scale is None or max_scale is None:
+        low = np.ones(len(scores), dtype=np.float64)
+        high = np.where(scores <= 5, 5.0, np.where(scores <= 10, 10.0, np.nan))
+    else:
+        low = np.full(len(scores), float(min_scale))
+        high = np.full(len(scores), float(max_scale))
+    
+    span = high - low
+    satisfied_at = np.where(high <= 5, 0.6, np.where(high <= 10, 0.7, 0.8))
+    neutral_at = np.where(high <= 5, 0.4, np.where(high <= 10, 0.5, 0.4))
+    
+    with np.errstate(invalid='ignore'):
+        classes = np.where(
+            scores >= low + satisfied_at * span, CSAT_SATISFIED,
+            np.where(scores >= low + neutral_at * span, CSAT_NEUTRAL, CSAT_DISSATISFIED)
+        )
+    return np.where(np.isnan(scores) | np.isnan(high), CSAT_UNCLASSIFIED, classes).astype(np.int64)
+
+
+def csat_counts(classes, weights=None) -> np.ndarray:
+    """
+    Tally CSAT class indexes into (satisfied, neutral, dissatisfied) counts.
+    
+    Unclassified entries are ignored.
+    """
+    classes = np.asarray(classes, dtype=np.int64)
+    weights = np.ones(len(classes), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+    valid = classes >= 0
+    return np.bincount(classes[valid], weights=weights[valid], minlength=3).astype(np.int64)
+
+
+def csat_confidence_interval(satisfied: int, total: int, z: float = Z_95) -> Tuple[float, float]:
+    """
+    Wilson score interval for a CSAT percentage.
+    
+    Stays inside 0-100 and behaves well for small samples and scores near
+    the bounds.
+    
+    Returns:
+        Tuple of (lower, upper) percentages
+    """
+    if total == 0:
+        return 0.0, 0.0
+    p = satisfied / total
+    denominator = 1 + z * z / total
+    center = (p + z * z / (2 * total)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, 100.0 * (center - margin)), min(100.0, 100.0 * (center + margin))
+
+
+def csat_period_series(period_codes, classes, weights, n_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-period CSAT counts and scores in one pass.
+    
+    Args:
+        period_codes: Period index of every answer
+        classes: CSAT class index of every answer
+        weights: Number of answers each entry stands for
+        n_periods: Number of periods
+    
+    Returns:
+        Tuple of (counts, scores): counts is an (n_periods, 3) int64 array of
+        satisfied/neutral/dissatisfied tallies, scores the unrounded CSAT
+        percentage per period (NaN for empty periods)
+    """
+    period_codes = np.asarray(period_codes, dtype=np.int64)
+    classes = np.asarray(classes, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.int64)
+    valid = classes >= 0
+    
+    cells = period_codes[valid] * 3 + classes[valid]
+    counts = np.bincount(cells, weights=weights[valid], minlength=n_periods * 3)
+    counts = counts.astype(np.int64).reshape(n_periods, 3)
+    
+    totals = counts.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.where(totals > 0, 100.0 * counts[:, CSAT_SATISFIED] / totals, np.nan)
+    return counts, scores
+
+
+def rating_counts(value_counts) -> List[Tuple[float, int]]:
+    """
+    Parse (answer text, count) pairs into distinct numeric ratings.
+    
+    Unparseable and non-finite answers are skipped; texts parsing to the
+    same number ("5", "5.0", "٥") are merged.
+    
+    Returns:
+        List of (rating, count) pairs in order of first appearance
+    """
+    totals = {}
+    for text, count in value_counts:
+        try:
+            value = float(text)
+        except (ValueError, TypeError):
+            continue
+        if math.isfinite(value):
+            totals[value] = totals.get(value, 0) + int(count)
+    return list(totals.items())
+
+
+def rating_summary(ratings: List[Tuple[float, int]]) -> Optional[Dict[str, float]]:
+    """
+    Summary statistics of count-weighted ratings without expanding them.
+    
+    Gives the same results as the statistics module (mean, median, mode,
+    stdev) and sorted-list quartiles on the expanded list of answers, in
+    O(distinct ratings). Ties for the mode go to the rating seen first.
+    
+    Args:
+        ratings: (rating, count) pairs from rating_counts()
+    
+    Returns:
+        Dict with count, mean, median, mode, min, max, std_dev, q1 and q3,
+        or None when there are no ratings
+    """
+    ratings = [(value, count) for value, count in ratings if count > 0]
+    total = sum(count for _, count in ratings)
+    if total == 0:
+        return None
+    
+    ordered = sorted(ratings)
+    cumulative = np.cumsum([count for _, count in ordered])
+    
+    def nth(index):
+        return ordered[int(np.searchsorted(cumulative, index, side='right'))][0]
+    
+    exact_mean = sum(Fraction(value) * count for value, count in ratings) / total
+    if total > 1:
+        variance = sum(Fraction(value) ** 2 * count for value, count in ratings) - exact_mean ** 2 * total
+        std_dev = math.sqrt(variance / (total - 1))
+    else:
+        std_dev = 0
+    
+    if total % 2:
+        median = nth(total // 2)
+    else:
+        median = (nth(total // 2 - 1) + nth(total // 2)) / 2
+    
+    return {
+        'count': total,
+        'mean': float(exact_mean),
+        'median': median,
+        'mode': max(ratings, key=lambda pair: pair[1])[0],
+        'min': ordered[0][0],
+        'max': ordered[-1][0],
+        'std_dev': std_dev,
+        'q1': nth(total // 4),
+        'q3': nth(3 * total // 4),
+    }
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-15 20:09
+
+import django.db.models.deletion
+import surveys.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0021_remove_deviceresponse_ip_address_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyAnswerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField(help_text='Start of the UTC hour this bucket covers')),
+                ('is_complete', models.BooleanField(default=True)),
+                ('value', surveys.models.EncryptedTextField(blank=True, default='', help_text='Answer value (encrypted)')),
+                ('value_hash', models.CharField(help_text='SHA256 hash of the answer value for Oracle-compatible matching', max_length=64)),
+                ('answer_count', models.PositiveIntegerField(default=0)),
+                ('word_total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_rollups', to='surveys.question')),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_rollups', to='surveys.survey')),
+            ],
+            options={
+                'verbose_name': 'Answer Rollup',
+                'verbose_name_plural': 'Answer Rollups',
+                'db_table': 'surveys_answer_rollup',
+                'ordering': ['survey', 'question', 'bucket_start'],
+                'indexes': [models.Index(fields=['survey', 'bucket_start'], name='surveys_ans_rollup_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('question', 'bucket_start', 'is_complete', 'value_hash'), name='unique_answer_rollup_value')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SurveyResponseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField(help_text='Start of the UTC hour this bucket covers')),
+                ('is_complete', models.BooleanField(default=True)),
+                ('response_count', models.PositiveIntegerField(default=0)),
+                ('authenticated_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='response_rollups', to='surveys.survey')),
+            ],
+            options={
+                'verbose_name': 'Response Rollup',
+                'verbose_name_plural': 'Response Rollups',
+                'db_table': 'surveys_response_rollup',
+                'ordering': ['survey', 'bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('survey', 'bucket_start', 'is_complete'), name='unique_response_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-15 20:15
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_contact_hashes(apps, schema_editor):
+    """
+    Hash the contacts of existing responses so duplicate checks find them.
+
+    Same as the backfill_contact_hashes command, in batches of
+    BACKFILL_BATCH_SIZE bulk updates.
+    """
+    from surveys.models import contact_hash
+
+    Response = apps.get_model('surveys', 'Response')
+    responses = Response.objects.filter(
+        Q(respondent_email__isnull=False) | Q(respondent_phone__isnull=False)
+    ).only('id', 'respondent_email', 'respondent_phone')
+
+    pending = []
+    for response in responses.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        response.respondent_email_hash = contact_hash(response.respondent_email)
+        response.respondent_phone_hash = contact_hash(response.respondent_phone)
+        pending.append(response)
+        if len(pending) >= BACKFILL_BATCH_SIZE:
+            Response.objects.bulk_update(pending, ['respondent_email_hash', 'respondent_phone_hash'])
+            pending = []
+    if pending:
+        Response.objects.bulk_update(pending, ['respondent_email_hash', 'respondent_phone_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0022_survey_analytics_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='respondent_email_hash',
+            field=models.CharField(blank=True, help_text='HMAC-SHA256 of respondent email for indexed duplicate checks', max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='respondent_phone_hash',
+            field=models.CharField(blank=True, help_text='HMAC-SHA256 of respondent phone for indexed duplicate checks', max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['survey', 'respondent_email_hash'], name='surveys_resp_email_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['survey', 'respondent_phone_hash'], name='surveys_resp_phone_hash_idx'),
+        ),
+        migrations.RunPython(backfill_contact_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-15 23:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0023_response_contact_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyRollupState',
+            fields=[
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup_state', serialize=False, to='surveys.survey')),
+                ('built_at', models.DateTimeField(help_text='When the rollups were last rebuilt (or the survey created)')),
+                ('stale_at', models.DateTimeField(blank=True, help_text='Latest change the rollups missed since built_at; empty while they are in sync', null=True)),
+            ],
+            options={
+                'verbose_name': 'Rollup State',
+                'verbose_name_plural': 'Rollup States',
+                'db_table': 'surveys_rollup_state',
+            },
+        ),
+    ]
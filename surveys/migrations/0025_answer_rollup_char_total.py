@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-16 00:09
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_rollups_stale(apps, schema_editor):
+    """
+    Free-text rollups are now kept per length class with character totals,
+    so existing rollups must be rebuilt (rebuild_survey_rollups --stale).
+    """
+    SurveyRollupState = apps.get_model('surveys', 'SurveyRollupState')
+    SurveyRollupState.objects.filter(stale_at__isnull=True).update(stale_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0024_survey_rollup_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveyanswerrollup',
+            name='char_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_rollups_stale, migrations.RunPython.noop),
+    ]
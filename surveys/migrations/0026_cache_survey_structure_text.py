@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-16 00:15
+
+import surveys.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0025_answer_rollup_char_total'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='question',
+            name='options',
+            field=surveys.models.EncryptedTextField(blank=True, cache_plaintext=True, help_text='JSON array of options for choice questions (encrypted)'),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='text',
+            field=surveys.models.EncryptedTextField(cache_plaintext=True, help_text='Question text (encrypted)'),
+        ),
+        migrations.AlterField(
+            model_name='questionoption',
+            name='option_text',
+            field=surveys.models.EncryptedCharField(cache_plaintext=True, help_text='Option text (encrypted). For yes/no: "yes", "no", "نعم", "لا"', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='survey',
+            name='description',
+            field=surveys.models.EncryptedTextField(blank=True, cache_plaintext=True, help_text='Survey description (encrypted)'),
+        ),
+        migrations.AlterField(
+            model_name='survey',
+            name='title',
+            field=surveys.models.EncryptedCharField(cache_plaintext=True, help_text='Survey title (encrypted)', max_length=255),
+        ),
+    ]
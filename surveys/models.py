@@ -7,9 +7,13 @@ Oracle-compatible hash fields for filtering.
 """
 
 import hashlib
+import hmac
 import logging
 import uuid
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from .encryption import surveys_data_encryption
@@ -44,13 +48,28 @@ except ImportError:
 
 
 class EncryptedTextField(models.TextField):
-    """Custom text field that automatically encrypts/decrypts data for surveys"""
+    """
+    Custom text field that automatically encrypts/decrypts data for surveys.
+    
+    cache_plaintext=True keeps decrypted values in the shared decryption
+    cache; only set it on survey structure text, never on answers or PII.
+    """
+    
+    def __init__(self, *args, cache_plaintext=False, **kwargs):
+        self.cache_plaintext = cache_plaintext
+        super().__init__(*args, **kwargs)
+    
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.cache_plaintext:
+            kwargs['cache_plaintext'] = True
+        return name, path, args, kwargs
     
     def from_db_value(self, value, expression, connection):
-        if not value:
+        if not value or not surveys_data_encryption.is_encrypted(value):
             return value
         try:
-            return surveys_data_encryption.decrypt(value)
+            return surveys_data_encryption.decrypt(value, cache=self.cache_plaintext)
         except Exception as e:
             logger.error(f"Failed to decrypt text field: {e}")
             return value
@@ -59,14 +78,16 @@ class EncryptedTextField(models.TextField):
         if not value:
             return value
         if isinstance(value, str):
-            # Always decrypt string values to handle all scenarios
+            # Values that are not Fernet tokens are already plaintext
+            if not surveys_data_encryption.is_encrypted(value):
+                return value
             try:
-                return surveys_data_encryption.decrypt(value)
+                return surveys_data_encryption.decrypt(value, cache=self.cache_plaintext)
             except Exception as e:
                 logger.error(f"Failed to decrypt text field in to_python: {e}")
                 return value
         try:
-            return surveys_data_encryption.decrypt(value)
+            return surveys_data_encryption.decrypt(value, cache=self.cache_plaintext)
         except Exception as e:
             logger.error(f"Failed to decrypt text field in to_python: {e}")
             return value
@@ -85,13 +106,28 @@ class EncryptedTextField(models.TextField):
 
 
 class EncryptedCharField(models.CharField):
-    """Custom char field that automatically encrypts/decrypts data for surveys"""
+    """
+    Custom char field that automatically encrypts/decrypts data for surveys.
+    
+    cache_plaintext=True keeps decrypted values in the shared decryption
+    cache; only set it on survey structure text, never on answers or PII.
+    """
+    
+    def __init__(self, *args, cache_plaintext=False, **kwargs):
+        self.cache_plaintext = cache_plaintext
+        super().__init__(*args, **kwargs)
+    
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.cache_plaintext:
+            kwargs['cache_plaintext'] = True
+        return name, path, args, kwargs
     
     def from_db_value(self, value, expression, connection):
-        if not value:
+        if not value or not surveys_data_encryption.is_encrypted(value):
             return value
         try:
-            return surveys_data_encryption.decrypt(value)
+            return surveys_data_encryption.decrypt(value, cache=self.cache_plaintext)
         except Exception as e:
             logger.error(f"Failed to decrypt char field: {e}")
             return value
@@ -100,14 +136,16 @@ class EncryptedCharField(models.CharField):
         if not value:
             return value
         if isinstance(value, str):
-            # Always decrypt string values to handle all scenarios
+            # Values that are not Fernet tokens are already plaintext
+            if not surveys_data_encryption.is_encrypted(value):
+                return value
             try:
-                return surveys_data_encryption.decrypt(value)
+                return surveys_data_encryption.decrypt(value, cache=self.cache_plaintext)
             except Exception as e:
                 logger.error(f"Failed to decrypt char field in to_python: {e}")
                 return value
         try:
-            return surveys_data_encryption.decrypt(value)
+            return surveys_data_encryption.decrypt(value, cache=self.cache_plaintext)
         except Exception as e:
             logger.error(f"Failed to decrypt char field in to_python: {e}")
             return value
@@ -125,6 +163,79 @@ class EncryptedCharField(models.CharField):
             return value
 
 
+def contact_hash(value):
+    """
+    Keyed HMAC-SHA256 of a respondent email or phone number.
+    
+    Values are normalized first (trimmed; emails lower-cased) so lookups are
+    deterministic. The key is SURVEYS_CONTACT_HASH_KEY, falling back to
+    SECRET_KEY, so the hashes can't be reversed by hashing a list of known
+    contacts. Changing the key (including rotating SECRET_KEY while
+    SURVEYS_CONTACT_HASH_KEY is unset) requires
+    `backfill_contact_hashes --all`, or existing responses stop matching.
+    
+    Returns:
+        str: 64-character hex digest, or None for empty values
+    """
+    if not value:
+        return None
+    normalized = value.strip()
+    if '@' in normalized:
+        normalized = normalized.lower()
+    if not normalized:
+        return None
+    key = getattr(settings, 'SURVEYS_CONTACT_HASH_KEY', None) or settings.SECRET_KEY
+    return hmac.new(key.encode('utf-8'), normalized.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class EncryptedQuerySet(models.QuerySet):
+    """QuerySet with batch decryption for models that have encrypted fields."""
+    
+    def decrypted_values(self, *fields, flat=False):
+        """
+        Like values_list(), but encrypted columns are fetched raw and decrypted
+        in one batch per column instead of row by row in from_db_value.
+        
+        Args:
+            *fields: Field names to fetch
+            flat: Return single values instead of 1-tuples when one field is given
+            
+        Returns:
+            list: Rows as tuples (or values when flat=True)
+        """
+        if flat and len(fields) != 1:
+            raise TypeError("'flat' is not valid when decrypted_values is called with more than one field.")
+        
+        annotations = {}
+        names = []
+        encrypted_positions = []
+        for position, name in enumerate(fields):
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            if isinstance(field, (EncryptedTextField, EncryptedCharField)):
+                alias = f'_ciphertext_{name}'
+                # Plain output field, so the row-by-row from_db_value decryption is skipped
+                annotations[alias] = models.ExpressionWrapper(models.F(name), output_field=models.TextField())
+                names.append(alias)
+                encrypted_positions.append(position)
+            else:
+                names.append(name)
+        
+        queryset = self.annotate(**annotations) if annotations else self
+        rows = [list(row) for row in queryset.values_list(*names)]
+        
+        for position in encrypted_positions:
+            column = surveys_data_encryption.decrypt_many(row[position] for row in rows)
+            for row, value in zip(rows, column):
+                row[position] = value
+        
+        if flat:
+            return [row[0] for row in rows]
+        return [tuple(row) for row in rows]
+
+
 class Survey(models.Model):
     """
     Main survey model with four visibility levels:
@@ -149,6 +260,7 @@ class Survey(models.Model):
     )
     title = EncryptedCharField(
         max_length=255,
+        cache_plaintext=True,
         help_text='Survey title (encrypted)'
     )
     title_hash = models.CharField(
@@ -158,6 +270,7 @@ class Survey(models.Model):
     )
     description = EncryptedTextField(
         blank=True,
+        cache_plaintext=True,
         help_text='Survey description (encrypted)'
     )
     
@@ -405,7 +518,7 @@ class Question(models.Model):
         on_delete=models.CASCADE,
         related_name='questions'
     )
-    text = EncryptedTextField(help_text='Question text (encrypted)')
+    text = EncryptedTextField(cache_plaintext=True, help_text='Question text (encrypted)')
     text_hash = models.CharField(
         max_length=64,
         blank=True,
@@ -418,6 +531,7 @@ class Question(models.Model):
     )
     options = EncryptedTextField(
         blank=True,
+        cache_plaintext=True,
         help_text='JSON array of options for choice questions (encrypted)'
     )
     is_required = models.BooleanField(default=False)
@@ -645,6 +759,7 @@ class QuestionOption(models.Model):
     )
     option_text = EncryptedCharField(
         max_length=255,
+        cache_plaintext=True,
         help_text='Option text (encrypted). For yes/no: "yes", "no", "نعم", "لا"'
     )
     option_text_hash = models.CharField(
@@ -693,6 +808,31 @@ class QuestionOption(models.Model):
         super().save(*args, **kwargs)
 
 
+class ResponseQuerySet(models.QuerySet):
+    """QuerySet for responses with contact lookups through the hash indexes."""
+    
+    def with_contact(self, email=None, phone=None):
+        """
+        Filter responses by respondent email or phone via their HMAC hash columns.
+        
+        Uses the (survey, respondent_email_hash) and (survey, respondent_phone_hash)
+        indexes when combined with a survey filter. Email takes precedence.
+        Rows without a hash yet (saved before the columns existed and not
+        backfilled) are still matched exactly on the plaintext column.
+        """
+        if email:
+            return self.filter(
+                Q(respondent_email_hash=contact_hash(email)) |
+                Q(respondent_email_hash__isnull=True, respondent_email=email)
+            )
+        if phone:
+            return self.filter(
+                Q(respondent_phone_hash=contact_hash(phone)) |
+                Q(respondent_phone_hash__isnull=True, respondent_phone=phone)
+            )
+        return self.none()
+
+
 class Response(models.Model):
     """Survey response with encrypted answers"""
     
@@ -725,6 +865,18 @@ class Response(models.Model):
         blank=True,
         help_text='Phone for anonymous responses (when respondent is null)'
     )
+    respondent_email_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text='HMAC-SHA256 of respondent email for indexed duplicate checks'
+    )
+    respondent_phone_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text='HMAC-SHA256 of respondent phone for indexed duplicate checks'
+    )
     
     # Response metadata
     submitted_at = models.DateTimeField(auto_now_add=True)
@@ -739,6 +891,12 @@ class Response(models.Model):
         # Indexes are already created by migrations 0001_initial and 0005_add_unique_response_constraints
         # Note: Oracle doesn't support unique constraints with conditions
         # We'll handle uniqueness validation in the model's clean() method instead
+        indexes = [
+            models.Index(fields=['survey', 'respondent_email_hash'], name='surveys_resp_email_hash_idx'),
+            models.Index(fields=['survey', 'respondent_phone_hash'], name='surveys_resp_phone_hash_idx'),
+        ]
+    
+    objects = ResponseQuerySet.as_manager()
     
     def __str__(self):
         user_info = self.respondent.email if self.respondent else "Anonymous"
@@ -767,22 +925,22 @@ class Response(models.Model):
             if self.survey.public_contact_method == 'email' and self.respondent_email:
                 existing = Response.objects.filter(
                     survey=self.survey,
-                    respondent__isnull=True,
-                    respondent_email=self.respondent_email
-                ).exclude(pk=self.pk)
+                    respondent__isnull=True
+                ).with_contact(email=self.respondent_email).exclude(pk=self.pk)
                 if existing.exists():
                     raise ValidationError("A response has already been submitted with this email address.")
             elif self.survey.public_contact_method == 'phone' and self.respondent_phone:
                 existing = Response.objects.filter(
                     survey=self.survey,
-                    respondent__isnull=True,
-                    respondent_phone=self.respondent_phone
-                ).exclude(pk=self.pk)
+                    respondent__isnull=True
+                ).with_contact(phone=self.respondent_phone).exclude(pk=self.pk)
                 if existing.exists():
                     raise ValidationError("A response has already been submitted with this phone number.")
 
     def save(self, *args, **kwargs):
-        """Override save to call clean validation."""
+        """Override save to generate contact hashes and call clean validation."""
+        self.respondent_email_hash = contact_hash(self.respondent_email)
+        self.respondent_phone_hash = contact_hash(self.respondent_phone)
         self.clean()
         super().save(*args, **kwargs)
 
@@ -942,6 +1100,8 @@ class Answer(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = EncryptedQuerySet.as_manager()
+    
     class Meta:
         db_table = 'surveys_answer'
         verbose_name = 'Answer'
@@ -953,6 +1113,130 @@ class Answer(models.Model):
         return f"Answer to {self.question.text[:30]}..."
 
 
+class SurveyResponseRollup(models.Model):
+    """
+    Hourly response counters per survey, maintained on every submission.
+
+    Analytics dashboards read these instead of rescanning every response.
+    Rows are keyed by the UTC hour the responses were submitted in.
+    """
+
+    survey = models.ForeignKey(
+        Survey,
+        on_delete=models.CASCADE,
+        related_name='response_rollups'
+    )
+    bucket_start = models.DateTimeField(help_text='Start of the UTC hour this bucket covers')
+    is_complete = models.BooleanField(default=True)
+    response_count = models.PositiveIntegerField(default=0)
+    authenticated_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'surveys_response_rollup'
+        verbose_name = 'Response Rollup'
+        verbose_name_plural = 'Response Rollups'
+        ordering = ['survey', 'bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['survey', 'bucket_start', 'is_complete'],
+                name='unique_response_rollup_bucket'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.survey_id} @ {self.bucket_start:%Y-%m-%d %H:00}: {self.response_count}"
+
+
+class SurveyAnswerRollup(models.Model):
+    """
+    Hourly per-question answer tallies, one row per distinct answer value.
+
+    Free-text answers are not tallied by value: they share one row per length
+    class (blank, short, medium, long; see analytics_engine.text_length_class)
+    with the class as value, and accumulate their word and character counts
+    instead.
+    """
+
+    survey = models.ForeignKey(
+        Survey,
+        on_delete=models.CASCADE,
+        related_name='answer_rollups'
+    )
+    question = models.ForeignKey(
+        Question,
+        on_delete=models.CASCADE,
+        related_name='answer_rollups'
+    )
+    bucket_start = models.DateTimeField(help_text='Start of the UTC hour this bucket covers')
+    is_complete = models.BooleanField(default=True)
+    value = EncryptedTextField(
+        blank=True,
+        default='',
+        help_text='Answer value (encrypted)'
+    )
+    value_hash = models.CharField(
+        max_length=64,
+        help_text='SHA256 hash of the answer value for Oracle-compatible matching'
+    )
+    answer_count = models.PositiveIntegerField(default=0)
+    word_total = models.PositiveIntegerField(default=0)
+    char_total = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = EncryptedQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'surveys_answer_rollup'
+        verbose_name = 'Answer Rollup'
+        verbose_name_plural = 'Answer Rollups'
+        ordering = ['survey', 'question', 'bucket_start']
+        indexes = [
+            models.Index(fields=['survey', 'bucket_start'], name='surveys_ans_rollup_bucket_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['question', 'bucket_start', 'is_complete', 'value_hash'],
+                name='unique_answer_rollup_value'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.question_id} @ {self.bucket_start:%Y-%m-%d %H:00}: {self.answer_count}"
+
+
+class SurveyRollupState(models.Model):
+    """
+    Watermarks telling whether a survey's rollups can be served.
+
+    Rollups are usable while stale_at is empty: built_at records when they
+    were last rebuilt from the raw responses, stale_at the latest change they
+    missed since (a deleted response, an answer saved outside a submission,
+    a failed rollup update).
+    """
+
+    survey = models.OneToOneField(
+        Survey,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rollup_state'
+    )
+    built_at = models.DateTimeField(help_text='When the rollups were last rebuilt (or the survey created)')
+    stale_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Latest change the rollups missed since built_at; empty while they are in sync'
+    )
+
+    class Meta:
+        db_table = 'surveys_rollup_state'
+        verbose_name = 'Rollup State'
+        verbose_name_plural = 'Rollup States'
+
+    def __str__(self):
+        return f"{self.survey_id}: {'stale' if self.stale_at else 'in sync'} (built {self.built_at:%Y-%m-%d %H:%M})"
+
+
 class PublicAccessToken(models.Model):
     """
     Public access tokens for surveys to enable anonymous access.
@@ -1066,18 +1350,33 @@ class PublicAccessToken(models.Model):
             return True  # No password required
         return self.password == password
     
+    def _restricted_contact_sets(self):
+        """
+        Parse the restriction lists once into (email_set, phone_set).
+        
+        Emails are lower-cased for case-insensitive matching. The result is
+        memoized per instance and invalidated when the raw columns change.
+        """
+        raw = (self.restricted_email, self.restricted_phone)
+        cached = getattr(self, '_contact_sets_cache', None)
+        if cached is None or cached[0] != raw:
+            emails = frozenset(email.lower() for email in self.get_restricted_emails())
+            phones = frozenset(self.get_restricted_phones())
+            cached = (raw, emails, phones)
+            self._contact_sets_cache = cached
+        return cached[1], cached[2]
+    
     def validate_contact(self, email=None, phone=None):
         """Validate the provided contact info against restrictions"""
-        if not self.is_contact_restricted():
-            return True  # No contact restrictions
+        # Get the restricted sets (parsed once per token instance)
+        restricted_emails, restricted_phones = self._restricted_contact_sets()
         
-        # Get the restricted lists
-        restricted_emails = self.get_restricted_emails()
-        restricted_phones = self.get_restricted_phones()
+        if not (restricted_emails or restricted_phones):
+            return True  # No contact restrictions
         
         # If there are restricted emails, check email validation
         if restricted_emails:
-            if email and email.lower() in [e.lower() for e in restricted_emails]:
+            if email and email.lower() in restricted_emails:
                 return True  # Email matches restriction
             elif not restricted_phones:
                 # Only emails are restricted and email doesn't match
@@ -1093,7 +1392,7 @@ class PublicAccessToken(models.Model):
         
         # If both emails and phones are restricted, at least one must match
         if restricted_emails and restricted_phones:
-            email_valid = email and email.lower() in [e.lower() for e in restricted_emails]
+            email_valid = email and email.lower() in restricted_emails
             phone_valid = phone and phone in restricted_phones
             return email_valid or phone_valid
         
@@ -0,0 +1,521 @@
+# surveys/rollups.py
+"""
+Incremental analytics rollups for survey dashboards.
+
+Every submission bumps hourly counters (SurveyResponseRollup) and per-value
+answer tallies (SurveyAnswerRollup) so the analytics dashboard can be served
+from O(buckets) rows instead of rescanning and decrypting every response.
+The counters are bumped after the submission commits, each in its own short
+transaction, so submissions never hold rollup row locks while they write.
+
+The rollups are a cache of the raw tables. SurveyRollupState keeps their
+watermarks: built_at (last rebuild, or survey creation) and stale_at (the
+latest change they missed: a deleted response, an answer saved outside a
+submission, a failed rollup update).
+While a survey is stale its dashboards fall back to the raw
+SurveyResponseFrame; marking it stale enqueues a background rebuild, and the
+rebuild_survey_rollups command rebuilds stale or never-built surveys. Reads
+only check the watermarks and never repair the rollups themselves.
+"""
+
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .analytics_engine import ANONYMOUS_RESPONDENT, QuestionAnswers, SurveyResponseFrame, text_length_class
+from .models import Answer, Response, SurveyAnswerRollup, SurveyResponseRollup, SurveyRollupState
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+
+# Wait before rebuilding again rollups that changed during a rebuild
+REBUILD_RETRY_DELAY = timedelta(minutes=5)
+
+# Responses submitted this long before a rebuild may still have their
+# after-commit tallies in flight, so the rebuild doesn't count them as settled
+REBUILD_SETTLE_TIME = timedelta(seconds=30)
+
+# Answers to these question types are tallied by length class instead of by value
+FREE_TEXT_TYPES = ('text', 'textarea')
+
+
+def bucket_start(moment):
+    """Start of the UTC hour containing a moment."""
+    moment = moment.astimezone(dt_timezone.utc)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def is_bucket_aligned(moment):
+    """True when a datetime falls exactly on a bucket boundary."""
+    return moment is None or moment.timestamp() % BUCKET_SECONDS == 0
+
+
+def _value_key(question_type, answer_text):
+    """
+    Return (value, value_hash, words, chars) for an answer's rollup row.
+
+    Free text is keyed by its length class ('' when blank), so the text
+    itself never reaches the rollups.
+    """
+    answer_text = answer_text if answer_text is not None else ''
+    if question_type in FREE_TEXT_TYPES:
+        length_class = text_length_class(answer_text)
+        chars = len(answer_text) if length_class else 0
+        value_hash = hashlib.sha256(length_class.encode('utf-8')).hexdigest()
+        return length_class, value_hash, len(answer_text.split()), chars
+    return answer_text, hashlib.sha256(answer_text.encode('utf-8')).hexdigest(), 0, 0
+
+
+# ----------------------------------------------------------------------
+# Write path
+# ----------------------------------------------------------------------
+
+def record_response(response):
+    """
+    Count a newly created response in its hourly bucket.
+
+    Called once the response is committed (see surveys.signals).
+
+    Args:
+        response: Response instance that was just saved
+    """
+    bucket = bucket_start(response.submitted_at)
+    authenticated = 1 if response.respondent_id else 0
+    lookup = {'survey_id': response.survey_id, 'bucket_start': bucket, 'is_complete': response.is_complete}
+    increments = {
+        'response_count': F('response_count') + 1,
+        'authenticated_count': F('authenticated_count') + authenticated,
+    }
+
+    with transaction.atomic():
+        if SurveyResponseRollup.objects.filter(**lookup).update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                SurveyResponseRollup.objects.create(
+                    response_count=1, authenticated_count=authenticated, **lookup
+                )
+        except IntegrityError:
+            # Another submission created the bucket first
+            SurveyResponseRollup.objects.filter(**lookup).update(**increments)
+
+
+def record_answers(response, answers):
+    """
+    Add a response's answers to the per-question value tallies.
+
+    Called once the submission is committed. Existing rows are locked and
+    updated in one bulk_update; new values are inserted with one bulk_create.
+    A concurrent insert of the same value is retried once against the
+    now-existing row. Failures are logged, never raised: a missed tally marks
+    the rollups stale until they are rebuilt.
+
+    Args:
+        response: Response the answers belong to
+        answers: iterable of Answer instances (with question loaded)
+    """
+    tallies = {}
+    for answer in answers:
+        value, value_hash, words, chars = _value_key(answer.question.question_type, answer.answer_text)
+        key = (answer.question_id, value_hash)
+        entry = tallies.setdefault(key, [value, 0, 0, 0])
+        entry[1] += 1
+        entry[2] += words
+        entry[3] += chars
+
+    if not tallies:
+        return
+
+    bucket = bucket_start(response.submitted_at)
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                _apply_answer_tallies(response.survey_id, bucket, response.is_complete, tallies)
+            return
+        except IntegrityError:
+            if not attempt:
+                logger.info(f"Answer rollup race for survey {response.survey_id}, retrying")
+                continue
+            logger.error(f"Failed to update answer rollups for response {response.id}")
+        except Exception as e:
+            logger.error(f"Failed to update answer rollups for response {response.id}: {e}")
+            break
+    try:
+        mark_stale(response.survey_id)
+    except Exception as e:
+        logger.error(f"Failed to mark analytics rollups stale for survey {response.survey_id}: {e}")
+
+
+def _apply_answer_tallies(survey_id, bucket, is_complete, tallies):
+    """Merge {(question_id, value_hash): [value, count, words, chars]} into one bucket."""
+    existing = SurveyAnswerRollup.objects.select_for_update().filter(
+        question_id__in={question_id for question_id, _ in tallies},
+        bucket_start=bucket,
+        is_complete=is_complete,
+        value_hash__in={value_hash for _, value_hash in tallies},
+    ).only('id', 'question_id', 'value_hash', 'answer_count', 'word_total', 'char_total')
+
+    to_update = []
+    seen = set()
+    for row in existing:
+        key = (row.question_id, row.value_hash)
+        if key not in tallies:
+            continue
+        _, count, words, chars = tallies[key]
+        row.answer_count += count
+        row.word_total += words
+        row.char_total += chars
+        to_update.append(row)
+        seen.add(key)
+
+    to_create = [
+        SurveyAnswerRollup(
+            survey_id=survey_id,
+            question_id=question_id,
+            bucket_start=bucket,
+            is_complete=is_complete,
+            value=value,
+            value_hash=value_hash,
+            answer_count=count,
+            word_total=words,
+            char_total=chars,
+        )
+        for (question_id, value_hash), (value, count, words, chars) in tallies.items()
+        if (question_id, value_hash) not in seen
+    ]
+
+    if to_update:
+        SurveyAnswerRollup.objects.bulk_update(to_update, ['answer_count', 'word_total', 'char_total'])
+    if to_create:
+        SurveyAnswerRollup.objects.bulk_create(to_create)
+
+
+def start_survey_rollups(survey):
+    """Mark the (empty) rollups of a new survey as in sync."""
+    SurveyRollupState.objects.get_or_create(survey=survey, defaults={'built_at': timezone.now()})
+
+
+def mark_stale(survey_id, delay=None):
+    """
+    Record that a survey's rollups missed a change.
+
+    Dashboards use the raw responses until the rollups are rebuilt. The
+    first change after a rebuild enqueues the background rebuild; later ones
+    only move stale_at forward, which the running rebuild checks.
+
+    Args:
+        survey_id: ID of the survey
+        delay: Optional timedelta before the rebuild may run
+    """
+    from notifications import jobs
+
+    now = timezone.now()
+    if SurveyRollupState.objects.filter(survey_id=survey_id, stale_at__isnull=True).update(stale_at=now):
+        jobs.enqueue(
+            'surveys.rebuild_rollups',
+            {'survey_id': str(survey_id)},
+            idempotency_key=f"survey_rollups:{survey_id}:{now.timestamp()}",
+            delay=delay
+        )
+    else:
+        SurveyRollupState.objects.filter(survey_id=survey_id).update(stale_at=now)
+
+
+def discard_survey_rollups(survey_id):
+    """Drop a survey's rollup rows."""
+    SurveyResponseRollup.objects.filter(survey_id=survey_id).delete()
+    SurveyAnswerRollup.objects.filter(survey_id=survey_id).delete()
+
+
+# ----------------------------------------------------------------------
+# Rebuild / verification
+# ----------------------------------------------------------------------
+
+def compute_rollups(frame):
+    """
+    Aggregate a full SurveyResponseFrame into unsaved rollup rows.
+
+    Returns:
+        (response_rollups, answer_rollups) lists of model instances
+    """
+    survey_id = frame.survey.id
+    buckets = [bucket_start(moment) for moment in frame.submitted_at]
+
+    response_counts = defaultdict(lambda: [0, 0])
+    authenticated = frame.authenticated
+    for row, bucket in enumerate(buckets):
+        entry = response_counts[(bucket, bool(frame.is_complete[row]))]
+        entry[0] += 1
+        entry[1] += int(authenticated[row])
+
+    response_rollups = [
+        SurveyResponseRollup(
+            survey_id=survey_id, bucket_start=bucket, is_complete=is_complete,
+            response_count=count, authenticated_count=auth_count,
+        )
+        for (bucket, is_complete), (count, auth_count) in response_counts.items()
+    ]
+
+    answer_rollups = []
+    for question in frame.questions:
+        column = frame.answers(question.id)
+        tallies = {}
+        for row, text in zip(column.rows, column.texts):
+            value, value_hash, words, chars = _value_key(question.question_type, text)
+            key = (buckets[row], bool(frame.is_complete[row]), value_hash)
+            entry = tallies.setdefault(key, [value, 0, 0, 0])
+            entry[1] += 1
+            entry[2] += words
+            entry[3] += chars
+        answer_rollups.extend(
+            SurveyAnswerRollup(
+                survey_id=survey_id, question_id=question.id, bucket_start=bucket,
+                is_complete=is_complete, value=value, value_hash=value_hash,
+                answer_count=count, word_total=words, char_total=chars,
+            )
+            for (bucket, is_complete, value_hash), (value, count, words, chars) in tallies.items()
+        )
+
+    return response_rollups, answer_rollups
+
+
+def rebuild_survey_rollups(survey):
+    """
+    Replace a survey's rollups with totals computed from the raw responses.
+
+    The rebuild watermark is taken before the responses are read. The rollups
+    are marked in sync only if nothing changed after it: a response deleted
+    meanwhile (stale_at moved past it) or submitted meanwhile (it may have
+    been counted twice or not at all; this includes responses submitted up to
+    REBUILD_SETTLE_TIME before, whose tallies run after they commit) leaves
+    them stale and enqueues another rebuild after REBUILD_RETRY_DELAY, so
+    busy surveys are not rebuilt in a loop.
+
+    Args:
+        survey: Survey instance
+
+    Returns:
+        (response_rollup_count, answer_rollup_count)
+    """
+    built_at = timezone.now()
+    frame = SurveyResponseFrame.load(survey)
+
+    response_rollups, answer_rollups = compute_rollups(frame)
+    with transaction.atomic():
+        discard_survey_rollups(survey.id)
+        SurveyResponseRollup.objects.bulk_create(response_rollups, batch_size=500)
+        SurveyAnswerRollup.objects.bulk_create(answer_rollups, batch_size=500)
+
+        state, _ = SurveyRollupState.objects.select_for_update().get_or_create(
+            survey=survey, defaults={'built_at': built_at}
+        )
+        submitted_meanwhile = Response.objects.filter(
+            survey=survey, submitted_at__gte=built_at - REBUILD_SETTLE_TIME
+        ).exists()
+        in_sync = not submitted_meanwhile and (state.stale_at is None or state.stale_at < built_at)
+        state.built_at = built_at
+        state.stale_at = None
+        state.save(update_fields=['built_at', 'stale_at'])
+        if not in_sync:
+            mark_stale(survey.id, delay=REBUILD_RETRY_DELAY)
+
+    logger.info(
+        f"Rebuilt rollups for survey {survey.id}: "
+        f"{len(response_rollups)} response buckets, {len(answer_rollups)} answer tallies"
+        f"{'' if in_sync else ' (changed meanwhile, rebuilding again)'}"
+    )
+    return len(response_rollups), len(answer_rollups)
+
+
+def verify_survey_rollups(survey):
+    """
+    Compare stored rollups with totals recomputed from the raw responses.
+
+    Returns:
+        list of human-readable mismatch descriptions (empty when consistent)
+    """
+    expected_responses, expected_answers = compute_rollups(SurveyResponseFrame.load(survey))
+
+    def response_key(row):
+        return (row.bucket_start, row.is_complete)
+
+    def answer_key(row):
+        return (row.question_id, row.bucket_start, row.is_complete, row.value_hash)
+
+    mismatches = []
+    stored = {
+        response_key(row): (row.response_count, row.authenticated_count)
+        for row in SurveyResponseRollup.objects.filter(survey=survey)
+    }
+    expected = {
+        response_key(row): (row.response_count, row.authenticated_count)
+        for row in expected_responses
+    }
+    for key in sorted(set(stored) | set(expected)):
+        if stored.get(key) != expected.get(key):
+            mismatches.append(
+                f"responses {key[0]:%Y-%m-%d %H:00} complete={key[1]}: "
+                f"stored={stored.get(key)} expected={expected.get(key)}"
+            )
+
+    stored = {
+        answer_key(row): (row.answer_count, row.word_total, row.char_total)
+        for row in SurveyAnswerRollup.objects.filter(survey=survey).defer('value')
+    }
+    expected = {answer_key(row): (row.answer_count, row.word_total, row.char_total) for row in expected_answers}
+    for key in set(stored) | set(expected):
+        if stored.get(key) != expected.get(key):
+            mismatches.append(
+                f"answers question={key[0]} {key[1]:%Y-%m-%d %H:00} complete={key[2]}: "
+                f"stored={stored.get(key)} expected={expected.get(key)}"
+            )
+
+    return mismatches
+
+
+# ----------------------------------------------------------------------
+# Read path
+# ----------------------------------------------------------------------
+
+class RollupResponseFrame(SurveyResponseFrame):
+    """
+    SurveyResponseFrame assembled from rollup rows.
+
+    Each row is a (bucket, is_complete, authenticated) group weighted by its
+    response count, and answers are distinct values weighted by their tally
+    (free-text answers: length classes with word and character totals).
+    Per-respondent columns (ids, contacts) are not available.
+    """
+
+    def __init__(self, *args, start=None, end=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def load(cls, survey, start=None, end=None, tz=None):
+        """
+        Build a frame from the survey's rollups, or return None when they can't be used.
+
+        Rollups are used only when their watermarks say they are in sync with
+        the raw tables, the requested range falls on bucket boundaries, and
+        (when given) the timezone shifts every bucket by whole hours.
+        """
+        if start is not None and timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if end is not None and timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        if not (is_bucket_aligned(start) and is_bucket_aligned(end)):
+            return None
+
+        if not SurveyRollupState.objects.filter(survey=survey, stale_at__isnull=True).exists():
+            return None
+
+        response_rows = SurveyResponseRollup.objects.filter(survey=survey)
+        answer_rows = SurveyAnswerRollup.objects.filter(survey=survey)
+        if start:
+            response_rows = response_rows.filter(bucket_start__gte=start)
+            answer_rows = answer_rows.filter(bucket_start__gte=start)
+        if end:
+            # end is exclusive, as for raw rows, so the bucket starting at end is left out
+            response_rows = response_rows.filter(bucket_start__lt=end)
+            answer_rows = answer_rows.filter(bucket_start__lt=end)
+
+        submitted_at, is_complete, respondent_ids, weights = [], [], [], []
+        position = {}
+        for bucket, complete, count, auth_count in response_rows.order_by('bucket_start', 'is_complete').values_list(
+            'bucket_start', 'is_complete', 'response_count', 'authenticated_count'
+        ):
+            position[(bucket, complete)] = len(submitted_at)
+            # One row for authenticated and one for anonymous respondents in the bucket;
+            # answers point at the first, which shares its time and completion flag
+            for respondent, weight in ((0, auth_count), (ANONYMOUS_RESPONDENT, count - auth_count)):
+                if weight > 0:
+                    submitted_at.append(bucket)
+                    is_complete.append(complete)
+                    respondent_ids.append(respondent)
+                    weights.append(weight)
+
+        if tz is not None and any(
+            moment.astimezone(tz).utcoffset().total_seconds() % BUCKET_SECONDS for moment in set(submitted_at)
+        ):
+            return None
+
+        grouped = {}
+        for question_id, bucket, complete, value, count, words, chars in answer_rows.order_by('id').decrypted_values(
+            'question_id', 'bucket_start', 'is_complete', 'value', 'answer_count', 'word_total', 'char_total'
+        ):
+            row = position.get((bucket, complete))
+            if row is None:
+                continue
+            columns = grouped.setdefault(question_id, ([], [], [], [], []))
+            columns[0].append(row)
+            columns[1].append(value if value is not None else '')
+            columns[2].append(count)
+            columns[3].append(words)
+            columns[4].append(chars)
+
+        answers = {
+            question_id: QuestionAnswers(
+                np.array(rows, dtype=np.int64),
+                np.array(texts, dtype=object),
+                np.array(counts, dtype=np.int64),
+                np.array(words, dtype=np.int64),
+                np.array(chars, dtype=np.int64),
+            )
+            for question_id, (rows, texts, counts, words, chars) in grouped.items()
+        }
+
+        row_count = len(submitted_at)
+        return cls(
+            survey=survey,
+            questions=list(survey.questions.all().order_by('order')),
+            response_ids=[],
+            submitted_at=submitted_at,
+            respondent_ids=np.array(respondent_ids, dtype=np.int64),
+            is_complete=np.array(is_complete, dtype=bool),
+            emails=np.full(row_count, None, dtype=object),
+            phones=np.full(row_count, None, dtype=object),
+            answers=answers,
+            weights=np.array(weights, dtype=np.int64),
+            start=start,
+            end=end,
+        )
+
+    def raw_answers(self, question_id):
+        """A question's raw answers in the frame's range, in answer order."""
+        answers = Answer.objects.filter(question_id=question_id)
+        if self.start:
+            answers = answers.filter(response__submitted_at__gte=self.start)
+        if self.end:
+            answers = answers.filter(response__submitted_at__lt=self.end)
+        return answers.order_by('id')
+
+    def sample_texts(self, question_id, limit):
+        """Free text is not kept in rollups, so read the first few answers directly."""
+        texts = self.raw_answers(question_id)[:limit].decrypted_values('answer_text', flat=True)
+        return [text for text in texts if text and text.strip()]
+
+
+def load_dashboard_frame(survey, start=None, end=None, tz=None):
+    """
+    Frame for the analytics dashboards: rollups when usable, raw rows otherwise.
+
+    Stale rollups are not repaired here; see mark_stale() and the
+    rebuild_survey_rollups command.
+    """
+    try:
+        frame = RollupResponseFrame.load(survey, start=start, end=end, tz=tz)
+    except Exception as e:
+        logger.error(f"Error loading analytics rollups for survey {survey.id}: {e}")
+        frame = None
+    if frame is not None:
+        return frame
+    return SurveyResponseFrame.load(survey, start=start, end=end)
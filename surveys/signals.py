@@ -3,18 +3,24 @@ Django signals for automatic notification triggering.
 
 This module contains signal handlers that automatically create and send
 notifications when certain survey events occur, such as surveys being
-shared, published, or responses being completed.
+shared, published, or responses being completed. The notifications are
+created by background jobs (surveys.tasks) enqueued in the triggering
+transaction.
 """
 
 import logging
-from django.db.models.signals import post_save, m2m_changed, pre_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
-from .models import Survey, Response
-from notifications.services import NotificationService, SurveyNotificationService
+from .models import Survey, Response, Answer
+from . import access, rollups
+from notifications import jobs
+from notifications.services import NotificationService
 from notifications.models import Notification
+from authentication.models import UserGroup
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -45,13 +51,14 @@ def track_survey_changes(sender, instance, **kwargs):
 
 
 @receiver(m2m_changed, sender=Survey.shared_with.through)
-def survey_shared_notification(sender, instance, action, pk_set, **kwargs):
+def survey_shared_notification(sender, instance, action, pk_set, reverse, **kwargs):
     """
     Send notifications when a survey is shared with users.
     
     This signal is triggered when users are added to a survey's shared_with field.
+    Notifications are sent by a background job once the transaction commits.
     """
-    if action == 'post_add' and pk_set:
+    if action == 'post_add' and pk_set and not reverse:
         survey = instance
         
         # Only send notifications for submitted surveys
@@ -59,41 +66,24 @@ def survey_shared_notification(sender, instance, action, pk_set, **kwargs):
             logger.debug(f"Skipping notification for draft survey {survey.id}")
             return
         
-        # Get the newly added users
-        new_users = User.objects.filter(pk__in=pk_set)
-        
-        # Create survey URL
-        survey_url = f"/surveys/{survey.id}/"
-        
-        # Send notification to each newly shared user
-        for user in new_users:
-            try:
-                NotificationService.create_survey_assigned_notification(
-                    recipient=user,
-                    survey_title=survey.title,
-                    sender=survey.creator,
-                    survey_id=str(survey.id),
-                    survey_url=survey_url
-                )
-                logger.info(
-                    f"Sent survey assigned notification to {user.email} "
-                    f"for survey {survey.id}"
-                )
-            except Exception as e:
-                logger.error(
-                    f"Failed to send survey assigned notification to {user.email} "
-                    f"for survey {survey.id}: {str(e)}"
-                )
+        try:
+            jobs.enqueue('surveys.notify_shared_users', {
+                'survey_id': str(survey.id),
+                'user_ids': sorted(pk_set)
+            })
+        except Exception as e:
+            logger.error(f"Failed to queue survey assigned notifications for survey {survey.id}: {str(e)}")
 
 
 @receiver(m2m_changed, sender=Survey.shared_with_groups.through)
-def survey_shared_with_groups_notification(sender, instance, action, pk_set, **kwargs):
+def survey_shared_with_groups_notification(sender, instance, action, pk_set, reverse, **kwargs):
     """
     Send notifications when a survey is shared with groups.
     
     This signal is triggered when groups are added to a survey's shared_with_groups field.
+    Notifications are sent by a background job once the transaction commits.
     """
-    if action == 'post_add' and pk_set:
+    if action == 'post_add' and pk_set and not reverse:
         survey = instance
         
         # Only send notifications for submitted surveys
@@ -101,41 +91,13 @@ def survey_shared_with_groups_notification(sender, instance, action, pk_set, **k
             logger.debug(f"Skipping group notification for draft survey {survey.id}")
             return
         
-        # Get the newly added groups and their users
         try:
-            from authentication.models import Group
-            new_groups = Group.objects.filter(pk__in=pk_set)
-            
-            # Create survey URL
-            survey_url = f"/surveys/{survey.id}/"
-            
-            # Send notification to each user in the newly shared groups
-            for group in new_groups:
-                group_users = group.users.all()
-                
-                for user in group_users:
-                    try:
-                        NotificationService.create_survey_assigned_notification(
-                            recipient=user,
-                            survey_title=survey.title,
-                            sender=survey.creator,
-                            survey_id=str(survey.id),
-                            survey_url=survey_url
-                        )
-                        logger.info(
-                            f"Sent survey assigned notification to {user.email} "
-                            f"for survey {survey.id} (via group {group.name})"
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to send survey assigned notification to {user.email} "
-                            f"for survey {survey.id} via group {group.name}: {str(e)}"
-                        )
-                        
-        except ImportError:
-            logger.error("Could not import Group model from authentication app")
+            jobs.enqueue('surveys.notify_shared_groups', {
+                'survey_id': str(survey.id),
+                'group_ids': sorted(pk_set)
+            })
         except Exception as e:
-            logger.error(f"Error processing group notifications for survey {survey.id}: {str(e)}")
+            logger.error(f"Failed to queue group notifications for survey {survey.id}: {str(e)}")
 
 
 @receiver(post_save, sender=Survey)
@@ -147,6 +109,8 @@ def survey_status_change_notification(sender, instance, created, **kwargs):
     - New surveys being published (draft -> submitted)
     - Surveys being activated/deactivated
     - Survey visibility changes
+    
+    Notifications are sent by background jobs once the transaction commits.
     """
     try:
         survey = instance
@@ -167,42 +131,27 @@ def survey_status_change_notification(sender, instance, created, **kwargs):
         
         # Check for survey being published (draft -> submitted)
         if old_status == 'draft' and survey.status == 'submitted' and survey.is_active:
-            logger.info(f"Survey {survey.id} was published, sending availability notifications")
-            try:
-                SurveyNotificationService.notify_users_of_new_survey(survey)
-            except Exception as e:
-                logger.error(f"Failed to send publication notifications for survey {survey.id}: {e}")
+            logger.info(f"Survey {survey.id} was published, queueing availability notifications")
+            jobs.enqueue('surveys.notify_new_survey', {'survey_id': str(survey.id)})
         
         # Check for survey being deactivated
         elif old_is_active == True and survey.is_active == False:
-            logger.info(f"Survey {survey.id} was deactivated, sending deactivation notifications")
-            try:
-                # We need to get the user who made this change - this is tricky from a signal
-                # For now, we'll use the survey creator as the deactivator
-                # In a real implementation, you might want to pass this through the request context
-                SurveyNotificationService.notify_users_of_survey_deactivation(
-                    survey, 
-                    survey.creator  # Using creator as fallback deactivator
-                )
-            except Exception as e:
-                logger.error(f"Failed to send deactivation notifications for survey {survey.id}: {e}")
+            logger.info(f"Survey {survey.id} was deactivated, queueing deactivation notifications")
+            # We need to get the user who made this change - this is tricky from a signal
+            # For now, we'll use the survey creator as the deactivator
+            # In a real implementation, you might want to pass this through the request context
+            jobs.enqueue('surveys.notify_survey_deactivated', {'survey_id': str(survey.id)})
         
         # Check for survey being reactivated after publication
         elif old_is_active == False and survey.is_active == True and survey.status == 'submitted':
-            logger.info(f"Survey {survey.id} was reactivated, sending availability notifications")
-            try:
-                SurveyNotificationService.notify_users_of_new_survey(survey)
-            except Exception as e:
-                logger.error(f"Failed to send reactivation notifications for survey {survey.id}: {e}")
+            logger.info(f"Survey {survey.id} was reactivated, queueing availability notifications")
+            jobs.enqueue('surveys.notify_new_survey', {'survey_id': str(survey.id)})
         
         # Check for visibility changes
         elif old_visibility and old_visibility != survey.visibility and survey.status == 'submitted' and survey.is_active:
             logger.info(f"Survey {survey.id} visibility changed from {old_visibility} to {survey.visibility}")
-            try:
-                # Send notifications to newly eligible users
-                SurveyNotificationService.notify_users_of_new_survey(survey)
-            except Exception as e:
-                logger.error(f"Failed to send visibility change notifications for survey {survey.id}: {e}")
+            # Send notifications to newly eligible users
+            jobs.enqueue('surveys.notify_new_survey', {'survey_id': str(survey.id)})
                 
     except Exception as e:
         logger.error(f"Error processing survey status change notification for survey {instance.pk}: {e}")
@@ -213,103 +162,129 @@ def survey_response_completed_notification(sender, instance, created, **kwargs):
     """
     Send notification to survey creator when a response is completed.
     
-    This signal is triggered when a new response is created.
+    This signal is triggered when a new response is created. The creator and
+    the users the survey is shared with are notified by a background job once
+    the transaction commits.
     """
     if created and instance.is_complete:
-        response = instance
-        survey = response.survey
-        
-        # Get respondent information
-        if response.respondent:
-            respondent_name = (
-                response.respondent.full_name or 
-                response.respondent.username or 
-                response.respondent.email
-            )
-        else:
-            # Anonymous respondent
-            respondent_name = (
-                response.respondent_email or 
-                response.respondent_phone or 
-                "Anonymous User"
-            )
-        
-        # Create survey results URL
-        survey_url = f"/surveys/{survey.id}/results/"
-        
-        # Send notification to survey creator
         try:
-            # Only send notification if the creator still exists
-            if survey.creator:
-                NotificationService.create_survey_completed_notification(
-                    recipient=survey.creator,
-                    survey_title=survey.title,
-                    respondent_name=respondent_name,
-                    survey_id=str(survey.id),
-                    survey_url=survey_url
-                )
-                logger.info(
-                    f"Sent survey completed notification to {survey.creator.email} "
-                    f"for response {response.id} to survey {survey.id}"
-                )
-            else:
-                logger.info(
-                    f"Skipped survey completed notification for deleted user "
-                    f"for response {response.id} to survey {survey.id}"
-                )
+            jobs.enqueue(
+                'surveys.notify_response_completed',
+                {'response_id': str(instance.id)},
+                idempotency_key=f"survey_response_completed:{instance.id}"
+            )
         except Exception as e:
-            creator_email = survey.creator.email if survey.creator else 'Deleted User'
             logger.error(
-                f"Failed to send survey completed notification to {creator_email} "
-                f"for response {response.id} to survey {survey.id}: {str(e)}"
+                f"Failed to queue survey completed notifications "
+                f"for response {instance.id} to survey {instance.survey_id}: {str(e)}"
             )
-        
-        # Also notify users who are shared with the survey (if they want completion notifications)
+
+
+@receiver(post_save, sender=Response)
+def record_response_rollup(sender, instance, created, **kwargs):
+    """
+    Count a new response in the survey's analytics rollups once it commits.
+    
+    The shared hourly counter is updated outside the submission's
+    transaction, so a burst of submissions doesn't queue on its row lock.
+    Answers are added separately by the submission views once they exist.
+    """
+    if not created:
+        return
+    
+    def record():
         try:
-            # Get users who have completion notifications enabled for this survey
-            shared_users = survey.shared_with.all()
-            
-            for shared_user in shared_users:
-                # Check user preferences - only send if they want survey completion notifications
-                try:
-                    from notifications.models import NotificationPreference
-                    prefs = NotificationPreference.objects.get(user=shared_user)
-                    
-                    # Only send if user wants survey completed notifications
-                    if prefs.survey_completed:
-                        NotificationService.create_survey_completed_notification(
-                            recipient=shared_user,
-                            survey_title=survey.title,
-                            respondent_name=respondent_name,
-                            survey_id=str(survey.id),
-                            survey_url=survey_url
-                        )
-                        logger.info(
-                            f"Sent survey completed notification to shared user {shared_user.email} "
-                            f"for response {response.id} to survey {survey.id}"
-                        )
-                except NotificationPreference.DoesNotExist:
-                    # User has no preferences, use default (send notification)
-                    NotificationService.create_survey_completed_notification(
-                        recipient=shared_user,
-                        survey_title=survey.title,
-                        respondent_name=respondent_name,
-                        survey_id=str(survey.id),
-                        survey_url=survey_url
-                    )
-                    logger.info(
-                        f"Sent survey completed notification to shared user {shared_user.email} "
-                        f"for response {response.id} to survey {survey.id} (default preferences)"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Failed to send survey completed notification to shared user {shared_user.email} "
-                        f"for response {response.id} to survey {survey.id}: {str(e)}"
-                    )
-                    
+            rollups.record_response(instance)
         except Exception as e:
-            logger.error(f"Error processing shared user notifications for survey {survey.id}: {str(e)}")
+            logger.error(f"Failed to update analytics rollup for response {instance.id} to survey {instance.survey_id}: {e}")
+            try:
+                rollups.mark_stale(instance.survey_id)
+            except Exception as e:
+                logger.error(f"Failed to mark analytics rollups stale for survey {instance.survey_id}: {e}")
+    
+    transaction.on_commit(record)
+
+
+@receiver(post_save, sender=Answer)
+def mark_answer_rollups_stale(sender, instance, **kwargs):
+    """
+    Mark the survey's analytics rollups stale when an answer is saved directly.
+    
+    Submissions bulk-create their answers (no signal) and tally them with
+    rollups.record_answers(); any other answer write isn't in the rollups.
+    """
+    try:
+        rollups.mark_stale(instance.response.survey_id)
+    except Exception as e:
+        logger.error(f"Failed to mark analytics rollups stale for answer {instance.id}: {e}")
+
+
+@receiver(post_delete, sender=Response)
+def mark_response_rollups_stale(sender, instance, **kwargs):
+    """
+    Mark the survey's analytics rollups stale when a response is deleted.
+    
+    Deleted answers can't be subtracted from per-value tallies reliably, so
+    dashboards use the raw responses until the background rebuild ran.
+    """
+    try:
+        rollups.mark_stale(instance.survey_id)
+    except Exception as e:
+        logger.error(f"Failed to mark analytics rollups stale for survey {instance.survey_id}: {e}")
+
+
+@receiver(post_save, sender=Survey)
+def start_survey_rollups(sender, instance, created, **kwargs):
+    """A new survey has no responses, so its (empty) rollups start in sync."""
+    if not created:
+        return
+    try:
+        rollups.start_survey_rollups(instance)
+    except Exception as e:
+        logger.error(f"Failed to start analytics rollups for survey {instance.id}: {e}")
+
+
+@receiver(m2m_changed, sender=Survey.shared_with.through)
+def invalidate_shared_user_access(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop cached accessible-survey sets when users are shared or unshared.
+    
+    Forward changes (survey.shared_with) affect the users in pk_set; reverse
+    changes (user.shared_surveys) affect that user. A clear can't tell who
+    was removed, so it retires every cached set.
+    """
+    if action == 'post_clear':
+        access.invalidate_all()
+    elif action in ('post_add', 'post_remove'):
+        access.invalidate_users([instance.pk] if reverse else (pk_set or []))
+
+
+@receiver(m2m_changed, sender=Survey.shared_with_groups.through)
+def invalidate_shared_group_access(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached accessible-survey sets of the members of groups shared or unshared."""
+    if action == 'post_clear':
+        access.invalidate_all()
+    elif action in ('post_add', 'post_remove'):
+        access.invalidate_groups([instance.pk] if reverse else (pk_set or []))
+
+
+@receiver(post_save, sender=Survey)
+@receiver(post_delete, sender=Survey)
+def invalidate_survey_access(sender, instance, **kwargs):
+    """
+    Retire all cached accessible-survey sets when a survey changes.
+    
+    Creation, visibility, status, activation and soft deletion can change
+    which surveys every user sees.
+    """
+    access.invalidate_all()
+
 
+@receiver(post_save, sender=UserGroup)
+@receiver(post_delete, sender=UserGroup)
+def invalidate_member_access(sender, instance, **kwargs):
+    """Drop a user's cached accessible-survey sets when their group membership changes."""
+    access.invalidate_users([instance.user_id])
 
 def send_survey_deadline_reminder(survey, days_remaining):
     """
@@ -0,0 +1,144 @@
+"""
+Background jobs for survey notifications and analytics rollups.
+
+The signal handlers in surveys.signals and the share/send-notifications
+views enqueue these jobs (see notifications.jobs) instead of creating
+notifications inside the request; surveys.rollups.mark_stale() enqueues
+rollup rebuilds. Jobs carry IDs only and reload the survey when they run,
+so they act on its current state.
+"""
+
+import logging
+from django.contrib.auth import get_user_model
+from notifications import jobs
+from notifications.models import Notification
+from notifications.services import NotificationService, SurveyNotificationService
+from . import rollups
+from .models import Survey, Response
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+
+def _get_survey(survey_id):
+    """Load a survey with its creator, or None if it no longer exists."""
+    return Survey.objects.select_related('creator').filter(id=survey_id).first()
+
+
+def _notify_assigned(survey, users):
+    """Send survey assignment notifications to users in bulk."""
+    if survey is None or survey.status != 'submitted':
+        return
+    if survey.creator is None:
+        logger.info(f"Skipped survey assigned notifications for survey {survey.id} without a creator")
+        return
+
+    title, body, metadata = NotificationService.survey_assigned_content(
+        survey.title, survey.creator, str(survey.id)
+    )
+    notifications = NotificationService.bulk_notify_users(
+        recipients=users,
+        title=title,
+        body=body,
+        notification_type=Notification.TYPE_SURVEY_ASSIGNED,
+        priority=Notification.PRIORITY_NORMAL,
+        sender=survey.creator,
+        action_url=f"/surveys/{survey.id}/",
+        metadata=metadata
+    )
+    logger.info(f"Sent {len(notifications)} survey assigned notifications for survey {survey.id}")
+
+
+@jobs.register('surveys.notify_shared_users')
+def notify_shared_users(survey_id, user_ids):
+    """Notify users a survey was shared with."""
+    _notify_assigned(_get_survey(survey_id), User.objects.filter(pk__in=user_ids))
+
+
+@jobs.register('surveys.notify_shared_groups')
+def notify_shared_groups(survey_id, group_ids):
+    """Notify the members of groups a survey was shared with."""
+    _notify_assigned(
+        _get_survey(survey_id),
+        User.objects.filter(user_groups__group_id__in=group_ids).distinct()
+    )
+
+
+@jobs.register('surveys.notify_new_survey')
+def notify_new_survey(survey_id, force_send=False, base_url=None):
+    """Announce a published, reactivated or re-scoped survey to eligible users."""
+    survey = _get_survey(survey_id)
+    if survey is None:
+        return
+    SurveyNotificationService.notify_users_of_new_survey(
+        survey, force_send=force_send, base_url=base_url
+    )
+
+
+@jobs.register('surveys.notify_survey_deactivated')
+def notify_survey_deactivated(survey_id, deactivator_id=None):
+    """Tell users who could see a survey that it was deactivated."""
+    survey = _get_survey(survey_id)
+    if survey is None:
+        return
+    deactivator = User.objects.filter(pk=deactivator_id).first() if deactivator_id else survey.creator
+    if deactivator is None:
+        logger.info(f"Skipped deactivation notifications for survey {survey.id} without a deactivator")
+        return
+    SurveyNotificationService.notify_users_of_survey_deactivation(survey, deactivator)
+
+
+@jobs.register('surveys.notify_response_completed')
+def notify_response_completed(response_id):
+    """Notify the survey creator and the users it is shared with about a completed response."""
+    response = Response.objects.select_related('survey__creator', 'respondent').filter(id=response_id).first()
+    if response is None:
+        return
+    survey = response.survey
+
+    # Get respondent information
+    if response.respondent:
+        respondent_name = (
+            response.respondent.full_name or
+            response.respondent.username or
+            response.respondent.email
+        )
+    else:
+        # Anonymous respondent
+        respondent_name = (
+            response.respondent_email or
+            response.respondent_phone or
+            "Anonymous User"
+        )
+
+    recipients = list(survey.shared_with.all())
+    if survey.creator:
+        recipients.insert(0, survey.creator)
+    else:
+        logger.info(f"Survey {survey.id} has no creator, notifying shared users only")
+
+    title, body, metadata = NotificationService.survey_completed_content(
+        survey.title, respondent_name, str(survey.id)
+    )
+    notifications = NotificationService.bulk_notify_users(
+        recipients=recipients,
+        title=title,
+        body=body,
+        notification_type=Notification.TYPE_SURVEY_COMPLETED,
+        priority=Notification.PRIORITY_HIGH,
+        action_url=f"/surveys/{survey.id}/results/",
+        metadata=metadata
+    )
+    logger.info(
+        f"Sent {len(notifications)} survey completed notifications "
+        f"for response {response.id} to survey {survey.id}"
+    )
+
+
+@jobs.register('surveys.rebuild_rollups')
+def rebuild_rollups(survey_id):
+    """Rebuild a survey's analytics rollups after they were marked stale."""
+    survey = Survey.objects.filter(id=survey_id).first()
+    if survey is None:
+        return
+    rollups.rebuild_survey_rollups(survey)
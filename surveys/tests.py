@@ -5,7 +5,10 @@ This module contains unit tests for models, views, permissions,
 and serializers following Django testing best practices.
 """
 
+from unittest import mock
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
@@ -13,7 +16,10 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 from .models import Survey, Question, Response, Answer, PublicAccessToken
 from .encryption import surveys_data_encryption
+import io
 import json
+import numpy as np
+from itertools import islice
 
 User = get_user_model()
 
@@ -55,6 +61,111 @@ class SurveyModelTest(TestCase):
         self.assertEqual(saved_survey.description, 'Encrypted Description')
 
 
+class SurveysDataEncryptionBatchTest(TestCase):
+    """Test cases for batched Fernet decryption"""
+    
+    def test_decrypt_many_skips_plaintext(self):
+        """Test that tokens are decrypted and plaintext/empty values pass through"""
+        tokens = [surveys_data_encryption.encrypt(f'value {idx}') for idx in range(5)]
+        values = tokens[:2] + ['already plain', '', None] + tokens[2:]
+        
+        decrypted = surveys_data_encryption.decrypt_many(values)
+        
+        self.assertEqual(
+            decrypted,
+            ['value 0', 'value 1', 'already plain', '', None, 'value 2', 'value 3', 'value 4']
+        )
+    
+    def test_decrypt_many_thread_pool(self):
+        """Test that a thread-pooled batch returns values in order"""
+        tokens = [surveys_data_encryption.encrypt(str(idx)) for idx in range(50)]
+        
+        with self.settings(SURVEYS_DECRYPTION_PARALLEL_THRESHOLD=10):
+            decrypted = surveys_data_encryption.decrypt_many(tokens, workers=4)
+        
+        self.assertEqual(decrypted, [str(idx) for idx in range(50)])
+    
+    def test_measure_decryption_counts_current_thread(self):
+        """Test that batch decryption inside a measured block is counted"""
+        tokens = [surveys_data_encryption.encrypt(str(idx)) for idx in range(5)]
+        
+        with surveys_data_encryption.measure_decryption() as decryption:
+            surveys_data_encryption.decrypt_many(tokens + ['plain'])
+        surveys_data_encryption.decrypt_many(tokens)
+        
+        self.assertEqual(decryption['values'], 5)
+        self.assertGreater(decryption['seconds'], 0)
+    
+    def test_decryption_cache_is_bounded_lru(self):
+        """Test that the plaintext cache counts hits and evicts least recently used entries"""
+        from .encryption import DecryptionCache
+        
+        cache = DecryptionCache(max_bytes=30)
+        cache.put('token-a', 'plain-a')  # 14 characters
+        cache.put('token-b', 'plain-b')
+        self.assertEqual(cache.get('token-a'), 'plain-a')
+        
+        cache.put('token-c', 'plain-c')  # evicts token-b, the least recently used
+        
+        self.assertIsNone(cache.get('token-b'))
+        self.assertEqual(cache.get('token-c'), 'plain-c')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+        self.assertLessEqual(stats['bytes'], 30)
+    
+    def test_decryption_cache_counts_utf8_bytes(self):
+        """Test that the cache bound counts Arabic plaintext in UTF-8 bytes"""
+        from .encryption import DecryptionCache
+        
+        cache = DecryptionCache(max_bytes=40)
+        cache.put('token-a', 'مرحبا بكم')  # 7 + 17 bytes
+        self.assertEqual(cache.stats()['bytes'], 24)
+        
+        cache.put('token-b', 'مرحبا بكم')  # 48 bytes in total, evicts token-a
+        self.assertIsNone(cache.get('token-a'))
+        self.assertEqual(cache.get('token-b'), 'مرحبا بكم')
+    
+    def test_decryption_cache_skips_answers(self):
+        """Test that only opted-in survey and question text reaches the plaintext cache"""
+        user = User.objects.create_user(username='cache@example.com', email='cache@example.com', password='x')
+        survey = Survey.objects.create(title='Cached title', creator=user)
+        question = Question.objects.create(survey=survey, text='Cached question', question_type='text', order=1)
+        response = Response.objects.create(survey=survey, respondent_email='private@example.com')
+        Answer.objects.create(response=response, question=question, answer_text='private answer')
+        
+        cache = surveys_data_encryption.cache
+        cache.clear()
+        with mock.patch.object(cache, '_redis_set') as redis_set:
+            self.assertEqual(Survey.objects.get(id=survey.id).title, 'Cached title')
+            self.assertEqual(Question.objects.get(id=question.id).text, 'Cached question')
+            self.assertEqual(Answer.objects.get(question=question).answer_text, 'private answer')
+        
+        cached = {plaintext for plaintext, _ in cache._entries.values()}
+        self.assertIn('Cached title', cached)
+        self.assertIn('Cached question', cached)
+        self.assertNotIn('private answer', cached)
+        self.assertNotIn('private answer', [call.args[1] for call in redis_set.call_args_list])
+    
+    def test_decrypted_values_matches_values_list(self):
+        """Test that the queryset batch mode returns the same rows as values_list"""
+        user = User.objects.create_user(username='batch@example.com', email='batch@example.com', password='x')
+        survey = Survey.objects.create(title='Batch', creator=user)
+        question = Question.objects.create(survey=survey, text='Q', question_type='text', order=1)
+        for idx in range(3):
+            response = Response.objects.create(survey=survey, respondent_email=f'r{idx}@example.com')
+            Answer.objects.create(response=response, question=question, answer_text=f'answer {idx}')
+        
+        answers = Answer.objects.filter(question=question).order_by('id')
+        self.assertEqual(
+            answers.decrypted_values('id', 'answer_text'),
+            list(answers.values_list('id', 'answer_text'))
+        )
+        self.assertEqual(
+            answers.decrypted_values('answer_text', flat=True),
+            ['answer 0', 'answer 1', 'answer 2']
+        )
+
+
 class SurveyAPITest(APITestCase):
     """Test cases for Survey API endpoints"""
     
@@ -474,4 +585,607 @@ class SurveyAccessControlTest(APITestCase):
         self.assertEqual(response.data['status'], 'success')
 
 
+class SurveyAnalyticsDashboardTest(APITestCase):
+    """Test cases for the single-pass survey analytics dashboard"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='dashboard@example.com',
+            email='dashboard@example.com',
+            password='testpass123',
+            role='admin'
+        )
+        self.survey = Survey.objects.create(
+            title='Dashboard Survey',
+            creator=self.user,
+            visibility='AUTH',
+            status='submitted'
+        )
+        self.nps_question = Question.objects.create(
+            survey=self.survey,
+            text='How likely are you to recommend us?',
+            question_type='rating',
+            NPS_Calculate=True,
+            min_scale=0,
+            max_scale=10,
+            order=1
+        )
+        self.comment_question = Question.objects.create(
+            survey=self.survey,
+            text='Any comments?',
+            question_type='textarea',
+            order=2
+        )
+        
+        # Sunday 2025-01-05 10:00 Asia/Dubai == 06:00 UTC
+        submitted_at = timezone.datetime(2025, 1, 5, 6, 0, tzinfo=timezone.timezone.utc)
+        for idx, score in enumerate(['10', '9', '3', '٨']):
+            response = Response.objects.create(
+                survey=self.survey,
+                respondent_email=f'anon{idx}@example.com',
+                is_complete=idx != 3
+            )
+            Response.objects.filter(pk=response.pk).update(
+                submitted_at=submitted_at + timezone.timedelta(days=idx)
+            )
+            Answer.objects.create(response=response, question=self.nps_question, answer_text=score)
+        
+        self.client.force_authenticate(user=self.user)
+    
+    def test_frame_loads_columns_once(self):
+        """Test that the response frame exposes columnar data for the survey"""
+        from .analytics_engine import SurveyResponseFrame
+        
+        frame = SurveyResponseFrame.load(self.survey)
+        
+        self.assertEqual(frame.total, 4)
+        self.assertEqual(frame.complete_count, 3)
+        self.assertEqual(frame.authenticated_count, 0)
+        self.assertEqual(frame.unique_respondents('email'), 4)
+        self.assertEqual(len(frame.answers(self.nps_question.id)), 4)
+        self.assertEqual(len(frame.answers(self.nps_question.id, complete_only=True)), 3)
+        self.assertEqual(len(frame.answers(self.comment_question.id)), 0)
+    
+    def test_dashboard_heatmap_nps_and_summary(self):
+        """Test dashboard metrics computed from the columnar frame"""
+        url = f'/api/surveys/admin/surveys/{self.survey.id}/dashboard/'
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        
+        # Complete responses on Sunday, Monday, Tuesday at 10:00 Dubai time
+        heatmap = data['heatmap']
+        self.assertEqual(heatmap['matrix'][0][10], 1)
+        self.assertEqual(heatmap['totals_by_day'], [1, 1, 1, 0, 0, 0, 0])
+        self.assertEqual(heatmap['totals_by_hour'][10], 3)
+        
+        # Only complete responses count towards NPS: 10 and 9 promote, 3 detracts
+        nps = data['nps']
+        self.assertEqual(nps['promoters_count'], 2)
+        self.assertEqual(nps['detractors_count'], 1)
+        self.assertEqual(nps['total_responses'], 3)
+        
+        summary = {item['question_id']: item for item in data['questions_summary']}
+        self.assertEqual(summary[str(self.nps_question.id)]['answer_count'], 4)
+        self.assertEqual(summary[str(self.comment_question.id)]['skipped_count'], 4)
+
+    def test_dashboard_served_from_rebuilt_rollups(self):
+        """Test that stale rollups fall back to raw rows until the command rebuilds them"""
+        from django.core.management import call_command
+        from notifications.models import BackgroundJob
+        from .rollups import RollupResponseFrame, verify_survey_rollups
+
+        url = f'/api/surveys/admin/surveys/{self.survey.id}/dashboard/'
+
+        # Answers were saved directly, so the rollups are stale and a rebuild is queued
+        self.assertIsNone(RollupResponseFrame.load(self.survey))
+        self.assertTrue(BackgroundJob.objects.filter(name='surveys.rebuild_rollups').exists())
+        raw_data = self.client.get(url).data['data']
+
+        # Reads never repair the rollups
+        self.assertIsNone(RollupResponseFrame.load(self.survey))
+
+        call_command('rebuild_survey_rollups', stale=True, stdout=io.StringIO())
+        self.assertEqual(verify_survey_rollups(self.survey), [])
+
+        frame = RollupResponseFrame.load(self.survey)
+        self.assertIsNotNone(frame)
+        self.assertEqual(frame.total, 4)
+        self.assertEqual(frame.complete_count, 3)
+
+        rollup_data = self.client.get(url).data['data']
+        self.assertEqual(rollup_data, raw_data)
+
+    def test_end_on_bucket_boundary_matches_raw_rows(self):
+        """Test that raw and rollup frames both leave out responses submitted exactly at end"""
+        from .analytics_engine import SurveyResponseFrame
+        from .rollups import RollupResponseFrame, load_dashboard_frame, rebuild_survey_rollups
+
+        # The second response was submitted exactly at 2025-01-06 06:00 UTC
+        start = timezone.datetime(2025, 1, 5, 6, 0, tzinfo=timezone.timezone.utc)
+        end = start + timezone.timedelta(days=1)
+
+        raw = load_dashboard_frame(self.survey, start=start, end=end)
+        self.assertNotIsInstance(raw, RollupResponseFrame)
+        self.assertEqual(raw.total, 1)
+
+        rebuild_survey_rollups(self.survey)
+        rollup = load_dashboard_frame(self.survey, start=start, end=end)
+        self.assertIsInstance(rollup, RollupResponseFrame)
+        self.assertEqual(rollup.total, raw.total)
+        self.assertEqual(len(rollup.answers(self.nps_question.id)), len(raw.answers(self.nps_question.id)))
+        self.assertEqual(SurveyResponseFrame.load(self.survey, end=end + timezone.timedelta(microseconds=1)).total, 2)
+
+    def test_question_dashboards_served_from_rollups(self):
+        """Test that the question analytics views give the same results from rollups"""
+        from .rollups import rebuild_survey_rollups
+
+        Answer.objects.create(
+            response=Response.objects.filter(survey=self.survey).first(),
+            question=self.comment_question,
+            answer_text='Quick and friendly'
+        )
+        questions_url = f'/api/surveys/admin/surveys/{self.survey.id}/questions/analytics/dashboard/'
+        question_url = f'/api/surveys/admin/surveys/{self.survey.id}/questions/{self.nps_question.id}/dashboard/'
+
+        def question_results():
+            overview = self.client.get(questions_url).data['data']
+            detail = self.client.get(question_url).data['data']
+            return (
+                [(item['kpis'], item['analytics']) for item in overview['questions']],
+                detail['kpis'],
+                detail['analytics'],
+            )
+
+        raw_results = question_results()
+        rebuild_survey_rollups(self.survey)
+        rollup_results = question_results()
+
+        self.assertEqual(rollup_results, raw_results)
+
+        # Served from rollups, free-text statistics never read the answers table
+        comment_url = f'/api/surveys/admin/surveys/{self.survey.id}/questions/{self.comment_question.id}/dashboard/'
+        with CaptureQueriesContext(connection) as queries:
+            overview = self.client.get(questions_url).data['data']
+            detail = self.client.get(comment_url).data['data']
+        self.assertFalse([query for query in queries if 'surveys_answer"' in query['sql']])
+        self.assertEqual(overview['questions'][1]['analytics']['textual']['response_lengths']['short']['count'], 1)
+        self.assertEqual(detail['analytics']['textual']['avg_words'], 3.0)
+
+        # Term and sample analysis reads a bounded number of raw answers
+        with CaptureQueriesContext(connection) as queries:
+            detail = self.client.get(comment_url, {'include_personal': 'true'}).data['data']
+        self.assertEqual(detail['analytics']['textual']['samples'], ['Quick and friendly'])
+        answer_queries = [query['sql'] for query in queries if 'surveys_answer"' in query['sql']]
+        self.assertEqual(len(answer_queries), 1)
+        self.assertIn('LIMIT 500', answer_queries[0])
+        overview_kpis = raw_results[0][1][0]
+        self.assertEqual(overview_kpis['answer_count'], 1)
+        self.assertEqual(raw_results[1]['answer_count'], 4)
+
+    def test_stale_rollups_rebuilt_by_job(self):
+        """Test that the queued rebuild job brings stale rollups back in sync"""
+        from notifications import jobs
+        from notifications.models import BackgroundJob
+        from .models import SurveyRollupState
+        from .rollups import RollupResponseFrame, mark_stale, rebuild_survey_rollups
+
+        rebuild_survey_rollups(self.survey)
+        BackgroundJob.objects.all().delete()
+        self.assertIsNotNone(RollupResponseFrame.load(self.survey))
+
+        # Only the first change after a rebuild queues another one
+        mark_stale(self.survey.id)
+        mark_stale(self.survey.id)
+        self.assertIsNone(RollupResponseFrame.load(self.survey))
+        self.assertEqual(BackgroundJob.objects.filter(name='surveys.rebuild_rollups').count(), 1)
+
+        jobs.run_pending()
+        self.assertIsNone(SurveyRollupState.objects.get(survey=self.survey).stale_at)
+        self.assertIsNotNone(RollupResponseFrame.load(self.survey))
+
+    def test_submission_keeps_rollups_in_sync(self):
+        """Test that new responses and answers are added to existing rollups"""
+        from .rollups import RollupResponseFrame, rebuild_survey_rollups, verify_survey_rollups
+        from .submissions import create_response_with_answers
+
+        rebuild_survey_rollups(self.survey)
+
+        # The submission only writes its own rows; the rollups are tallied once it commits
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response, _ = create_response_with_answers(
+                self.survey,
+                [(self.nps_question, '10'), (self.comment_question, 'Great service overall')],
+                respondent=self.user
+            )
+            self.assertEqual(RollupResponseFrame.load(self.survey).total, 4)
+        self.assertEqual(len(callbacks), 2)
+
+        self.assertEqual(verify_survey_rollups(self.survey), [])
+        frame = RollupResponseFrame.load(self.survey)
+        self.assertEqual(frame.total, 5)
+        self.assertEqual(frame.authenticated_count, 1)
+        self.assertEqual(len(frame.answers(self.nps_question.id)), 5)
+        self.assertEqual(frame.answers(self.comment_question.id).total_words(), 3)
+
+        # Deleting a response marks the rollups stale until the next rebuild
+        response.delete()
+        self.assertIsNone(RollupResponseFrame.load(self.survey))
+
+    def test_streaming_export_walks_all_chunks(self):
+        """Test that CSV and JSON exports stream every response across keyset chunks"""
+        from .exports import stream_csv, stream_json
+
+        questions = list(self.survey.questions.order_by('order'))
+
+        csv_text = ''.join(stream_csv(self.survey, questions, include_personal=False, chunk_size=3))
+        lines = csv_text.strip().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[1].endswith(',٨,'))  # newest response first
+
+        json_text = ''.join(stream_json(self.survey, questions, include_personal=False, chunk_size=3))
+        export = json.loads(json_text)
+        self.assertEqual(export['survey']['total_responses'], 4)
+        self.assertEqual(
+            [item['answers'][0]['answer_text'] for item in export['responses']],
+            ['٨', '3', '9', '10']
+        )
+
+        url = f'/api/surveys/surveys/{self.survey.id}/export/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().strip().splitlines()), 5)
+
+    def test_streaming_export_failure_breaks_the_stream(self):
+        """Test that a failure mid-export is raised instead of ending the document"""
+        from unittest import mock
+        from . import exports
+
+        questions = list(self.survey.questions.order_by('order'))
+
+        def failing_chunks(survey, chunk_size):
+            yield from islice(original(survey, chunk_size), 1)
+            raise RuntimeError('database went away')
+
+        original = exports.iter_response_chunks
+        with mock.patch.object(exports, 'iter_response_chunks', failing_chunks):
+            for stream in (exports.stream_csv, exports.stream_json):
+                with self.assertRaises(RuntimeError):
+                    ''.join(stream(self.survey, questions, include_personal=False, chunk_size=3))
+
+
+class SurveyBulkSubmissionTest(APITestCase):
+    """Test cases for the shared validate-then-bulk-insert submission path"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='respondent@example.com',
+            email='respondent@example.com',
+            password='testpass123'
+        )
+        self.survey = Survey.objects.create(
+            title='Bulk Submission Survey',
+            creator=self.user,
+            visibility='AUTH',
+            status='submitted'
+        )
+        self.email_question = Question.objects.create(
+            survey=self.survey,
+            text='Your work email',
+            question_type='text',
+            validation_type='email',
+            order=1
+        )
+        self.rating_question = Question.objects.create(
+            survey=self.survey,
+            text='Rate us',
+            question_type='rating',
+            order=2
+        )
+        self.url = '/api/surveys/auth-responses/'
+        self.client.force_authenticate(user=self.user)
+
+    def test_invalid_answer_writes_nothing(self):
+        """Test that validation runs before the response is created"""
+        data = {
+            'survey_id': str(self.survey.id),
+            'answers': [
+                {'question_id': str(self.email_question.id), 'answer_text': 'not-an-email'},
+                {'question_id': str(self.rating_question.id), 'answer_text': '5'},
+            ]
+        }
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['data']['validation_errors']), 1)
+        self.assertFalse(Response.objects.filter(survey=self.survey).exists())
+
+    def test_answers_inserted_in_bulk(self):
+        """Test that all answers are written with a constant number of queries"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        data = {
+            'survey_id': str(self.survey.id),
+            'answers': [
+                {'question_id': str(self.email_question.id), 'answer_text': 'me@example.com'},
+                {'question_id': str(self.rating_question.id), 'answer_text': '5'},
+            ]
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        survey_response = Response.objects.get(survey=self.survey)
+        self.assertEqual(survey_response.answers.count(), 2)
+        answer_inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "surveys_answer"')]
+        self.assertEqual(len(answer_inserts), 1)
+
+
+class ResponseContactHashTest(TestCase):
+    """Test cases for respondent contact hash lookups"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='creator@example.com',
+            email='creator@example.com',
+            password='testpass123'
+        )
+        self.survey = Survey.objects.create(
+            title='Public Survey',
+            creator=self.user,
+            visibility='PUBLIC',
+            public_contact_method='email'
+        )
+
+    def test_duplicate_check_uses_normalized_hash(self):
+        """Test that duplicate emails are found regardless of case and whitespace"""
+        from django.core.exceptions import ValidationError
+
+        first = Response.objects.create(survey=self.survey, respondent_email='Person@Example.com')
+        self.assertIsNotNone(first.respondent_email_hash)
+        self.assertNotIn('person', first.respondent_email_hash)
+
+        self.assertTrue(
+            Response.objects.filter(survey=self.survey).with_contact(email=' person@example.com ').exists()
+        )
+        with self.assertRaises(ValidationError):
+            Response.objects.create(survey=self.survey, respondent_email='person@example.COM')
+
+    def test_backfill_command_fills_missing_hashes(self):
+        """Test that the backfill command recomputes hashes skipped by queryset updates"""
+        from django.core.management import call_command
+        from io import StringIO
+
+        response = Response.objects.create(survey=self.survey, respondent_email='late@example.com')
+        expected = response.respondent_email_hash
+        Response.objects.filter(pk=response.pk).update(respondent_email_hash=None)
+
+        call_command('backfill_contact_hashes', stdout=StringIO())
+
+        response.refresh_from_db()
+        self.assertEqual(response.respondent_email_hash, expected)
+
+    def test_unhashed_responses_still_block_duplicates(self):
+        """Test that responses without a hash are matched on the plaintext contact"""
+        from django.core.exceptions import ValidationError
+
+        response = Response.objects.create(survey=self.survey, respondent_email='old@example.com')
+        Response.objects.filter(pk=response.pk).update(respondent_email_hash=None)
+
+        self.assertTrue(
+            Response.objects.filter(survey=self.survey).with_contact(email='old@example.com').exists()
+        )
+        with self.assertRaises(ValidationError):
+            Response.objects.create(survey=self.survey, respondent_email='old@example.com')
+
+    def test_migration_backfills_existing_hashes(self):
+        """Test that the contact hash migration hashes responses that predate it"""
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module('surveys.migrations.0023_response_contact_hashes')
+        response = Response.objects.create(survey=self.survey, respondent_phone='+971500000000')
+        expected = response.respondent_phone_hash
+        Response.objects.filter(pk=response.pk).update(respondent_phone_hash=None)
+
+        migration.backfill_contact_hashes(apps, None)
+
+        response.refresh_from_db()
+        self.assertEqual(response.respondent_phone_hash, expected)
+
+
+class MetricsBatchTest(TestCase):
+    """Test cases for the NumPy NPS/CSAT batch helpers"""
+
+    def test_map_distinct_parses_each_string_once(self):
+        """Test that repeated answers are parsed once and broadcast back"""
+        from .arabic_text import extract_number
+        from .metrics import map_distinct
+
+        calls = []
+
+        def parse(text):
+            calls.append(text)
+            return extract_number(text)
+
+        scores = map_distinct(['5', '٥', '5', 'n/a', '3', '5'], parse)
+
+        self.assertEqual(sorted(calls), sorted(['5', '٥', 'n/a', '3']))
+        self.assertEqual(scores[:3].tolist(), [5.0, 5.0, 5.0])
+        self.assertTrue(np.isnan(scores[3]))
+
+    def test_nps_counts_and_confidence_interval(self):
+        """Test NPS bucketing with weights, out-of-range values and the interval"""
+        from .metrics import nps_counts, nps_score, nps_confidence_interval
+
+        scores = np.array([0, 3, 5, 5, 9, np.nan])
+        weights = np.array([2, 1, 3, 1, 4, 1])
+
+        detractors, passives, promoters = nps_counts(scores, 0, 5, weights)
+        self.assertEqual((detractors, passives, promoters), (2, 1, 4))
+        self.assertAlmostEqual(nps_score(detractors, passives, promoters), 100 * 2 / 7)
+
+        lower, upper = nps_confidence_interval(detractors, passives, promoters)
+        self.assertLess(lower, nps_score(detractors, passives, promoters))
+        self.assertGreater(upper, nps_score(detractors, passives, promoters))
+        self.assertLessEqual(upper, 100.0)
+
+    def test_csat_period_series(self):
+        """Test per-period CSAT tallies from rating classes"""
+        from .metrics import csat_rating_classes, csat_period_series, CSAT_UNCLASSIFIED
+
+        classes = csat_rating_classes(np.array([5, 3, 1, 9, 42, np.nan]))
+        self.assertEqual(classes.tolist(), [0, 1, 2, 0, CSAT_UNCLASSIFIED, CSAT_UNCLASSIFIED])
+
+        counts, scores = csat_period_series([0, 0, 1, 1, 1, 1], classes, np.ones(6, dtype=np.int64), 3)
+        self.assertEqual(counts.tolist(), [[1, 1, 0], [1, 0, 1], [0, 0, 0]])
+        self.assertEqual(scores[:2].tolist(), [50.0, 50.0])
+        self.assertTrue(np.isnan(scores[2]))
+
+    def test_rating_summary_matches_expanded_answers(self):
+        """Test that weighted rating statistics equal the statistics module on the expanded list"""
+        import statistics
+        from .metrics import rating_counts, rating_summary
+
+        value_counts = [('4', 3), ('n/a', 2), ('1', 1), ('4.0', 1), ('10', 2), ('inf', 1), ('٥', 1)]
+        expanded = [4.0] * 3 + [1.0] + [4.0] + [10.0] * 2 + [5.0]
+
+        ratings = rating_counts(value_counts)
+        self.assertEqual(ratings, [(4.0, 4), (1.0, 1), (10.0, 2), (5.0, 1)])
+
+        stats = rating_summary(ratings)
+        ordered = sorted(expanded)
+        self.assertEqual(stats['count'], len(expanded))
+        self.assertEqual(stats['mean'], statistics.mean(expanded))
+        self.assertEqual(stats['median'], statistics.median(expanded))
+        self.assertEqual(stats['mode'], statistics.mode(expanded))
+        self.assertAlmostEqual(stats['std_dev'], statistics.stdev(expanded))
+        self.assertEqual((stats['min'], stats['max']), (1.0, 10.0))
+        self.assertEqual((stats['q1'], stats['q3']), (ordered[len(ordered) // 4], ordered[3 * len(ordered) // 4]))
+        self.assertIsNone(rating_summary([]))
+
+
+class ArabicTextCacheTest(TestCase):
+    """Test cases for memoized Arabic text parsing and keyword automata"""
+
+    def tearDown(self):
+        from .arabic_text import configure_text_cache
+        configure_text_cache()
+
+    def test_results_are_memoized_within_bound(self):
+        """Test that repeated answers hit the cache and the bound is respected"""
+        from .arabic_text import classify_csat_choice, configure_text_cache, text_cache_info
+
+        configure_text_cache(2)
+        for answer in ['مُمْتَاز', 'مُمْتَاز', 'سيء', 'عادي', 'مُمْتَاز']:
+            classify_csat_choice(answer)
+
+        info = text_cache_info()['classify_csat_choice']
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.currsize, 2)
+        self.assertEqual(classify_csat_choice('مُمْتَاز'), 'satisfied')
+
+    def test_compiled_keywords_match_substring_scan(self):
+        """Test that the alternation regex agrees with a plain keyword scan"""
+        from .arabic_text import match_intent, normalize_arabic, NPS_KEYWORDS_AR, NPS_KEYWORDS_EN
+
+        texts = [
+            'ما مدى احتمالية أن توصي بنا لصديق؟',
+            'How likely are you to recommend us?',
+            'كيف تقيم الخدمة؟',
+            '',
+        ]
+        for text in texts:
+            for keywords in (NPS_KEYWORDS_AR, NPS_KEYWORDS_EN):
+                expected = bool(text) and any(keyword in normalize_arabic(text) for keyword in keywords)
+                self.assertEqual(match_intent(text, keywords), expected)
+
+
+class SurveyAccessCacheTest(APITestCase):
+    """Test cases for cached accessible-survey ID sets"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.creator = User.objects.create_user(
+            username='owner@example.com',
+            email='owner@example.com',
+            password='testpass123'
+        )
+        self.viewer = User.objects.create_user(
+            username='viewer@example.com',
+            email='viewer@example.com',
+            password='testpass123',
+            role='user'
+        )
+        self.private_survey = Survey.objects.create(
+            title='Private Survey',
+            creator=self.creator,
+            visibility='PRIVATE',
+            status='submitted'
+        )
+        self.group_survey = Survey.objects.create(
+            title='Group Survey',
+            creator=self.creator,
+            visibility='GROUPS',
+            status='submitted'
+        )
+
+    def test_sharing_invalidates_cached_set(self):
+        """Test that sharing a survey with a user refreshes their shared list"""
+        from .access import accessible_survey_ids, SCOPE_SHARED
+
+        self.assertNotIn(self.private_survey.id, accessible_survey_ids(self.viewer, SCOPE_SHARED))
+
+        self.private_survey.shared_with.add(self.viewer)
+        self.assertIn(self.private_survey.id, accessible_survey_ids(self.viewer, SCOPE_SHARED))
+
+        self.client.force_authenticate(user=self.viewer)
+        response = self.client.get('/api/surveys/my-shared/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(str(self.private_survey.id), json.dumps(response.data, default=str))
+
+    def test_group_membership_invalidates_cached_set(self):
+        """Test that joining a group exposes the group's surveys"""
+        from authentication.models import Group, UserGroup
+        from .access import accessible_survey_ids, SCOPE_LIST, SCOPE_SHARED
+
+        group = Group.objects.create(name='Analysts')
+        self.group_survey.shared_with_groups.add(group)
+        self.assertNotIn(self.group_survey.id, accessible_survey_ids(self.viewer, SCOPE_SHARED))
+        self.assertNotIn(self.group_survey.id, accessible_survey_ids(self.viewer, SCOPE_LIST))
+
+        membership = UserGroup.objects.create(user=self.viewer, group=group)
+        self.assertIn(self.group_survey.id, accessible_survey_ids(self.viewer, SCOPE_SHARED))
+        self.assertIn(self.group_survey.id, accessible_survey_ids(self.viewer, SCOPE_LIST))
+
+        membership.delete()
+        self.assertNotIn(self.group_survey.id, accessible_survey_ids(self.viewer, SCOPE_SHARED))
+
+    def test_survey_changes_retire_cached_sets(self):
+        """Test that unpublishing a survey removes it from cached sets"""
+        from .access import accessible_survey_ids, SCOPE_LIST
+
+        public_survey = Survey.objects.create(
+            title='Public Survey',
+            creator=self.creator,
+            visibility='PUBLIC',
+            status='submitted'
+        )
+        self.assertIn(public_survey.id, accessible_survey_ids(self.viewer, SCOPE_LIST))
+
+        self.client.force_authenticate(user=self.viewer)
+        response = self.client.get('/api/surveys/surveys/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_surveys'], 0)
+        self.assertIn(str(public_survey.id), json.dumps(response.data, default=str))
+
+        public_survey.status = 'draft'
+        public_survey.save()
+        self.assertNotIn(public_survey.id, accessible_survey_ids(self.viewer, SCOPE_LIST))
+
+
 # Add more test cases as needed...
@@ -8,7 +8,7 @@ with comprehensive error handling and logging.
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.db.models import Q, Count, Avg
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import status, generics, filters
 from rest_framework.decorators import api_view, permission_classes, action, authentication_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -27,10 +27,12 @@ import secrets
 import pytz
 import math
 import hashlib
+import numpy as np
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q, Count, Avg, F, Sum, StdDev, Variance
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import status, generics, filters
 from rest_framework.decorators import api_view, permission_classes, action, authentication_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -49,6 +51,17 @@ from dateutil.parser import parse as parse_datetime
 
 from .models import Survey, Question, Response as SurveyResponse, Answer, PublicAccessToken, SurveyTemplate, TemplateQuestion
 from .pagination import SurveyPagination, ResponsePagination
+from .analytics_engine import resolve_timezone, csat_period_label
+from .rollups import load_dashboard_frame
+from .submissions import prepare_answers, create_response_with_answers
+from .access import accessible_survey_ids, SCOPE_LIST, SCOPE_SHARED
+from .validators import get_validation_error_messages
+from .exports import stream_csv, stream_json
+from .metrics import (
+    CSAT_SATISFIED, CSAT_NEUTRAL, CSAT_DISSATISFIED, CSAT_UNCLASSIFIED,
+    map_distinct, csat_counts, csat_confidence_interval, csat_rating_classes, csat_period_series,
+    rating_counts, rating_summary
+)
 from .serializers import (
     SurveySerializer, QuestionSerializer, ResponseSerializer,
     SurveySubmissionSerializer, ResponseSubmissionSerializer,
@@ -64,12 +77,16 @@ from .timezone_utils import (
     format_uae_datetime, format_uae_date_only, get_status_uae, 
     is_currently_active_uae, serialize_datetime_uae
 )
-from notifications.services import SurveyNotificationService
+from notifications import jobs
+from notifications.services import SurveyNotificationService, get_domain_url
 from Audit.middleware import AuditMixin
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+# Free-text analysis (top terms, samples) reads at most this many raw answers
+TEXT_ANALYSIS_SAMPLE_SIZE = 500
+
 
 def safe_get_query_params(request, key, default=None):
     """
@@ -241,6 +258,39 @@ def get_arabic_error_messages():
     }
 
 
+def _parse_float(answer_text):
+    """Strict float parse used by CSAT rating questions (None if not numeric)."""
+    try:
+        return float(answer_text)
+    except (ValueError, TypeError):
+        return None
+
+
+def _classify_csat_yes_no(answer_text):
+    """CSAT class index for a yes/no answer (anything but yes is dissatisfied)."""
+    if answer_text.lower() in ['yes', 'true', '1', 'نعم']:
+        return CSAT_SATISFIED
+    return CSAT_DISSATISFIED
+
+
+def _classify_csat_single_choice(answer_text):
+    """CSAT class index for a single-choice satisfaction answer (default neutral)."""
+    answer_text = answer_text.lower()
+    
+    # Satisfied keywords
+    if any(keyword in answer_text for keyword in [
+        'very satisfied', 'satisfied', 'excellent', 'great', 'good',
+        'راضي جدا', 'راضي', 'ممتاز', 'جيد جدا', 'جيد'
+    ]):
+        return CSAT_SATISFIED
+    # Dissatisfied keywords
+    if any(keyword in answer_text for keyword in [
+        'dissatisfied', 'very dissatisfied', 'poor', 'bad', 'terrible',
+        'غير راضي', 'سيء', 'سيء جدا'
+    ]):
+        return CSAT_DISSATISFIED
+    return CSAT_NEUTRAL
+
 def check_link_switch_reason(token):
     """
     Check if a token was deactivated due to link type switching.
@@ -537,22 +587,7 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
                     base_queryset = self.queryset
                 else:
                     # Regular users see their own surveys, shared surveys, public/auth surveys, and group-shared surveys
-                    try:
-                        user_groups = user.user_groups.values_list('group', flat=True)
-                        base_queryset = self.queryset.filter(
-                            Q(creator=user) |  # Own surveys (including drafts)
-                            (Q(shared_with=user) & Q(status='submitted')) |  # Shared surveys (submitted only)
-                            (Q(shared_with_groups__in=user_groups) & Q(status='submitted')) |  # Group shared (submitted only)
-                            (Q(visibility='PUBLIC') & Q(status='submitted')) |  # Public surveys (submitted only)
-                            (Q(visibility='AUTH') & Q(status='submitted'))  # Auth surveys (submitted only)
-                        ).distinct().only(*self.get_oracle_safe_fields())
-                    except Exception:
-                        # Fallback to basic access if user_groups fails
-                        base_queryset = self.queryset.filter(
-                            Q(creator=user) |
-                            (Q(visibility='PUBLIC') & Q(status='submitted')) |
-                            (Q(visibility='AUTH') & Q(status='submitted'))
-                        ).distinct().only(*self.get_oracle_safe_fields())
+                    base_queryset = self.queryset.filter(pk__in=accessible_survey_ids(user, SCOPE_LIST))
                 
                 return base_queryset.get(pk=pk)
             else:
@@ -574,15 +609,8 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
             base_queryset = self.queryset
         else:
             # Regular users see their own surveys (including drafts), shared surveys (submitted only), public/auth surveys (submitted only), and group-shared surveys (submitted only)
-            user_groups = user.user_groups.values_list('group', flat=True)
-            # Oracle fix: use only() to exclude NCLOB fields when using distinct() to avoid ORA-00932 error
-            base_queryset = self.queryset.filter(
-                Q(creator=user) |  # Own surveys (including drafts)
-                (Q(shared_with=user) & Q(status='submitted')) |  # Shared surveys (submitted only)
-                (Q(shared_with_groups__in=user_groups) & Q(status='submitted')) |  # Group shared (submitted only)
-                (Q(visibility='PUBLIC') & Q(status='submitted')) |  # Public surveys (submitted only)
-                (Q(visibility='AUTH') & Q(status='submitted'))  # Auth surveys (submitted only)
-            ).distinct().only(*SurveyViewSet.get_oracle_safe_fields())
+            # The IDs are a cached UNION of those rules (see surveys.access), so no DISTINCT is needed
+            base_queryset = self.queryset.filter(pk__in=accessible_survey_ids(user, SCOPE_LIST))
         
         # Apply additional filters
         queryset = self._apply_custom_filters(base_queryset)
@@ -711,82 +739,55 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
         """
         # Get user's surveys (surveys they created)
         user_surveys = Survey.objects.filter(creator=user, deleted_at__isnull=True)
+        user_responses = SurveyResponse.objects.filter(survey__creator=user, survey__deleted_at__isnull=True)
         
         # Get date ranges
         date_ranges = self._get_date_ranges()
+        current_month = Q(created_at__gte=date_ranges['current_start'], created_at__lte=date_ranges['current_end'])
+        previous_month = Q(created_at__gte=date_ranges['previous_start'], created_at__lte=date_ranges['previous_end'])
+        active = Q(is_active=True, status='submitted')
+        week_start = timezone.now() - timedelta(days=7)
+        
+        # All survey counts in one aggregate query
+        survey_counts = user_surveys.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=active),
+            current_month=Count('id', filter=current_month),
+            current_month_active=Count('id', filter=active & current_month),
+            previous_month=Count('id', filter=previous_month),
+            previous_month_active=Count('id', filter=active & previous_month),
+            this_week=Count('id', filter=Q(created_at__gte=week_start)),
+        )
         
-        # Current counts
-        total_surveys = user_surveys.count()
-        active_surveys = user_surveys.filter(is_active=True, status='submitted').count()
-        total_responses = SurveyResponse.objects.filter(survey__creator=user, survey__deleted_at__isnull=True).count()
+        # All response counts in one aggregate query
+        response_counts = user_responses.aggregate(
+            total=Count('id'),
+            current_month=Count('id', filter=Q(
+                submitted_at__gte=date_ranges['current_start'], submitted_at__lte=date_ranges['current_end']
+            )),
+            previous_month=Count('id', filter=Q(
+                submitted_at__gte=date_ranges['previous_start'], submitted_at__lte=date_ranges['previous_end']
+            )),
+            this_week=Count('id', filter=Q(submitted_at__gte=week_start)),
+        )
+        
+        total_surveys = survey_counts['total']
+        active_surveys = survey_counts['active']
+        total_responses = response_counts['total']
         
         # Calculate average response rate
-        surveys_with_responses = user_surveys.filter(status='submitted')
-        if surveys_with_responses.exists():
-            response_rates = []
-            for survey in surveys_with_responses:
-                responses_count = survey.responses.count()
-                # Assuming target is not defined, we'll calculate based on actual participation
-                # You can adjust this logic based on your business requirements
-                if responses_count > 0:
-                    response_rates.append(100.0)  # Placeholder logic
-            avg_response_rate = sum(response_rates) / len(response_rates) if response_rates else 0.0
-        else:
-            avg_response_rate = 0.0
-        
-        # Current month counts for trends
-        current_month_surveys = user_surveys.filter(
-            created_at__gte=date_ranges['current_start'],
-            created_at__lte=date_ranges['current_end']
-        ).count()
-        
-        current_month_active = user_surveys.filter(
-            is_active=True,
-            status='submitted',
-            created_at__gte=date_ranges['current_start'],
-            created_at__lte=date_ranges['current_end']
-        ).count()
-        
-        current_month_responses = SurveyResponse.objects.filter(
-            survey__creator=user,
-            survey__deleted_at__isnull=True,
-            submitted_at__gte=date_ranges['current_start'],
-            submitted_at__lte=date_ranges['current_end']
-        ).count()
-        
-        # Previous month counts for trends
-        previous_month_surveys = user_surveys.filter(
-            created_at__gte=date_ranges['previous_start'],
-            created_at__lte=date_ranges['previous_end']
-        ).count()
-        
-        previous_month_active = user_surveys.filter(
-            is_active=True,
-            status='submitted',
-            created_at__gte=date_ranges['previous_start'],
-            created_at__lte=date_ranges['previous_end']
-        ).count()
-        
-        previous_month_responses = SurveyResponse.objects.filter(
-            survey__creator=user,
-            survey__deleted_at__isnull=True,
-            submitted_at__gte=date_ranges['previous_start'],
-            submitted_at__lte=date_ranges['previous_end']
-        ).count()
+        # Assuming target is not defined, every submitted survey with responses counts as 100%
+        has_responses = user_surveys.filter(status='submitted', responses__isnull=False).exists()
+        avg_response_rate = 100.0 if has_responses else 0.0
         
         # Calculate trends
-        total_trend = self._calculate_trend(current_month_surveys, previous_month_surveys)
-        active_trend = self._calculate_trend(current_month_active, previous_month_active)
-        responses_trend = self._calculate_trend(current_month_responses, previous_month_responses)
+        total_trend = self._calculate_trend(survey_counts['current_month'], survey_counts['previous_month'])
+        active_trend = self._calculate_trend(survey_counts['current_month_active'], survey_counts['previous_month_active'])
+        responses_trend = self._calculate_trend(response_counts['current_month'], response_counts['previous_month'])
         
         # Recent activity (this week)
-        week_start = timezone.now() - timedelta(days=7)
-        new_surveys_this_week = user_surveys.filter(created_at__gte=week_start).count()
-        new_responses_this_week = SurveyResponse.objects.filter(
-            survey__creator=user,
-            survey__deleted_at__isnull=True,
-            submitted_at__gte=week_start
-        ).count()
+        new_surveys_this_week = survey_counts['this_week']
+        new_responses_this_week = response_counts['this_week']
         
         return {
             'total_surveys': total_surveys,
@@ -1698,13 +1699,12 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
                     status_code=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get all responses for the survey
-            responses = survey.responses.all().prefetch_related('answers', 'respondent')
+            questions = list(survey.questions.all().order_by('order'))
             
             if export_format == 'csv':
-                return self._export_csv(survey, responses, include_personal)
+                return self._export_csv(survey, questions, include_personal)
             else:  # json
-                return self._export_json(survey, responses, include_personal)
+                return self._export_json(survey, questions, include_personal)
                 
         except Exception as e:
             logger.error(f"Error exporting survey {pk}: {e}")
@@ -1714,44 +1714,10 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    def _export_csv(self, survey, responses, include_personal):
-        """Export survey responses as CSV"""
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Build headers
-        headers = ['Response ID', 'Submitted At', 'Is Complete']
-        if include_personal:
-            headers.append('Respondent Email')
-        
-        # Add question headers
-        questions = survey.questions.all().order_by('order')
-        for question in questions:
-            headers.append(f"Q{question.order}: {question.text[:50]}")
-        
-        writer.writerow(headers)
-        
-        # Write data rows
-        for response in responses:
-            row = [
-                str(response.id),
-                response.submitted_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'Yes' if response.is_complete else 'No'
-            ]
-            
-            if include_personal:
-                row.append(response.respondent.email if response.respondent else 'Anonymous')
-            
-            # Add answers
-            answers_dict = {answer.question.id: answer.answer_text for answer in response.answers.all()}
-            for question in questions:
-                row.append(answers_dict.get(question.id, ''))
-            
-            writer.writerow(row)
-        
-        # Create HTTP response
-        response = HttpResponse(
-            output.getvalue(),
+    def _export_csv(self, survey, questions, include_personal):
+        """Stream survey responses as CSV, fetching responses and answers in chunks"""
+        response = StreamingHttpResponse(
+            stream_csv(survey, questions, include_personal),
             content_type='text/csv'
         )
         response['Content-Disposition'] = f'attachment; filename="survey_{survey.id}_responses.csv"'
@@ -1759,43 +1725,10 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
         logger.info(f"Survey {survey.id} exported as CSV by {self.request.user.email}")
         return response
     
-    def _export_json(self, survey, responses, include_personal):
-        """Export survey responses as JSON"""
-        export_data = {
-            'survey': {
-                'id': str(survey.id),
-                'title': survey.title,
-                'description': survey.description,
-                'exported_at': timezone.now().isoformat(),
-                'total_responses': responses.count()
-            },
-            'responses': []
-        }
-        
-        for response in responses:
-            response_data = {
-                'id': str(response.id),
-                'submitted_at': response.submitted_at.isoformat(),
-                'is_complete': response.is_complete,
-                'answers': []
-            }
-            
-            if include_personal and response.respondent:
-                response_data['respondent_email'] = response.respondent.email
-            
-            for answer in response.answers.all():
-                response_data['answers'].append({
-                    'question_id': str(answer.question.id),
-                    'question_text': answer.question.text,
-                    'question_type': answer.question.question_type,
-                    'answer_text': answer.answer_text
-                })
-            
-            export_data['responses'].append(response_data)
-        
-        # Create HTTP response
-        response = HttpResponse(
-            json.dumps(export_data, indent=2),
+    def _export_json(self, survey, questions, include_personal):
+        """Stream survey responses as JSON, fetching responses and answers in chunks"""
+        response = StreamingHttpResponse(
+            stream_json(survey, questions, include_personal),
             content_type='application/json'
         )
         response['Content-Disposition'] = f'attachment; filename="survey_{survey.id}_responses.json"'
@@ -2704,38 +2637,40 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
             user_ids = request.data.get('user_ids', [])
             emails = request.data.get('emails', [])
             
-            shared_users = []
+            users = []
             
             # Add users by ID
             if user_ids:
-                users = User.objects.filter(id__in=user_ids)
-                for user in users:
-                    survey.shared_with.add(user)
-                    shared_users.append({
-                        'id': user.id,
-                        'email': user.email,
-                        'name': user.full_name
-                    })
+                users.extend(User.objects.filter(id__in=user_ids))
             
             # Add users by email
             if emails:
                 for email in emails:
                     try:
-                        user = User.objects.get_by_email(email)
-                        survey.shared_with.add(user)
-                        shared_users.append({
-                            'id': user.id,
-                            'email': user.email,
-                            'name': user.full_name
-                        })
+                        users.append(User.objects.get_by_email(email))
                     except User.DoesNotExist:
                         # Log that user doesn't exist but don't fail the request
                         logger.warning(f"User with email {email} not found for sharing survey {survey.id}")
             
-            # Set survey to private if not already
-            if survey.visibility != 'PRIVATE':
-                survey.visibility = 'PRIVATE'
-                survey.save(update_fields=['visibility'])
+            shared_users = [
+                {
+                    'id': user.id,
+                    'email': user.email,
+                    'name': user.full_name
+                }
+                for user in users
+            ]
+            
+            with transaction.atomic():
+                # One add for all users: their notifications go out as a
+                # single background job after commit
+                if users:
+                    survey.shared_with.add(*users)
+                
+                # Set survey to private if not already
+                if survey.visibility != 'PRIVATE':
+                    survey.visibility = 'PRIVATE'
+                    survey.save(update_fields=['visibility'])
             
             logger.info(f"Survey {survey.id} shared with {len(shared_users)} users by {request.user.email}")
             
@@ -2765,7 +2700,7 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
         
         Body:
         {
-            "force_send": false  // Optional: Set to true to send to all users even for PUBLIC/AUTH surveys (default: false)
+            "force_send": false  // Optional: Set to true to send to all users even for PUBLIC surveys (default: false)
         }
         
         This endpoint allows survey creators to manually send notifications after creating/updating surveys.
@@ -2786,28 +2721,39 @@ class SurveyViewSet(AuditMixin, ModelViewSet):
             # Get force_send parameter
             force_send = request.data.get('force_send', False)
             
+            if survey.visibility == 'PUBLIC' and not force_send:
+                message = "Notifications not sent to prevent spam to all users. Use force_send=true to override."
+                return uniform_response(
+                    success=True,
+                    message=message,
+                    data={
+                        'notifications_queued': False,
+                        'survey_visibility': survey.visibility,
+                        'force_send_used': force_send
+                    }
+                )
+            
             try:
-                notifications = SurveyNotificationService.notify_users_of_new_survey(
-                    survey, request, force_send=force_send
+                # Clients may retry with the same Idempotency-Key header without duplicating the send
+                client_key = request.headers.get('Idempotency-Key')
+                job = jobs.enqueue(
+                    'surveys.notify_new_survey',
+                    {
+                        'survey_id': str(survey.id),
+                        'force_send': bool(force_send),
+                        'base_url': get_domain_url(request)
+                    },
+                    idempotency_key=f"survey_send_notifications:{survey.id}:{client_key}"[:255] if client_key else None
                 )
                 
-                if notifications is None or len(notifications) == 0:
-                    if survey.visibility == 'PUBLIC' and not force_send:
-                        message = "Notifications not sent to prevent spam to all users. Use force_send=true to override."
-                    elif survey.visibility == 'AUTH' and not force_send:
-                        message = "Notifications not sent to prevent spam to all authenticated users. Use force_send=true to override."
-                    else:
-                        message = "No eligible users to notify for this survey."
-                else:
-                    message = f"Successfully sent {len(notifications)} notifications."
-                
-                logger.info(f"Manual notification sending for survey {survey.id} by {request.user.email}: {message}")
+                logger.info(f"Queued notification job {job.id} for survey {survey.id} by {request.user.email}")
                 
                 return uniform_response(
                     success=True,
-                    message=message,
+                    message="Notifications are being sent.",
                     data={
-                        'notifications_sent': len(notifications) if notifications else 0,
+                        'notifications_queued': True,
+                        'job_id': job.id,
                         'survey_visibility': survey.visibility,
                         'force_send_used': force_send
                     }
@@ -3486,40 +3432,15 @@ class MySharedSurveysView(generics.ListAPIView):
         try:
             logger.info(f"Building queryset for user {user.email}")
             
-            public_surveys = Q(visibility='PUBLIC')
-            auth_surveys = Q(visibility='AUTH')
-            
-            # Start with basic query that should always work
-            base_query = public_surveys | auth_surveys
-            
-            # Try to add private shared surveys
-            try:
-                private_shared_surveys = Q(visibility='PRIVATE', shared_with=user) & ~Q(creator=user)
-                base_query = base_query | private_shared_surveys
-                logger.debug(f"Added private shared surveys for {user.email}")
-            except Exception as e:
-                logger.warning(f"Could not query private shared surveys for {user.email}: {e}")
-            
-            # Try to add group surveys if user has groups
-            try:
-                user_groups = user.user_groups.values_list('group', flat=True)
-                if user_groups.exists():
-                    group_shared_surveys = Q(visibility='GROUPS', shared_with_groups__in=user_groups) & ~Q(creator=user)
-                    base_query = base_query | group_shared_surveys
-                    logger.debug(f"Added group shared surveys for {user.email}")
-                else:
-                    logger.debug(f"User {user.email} has no groups")
-            except Exception as e:
-                logger.warning(f"Could not query user groups for {user.email}: {e}")
-            
-            # Build the final queryset with minimal prefetch to avoid table issues
-            # Oracle fix: use only() to exclude NCLOB fields when using distinct() to avoid ORA-00932 error
+            # Accessible IDs come from a cached UNION of the sharing rules, so the
+            # list is a primary-key lookup instead of an OR across join tables with DISTINCT
+            survey_ids = accessible_survey_ids(user, SCOPE_SHARED)
             queryset = Survey.objects.filter(
-                base_query,
+                pk__in=survey_ids,
                 deleted_at__isnull=True,
                 is_active=True,  # Only show active surveys
                 status='submitted'  # Only show submitted surveys, exclude drafts
-            ).distinct().select_related('creator').only(*self.get_oracle_safe_fields())
+            ).select_related('creator')
             
             # Try to add prefetch_related safely
             try:
@@ -3967,34 +3888,26 @@ class AuthenticatedSurveyResponseView(APIView):
                     status_code=status.HTTP_409_CONFLICT
                 )
             
-            # Create survey response
-            survey_response = SurveyResponse.objects.create(
-                survey=survey,
+            # Validate all answers in memory before writing anything
+            answers, validation_errors = prepare_answers(
+                survey, answers_data, answer_key='answer_text', skip_unknown=True
+            )
+            if validation_errors:
+                return uniform_response(
+                    success=False,
+                    message="فشل التحقق من صحة البيانات / Validation failed",
+                    data={'validation_errors': validation_errors},
+                    status_code=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Create survey response and answers in one transaction
+            survey_response, created_answers = create_response_with_answers(
+                survey,
+                answers,
                 respondent=user,
                 is_complete=True  # Assume complete submission for authenticated users
             )
             
-            # Create answers
-            created_answers = []
-            for answer_data in answers_data:
-                question_id = answer_data.get('question_id')
-                answer_text = answer_data.get('answer_text', '')
-                
-                if not question_id:
-                    continue
-                
-                try:
-                    question = Question.objects.get(id=question_id, survey=survey)
-                    answer = Answer.objects.create(
-                        response=survey_response,
-                        question=question,
-                        answer_text=str(answer_text)
-                    )
-                    created_answers.append(answer)
-                except Question.DoesNotExist:
-                    logger.warning(f"Question {question_id} not found in survey {survey.id}")
-                    continue
-            
             # Log the submission
             logger.info(f"Authenticated survey response submitted: {survey_response.id} for survey {survey.id} by {user.email}")
             
@@ -4215,16 +4128,14 @@ class SurveyResponseSubmissionView(APIView):
                     # Check by email for anonymous users only (don't cross-check with authenticated users)
                     existing_response = SurveyResponse.objects.filter(
                         survey=survey,
-                        respondent__isnull=True,  # Only check anonymous responses
-                        respondent_email=respondent_email
-                    ).first()
+                        respondent__isnull=True  # Only check anonymous responses
+                    ).with_contact(email=respondent_email).first()
                 elif respondent_phone:
                     # Check by phone for anonymous users only
                     existing_response = SurveyResponse.objects.filter(
                         survey=survey,
-                        respondent__isnull=True,  # Only check anonymous responses
-                        respondent_phone=respondent_phone
-                    ).first()
+                        respondent__isnull=True  # Only check anonymous responses
+                    ).with_contact(phone=respondent_phone).first()
                 
                 if existing_response:
                     arabic_messages = get_arabic_error_messages()
@@ -4238,49 +4149,9 @@ class SurveyResponseSubmissionView(APIView):
                         status_code=status.HTTP_409_CONFLICT
                     )
             
-            # Create survey response
-            survey_response = SurveyResponse.objects.create(
-                survey=survey,
-                respondent=respondent,
-                respondent_email=respondent_email,  # Store email for anonymous responses
-                respondent_phone=respondent_phone   # Store phone for anonymous responses
-            )
-            
-            # Create device tracking record if per-device access is enabled
-            if survey.per_device_access:
-                from .models import DeviceResponse
-                DeviceResponse.create_device_tracking(survey, request, survey_response)
-            
-            # Import answer validator
-            from .validators import validate_answer
-            
-            # Validate all answers first before creating any
-            validation_errors = []
-            for answer_data in answers_data:
-                try:
-                    question = Question.objects.get(
-                        id=answer_data['question_id'], 
-                        survey=survey
-                    )
-                    
-                    # Validate answer based on question's validation_type
-                    is_valid, error_message = validate_answer(question, answer_data['answer'])
-                    if not is_valid:
-                        validation_errors.append({
-                            'question_id': str(question.id),
-                            'question_text': question.text,
-                            'error': error_message
-                        })
-                        
-                except Question.DoesNotExist:
-                    validation_errors.append({
-                        'question_id': answer_data['question_id'],
-                        'error': f"Question {answer_data['question_id']} not found in survey"
-                    })
-            
-            # If validation errors exist, delete response and return errors
+            # Validate all answers in memory before writing anything
+            answers, validation_errors = prepare_answers(survey, answers_data, answer_key='answer')
             if validation_errors:
-                survey_response.delete()
                 return uniform_response(
                     success=False,
                     message="فشل التحقق من صحة البيانات / Validation failed",
@@ -4288,20 +4159,23 @@ class SurveyResponseSubmissionView(APIView):
                     status_code=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Create answers (validation passed)
-            created_answers = []
-            for answer_data in answers_data:
-                question = Question.objects.get(
-                    id=answer_data['question_id'], 
-                    survey=survey
-                )
+            # Create device tracking record if per-device access is enabled
+            track_device = None
+            if survey.per_device_access:
+                from .models import DeviceResponse
                 
-                answer = Answer.objects.create(
-                    response=survey_response,
-                    question=question,
-                    answer_text=answer_data['answer']
-                )
-                created_answers.append(answer)
+                def track_device(created_response):
+                    DeviceResponse.create_device_tracking(survey, request, created_response)
+            
+            # Create the response and all answers in one transaction (validation passed)
+            survey_response, created_answers = create_response_with_answers(
+                survey,
+                answers,
+                on_created=track_device,
+                respondent=respondent,
+                respondent_email=respondent_email,  # Store email for anonymous responses
+                respondent_phone=respondent_phone   # Store phone for anonymous responses
+            )
             
             # Log the submission
             user_info = f"user {respondent.email}" if respondent else f"email {respondent_email}"
@@ -4420,28 +4294,23 @@ class SurveySubmissionView(APIView):
             
             answers_data = serializer.validated_data['answers']
             
-            # Create response
-            survey_response = SurveyResponse.objects.create(
-                survey=survey,
+            # Validate all answers in memory before writing anything
+            answers, validation_errors = prepare_answers(survey, answers_data, answer_key='answer_text')
+            if validation_errors:
+                return uniform_response(
+                    success=False,
+                    message="فشل التحقق من صحة البيانات / Validation failed",
+                    data={'validation_errors': validation_errors},
+                    status_code=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Create response and answers in one transaction
+            survey_response, created_answers = create_response_with_answers(
+                survey,
+                answers,
                 respondent=request.user if request.user.is_authenticated else None
             )
             
-            # Create answers
-            created_answers = []
-            for answer_data in answers_data:
-                question = get_object_or_404(
-                    Question, 
-                    id=answer_data['question_id'], 
-                    survey=survey
-                )
-                
-                answer = Answer.objects.create(
-                    response=survey_response,
-                    question=question,
-                    answer_text=answer_data['answer_text']
-                )
-                created_answers.append(answer)
-            
             logger.info(f"Survey response submitted: {survey_response.id} for survey {survey.id}")
             
             return uniform_response(
@@ -4625,7 +4494,7 @@ class SurveyAnalyticsDashboardView(APIView):
     
     Query Parameters:
     - start (ISO datetime): Filter responses from this date
-    - end (ISO datetime): Filter responses until this date  
+    - end (ISO datetime): Filter responses before this date (exclusive)  
     - tz (timezone): Timezone for grouping (default: Asia/Dubai)
     - group_by (day|week|month): Time series grouping (default: day)
     - include_personal (true|false): Include PII in responses (default: false)
@@ -4656,23 +4525,23 @@ class SurveyAnalyticsDashboardView(APIView):
                     'include_personal': False
                 }
             
-            # Get filtered responses with optimized prefetch
-            responses = self._get_filtered_responses(survey, params)
-            logger.info(f"Retrieved {responses.count()} responses for survey {survey_id} analytics")
+            # Load responses and answers once into a columnar frame
+            frame = self._get_filtered_responses(survey, params)
+            logger.info(f"Retrieved {frame.total} responses for survey {survey_id} analytics")
             
             # Build dashboard data with minimal payload (v2)
             # Only include 'nps' and 'csat_tracking' if any question has the flag True
-            has_nps = survey.questions.filter(NPS_Calculate=True).exists()
-            has_csat = survey.questions.filter(CSAT_Calculate=True).exists()
+            has_nps = any(question.NPS_Calculate for question in frame.questions)
+            has_csat = any(question.CSAT_Calculate for question in frame.questions)
 
             dashboard_data = {
-                'heatmap': self._calculate_heatmap(responses, params.get('tz', 'Asia/Dubai')),
-                'questions_summary': self._get_questions_summary(survey, responses, params['include_personal'])
+                'heatmap': self._calculate_heatmap(frame, params.get('tz', 'Asia/Dubai')),
+                'questions_summary': self._get_questions_summary(survey, frame, params['include_personal'])
             }
             if has_nps:
-                dashboard_data['nps'] = self._calculate_nps_fixed(survey, responses)
+                dashboard_data['nps'] = self._calculate_nps_fixed(survey, frame)
             if has_csat:
-                dashboard_data['csat_tracking'] = self._calculate_csat_tracking(survey, responses, params)
+                dashboard_data['csat_tracking'] = self._calculate_csat_tracking(survey, frame, params)
             
             logger.info(f"Successfully generated analytics dashboard for survey {survey_id}")
             return uniform_response(
@@ -4776,16 +4645,13 @@ class SurveyAnalyticsDashboardView(APIView):
             }
     
     def _get_filtered_responses(self, survey, params):
-        """Get responses with date filtering and optimization"""
-        queryset = survey.responses.all().select_related('respondent').prefetch_related('answers__question')
-        
-        # Apply date filters
-        if params['start']:
-            queryset = queryset.filter(submitted_at__gte=params['start'])
-        if params['end']:
-            queryset = queryset.filter(submitted_at__lte=params['end'])
-        
-        return queryset
+        """Load date-filtered responses and answers as a frame, from rollups when they are in sync"""
+        return load_dashboard_frame(
+            survey,
+            start=params['start'],
+            end=params['end'],
+            tz=resolve_timezone(params.get('tz', 'Asia/Dubai'))
+        )
     
     def _get_survey_info(self, survey):
         """Get basic survey information"""
@@ -4797,486 +4663,142 @@ class SurveyAnalyticsDashboardView(APIView):
             'total_questions': survey.questions.count()
         }
     
-    def _calculate_kpis(self, survey, responses, include_personal):
+    def _calculate_heatmap(self, frame, tz_str='Asia/Dubai'):
         """
-        Calculate comprehensive key performance indicators including NPS and CSAT.
+        Calculate response heatmap (7 days × 24 hours) with timezone support.
+        
+        Returns density matrix showing when responses were submitted:
+        - Rows: Days of week (0=Sunday, 6=Saturday, UAE standard)
+        - Columns: Hours of day (0-23)
         
-        All metrics are calculated with 100% accuracy and validated for correctness.
-        Includes advanced NPS (Net Promoter Score) and CSAT (Customer Satisfaction Score) tracking.
+        Args:
+            frame: SurveyResponseFrame of the filtered responses
+            tz_str: Timezone string (e.g., 'Asia/Dubai')
+        
+        Returns:
+            dict with 'matrix', 'totals_by_day', 'totals_by_hour'
         """
-        total_responses = responses.count()
+        counts = frame.heatmap(resolve_timezone(tz_str))
         
-        if total_responses == 0:
-            return {
-                'total_responses': 0,
-                'unique_respondents': 0,
-                'completion_rate': 0.0,
-                'authenticated_count': 0,
-                'anonymous_count': 0,
-                'first_response_at': None,
-                'last_response_at': None,
-                'unique_ips': 0,
-                'avg_response_time': None,
-                'response_velocity': None,
-                'nps': None,
-                'csat': None
-            }
+        return {
+            "matrix": counts.tolist(),
+            "totals_by_day": counts.sum(axis=1).tolist(),
+            "totals_by_hour": counts.sum(axis=0).tolist()
+        }
+    
+    def _calculate_nps_fixed(self, survey, frame):
+        """
+        Calculate Net Promoter Score (NPS) with Arabic support and dynamic scale detection.
         
-        # Calculate unique respondents based on survey's contact method
-        unique_respondents = self._calculate_unique_respondents(survey, responses)
+        Selection Priority:
+        1. PRIMARY: Question with NPS_Calculate == True
+        2. FALLBACK 1: Question with semantic_tag == 'nps'
+        3. FALLBACK 2: Rating question matching NPS intent keywords (Arabic/English)
+        4. FALLBACK 3: First rating question
         
-        # Completion rate - 100% accurate calculation
-        complete_count = responses.filter(is_complete=True).count()
-        completion_rate = Decimal(complete_count) / Decimal(total_responses)
+        Dynamic Scale Support:
+        - Detects min_scale and max_scale from question (defaults: 0-5)
+        - Calculates dynamic thresholds:
+          * Detractors: bottom 60% of scale
+          * Passives: middle 20% of scale
+          * Promoters: top 20% of scale
         
-        # Authentication counts - validated for accuracy
-        authenticated_count = responses.filter(respondent__isnull=False).count()
-        anonymous_count = total_responses - authenticated_count
+        Arabic Support:
+        - Comprehensive keyword matching via arabic_text module
+        - Arabic/Persian/English digit parsing
+        - Handles all diacritics, hamza, alef variations
         
-        # Validate count accuracy
-        assert authenticated_count + anonymous_count == total_responses, "Authentication count mismatch"
+        Returns:
+            dict with NPS data or None if no valid NPS question found
+        """
+        from .arabic_text import normalize_arabic, match_intent, extract_number
+        from .arabic_text import NPS_KEYWORDS_AR, NPS_KEYWORDS_EN
+        from .metrics import nps_thresholds, nps_distribution, nps_interpretation
+        from .metrics import nps_counts, nps_confidence_interval
         
-        # Time range analysis
-        first_response = responses.order_by('submitted_at').first()
-        last_response = responses.order_by('-submitted_at').first()
+        # Frame questions are already ordered by 'order'
+        rating_questions = [q for q in frame.questions if q.question_type in ['rating', 'تقييم']]
         
-        # Average response time (time between survey creation and response submission)
-        avg_response_time = self._calculate_avg_response_time(survey, responses)
+        # Priority 1: Check for NPS_Calculate flag
+        nps_question = next((q for q in rating_questions if q.NPS_Calculate), None)
         
-        # Response velocity (responses per day)
-        response_velocity = self._calculate_response_velocity(responses)
+        if not nps_question:
+            # Priority 2: Check for semantic_tag
+            nps_question = next((q for q in rating_questions if q.semantic_tag == 'nps'), None)
         
-        # Unique IPs (only if include_personal is True)
-        unique_ips = 0
-        if include_personal:
-            # Count unique devices from device tracking (more accurate than IP)
-            unique_devices = survey.device_responses.values('mac_address').distinct().count()
-            unique_ips = unique_devices  # Keep variable name for backward compatibility
+        if not nps_question:
+            # Priority 3: Intent matching via keywords
+            for question in rating_questions:
+                question_text = question.text
+                # Check Arabic keywords
+                if match_intent(question_text, NPS_KEYWORDS_AR):
+                    nps_question = question
+                    break
+                # Check English keywords
+                if match_intent(question_text, NPS_KEYWORDS_EN):
+                    nps_question = question
+                    break
         
-        # Calculate NPS (Net Promoter Score) - detects rating questions with dynamic scale support
-        nps_data = self._calculate_nps_fixed(survey, responses)
+        if not nps_question:
+            # Priority 4: Fallback to first rating question
+            nps_question = rating_questions[0] if rating_questions else None
         
-        # Calculate CSAT (Customer Satisfaction Score) - detects satisfaction questions
-        csat_data = self._calculate_csat(survey, responses)
+        if not nps_question:
+            logger.debug(f"No NPS question found for survey {survey.id}")
+            return None
         
-        kpis = {
-            'total_responses': total_responses,
-            'unique_respondents': unique_respondents,
-            'completion_rate': float(completion_rate.quantize(Decimal('0.001'), rounding=ROUND_HALF_UP)),
-            'completion_rate_pct': float((completion_rate * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'authenticated_count': authenticated_count,
-            'anonymous_count': anonymous_count,
-            'first_response_at': serialize_datetime_uae(first_response.submitted_at) if first_response else None,
-            'last_response_at': serialize_datetime_uae(last_response.submitted_at) if last_response else None,
-            'unique_ips': unique_ips,
-            'avg_response_time': avg_response_time,
-            'response_velocity': response_velocity
-        }
+        # Get scale metadata
+        min_scale = nps_question.min_scale if nps_question.min_scale is not None else 0
+        max_scale = nps_question.max_scale if nps_question.max_scale is not None else 5
         
-        # Add NPS data if available
-        if nps_data:
-            kpis['nps'] = nps_data
-        
-        # Add CSAT data if available
-        if csat_data:
-            kpis['csat'] = csat_data
-        
-        return kpis
-    
-    def _calculate_unique_respondents(self, survey, responses):
-        """Calculate unique respondents based on contact method"""
-        # Count authenticated users
-        auth_count = responses.filter(respondent__isnull=False).values('respondent').distinct().count()
-        
-        # Count anonymous users based on contact method
-        anon_count = 0
-        if survey.public_contact_method == 'email':
-            anon_count = responses.filter(
-                respondent__isnull=True,
-                respondent_email__isnull=False
-            ).values('respondent_email').distinct().count()
-        elif survey.public_contact_method == 'phone':
-            anon_count = responses.filter(
-                respondent__isnull=True,
-                respondent_phone__isnull=False
-            ).values('respondent_phone').distinct().count()
-        
-        return auth_count + anon_count
-    
-    def _calculate_avg_response_time(self, survey, responses):
-        """
-        Calculate average time between survey creation and response submission.
-        Returns average time in hours, rounded to 2 decimal places.
-        """
-        if not responses.exists():
+        # Validate scale
+        if min_scale >= max_scale:
+            logger.warning(f"Invalid NPS scale for question {nps_question.id}: min={min_scale}, max={max_scale}")
             return None
         
-        total_hours = Decimal('0')
-        valid_responses = 0
+        # Get dynamic thresholds
+        det_max, pas_max = nps_thresholds(min_scale, max_scale)
         
-        for response in responses:
-            time_diff = response.submitted_at - survey.created_at
-            hours = Decimal(time_diff.total_seconds()) / Decimal('3600')
-            total_hours += hours
-            valid_responses += 1
+        # Get all answers for this question (only complete responses)
+        answers = frame.answers(nps_question.id, complete_only=True)
         
-        if valid_responses == 0:
+        if not answers:
+            logger.debug(f"No answers found for NPS question {nps_question.id}")
             return None
         
-        avg_hours = total_hours / Decimal(valid_responses)
-        return float(avg_hours.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-    
-    def _calculate_response_velocity(self, responses):
-        """
-        Calculate response velocity (responses per day) with UAE timezone consistency.
-        Returns the average number of responses per day since the first response.
-        """
-        if not responses.exists() or responses.count() < 2:
-            return None
+        # Parse each distinct answer once (Arabic/Persian/English digit support)
+        scores = map_distinct(answers.texts, extract_number)
+        counts = answers.counts
         
-        first_response = responses.order_by('submitted_at').first()
-        last_response = responses.order_by('-submitted_at').first()
+        unparsed = np.isnan(scores)
+        if unparsed.any():
+            logger.debug(f"Could not extract a number from {int(counts[unparsed].sum())} answers to question {nps_question.id}")
         
-        # Ensure UAE timezone for consistent calculation
-        from .timezone_utils import ensure_uae_timezone
-        first_response_uae = ensure_uae_timezone(first_response.submitted_at)
-        last_response_uae = ensure_uae_timezone(last_response.submitted_at)
+        # Validate range
+        in_range = (scores >= min_scale) & (scores <= max_scale)
+        out_of_range = ~unparsed & ~in_range
+        if out_of_range.any():
+            logger.warning(f"{int(counts[out_of_range].sum())} answers outside scale [{min_scale}, {max_scale}] for question {nps_question.id}")
         
-        time_diff = last_response_uae - first_response_uae
-        # Use max to ensure at least 1 day to avoid division by very small numbers
-        days = max(Decimal(time_diff.total_seconds()) / Decimal('86400'), Decimal('1'))
+        if not in_range.any():
+            logger.info(f"No valid numeric answers for NPS question {nps_question.id}")
+            return None
         
-        velocity = Decimal(responses.count()) / days
-        return float(velocity.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-    
-    def _calculate_heatmap(self, responses, tz_str='Asia/Dubai'):
-        """
-        Calculate response heatmap (7 days × 24 hours) with timezone support.
+        # Categorize responses using dynamic thresholds (each value weighted by its answer count)
+        detractors, passives, promoters = nps_counts(scores, min_scale, max_scale, counts)
+        total_responses = detractors + passives + promoters
+        ci_lower, ci_upper = nps_confidence_interval(detractors, passives, promoters)
         
-        Returns density matrix showing when responses were submitted:
-        - Rows: Days of week (0=Sunday, 6=Saturday, UAE standard)
-        - Columns: Hours of day (0-23)
+        # Calculate percentages using Decimal for precision
+        promoters_pct = Decimal(promoters) / Decimal(total_responses) * Decimal('100')
+        passives_pct = Decimal(passives) / Decimal(total_responses) * Decimal('100')
+        detractors_pct = Decimal(detractors) / Decimal(total_responses) * Decimal('100')
         
-        Args:
-            responses: QuerySet of Response objects
-            tz_str: Timezone string (e.g., 'Asia/Dubai')
-        
-        Returns:
-            dict with 'matrix', 'totals_by_day', 'totals_by_hour'
-        """
-        import pytz
-        
-        # Validate and setup timezone
-        try:
-            tz = pytz.timezone(tz_str) if tz_str else pytz.timezone('Asia/Dubai')
-        except pytz.exceptions.UnknownTimeZoneError:
-            logger.warning(f"Invalid timezone '{tz_str}', using fallback 'Asia/Dubai'")
-            tz = pytz.timezone('Asia/Dubai')
-        
-        # Initialize 7×24 matrix (all zeros)
-        matrix = [[0] * 24 for _ in range(7)]
-        
-        # Filter to complete responses
-        complete_responses = responses.filter(is_complete=True)
-        
-        # Process each response
-        for response in complete_responses:
-            try:
-                if not response.submitted_at:
-                    logger.debug(f"Response {response.id} has no submitted_at timestamp, skipping")
-                    continue
-                
-                # Convert to local timezone
-                local_dt = response.submitted_at.astimezone(tz)
-                
-                # Calculate weekday index (convert Monday=0 to Sunday=0)
-                # Python's weekday(): Monday=0, Sunday=6
-                # Our format: Sunday=0, Saturday=6
-                weekday_idx = (local_dt.weekday() + 1) % 7
-                
-                # Hour is 0-23
-                hour = local_dt.hour
-                
-                # Increment matrix cell
-                matrix[weekday_idx][hour] += 1
-                
-            except (AttributeError, TypeError) as e:
-                logger.warning(f"Error processing response {response.id} timestamp: {e}")
-                continue
-        
-        # Calculate totals
-        totals_by_day = [sum(row) for row in matrix]
-        totals_by_hour = [sum(matrix[day][hour] for day in range(7)) for hour in range(24)]
-        
-        return {
-            "matrix": matrix,
-            "totals_by_day": totals_by_day,
-            "totals_by_hour": totals_by_hour
-        }
-    
-    def _calculate_nps(self, survey, responses):
-        """
-        Calculate Net Promoter Score (NPS) from rating questions.
-        
-        NPS is calculated from 0-10 scale questions:
-        - Promoters: 9-10 (positive)
-        - Passives: 7-8 (neutral)
-        - Detractors: 0-6 (negative)
-        
-        NPS = (% Promoters - % Detractors)
-        Range: -100 to +100
-        
-        Returns detailed NPS data including:
-        - score: The NPS score (-100 to +100)
-        - promoters_count, passives_count, detractors_count
-        - promoters_pct, passives_pct, detractors_pct
-        - question_id: ID of the question used for NPS calculation
-        - total_responses: Number of responses used in calculation
-        """
-        # Find rating questions that could be NPS questions
-        nps_questions = survey.questions.filter(question_type='rating').order_by('order')
-        
-        if not nps_questions.exists():
-            return None
-        
-        # Try to find the best NPS question (look for keywords or use first rating question)
-        nps_question = None
-        for question in nps_questions:
-            question_text = question.text.lower()
-            # Check for NPS-related keywords
-            if any(keyword in question_text for keyword in ['recommend', 'likely to recommend', 'نوصي', 'التوصية']):
-                nps_question = question
-                break
-        
-        # If no keyword match, use the first rating question
-        if not nps_question:
-            nps_question = nps_questions.first()
-        
-        # Get all answers for this question
-        answers = Answer.objects.filter(
-            question=nps_question,
-            response__in=responses
-        )
-        
-        if not answers.exists():
-            return None
-        
-        # Extract numeric values
-        numeric_values = []
-        for answer in answers:
-            try:
-                value = float(answer.answer_text)
-                # Validate that the value is in 0-10 range (NPS standard)
-                if 0 <= value <= 10:
-                    numeric_values.append(int(round(value)))  # Round to nearest integer
-            except (ValueError, TypeError):
-                continue
-        
-        if not numeric_values:
-            return None
-        
-        total_responses = len(numeric_values)
-        
-        # Categorize responses
-        promoters = sum(1 for v in numeric_values if v >= 9)
-        passives = sum(1 for v in numeric_values if 7 <= v <= 8)
-        detractors = sum(1 for v in numeric_values if v <= 6)
-        
-        # Validate categorization accuracy
-        assert promoters + passives + detractors == total_responses, "NPS categorization count mismatch"
-        
-        # Calculate percentages using Decimal for precision
-        promoters_pct = Decimal(promoters) / Decimal(total_responses) * Decimal('100')
-        passives_pct = Decimal(passives) / Decimal(total_responses) * Decimal('100')
-        detractors_pct = Decimal(detractors) / Decimal(total_responses) * Decimal('100')
-        
-        # Calculate NPS score: % Promoters - % Detractors
-        nps_score = promoters_pct - detractors_pct
-        
-        # Distribution by score
-        score_distribution = Counter(numeric_values)
-        distribution = []
-        for score in range(11):  # 0-10
-            count = score_distribution.get(score, 0)
-            pct = Decimal(count) / Decimal(total_responses) * Decimal('100') if total_responses > 0 else Decimal('0')
-            distribution.append({
-                'score': score,
-                'count': count,
-                'pct': float(pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-            })
-        
-        return {
-            'score': float(nps_score.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'promoters_count': promoters,
-            'passives_count': passives,
-            'detractors_count': detractors,
-            'promoters_pct': float(promoters_pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'passives_pct': float(passives_pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'detractors_pct': float(detractors_pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'total_responses': total_responses,
-            'question_id': str(nps_question.id),
-            'question_text': nps_question.text[:100],  # Truncate for readability
-            'distribution': distribution,
-            'interpretation': self._interpret_nps(float(nps_score))
-        }
-    
-    def _interpret_nps(self, nps_score):
-        """
-        Provide interpretation of NPS score.
-        
-        Industry benchmarks:
-        - Above 70: Excellent (World-class)
-        - 50-70: Great (Very good)
-        - 30-49: Good (Room for improvement)
-        - 0-29: Needs improvement
-        - Below 0: Critical (Urgent action needed)
-        """
-        if nps_score >= 70:
-            return "Excellent - World-class NPS score"
-        elif nps_score >= 50:
-            return "Great - Very strong customer loyalty"
-        elif nps_score >= 30:
-            return "Good - Positive but room for improvement"
-        elif nps_score >= 0:
-            return "Fair - Needs improvement"
-        else:
-            return "Critical - Urgent action needed"
-    
-    def _calculate_nps_fixed(self, survey, responses):
-        """
-        Calculate Net Promoter Score (NPS) with Arabic support and dynamic scale detection.
-        
-        Selection Priority:
-        1. PRIMARY: Question with NPS_Calculate == True
-        2. FALLBACK 1: Question with semantic_tag == 'nps'
-        3. FALLBACK 2: Rating question matching NPS intent keywords (Arabic/English)
-        4. FALLBACK 3: First rating question
-        
-        Dynamic Scale Support:
-        - Detects min_scale and max_scale from question (defaults: 0-5)
-        - Calculates dynamic thresholds:
-          * Detractors: bottom 60% of scale
-          * Passives: middle 20% of scale
-          * Promoters: top 20% of scale
-        
-        Arabic Support:
-        - Comprehensive keyword matching via arabic_text module
-        - Arabic/Persian/English digit parsing
-        - Handles all diacritics, hamza, alef variations
-        
-        Returns:
-            dict with NPS data or None if no valid NPS question found
-        """
-        from .arabic_text import normalize_arabic, match_intent, extract_number
-        from .arabic_text import NPS_KEYWORDS_AR, NPS_KEYWORDS_EN
-        from .metrics import nps_thresholds, nps_distribution, nps_interpretation
-        
-        # Priority 1: Check for NPS_Calculate flag
-        nps_question = survey.questions.filter(
-            question_type__in=['rating', 'تقييم'],
-            NPS_Calculate=True
-        ).first()
-        
-        if not nps_question:
-            # Priority 2: Check for semantic_tag
-            nps_question = survey.questions.filter(
-                question_type__in=['rating', 'تقييم'],
-                semantic_tag='nps'
-            ).first()
-        
-        if not nps_question:
-            # Priority 3: Intent matching via keywords
-            rating_questions = survey.questions.filter(
-                question_type__in=['rating', 'تقييم']
-            ).order_by('order')
-            
-            for question in rating_questions:
-                question_text = question.text
-                # Check Arabic keywords
-                if match_intent(question_text, NPS_KEYWORDS_AR):
-                    nps_question = question
-                    break
-                # Check English keywords
-                if match_intent(question_text, NPS_KEYWORDS_EN):
-                    nps_question = question
-                    break
-        
-        if not nps_question:
-            # Priority 4: Fallback to first rating question
-            nps_question = survey.questions.filter(
-                question_type__in=['rating', 'تقييم']
-            ).order_by('order').first()
-        
-        if not nps_question:
-            logger.debug(f"No NPS question found for survey {survey.id}")
-            return None
-        
-        # Get scale metadata
-        min_scale = nps_question.min_scale if nps_question.min_scale is not None else 0
-        max_scale = nps_question.max_scale if nps_question.max_scale is not None else 5
-        
-        # Validate scale
-        if min_scale >= max_scale:
-            logger.warning(f"Invalid NPS scale for question {nps_question.id}: min={min_scale}, max={max_scale}")
-            return None
-        
-        # Get dynamic thresholds
-        det_max, pas_max = nps_thresholds(min_scale, max_scale)
-        
-        # Get all answers for this question (only complete responses)
-        answers = Answer.objects.filter(
-            question=nps_question,
-            response__in=responses.filter(is_complete=True)
-        ).select_related('response')
-        
-        if not answers.exists():
-            logger.debug(f"No answers found for NPS question {nps_question.id}")
-            return None
-        
-        # Extract numeric values with Arabic digit support
-        numeric_values = []
-        for answer in answers:
-            try:
-                # Use extract_number for Arabic/Persian/English digit support
-                value = extract_number(answer.answer_text)
-                if value is None:
-                    logger.debug(f"Could not extract number from answer: {answer.answer_text[:50]}")
-                    continue
-                
-                # Validate range
-                if min_scale <= value <= max_scale:
-                    numeric_values.append(value)
-                else:
-                    logger.warning(f"Answer {value} outside scale [{min_scale}, {max_scale}] for question {nps_question.id}")
-            except (ValueError, TypeError) as e:
-                logger.debug(f"Error parsing answer text: {e}")
-                continue
-        
-        if not numeric_values:
-            logger.info(f"No valid numeric answers for NPS question {nps_question.id}")
-            return None
-        
-        total_responses = len(numeric_values)
-        
-        # Categorize responses using dynamic thresholds
-        promoters = sum(1 for v in numeric_values if v > pas_max)
-        passives = sum(1 for v in numeric_values if det_max < v <= pas_max)
-        detractors = sum(1 for v in numeric_values if v <= det_max)
-        
-        # Validate categorization
-        if promoters + passives + detractors != total_responses:
-            logger.error(f"NPS categorization count mismatch: {promoters}+{passives}+{detractors} != {total_responses}")
-        
-        # Calculate percentages using Decimal for precision
-        promoters_pct = Decimal(promoters) / Decimal(total_responses) * Decimal('100')
-        passives_pct = Decimal(passives) / Decimal(total_responses) * Decimal('100')
-        detractors_pct = Decimal(detractors) / Decimal(total_responses) * Decimal('100')
-        
-        # Calculate NPS score: % Promoters - % Detractors
-        nps_score = promoters_pct - detractors_pct
+        # Calculate NPS score: % Promoters - % Detractors
+        nps_score = promoters_pct - detractors_pct
         
         # Get distribution
-        distribution = nps_distribution(numeric_values, min_scale, max_scale)
+        distribution = nps_distribution(scores[in_range], min_scale, max_scale, counts[in_range])
         
         return {
             'score': float(nps_score.quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)),
@@ -5295,200 +4817,14 @@ class SurveyAnalyticsDashboardView(APIView):
             'passive_range': f"{det_max+1}-{pas_max}",
             'promoter_range': f"{pas_max+1}-{max_scale}",
             'distribution': distribution,
+            'confidence_interval': {
+                'lower': round(ci_lower, 1),
+                'upper': round(ci_upper, 1)
+            },
             'interpretation': nps_interpretation(float(nps_score))
         }
     
-    def _calculate_csat(self, survey, responses):
-        """
-        Calculate Customer Satisfaction Score (CSAT) from satisfaction-related questions.
-        
-        CSAT is typically calculated from:
-        1. Rating questions (1-5 or 1-10 scale) - % who rate 4-5 (or 8-10)
-        2. Yes/No questions asking about satisfaction
-        3. Single choice questions with satisfaction levels
-        
-        CSAT = (Number of satisfied customers / Total responses) × 100
-        Range: 0% to 100%
-        
-        Returns detailed CSAT data including:
-        - score: The CSAT percentage (0-100)
-        - satisfied_count: Number of satisfied respondents
-        - neutral_count: Number of neutral respondents
-        - dissatisfied_count: Number of dissatisfied respondents
-        - question_id: ID of the question used for CSAT calculation
-        - total_responses: Number of responses used in calculation
-        """
-        # Find potential CSAT questions
-        # Priority 1: Rating questions with satisfaction keywords
-        rating_questions = survey.questions.filter(question_type='rating').order_by('order')
-        
-        csat_question = None
-        csat_type = None
-        
-        # Look for satisfaction-related rating questions
-        for question in rating_questions:
-            question_text = question.text.lower()
-            if any(keyword in question_text for keyword in [
-                'satisf', 'happy', 'pleased', 'content',
-                'راضي', 'رضا', 'سعيد', 'مسرور'
-            ]):
-                csat_question = question
-                csat_type = 'rating'
-                break
-        
-        # Priority 2: Yes/No questions about satisfaction
-        if not csat_question:
-            yesno_questions = survey.questions.filter(question_type='yes_no').order_by('order')
-            for question in yesno_questions:
-                question_text = question.text.lower()
-                if any(keyword in question_text for keyword in [
-                    'satisf', 'happy', 'pleased',
-                    'راضي', 'رضا', 'سعيد'
-                ]):
-                    csat_question = question
-                    csat_type = 'yes_no'
-                    break
-        
-        # Priority 3: Single choice questions with satisfaction levels
-        if not csat_question:
-            choice_questions = survey.questions.filter(question_type='single_choice').order_by('order')
-            for question in choice_questions:
-                question_text = question.text.lower()
-                if any(keyword in question_text for keyword in [
-                    'satisf', 'experience', 'rate',
-                    'راضي', 'رضا', 'تجربة', 'تقييم'
-                ]):
-                    csat_question = question
-                    csat_type = 'single_choice'
-                    break
-        
-        if not csat_question:
-            return None
-        
-        # Get all answers for this question
-        answers = Answer.objects.filter(
-            question=csat_question,
-            response__in=responses
-        )
-        
-        if not answers.exists():
-            return None
-        
-        total_responses = answers.count()
-        satisfied_count = 0
-        neutral_count = 0
-        dissatisfied_count = 0
-        
-        # Calculate based on question type
-        if csat_type == 'rating':
-            numeric_values = []
-            for answer in answers:
-                try:
-                    value = float(answer.answer_text)
-                    numeric_values.append(value)
-                except (ValueError, TypeError):
-                    continue
-            
-            if not numeric_values:
-                return None
-            
-            total_responses = len(numeric_values)
-            max_value = max(numeric_values)
-            
-            # Determine scale and thresholds
-            if max_value <= 5:
-                # 1-5 scale: 4-5 = satisfied, 3 = neutral, 1-2 = dissatisfied
-                satisfied_count = sum(1 for v in numeric_values if v >= 4)
-                neutral_count = sum(1 for v in numeric_values if v == 3)
-                dissatisfied_count = sum(1 for v in numeric_values if v <= 2)
-            elif max_value <= 10:
-                # 1-10 scale: 8-10 = satisfied, 6-7 = neutral, 1-5 = dissatisfied
-                satisfied_count = sum(1 for v in numeric_values if v >= 8)
-                neutral_count = sum(1 for v in numeric_values if 6 <= v <= 7)
-                dissatisfied_count = sum(1 for v in numeric_values if v <= 5)
-            else:
-                # Custom scale: use percentile approach
-                threshold_high = max_value * 0.8
-                threshold_low = max_value * 0.4
-                satisfied_count = sum(1 for v in numeric_values if v >= threshold_high)
-                neutral_count = sum(1 for v in numeric_values if threshold_low <= v < threshold_high)
-                dissatisfied_count = sum(1 for v in numeric_values if v < threshold_low)
-            
-        elif csat_type == 'yes_no':
-            for answer in answers:
-                answer_text = answer.answer_text.lower()
-                if answer_text in ['yes', 'true', '1', 'نعم']:
-                    satisfied_count += 1
-                else:
-                    dissatisfied_count += 1
-        
-        elif csat_type == 'single_choice':
-            # Analyze options to categorize as satisfied/neutral/dissatisfied
-            for answer in answers:
-                answer_text = answer.answer_text.lower()
-                
-                # Satisfied keywords
-                if any(keyword in answer_text for keyword in [
-                    'very satisfied', 'satisfied', 'excellent', 'great', 'good',
-                    'راضي جدا', 'راضي', 'ممتاز', 'جيد جدا', 'جيد'
-                ]):
-                    satisfied_count += 1
-                # Dissatisfied keywords
-                elif any(keyword in answer_text for keyword in [
-                    'dissatisfied', 'very dissatisfied', 'poor', 'bad', 'terrible',
-                    'غير راضي', 'سيء', 'سيء جدا'
-                ]):
-                    dissatisfied_count += 1
-                # Neutral
-                else:
-                    neutral_count += 1
-        
-        # Validate categorization accuracy
-        assert satisfied_count + neutral_count + dissatisfied_count == total_responses, "CSAT categorization count mismatch"
-        
-        # Calculate CSAT score: (Satisfied / Total) × 100
-        csat_score = Decimal(satisfied_count) / Decimal(total_responses) * Decimal('100')
-        
-        # Calculate percentages using Decimal for precision
-        satisfied_pct = Decimal(satisfied_count) / Decimal(total_responses) * Decimal('100')
-        neutral_pct = Decimal(neutral_count) / Decimal(total_responses) * Decimal('100')
-        dissatisfied_pct = Decimal(dissatisfied_count) / Decimal(total_responses) * Decimal('100')
-        
-        return {
-            'score': float(csat_score.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'satisfied_count': satisfied_count,
-            'neutral_count': neutral_count,
-            'dissatisfied_count': dissatisfied_count,
-            'satisfied_pct': float(satisfied_pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'neutral_pct': float(neutral_pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'dissatisfied_pct': float(dissatisfied_pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-            'total_responses': total_responses,
-            'question_id': str(csat_question.id),
-            'question_text': csat_question.text[:100],  # Truncate for readability
-            'question_type': csat_type,
-            'interpretation': self._interpret_csat(float(csat_score))
-        }
-    
-    def _interpret_csat(self, csat_score):
-        """
-        Provide interpretation of CSAT score.
-        
-        Industry benchmarks:
-        - 85-100%: Excellent (Outstanding satisfaction)
-        - 75-84%: Good (Above average)
-        - 65-74%: Fair (Average, needs improvement)
-        - Below 65%: Poor (Significant issues)
-        """
-        if csat_score >= 85:
-            return "Excellent - Outstanding customer satisfaction"
-        elif csat_score >= 75:
-            return "Good - Above average satisfaction"
-        elif csat_score >= 65:
-            return "Fair - Average, room for improvement"
-        else:
-            return "Poor - Significant customer satisfaction issues"
-    
-    def _calculate_csat_tracking(self, survey, responses, params):
+    def _calculate_csat_tracking(self, survey, frame, params):
         """
         Calculate CSAT tracking over time with Arabic support and satisfaction_value mapping.
         
@@ -5509,73 +4845,52 @@ class SurveyAnalyticsDashboardView(APIView):
         - week: Week starting Sunday (UAE standard)
         - month: YYYY-MM format
         
+        Periods are assigned once per response row from the frame's timestamp
+        column, each distinct answer string is classified once, and the
+        classifications are tallied with a single bincount.
+        
         Args:
             survey: Survey instance
-            responses: QuerySet of Response objects
+            frame: SurveyResponseFrame of the filtered responses
             params: dict with 'group_by' and 'tz' keys
         
         Returns:
             list of dicts with period, score, satisfied, neutral, dissatisfied, total
         """
-        from .arabic_text import normalize_arabic, match_intent, extract_number
+        from .arabic_text import match_intent, extract_number
         from .arabic_text import CSAT_KEYWORDS_AR, CSAT_KEYWORDS_EN, classify_csat_choice, yes_no_normalize
         from .metrics import csat_score as calculate_csat_score
-        from collections import defaultdict
-        import pytz
-        from datetime import datetime, timedelta
+        from .models import QuestionOption
+        
+        # Mapped satisfaction_value -> CSAT class index
+        sat_value_class = {2: CSAT_SATISFIED, 1: CSAT_NEUTRAL, 0: CSAT_DISSATISFIED}
+        yes_no_class = {'yes': CSAT_SATISFIED, 'no': CSAT_DISSATISFIED}
+        # Keyword classifications; 'unknown' counts as neutral
+        choice_class = {'satisfied': CSAT_SATISFIED, 'neutral': CSAT_NEUTRAL, 'dissatisfied': CSAT_DISSATISFIED}
         
         # Priority 1: Get ALL questions with CSAT_Calculate flag (not just the first!)
         valid_csat_types = ['single_choice', 'rating', 'yes_no', 'اختيار واحد', 'تقييم', 'نعم/لا']
-        csat_questions = survey.questions.filter(
-            question_type__in=valid_csat_types,
-            CSAT_Calculate=True
-        ).order_by('order')
+        candidates = [q for q in frame.questions if q.question_type in valid_csat_types]
+        csat_questions = [q for q in candidates if q.CSAT_Calculate]
         
-        if not csat_questions.exists():
+        if not csat_questions:
             # Priority 2: Check for semantic_tag (get all, not just first)
-            csat_questions = survey.questions.filter(
-                question_type__in=valid_csat_types,
-                semantic_tag='csat'
-            ).order_by('order')
+            csat_questions = [q for q in candidates if q.semantic_tag == 'csat']
         
-        if not csat_questions.exists():
+        if not csat_questions:
             # Priority 3: Intent matching with priority order (fallback to single question)
+            # Rating questions first, then yes/no, then single choice
             csat_question = None
-            
-            # Rating questions first
-            rating_questions = survey.questions.filter(
-                question_type__in=['rating', 'تقييم']
-            ).order_by('order')
-            
-            for question in rating_questions:
-                question_text = question.text
-                if match_intent(question_text, CSAT_KEYWORDS_AR) or match_intent(question_text, CSAT_KEYWORDS_EN):
-                    csat_question = question
-                    break
-            
-            # Yes/No questions second
-            if not csat_question:
-                yesno_questions = survey.questions.filter(
-                    question_type__in=['yes_no', 'نعم/لا']
-                ).order_by('order')
-                
-                for question in yesno_questions:
-                    question_text = question.text
-                    if match_intent(question_text, CSAT_KEYWORDS_AR) or match_intent(question_text, CSAT_KEYWORDS_EN):
-                        csat_question = question
-                        break
-            
-            # Single choice questions third
-            if not csat_question:
-                choice_questions = survey.questions.filter(
-                    question_type__in=['single_choice', 'اختيار واحد']
-                ).order_by('order')
-                
-                for question in choice_questions:
+            for type_group in (['rating', 'تقييم'], ['yes_no', 'نعم/لا'], ['single_choice', 'اختيار واحد']):
+                for question in candidates:
+                    if question.question_type not in type_group:
+                        continue
                     question_text = question.text
                     if match_intent(question_text, CSAT_KEYWORDS_AR) or match_intent(question_text, CSAT_KEYWORDS_EN):
                         csat_question = question
                         break
+                if csat_question:
+                    break
             
             if csat_question:
                 csat_questions = [csat_question]
@@ -5589,15 +4904,27 @@ class SurveyAnalyticsDashboardView(APIView):
             logger.info(f"Invalid group_by '{group_by}', defaulting to 'day'")
             group_by = 'day'
         
-        tz_str = params.get('tz', 'Asia/Dubai')
-        try:
-            tz = pytz.timezone(tz_str)
-        except pytz.exceptions.UnknownTimeZoneError:
-            logger.warning(f"Invalid timezone '{tz_str}', using fallback 'Asia/Dubai'")
-            tz = pytz.timezone('Asia/Dubai')
+        tz = resolve_timezone(params.get('tz', 'Asia/Dubai'))
+        
+        # Period of every response row, computed once for all questions
+        period_codes, period_labels = frame.period_codes(tz, group_by, csat_period_label)
         
-        # Group answers by period - aggregate ALL CSAT questions
-        period_data = defaultdict(lambda: {'satisfied': 0, 'neutral': 0, 'dissatisfied': 0})
+        # Preload QuestionOption mappings for all choice questions in one query
+        option_mappings = defaultdict(dict)
+        choice_question_ids = [
+            q.id for q in csat_questions
+            if q.question_type in ['single_choice', 'اختيار واحد', 'yes_no', 'نعم/لا']
+        ]
+        if choice_question_ids:
+            for question_id, text_hash, sat_value in QuestionOption.objects.filter(
+                question_id__in=choice_question_ids
+            ).values_list('question_id', 'option_text_hash', 'satisfaction_value'):
+                option_mappings[question_id][text_hash] = sat_value
+        
+        # Rows and classification indexes across ALL CSAT questions
+        tallied_rows = []
+        tallied_classes = []
+        tallied_counts = []
         total_questions_processed = 0
         
         # Process each CSAT question and aggregate results
@@ -5605,154 +4932,77 @@ class SurveyAnalyticsDashboardView(APIView):
             logger.debug(f"Processing CSAT question {csat_question.id}: {csat_question.text[:50]}")
             
             # Get all answers for this specific question (only complete responses)
-            answers = Answer.objects.filter(
-                question=csat_question,
-                response__in=responses.filter(is_complete=True)
-            ).select_related('response').order_by('response__submitted_at')
+            answers = frame.answers(csat_question.id, complete_only=True)
             
-            if not answers.exists():
+            if not answers:
                 logger.debug(f"No answers found for CSAT question {csat_question.id}")
                 continue
             
             total_questions_processed += 1
+            mappings = option_mappings.get(csat_question.id, {})
+            
+            def classify_mapped(answer_text, fallback):
+                # PRIMARY: satisfaction_value mapping; unknown values count as neutral
+                answer_hash = hashlib.sha256(answer_text.encode('utf-8')).hexdigest()
+                if answer_hash in mappings:
+                    return sat_value_class.get(mappings[answer_hash], CSAT_NEUTRAL)
+                return fallback(answer_text)
+            
+            # Every distinct answer string is parsed/classified once
+            if csat_question.question_type in ['single_choice', 'اختيار واحد']:
+                # FALLBACK: Keyword-based classification
+                classes = map_distinct(answers.texts, lambda text: classify_mapped(
+                    text, lambda t: choice_class.get(classify_csat_choice(t), CSAT_NEUTRAL)
+                ), dtype=np.int64)
+            
+            elif csat_question.question_type in ['rating', 'تقييم']:
+                # Explicit scale metadata, or per-value auto-detection (1-5 / 1-10)
+                values = map_distinct(answers.texts, extract_number)
+                has_scale = csat_question.min_scale is not None and csat_question.max_scale is not None
+                classes = csat_rating_classes(
+                    values,
+                    csat_question.min_scale if has_scale else None,
+                    csat_question.max_scale if has_scale else None
+                )
+                skipped = classes == CSAT_UNCLASSIFIED
+                if skipped.any():
+                    logger.debug(f"Skipped {int(answers.counts[skipped].sum())} unparseable or unscaled rating answers for question {csat_question.id}")
             
-            # Preload QuestionOption mappings if single_choice or yes_no
-            option_mappings = {}
-            if csat_question.question_type in ['single_choice', 'اختيار واحد', 'yes_no', 'نعم/لا']:
-                from .models import QuestionOption
-                for opt in QuestionOption.objects.filter(question=csat_question):
-                    option_mappings[opt.option_text_hash] = opt.satisfaction_value
+            elif csat_question.question_type in ['yes_no', 'نعم/لا']:
+                # FALLBACK: Keyword-based yes/no normalization
+                classes = map_distinct(answers.texts, lambda text: classify_mapped(
+                    text, lambda t: yes_no_class.get(yes_no_normalize(t), CSAT_NEUTRAL)
+                ), dtype=np.int64)
             
-            for answer in answers:
-                try:
-                    if not answer.response.submitted_at:
-                        continue
-                    
-                    # Convert to local timezone
-                    local_dt = answer.response.submitted_at.astimezone(tz)
-                    
-                    # Calculate period key
-                    if group_by == 'day':
-                        period = local_dt.strftime('%Y-%m-%d')
-                    elif group_by == 'week':
-                        # Week starts on Sunday (UAE standard)
-                        days_since_sunday = (local_dt.weekday() + 1) % 7
-                        week_start = local_dt.date() - timedelta(days=days_since_sunday)
-                        period = week_start.strftime('%Y-W%U')
-                    else:  # month
-                        period = local_dt.strftime('%Y-%m')
-                    
-                    # Classify the answer
-                    classification = 'unknown'
-                    
-                    if csat_question.question_type in ['single_choice', 'اختيار واحد']:
-                        # PRIMARY: Try satisfaction_value mapping
-                        answer_hash = hashlib.sha256(answer.answer_text.encode('utf-8')).hexdigest()
-                        if answer_hash in option_mappings:
-                            sat_value = option_mappings[answer_hash]
-                            if sat_value == 2:
-                                classification = 'satisfied'
-                            elif sat_value == 1:
-                                classification = 'neutral'
-                            elif sat_value == 0:
-                                classification = 'dissatisfied'
-                        else:
-                            # FALLBACK: Keyword-based classification
-                            classification = classify_csat_choice(answer.answer_text)
-                    
-                    elif csat_question.question_type in ['rating', 'تقييم']:
-                        # Extract numeric value
-                        value = extract_number(answer.answer_text)
-                        if value is None:
-                            logger.debug(f"Could not extract number from rating answer: {answer.answer_text[:50]}")
-                            continue
-                        
-                        # Check for explicit scale metadata
-                        min_scale = csat_question.min_scale if csat_question.min_scale is not None else None
-                        max_scale = csat_question.max_scale if csat_question.max_scale is not None else None
-                        
-                        # Auto-detect scale if not explicit
-                        if min_scale is None or max_scale is None:
-                            # We'll use the value itself to infer scale
-                            if value <= 5:
-                                min_scale, max_scale = 1, 5
-                            elif value <= 10:
-                                min_scale, max_scale = 1, 10
-                            else:
-                                # Custom scale - can't auto-detect reliably
-                                logger.warning(f"Cannot auto-detect scale for value {value}")
-                                continue
-                        
-                        # Apply thresholds
-                        span = max_scale - min_scale
-                        if max_scale <= 5:
-                            # 1-5 scale: 4-5 = satisfied, 3 = neutral, 1-2 = dissatisfied
-                            if value >= min_scale + 0.6 * span:
-                                classification = 'satisfied'
-                            elif value >= min_scale + 0.4 * span:
-                                classification = 'neutral'
-                            else:
-                                classification = 'dissatisfied'
-                        elif max_scale <= 10:
-                            # 1-10 scale: 8-10 = satisfied, 6-7 = neutral, 1-5 = dissatisfied
-                            if value >= min_scale + 0.7 * span:
-                                classification = 'satisfied'
-                            elif value >= min_scale + 0.5 * span:
-                                classification = 'neutral'
-                            else:
-                                classification = 'dissatisfied'
-                        else:
-                            # Custom scale: percentile-based
-                            if value >= min_scale + 0.8 * span:
-                                classification = 'satisfied'
-                            elif value >= min_scale + 0.4 * span:
-                                classification = 'neutral'
-                            else:
-                                classification = 'dissatisfied'
-                    
-                    elif csat_question.question_type in ['yes_no', 'نعم/لا']:
-                        # PRIMARY: Try satisfaction_value mapping
-                        answer_hash = hashlib.sha256(answer.answer_text.encode('utf-8')).hexdigest()
-                        if answer_hash in option_mappings:
-                            sat_value = option_mappings[answer_hash]
-                            if sat_value == 2:
-                                classification = 'satisfied'
-                            elif sat_value == 1:
-                                classification = 'neutral'
-                            elif sat_value == 0:
-                                classification = 'dissatisfied'
-                        else:
-                            # FALLBACK: Keyword-based yes/no normalization
-                            result = yes_no_normalize(answer.answer_text)
-                            if result == 'yes':
-                                classification = 'satisfied'
-                            elif result == 'no':
-                                classification = 'dissatisfied'
-                            else:
-                                classification = 'neutral'
-                    
-                    # Increment counter
-                    if classification in ['satisfied', 'neutral', 'dissatisfied']:
-                        period_data[period][classification] += 1
-                    else:
-                        # Unknown classifications count as neutral (configurable)
-                        period_data[period]['neutral'] += 1
-                        
-                except Exception as e:
-                    logger.warning(f"Error processing answer {answer.id} for CSAT tracking: {e}")
-                    continue
+            else:
+                continue
+            
+            tallied_rows.append(answers.rows)
+            tallied_classes.append(classes)
+            tallied_counts.append(answers.counts)
         
         if total_questions_processed > 1:
             logger.info(f"CSAT tracking aggregated {total_questions_processed} questions with CSAT_Calculate=True for survey {survey.id}")
         
-        # Build result array
+        if not tallied_rows:
+            return []
+        
+        # Tally (period, classification) pairs in one pass
+        rows = np.concatenate(tallied_rows)
+        counts, _ = csat_period_series(
+            period_codes[rows],
+            np.concatenate(tallied_classes),
+            np.concatenate(tallied_counts),
+            len(period_labels)
+        )
+        
+        # Build result array
         result = []
-        for period in sorted(period_data.keys()):
-            data = period_data[period]
-            satisfied = data['satisfied']
-            neutral = data['neutral']
-            dissatisfied = data['dissatisfied']
+        for idx, period in enumerate(period_labels):
+            satisfied, neutral, dissatisfied = (int(c) for c in counts[idx])
             total = satisfied + neutral + dissatisfied
+            if total == 0:
+                continue
             
             score = calculate_csat_score(satisfied, neutral, dissatisfied)
             
@@ -5799,858 +5049,194 @@ class SurveyAnalyticsDashboardView(APIView):
                 'std_dev': 0,  # No variation with single value
                 'q1': numeric_values[0],
                 'q3': numeric_values[0],
-                'total_responses': 1
-            }
-        
-        # Safe calculation for multiple values
-        avg_val = mean(numeric_values)
-        median_val = median(numeric_values)
-        
-        # Calculate mode safely
-        try:
-            mode_val = mode(numeric_values)
-        except:
-            mode_val = None  # No unique mode
-        
-        # Calculate std_dev safely (requires at least 2 values)
-        try:
-            std_dev_val = stdev(numeric_values)
-        except:
-            std_dev_val = 0
-        
-        # Quartiles
-        sorted_values = sorted(numeric_values)
-        q1_idx = len(sorted_values) // 4
-        q3_idx = 3 * len(sorted_values) // 4
-        
-        return {
-            'avg': round(avg_val, 2),
-            'median': median_val,
-            'mode': mode_val,
-            'min': min(numeric_values),
-            'max': max(numeric_values),
-            'std_dev': round(std_dev_val, 2),
-            'q1': sorted_values[q1_idx] if sorted_values else 0,
-            'q3': sorted_values[q3_idx] if sorted_values else 0,
-            'total_responses': len(numeric_values)
-        }
-    
-    def _generate_time_series(self, responses, params):
-        """Generate time series data for responses"""
-        if not responses.exists():
-            return []
-        
-        # Get timezone for grouping
-        tz = pytz.timezone(params['tz'])
-        
-        # Group responses by time period
-        grouped_data = defaultdict(lambda: {'responses': 0, 'complete': 0, 'incomplete': 0})
-        
-        for response in responses:
-            # Convert to specified timezone
-            local_time = response.submitted_at.astimezone(tz)
-            
-            # Generate period key based on group_by
-            if params['group_by'] == 'day':
-                period_key = local_time.strftime('%Y-%m-%d')
-            elif params['group_by'] == 'week':
-                # Week start (Monday)
-                week_start = local_time - timedelta(days=local_time.weekday())
-                period_key = week_start.strftime('%Y-%m-%d')
-            else:  # month
-                period_key = local_time.strftime('%Y-%m')
-            
-            grouped_data[period_key]['responses'] += 1
-            if response.is_complete:
-                grouped_data[period_key]['complete'] += 1
-            else:
-                grouped_data[period_key]['incomplete'] += 1
-        
-        # Sort and format output
-        time_series = []
-        for period in sorted(grouped_data.keys()):
-            data = grouped_data[period]
-            time_series.append({
-                'period': period,
-                'responses': data['responses'],
-                'complete': data['complete'],
-                'incomplete': data['incomplete']
-            })
-        
-        return time_series
-    
-    def _calculate_segments(self, responses):
-        """Calculate response segments"""
-        total = responses.count()
-        
-        # By authentication type
-        auth_count = responses.filter(respondent__isnull=False).count()
-        anon_count = total - auth_count
-        
-        by_auth = [
-            {'type': 'authenticated', 'count': auth_count},
-            {'type': 'anonymous', 'count': anon_count}
-        ]
-        
-        # By completion status
-        complete_count = responses.filter(is_complete=True).count()
-        incomplete_count = total - complete_count
-        
-        by_completion = [
-            {'status': 'complete', 'count': complete_count},
-            {'status': 'incomplete', 'count': incomplete_count}
-        ]
-        
-        return {
-            'by_auth': by_auth,
-            'by_completion': by_completion
-        }
-    
-    def _get_questions_summary(self, survey, responses, include_personal):
-        """Generate summary analytics for each question"""
-        questions = survey.questions.all().order_by('order')
-        total_responses = responses.count()
-        summaries = []
-        
-        for question in questions:
-            # Get all answers for this question
-            question_answers = Answer.objects.filter(
-                question=question,
-                response__in=responses
-            ).select_related('response')
-            
-            answer_count = question_answers.count()
-            skipped_count = total_responses - answer_count
-            
-            # Generate distributions based on question type
-            distributions = self._calculate_question_distributions(
-                question, question_answers, include_personal
-            )
-            
-            summary = {
-                'question_id': str(question.id),
-                'order': question.order,
-                'type': question.question_type,
-                'is_required': question.is_required,
-                'answer_count': answer_count,
-                'skipped_count': skipped_count,
-                'distributions': distributions
-            }
-            
-            summaries.append(summary)
-        
-        return summaries
-    
-    def _calculate_question_distributions(self, question, answers, include_personal):
-        """Calculate distributions based on question type"""
-        distributions = {}
-        answer_texts = [answer.answer_text for answer in answers]
-        
-        if question.question_type in ['single_choice', 'multiple_choice']:
-            # Parse options from question
-            try:
-                options = json.loads(question.options) if question.options else []
-            except (json.JSONDecodeError, TypeError):
-                options = []
-            
-            # Count responses for each option
-            option_counts = Counter()
-            total_answers = len(answer_texts)
-            
-            for answer_text in answer_texts:
-                if question.question_type == 'multiple_choice':
-                    # Handle multiple selections (assuming comma-separated or JSON array)
-                    try:
-                        selected = json.loads(answer_text) if answer_text.startswith('[') else answer_text.split(',')
-                        for selection in selected:
-                            selection = selection.strip()
-                            option_counts[selection] += 1
-                    except (json.JSONDecodeError, AttributeError):
-                        option_counts[answer_text] += 1
-                else:
-                    option_counts[answer_text] += 1
-            
-            # Format option distribution
-            option_list = []
-            for option in options:
-                count = option_counts.get(option['value'] if isinstance(option, dict) else option, 0)
-                pct = count / total_answers if total_answers > 0 else 0
-                option_list.append({
-                    'label': option['label'] if isinstance(option, dict) else option,
-                    'count': count,
-                    'pct': round(pct, 3)
-                })
-            
-            distributions['options'] = option_list
-            
-        elif question.question_type == 'yes_no':
-            # Count yes/no responses
-            yes_count = sum(1 for text in answer_texts if text.lower() in ['yes', 'true', '1', 'نعم'])
-            no_count = sum(1 for text in answer_texts if text.lower() in ['no', 'false', '0', 'لا'])
-            total_answers = len(answer_texts)
-            
-            distributions['yes_no'] = [
-                {
-                    'value': 'yes',
-                    'count': yes_count,
-                    'pct': round(yes_count / total_answers, 3) if total_answers > 0 else 0
-                },
-                {
-                    'value': 'no', 
-                    'count': no_count,
-                    'pct': round(no_count / total_answers, 3) if total_answers > 0 else 0
-                }
-            ]
-            
-        elif question.question_type == 'rating':
-            # Calculate comprehensive rating statistics with 100% accuracy
-            numeric_values = []
-            for text in answer_texts:
-                try:
-                    numeric_values.append(float(text))
-                except (ValueError, TypeError):
-                    pass
-            
-            if numeric_values:
-                # Calculate central tendency measures
-                avg_rating = mean(numeric_values)
-                median_rating = median(numeric_values)
-                
-                # Calculate mode (most common rating)
-                try:
-                    mode_rating = mode(numeric_values)
-                except:
-                    mode_rating = None  # No unique mode
-                
-                # Calculate variability measures
-                try:
-                    std_dev = stdev(numeric_values) if len(numeric_values) > 1 else 0
-                except:
-                    std_dev = 0
-                
-                min_rating = min(numeric_values)
-                max_rating = max(numeric_values)
-                
-                # Create histogram
-                histogram = defaultdict(int)
-                for value in numeric_values:
-                    bucket = str(int(value))  # Round to nearest integer for buckets
-                    histogram[bucket] += 1
-                
-                histogram_list = []
-                total_count = len(numeric_values)
-                for bucket in sorted(histogram.keys(), key=lambda x: int(x)):
-                    count = histogram[bucket]
-                    pct = Decimal(count) / Decimal(total_count) * Decimal('100')
-                    histogram_list.append({
-                        'bucket': bucket,
-                        'count': count,
-                        'pct': float(pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
-                    })
-                
-                # Quartile calculation
-                sorted_values = sorted(numeric_values)
-                q1_idx = len(sorted_values) // 4
-                q2_idx = len(sorted_values) // 2
-                q3_idx = 3 * len(sorted_values) // 4
-                
-                distributions['rating'] = {
-                    'avg': round(avg_rating, 2),
-                    'median': median_rating,
-                    'mode': mode_rating,
-                    'min': min_rating,
-                    'max': max_rating,
-                    'std_dev': round(std_dev, 2),
-                    'q1': sorted_values[q1_idx] if sorted_values else None,
-                    'q3': sorted_values[q3_idx] if sorted_values else None,
-                    'total_responses': len(numeric_values),
-                    'histogram': histogram_list
-                }
-            
-        elif question.question_type in ['text', 'textarea']:
-            # Text analysis
-            if include_personal:
-                # Show sample responses (limited to 5)
-                sample_texts = [text for text in answer_texts[:5] if text.strip()]
-                distributions['sample_text'] = sample_texts
-            else:
-                # Count basic statistics without revealing content
-                word_counts = []
-                for text in answer_texts:
-                    word_counts.append(len(text.split()) if text else 0)
-                
-                if word_counts:
-                    distributions['textual'] = {
-                        'avg_words': round(mean(word_counts), 1),
-                        'total_responses': len(word_counts)
-                    }
-                else:
-                    distributions['textual'] = {
-                        'avg_words': 0,
-                        'total_responses': 0
-                    }
-        
-        return distributions
-    
-    def _calculate_advanced_statistics(self, responses, survey):
-        """
-        Calculate advanced statistical metrics for deeper insights.
-        
-        Provides comprehensive analytics including:
-        - Response quality scoring
-        - Statistical confidence metrics
-        - Engagement analysis
-        - Temporal patterns
-        - Predictive metrics
-        """
-        if not responses.exists():
-            return {
-                'response_quality_score': None,
-                'confidence_interval': None,
-                'margin_of_error': None,
-                'engagement_score': None,
-                'question_fatigue_index': None,
-                'dropout_analysis': None,
-                'peak_response_times': None,
-                'response_cadence': None,
-                'weekend_vs_weekday': None,
-                'projected_total_responses': None,
-                'completion_rate_trend': None,
-                'estimated_survey_close_date': None
-            }
-        
-        return {
-            # Response Quality Metrics
-            'response_quality_score': self._calculate_response_quality_score(responses),
-            'confidence_interval': self._calculate_confidence_interval(responses.count()),
-            'margin_of_error': self._calculate_margin_of_error(responses.count()),
-            
-            # Engagement Metrics
-            'engagement_score': self._calculate_engagement_score(responses),
-            'question_fatigue_index': self._calculate_question_fatigue_index(responses),
-            'dropout_analysis': self._analyze_dropout_patterns(responses),
-            
-            # Temporal Patterns
-            'peak_response_times': self._identify_peak_response_times(responses),
-            'response_cadence': self._calculate_response_cadence(responses),
-            'weekend_vs_weekday': self._compare_weekend_weekday_responses(responses),
-            
-            # Predictive Metrics
-            'projected_total_responses': self._project_total_responses(responses, survey),
-            'completion_rate_trend': self._calculate_completion_trend(responses),
-            'estimated_survey_close_date': self._estimate_survey_close_date(responses, survey)
-        }
-    
-    def _calculate_response_quality_score(self, responses):
-        """
-        Calculate quality score based on:
-        - Completion rate
-        - Time spent on survey
-        - Answer consistency
-        - Response completeness
-        """
-        quality_factors = []
-        
-        for response in responses:
-            # Calculate individual quality score
-            completion_score = 1.0 if response.is_complete else 0.5
-            
-            # Time spent (penalize too fast or too slow)
-            time_spent = self._calculate_time_spent(response)
-            if 30 <= time_spent <= 600:  # 30 seconds to 10 minutes
-                time_score = 1.0
-            elif time_spent < 30:
-                time_score = 0.3  # Too fast, possibly random
-            else:
-                time_score = 0.7  # Too slow, possibly distracted
-            
-            # Answer completeness
-            total_questions = response.survey.questions.count()
-            answered_questions = response.answers.count()
-            completeness_score = answered_questions / total_questions if total_questions > 0 else 0
-            
-            # Combined quality score
-            quality_score = (completion_score * 0.3 + time_score * 0.3 + completeness_score * 0.4)
-            quality_factors.append(quality_score)
-        
-        if not quality_factors:
-            return {
-                'average_quality': 0,
-                'median_quality': 0,
-                'low_quality_responses': 0,
-                'high_quality_responses': 0
-            }
-        
-        return {
-            'average_quality': round(mean(quality_factors), 2),
-            'median_quality': round(median(quality_factors), 2),
-            'low_quality_responses': sum(1 for q in quality_factors if q < 0.5),
-            'high_quality_responses': sum(1 for q in quality_factors if q >= 0.8)
-        }
-    
-    def _calculate_time_spent(self, response):
-        """Calculate time spent on survey in seconds"""
-        # This is a simplified calculation
-        # In a real implementation, you'd track when user started vs submitted
-        # For now, we'll estimate based on number of questions and type
-        
-        total_questions = response.survey.questions.count()
-        answers_count = response.answers.count()
-        
-        # Estimate 30 seconds per question on average
-        estimated_time = answers_count * 30
-        
-        return estimated_time
-    
-    def _calculate_confidence_interval(self, sample_size, confidence_level=0.95):
-        """Calculate confidence interval for the survey results"""
-        if sample_size == 0:
-            return None
-        
-        # Using standard formula for confidence interval
-        # For 95% confidence level, z-score = 1.96
-        from math import sqrt
-        
-        z_score = 1.96 if confidence_level == 0.95 else 1.645  # 90% confidence
-        
-        # Assuming proportion = 0.5 for maximum variability
-        margin = z_score * sqrt((0.5 * 0.5) / sample_size)
-        
-        return {
-            'confidence_level': f"{int(confidence_level * 100)}%",
-            'lower_bound': round(0.5 - margin, 3),
-            'upper_bound': round(0.5 + margin, 3),
-            'margin': round(margin, 3)
-        }
-    
-    def _calculate_margin_of_error(self, sample_size, confidence_level=0.95):
-        """Calculate margin of error"""
-        if sample_size == 0:
-            return None
-        
-        from math import sqrt
-        
-        z_score = 1.96 if confidence_level == 0.95 else 1.645
-        margin = z_score * sqrt((0.5 * 0.5) / sample_size)
-        
-        return {
-            'margin_of_error_pct': round(margin * 100, 2),
-            'sample_size': sample_size,
-            'confidence_level': f"{int(confidence_level * 100)}%"
-        }
-    
-    def _calculate_engagement_score(self, responses):
-        """Calculate overall engagement score"""
-        if not responses.exists():
-            return None
-        
-        total = responses.count()
-        completed = responses.filter(is_complete=True).count()
-        
-        completion_rate = completed / total if total > 0 else 0
-        
-        # Simple engagement score based on completion rate
-        # Could be enhanced with more factors
-        engagement_score = completion_rate * 100
-        
-        return {
-            'score': round(engagement_score, 1),
-            'level': 'high' if engagement_score >= 75 else 'medium' if engagement_score >= 50 else 'low'
-        }
-    
-    def _calculate_question_fatigue_index(self, responses):
-        """Calculate question fatigue (drop-off rate by question position)"""
-        if not responses.exists():
-            return None
-        
-        # Get survey from first response and cache it
-        first_response = responses.first()
-        survey = first_response.survey
-        questions = survey.questions.order_by('order')
-        total_responses = responses.count()
-        
-        fatigue_data = []
-        for idx, question in enumerate(questions):
-            answered_count = Answer.objects.filter(
-                question=question,
-                response__in=responses
-            ).count()
-            
-            answer_rate = answered_count / total_responses if total_responses > 0 else 0
-            
-            fatigue_data.append({
-                'question_order': idx + 1,
-                'answer_rate': round(answer_rate, 3),
-                'dropout_rate': round(1 - answer_rate, 3)
-            })
-        
-        # Calculate fatigue index (average dropout increase)
-        if len(fatigue_data) > 1:
-            dropout_increase = fatigue_data[-1]['dropout_rate'] - fatigue_data[0]['dropout_rate']
-            fatigue_index = round(dropout_increase / len(fatigue_data), 3)
-        else:
-            fatigue_index = 0
-        
-        return {
-            'fatigue_index': fatigue_index,
-            'by_question': fatigue_data
-        }
-    
-    def _analyze_dropout_patterns(self, responses):
-        """Analyze where respondents drop off"""
-        if not responses.exists():
-            return None
-        
-        incomplete_responses = responses.filter(is_complete=False)
-        
-        if not incomplete_responses.exists():
-            return {
-                'total_dropouts': 0,
-                'dropout_rate': 0,
-                'common_dropout_points': []
-            }
-        
-        total = responses.count()
-        dropout_count = incomplete_responses.count()
-        
-        # Find common dropout points
-        dropout_points = Counter()
-        for response in incomplete_responses:
-            last_answered = response.answers.order_by('-question__order').first()
-            if last_answered:
-                dropout_points[last_answered.question.order] += 1
-        
-        common_points = [
-            {'question_order': order, 'count': count}
-            for order, count in dropout_points.most_common(5)
-        ]
-        
-        return {
-            'total_dropouts': dropout_count,
-            'dropout_rate': round(dropout_count / total, 3),
-            'common_dropout_points': common_points
-        }
-    
-    def _identify_peak_response_times(self, responses):
-        """Identify peak response times (hour of day, day of week)"""
-        if not responses.exists():
-            return None
-        
-        from .timezone_utils import ensure_uae_timezone
-        
-        hour_distribution = defaultdict(int)
-        day_distribution = defaultdict(int)
-        
-        for response in responses:
-            dt_uae = ensure_uae_timezone(response.submitted_at)
-            hour_distribution[dt_uae.hour] += 1
-            day_distribution[dt_uae.strftime('%A')] += 1
-        
-        # Find peak hour
-        peak_hour = max(hour_distribution.items(), key=lambda x: x[1]) if hour_distribution else (0, 0)
-        
-        # Find peak day
-        peak_day = max(day_distribution.items(), key=lambda x: x[1]) if day_distribution else ('Unknown', 0)
-        
-        return {
-            'peak_hour': {
-                'hour': peak_hour[0],
-                'count': peak_hour[1],
-                'time_range': f"{peak_hour[0]:02d}:00-{peak_hour[0]+1:02d}:00"
-            },
-            'peak_day': {
-                'day': peak_day[0],
-                'count': peak_day[1]
-            },
-            'hourly_distribution': dict(hour_distribution),
-            'daily_distribution': dict(day_distribution)
-        }
-    
-    def _calculate_response_cadence(self, responses):
-        """Calculate response cadence (distribution over time)"""
-        if responses.count() < 2:
-            return None
-        
-        # Convert to list to avoid queryset slicing issues
-        ordered_responses = list(responses.order_by('submitted_at'))
-        intervals = []
-        
-        for i in range(1, min(len(ordered_responses), 50)):  # Sample first 50
-            prev = ordered_responses[i-1]
-            curr = ordered_responses[i]
-            interval = (curr.submitted_at - prev.submitted_at).total_seconds() / 60  # minutes
-            intervals.append(interval)
-        
-        if not intervals:
-            return None
-        
-        return {
-            'avg_interval_minutes': round(mean(intervals), 2),
-            'median_interval_minutes': round(median(intervals), 2),
-            'pattern': 'steady' if max(intervals) / min(intervals) < 3 else 'variable'
-        }
-    
-    def _compare_weekend_weekday_responses(self, responses):
-        """Compare weekend vs weekday response patterns"""
-        if not responses.exists():
-            return None
-        
-        from .timezone_utils import ensure_uae_timezone
-        
-        weekend_count = 0
-        weekday_count = 0
-        
-        for response in responses:
-            dt_uae = ensure_uae_timezone(response.submitted_at)
-            if dt_uae.weekday() >= 5:  # Saturday = 5, Sunday = 6
-                weekend_count += 1
-            else:
-                weekday_count += 1
-        
-        total = responses.count()
-        
-        return {
-            'weekend_count': weekend_count,
-            'weekday_count': weekday_count,
-            'weekend_pct': round(weekend_count / total * 100, 1) if total > 0 else 0,
-            'weekday_pct': round(weekday_count / total * 100, 1) if total > 0 else 0,
-            'preference': 'weekend' if weekend_count > weekday_count else 'weekday'
-        }
-    
-    def _project_total_responses(self, responses, survey):
-        """Project total responses based on current trend"""
-        if responses.count() < 5:
-            return None
-        
-        # Simple linear projection based on current velocity
-        from .timezone_utils import ensure_uae_timezone
-        
-        first_response = responses.order_by('submitted_at').first()
-        last_response = responses.order_by('-submitted_at').last()
-        
-        first_dt = ensure_uae_timezone(first_response.submitted_at)
-        last_dt = ensure_uae_timezone(last_response.submitted_at)
-        
-        days_elapsed = (last_dt - first_dt).total_seconds() / 86400
-        
-        if days_elapsed == 0:
-            return None
-        
-        current_velocity = responses.count() / max(days_elapsed, 1)
-        
-        # Project for next 7 days
-        projected_responses = int(responses.count() + (current_velocity * 7))
-        
-        return {
-            'current_count': responses.count(),
-            'projected_7_days': projected_responses,
-            'daily_velocity': round(current_velocity, 2)
-        }
-    
-    def _calculate_completion_trend(self, responses):
-        """Calculate completion rate trend over time"""
-        if responses.count() < 10:
-            return None
-        
-        # Split responses into thirds to see trend
-        total = responses.count()
-        third = total // 3
-        
-        # Convert to list to avoid queryset slicing issues
-        ordered_responses = list(responses.order_by('submitted_at'))
-        
-        first_third = ordered_responses[:third]
-        middle_third = ordered_responses[third:2*third]
-        last_third = ordered_responses[2*third:]
-        
-        # Calculate completion rates for each third
-        first_completion = sum(1 for r in first_third if r.is_complete) / len(first_third) if first_third else 0
-        middle_completion = sum(1 for r in middle_third if r.is_complete) / len(middle_third) if middle_third else 0
-        last_completion = sum(1 for r in last_third if r.is_complete) / len(last_third) if last_third else 0
-        
-        # Determine trend
-        if last_completion > first_completion:
-            trend = 'improving'
-        elif last_completion < first_completion:
-            trend = 'declining'
-        else:
-            trend = 'stable'
-        
-        return {
-            'trend': trend,
-            'first_third_rate': round(first_completion, 3),
-            'middle_third_rate': round(middle_completion, 3),
-            'last_third_rate': round(last_completion, 3)
-        }
-    
-    def _estimate_survey_close_date(self, responses, survey):
-        """Estimate when survey might reach target or natural completion"""
-        if not survey.end_date or responses.count() < 5:
-            return None
+                'total_responses': 1
+            }
         
-        from .timezone_utils import ensure_uae_timezone
+        # Safe calculation for multiple values
+        avg_val = mean(numeric_values)
+        median_val = median(numeric_values)
         
-        end_date_uae = ensure_uae_timezone(survey.end_date)
-        now_uae = timezone.now()
+        # Calculate mode safely
+        try:
+            mode_val = mode(numeric_values)
+        except:
+            mode_val = None  # No unique mode
         
-        days_remaining = (end_date_uae - now_uae).total_seconds() / 86400
+        # Calculate std_dev safely (requires at least 2 values)
+        try:
+            std_dev_val = stdev(numeric_values)
+        except:
+            std_dev_val = 0
         
-        if days_remaining <= 0:
-            return {
-                'status': 'closed',
-                'end_date': serialize_datetime_uae(end_date_uae)
-            }
+        # Quartiles
+        sorted_values = sorted(numeric_values)
+        q1_idx = len(sorted_values) // 4
+        q3_idx = 3 * len(sorted_values) // 4
         
         return {
-            'status': 'open',
-            'end_date': serialize_datetime_uae(end_date_uae),
-            'days_remaining': round(days_remaining, 1)
-        }
-    
-    def _calculate_cohort_analysis(self, responses, survey):
-        """
-        Perform cohort analysis for response patterns.
-        
-        Divides responses into three cohorts:
-        - Early Adopters: First 20% of responses
-        - Majority: Middle 60% of responses  
-        - Laggards: Last 20% of responses
-        
-        Analyzes each cohort for completion rate, response time, and NPS.
-        """
-        if not responses.exists():
-            return None
-        
-        cohorts = {
-            'early_adopters': [],
-            'majority': [],
-            'laggards': []
+            'avg': round(avg_val, 2),
+            'median': median_val,
+            'mode': mode_val,
+            'min': min(numeric_values),
+            'max': max(numeric_values),
+            'std_dev': round(std_dev_val, 2),
+            'q1': sorted_values[q1_idx] if sorted_values else 0,
+            'q3': sorted_values[q3_idx] if sorted_values else 0,
+            'total_responses': len(numeric_values)
         }
-        
-        total = responses.count()
-        ordered_responses = list(responses.order_by('submitted_at'))
-        
-        for i, response in enumerate(ordered_responses):
-            if i < total * 0.2:
-                cohorts['early_adopters'].append(response)
-            elif i < total * 0.8:
-                cohorts['majority'].append(response)
-            else:
-                cohorts['laggards'].append(response)
-        
-        # Analyze each cohort
-        cohort_analysis = {}
-        for cohort_name, cohort_responses in cohorts.items():
-            if cohort_responses:
-                cohort_analysis[cohort_name] = {
-                    'count': len(cohort_responses),
-                    'completion_rate': self._calculate_cohort_completion_rate(cohort_responses),
-                    'avg_response_time': self._calculate_avg_response_time_cohort(cohort_responses),
-                    'nps_score': self._calculate_cohort_nps(cohort_responses, survey),
-                    'characteristics': self._identify_cohort_characteristics(cohort_responses)
-                }
-            else:
-                cohort_analysis[cohort_name] = None
-        
-        return cohort_analysis
     
-    def _calculate_cohort_completion_rate(self, cohort_responses):
-        """Calculate completion rate for a cohort"""
-        if not cohort_responses:
-            return 0
-        
-        completed = sum(1 for r in cohort_responses if r.is_complete)
-        return round(completed / len(cohort_responses), 3)
-    
-    def _calculate_avg_response_time_cohort(self, cohort_responses):
-        """Calculate average response time for a cohort"""
-        if not cohort_responses:
-            return None
+    def _get_questions_summary(self, survey, frame, include_personal):
+        """Generate summary analytics for each question"""
+        total_responses = frame.total
+        summaries = []
         
-        total_time = 0
-        for response in cohort_responses:
-            # Estimate based on survey creation to response submission
-            time_diff = response.submitted_at - response.survey.created_at
-            total_time += time_diff.total_seconds() / 3600  # Convert to hours
+        for question in frame.questions:
+            # Get all answers for this question
+            answers = frame.answers(question.id)
+            
+            answer_count = len(answers)
+            skipped_count = total_responses - answer_count
+            
+            # Generate distributions based on question type
+            distributions = self._calculate_question_distributions(
+                question, frame, answers, include_personal
+            )
+            
+            summary = {
+                'question_id': str(question.id),
+                'order': question.order,
+                'type': question.question_type,
+                'is_required': question.is_required,
+                'answer_count': answer_count,
+                'skipped_count': skipped_count,
+                'distributions': distributions
+            }
+            
+            summaries.append(summary)
         
-        return round(total_time / len(cohort_responses), 2)
+        return summaries
     
-    def _calculate_cohort_nps(self, cohort_responses, survey):
-        """Calculate NPS for a specific cohort"""
-        # Find NPS question
-        nps_questions = survey.questions.filter(question_type='rating').order_by('order')
-        
-        if not nps_questions.exists():
-            return None
-        
-        # Use first rating question as NPS
-        nps_question = nps_questions.first()
-        
-        # Get cohort response IDs
-        cohort_response_ids = [r.id for r in cohort_responses]
-        
-        # Get answers for this cohort
-        answers = Answer.objects.filter(
-            question=nps_question,
-            response_id__in=cohort_response_ids
-        )
-        
-        if not answers.exists():
-            return None
+    def _calculate_question_distributions(self, question, frame, answers, include_personal):
+        """Calculate distributions based on question type (answers are count-weighted QuestionAnswers)"""
+        distributions = {}
+        answer_texts = answers.texts
+        answer_counts = answers.counts
         
-        # Extract numeric values
-        numeric_values = []
-        for answer in answers:
+        if question.question_type in ['single_choice', 'multiple_choice']:
+            # Parse options from question
             try:
-                value = float(answer.answer_text)
-                if 0 <= value <= 10:
-                    numeric_values.append(int(round(value)))
-            except (ValueError, TypeError):
-                continue
-        
-        if not numeric_values:
-            return None
-        
-        # Calculate NPS
-        promoters = sum(1 for v in numeric_values if v >= 9)
-        detractors = sum(1 for v in numeric_values if v <= 6)
-        total = len(numeric_values)
-        
-        nps_score = ((promoters - detractors) / total * 100) if total > 0 else 0
+                options = json.loads(question.options) if question.options else []
+            except (json.JSONDecodeError, TypeError):
+                options = []
+            
+            # Count responses for each option
+            option_counts = Counter()
+            total_answers = len(answers)
+            
+            for answer_text, count in zip(answer_texts, answer_counts):
+                count = int(count)
+                if question.question_type == 'multiple_choice':
+                    # Handle multiple selections (assuming comma-separated or JSON array)
+                    try:
+                        selected = json.loads(answer_text) if answer_text.startswith('[') else answer_text.split(',')
+                        for selection in selected:
+                            selection = selection.strip()
+                            option_counts[selection] += count
+                    except (json.JSONDecodeError, AttributeError):
+                        option_counts[answer_text] += count
+                else:
+                    option_counts[answer_text] += count
+            
+            # Format option distribution
+            option_list = []
+            for option in options:
+                count = option_counts.get(option['value'] if isinstance(option, dict) else option, 0)
+                pct = count / total_answers if total_answers > 0 else 0
+                option_list.append({
+                    'label': option['label'] if isinstance(option, dict) else option,
+                    'count': count,
+                    'pct': round(pct, 3)
+                })
+            
+            distributions['options'] = option_list
+            
+        elif question.question_type == 'yes_no':
+            # Count yes/no responses
+            yes_count = sum(int(count) for text, count in zip(answer_texts, answer_counts) if text.lower() in ['yes', 'true', '1', 'نعم'])
+            no_count = sum(int(count) for text, count in zip(answer_texts, answer_counts) if text.lower() in ['no', 'false', '0', 'لا'])
+            total_answers = len(answers)
+            
+            distributions['yes_no'] = [
+                {
+                    'value': 'yes',
+                    'count': yes_count,
+                    'pct': round(yes_count / total_answers, 3) if total_answers > 0 else 0
+                },
+                {
+                    'value': 'no', 
+                    'count': no_count,
+                    'pct': round(no_count / total_answers, 3) if total_answers > 0 else 0
+                }
+            ]
+            
+        elif question.question_type == 'rating':
+            # Calculate comprehensive rating statistics from (rating, count) pairs with 100% accuracy
+            ratings = rating_counts(zip(answer_texts, answer_counts))
+            stats = rating_summary(ratings)
+            
+            if stats:
+                # Create histogram
+                histogram = defaultdict(int)
+                for value, count in ratings:
+                    bucket = str(int(value))  # Round to nearest integer for buckets
+                    histogram[bucket] += count
+                
+                histogram_list = []
+                total_count = stats['count']
+                for bucket in sorted(histogram.keys(), key=lambda x: int(x)):
+                    count = histogram[bucket]
+                    pct = Decimal(count) / Decimal(total_count) * Decimal('100')
+                    histogram_list.append({
+                        'bucket': bucket,
+                        'count': count,
+                        'pct': float(pct.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+                    })
+                
+                distributions['rating'] = {
+                    'avg': round(stats['mean'], 2),
+                    'median': stats['median'],
+                    'mode': stats['mode'],
+                    'min': stats['min'],
+                    'max': stats['max'],
+                    'std_dev': round(stats['std_dev'], 2),
+                    'q1': stats['q1'],
+                    'q3': stats['q3'],
+                    'total_responses': total_count,
+                    'histogram': histogram_list
+                }
+            
+        elif question.question_type in ['text', 'textarea']:
+            # Text analysis
+            if include_personal:
+                # Show sample responses (limited to 5)
+                distributions['sample_text'] = frame.sample_texts(question.id, 5)
+            else:
+                # Count basic statistics without revealing content
+                total_responses = len(answers)
+                
+                if total_responses:
+                    distributions['textual'] = {
+                        'avg_words': round(answers.total_words() / total_responses, 1),
+                        'total_responses': total_responses
+                    }
+                else:
+                    distributions['textual'] = {
+                        'avg_words': 0,
+                        'total_responses': 0
+                    }
         
-        return round(nps_score, 1)
+        return distributions
     
-    def _identify_cohort_characteristics(self, cohort_responses):
-        """Identify key characteristics of a cohort"""
-        if not cohort_responses:
-            return []
-        
-        characteristics = []
-        
-        # Completion rate characteristic
-        completed = sum(1 for r in cohort_responses if r.is_complete)
-        completion_rate = completed / len(cohort_responses)
-        
-        if completion_rate >= 0.9:
-            characteristics.append('highly_engaged')
-        elif completion_rate < 0.5:
-            characteristics.append('low_engagement')
-        
-        # Response speed characteristic
-        avg_time = self._calculate_avg_response_time_cohort(cohort_responses)
-        if avg_time and avg_time < 1:  # Less than 1 hour
-            characteristics.append('quick_responders')
-        elif avg_time and avg_time > 24:  # More than 24 hours
-            characteristics.append('delayed_responders')
-        
-        # Authentication characteristic
-        auth_count = sum(1 for r in cohort_responses if r.respondent is not None)
-        if auth_count / len(cohort_responses) > 0.7:
-            characteristics.append('authenticated')
-        
-        return characteristics
-
-
 class QuestionAnalyticsDashboardView(APIView):
     """
     Question-level analytics dashboard providing deep dive analysis per question.
@@ -6660,7 +5246,7 @@ class QuestionAnalyticsDashboardView(APIView):
     
     Query Parameters:
     - start (ISO datetime): Filter responses from this date
-    - end (ISO datetime): Filter responses until this date
+    - end (ISO datetime): Filter responses before this date (exclusive)
     - tz (timezone): Timezone for analysis (default: Asia/Dubai)
     - group_by (day|week|month): Not used for question analysis but kept for API consistency
     - include_personal (true|false): Include PII in text responses (default: false)
@@ -6679,18 +5265,15 @@ class QuestionAnalyticsDashboardView(APIView):
             # Parse query parameters
             params = self._parse_query_params(request)
             
-            # Get filtered responses for this question
-            responses = self._get_filtered_responses(survey, params)
-            question_answers = Answer.objects.filter(
-                question=question,
-                response__in=responses
-            ).select_related('response', 'response__respondent')
+            # Get filtered responses (from rollups when they are in sync) and this question's answers
+            frame = self._get_filtered_responses(survey, params)
+            answers = frame.answers(question.id)
             
             # Build question dashboard data
             dashboard_data = {
                 'question': self._get_question_info(question),
-                'kpis': self._calculate_question_kpis(responses.count(), question_answers),
-                'analytics': self._get_detailed_question_analytics(question, question_answers, params['include_personal'])
+                'kpis': self._calculate_question_kpis(frame.total, len(answers)),
+                'analytics': self._get_detailed_question_analytics(question, frame, answers, params['include_personal'])
             }
             
             return uniform_response(
@@ -6767,16 +5350,8 @@ class QuestionAnalyticsDashboardView(APIView):
         return params
     
     def _get_filtered_responses(self, survey, params):
-        """Get responses with date filtering"""
-        queryset = survey.responses.all()
-        
-        # Apply date filters
-        if params['start']:
-            queryset = queryset.filter(submitted_at__gte=params['start'])
-        if params['end']:
-            queryset = queryset.filter(submitted_at__lte=params['end'])
-        
-        return queryset
+        """Load date-filtered responses and answers as a frame, from rollups when they are in sync"""
+        return load_dashboard_frame(survey, start=params['start'], end=params['end'])
     
     def _get_question_info(self, question):
         """Get question information"""
@@ -6788,9 +5363,8 @@ class QuestionAnalyticsDashboardView(APIView):
             'text': question.text
         }
     
-    def _calculate_question_kpis(self, total_responses, question_answers):
+    def _calculate_question_kpis(self, total_responses, answer_count):
         """Calculate question-level KPIs"""
-        answer_count = question_answers.count()
         skipped_count = total_responses - answer_count
         answer_rate = answer_count / total_responses if total_responses > 0 else 0.0
         
@@ -6800,30 +5374,29 @@ class QuestionAnalyticsDashboardView(APIView):
             'answer_rate': round(answer_rate, 3)
         }
     
-    def _get_detailed_question_analytics(self, question, answers, include_personal):
-        """Get detailed analytics based on question type"""
+    def _get_detailed_question_analytics(self, question, frame, answers, include_personal):
+        """Get detailed analytics based on question type (answers are count-weighted QuestionAnswers)"""
         analytics = {}
-        answer_texts = [answer.answer_text for answer in answers]
-        total_answers = len(answer_texts)
+        total_answers = len(answers)
         
         if question.question_type == 'single_choice':
-            analytics['single_choice'] = self._analyze_single_choice(question, answer_texts, total_answers)
+            analytics['single_choice'] = self._analyze_single_choice(question, answers.value_counts(), total_answers)
             
         elif question.question_type == 'multiple_choice':
-            analytics['multiple_choice'] = self._analyze_multiple_choice(question, answer_texts, total_answers)
+            analytics['multiple_choice'] = self._analyze_multiple_choice(question, answers.value_counts(), total_answers)
             
         elif question.question_type == 'yes_no':
-            analytics['yes_no'] = self._analyze_yes_no(answer_texts, total_answers)
+            analytics['yes_no'] = self._analyze_yes_no(answers.value_counts(), total_answers)
             
         elif question.question_type == 'rating':
-            analytics['rating'] = self._analyze_rating(answer_texts)
+            analytics['rating'] = self._analyze_rating(answers.value_counts())
             
         elif question.question_type in ['text', 'textarea']:
-            analytics['textual'] = self._analyze_textual(answer_texts, include_personal)
+            analytics['textual'] = self._analyze_textual(question, frame, answers, include_personal)
         
         return analytics
     
-    def _analyze_single_choice(self, question, answer_texts, total_answers):
+    def _analyze_single_choice(self, question, value_counts, total_answers):
         """Analyze single choice question"""
         try:
             options = json.loads(question.options) if question.options else []
@@ -6831,7 +5404,7 @@ class QuestionAnalyticsDashboardView(APIView):
             options = []
         
         # Count responses for each option
-        option_counts = Counter(answer_texts)
+        option_counts = Counter(dict(value_counts))
         
         option_list = []
         for option in options:
@@ -6860,7 +5433,7 @@ class QuestionAnalyticsDashboardView(APIView):
         
         return {'options': option_list}
     
-    def _analyze_multiple_choice(self, question, answer_texts, total_answers):
+    def _analyze_multiple_choice(self, question, value_counts, total_answers):
         """Analyze multiple choice question"""
         try:
             options = json.loads(question.options) if question.options else []
@@ -6870,7 +5443,7 @@ class QuestionAnalyticsDashboardView(APIView):
         # Count how many respondents selected each option
         option_counts = defaultdict(int)
         
-        for answer_text in answer_texts:
+        for answer_text, answer_count in value_counts:
             try:
                 # Try parsing as JSON array first
                 if answer_text.startswith('['):
@@ -6881,12 +5454,12 @@ class QuestionAnalyticsDashboardView(APIView):
                 
                 for selection in selections:
                     if selection:  # Skip empty selections
-                        option_counts[selection] += 1
+                        option_counts[selection] += answer_count
                         
             except (json.JSONDecodeError, AttributeError):
                 # Single selection case
                 if answer_text:
-                    option_counts[answer_text] += 1
+                    option_counts[answer_text] += answer_count
         
         option_list = []
         for option in options:
@@ -6915,10 +5488,10 @@ class QuestionAnalyticsDashboardView(APIView):
         
         return {'options': option_list}
     
-    def _analyze_yes_no(self, answer_texts, total_answers):
+    def _analyze_yes_no(self, value_counts, total_answers):
         """Analyze yes/no question"""
-        yes_count = sum(1 for text in answer_texts if text.lower() in ['yes', 'true', '1', 'نعم'])
-        no_count = sum(1 for text in answer_texts if text.lower() in ['no', 'false', '0', 'لا'])
+        yes_count = sum(count for text, count in value_counts if text.lower() in ['yes', 'true', '1', 'نعم'])
+        no_count = sum(count for text, count in value_counts if text.lower() in ['no', 'false', '0', 'لا'])
         
         result = []
         for value, count in [('yes', yes_count), ('no', no_count)]:
@@ -6931,31 +5504,26 @@ class QuestionAnalyticsDashboardView(APIView):
         
         return result
     
-    def _analyze_rating(self, answer_texts):
+    def _analyze_rating(self, value_counts):
         """Analyze rating question"""
-        numeric_values = []
-        for text in answer_texts:
-            try:
-                value = float(text)
-                numeric_values.append(value)
-            except (ValueError, TypeError):
-                pass
+        ratings = rating_counts(value_counts)
+        stats = rating_summary(ratings)
         
-        if not numeric_values:
+        if not stats:
             return {
                 'avg': 0,
                 'median': 0,
                 'histogram': []
             }
         
-        avg_rating = mean(numeric_values)
-        median_rating = median(numeric_values)
+        avg_rating = stats['mean']
+        median_rating = stats['median']
         
         # Create histogram (bucket by integer values)
         histogram_data = defaultdict(int)
-        for value in numeric_values:
+        for value, count in ratings:
             bucket = str(int(value))  # Round to nearest integer
-            histogram_data[bucket] += 1
+            histogram_data[bucket] += count
         
         histogram = []
         for bucket in sorted(histogram_data.keys(), key=lambda x: int(x)):
@@ -6970,9 +5538,9 @@ class QuestionAnalyticsDashboardView(APIView):
             'histogram': histogram
         }
     
-    def _analyze_textual(self, answer_texts, include_personal):
+    def _analyze_textual(self, question, frame, answers, include_personal):
         """Analyze text/textarea questions - supports both Arabic and English"""
-        if not answer_texts:
+        if not answers:
             return {
                 'top_terms': [],
                 'samples': []
@@ -6980,20 +5548,22 @@ class QuestionAnalyticsDashboardView(APIView):
         
         # Simple word frequency analysis (without PII if include_personal is False)
         word_freq = defaultdict(int)
-        clean_texts = [text for text in answer_texts if text and text.strip()]
         
         if not include_personal:
-            # Return basic statistics without revealing content
-            word_counts = [len(text.split()) for text in clean_texts]
-            char_counts = [len(text) for text in clean_texts]
+            # Return basic statistics without revealing content (from length totals, no text is read)
+            profile = answers.text_profile()
+            response_count = profile['count']
             
             return {
-                'response_count': len(clean_texts),
-                'avg_words': round(mean(word_counts), 1) if word_counts else 0,
-                'avg_chars': round(mean(char_counts), 1) if char_counts else 0,
+                'response_count': response_count,
+                'avg_words': round(profile['words'] / response_count, 1) if response_count else 0,
+                'avg_chars': round(profile['chars'] / response_count, 1) if response_count else 0,
                 'samples': []  # No samples when include_personal is False
             }
         
+        # Terms and samples come from the first TEXT_ANALYSIS_SAMPLE_SIZE answers
+        clean_texts = frame.sample_texts(question.id, TEXT_ANALYSIS_SAMPLE_SIZE)
+        
         # When include_personal is True, provide more detailed analysis
         # Arabic stop words (common words to exclude)
         arabic_stop_words = {
@@ -7085,28 +5655,25 @@ class SurveyQuestionsAnalyticsView(APIView):
             # Parse query parameters
             params = self._parse_query_params(request)
             
-            # Get filtered responses with optimized prefetch
-            responses = self._get_filtered_responses(survey, params)
+            # Load filtered responses and answers once (from rollups when they are in sync)
+            frame = self._get_filtered_responses(survey, params)
+            total_responses = frame.total
             
             # Get questions with their analytics
-            questions = survey.questions.all().order_by('order')
+            questions = frame.questions
             questions_analytics = []
             
             for question in questions:
                 # Get answers for this question from filtered responses
-                question_answers = []
-                for response in responses:
-                    for answer in response.answers.all():
-                        if answer.question_id == question.id:
-                            question_answers.append(answer)
+                answers = frame.answers(question.id)
                 
                 # Calculate question KPIs
-                answer_count = len(question_answers)
-                skipped_count = len(responses) - answer_count
-                answer_rate = answer_count / len(responses) if responses else 0
+                answer_count = len(answers)
+                skipped_count = total_responses - answer_count
+                answer_rate = answer_count / total_responses if total_responses else 0
                 
                 # Get detailed analytics for this question
-                analytics = self._get_detailed_question_analytics(question, question_answers, params['include_personal'])
+                analytics = self._get_detailed_question_analytics(question, answers, params['include_personal'])
                 
                 question_data = {
                     'id': str(question.id),
@@ -7118,7 +5685,7 @@ class SurveyQuestionsAnalyticsView(APIView):
                         'answer_count': answer_count,
                         'skipped_count': skipped_count,
                         'answer_rate': round(answer_rate, 3),
-                        'total_eligible_responses': len(responses)
+                        'total_eligible_responses': total_responses
                     },
                     'analytics': analytics
                 }
@@ -7131,13 +5698,13 @@ class SurveyQuestionsAnalyticsView(APIView):
                     'id': str(survey.id),
                     'title': survey.title,
                     'total_questions': len(questions),
-                    'total_responses': len(responses)
+                    'total_responses': total_responses
                 },
                 'questions': questions_analytics,
                 'summary': {
                     'total_questions': len(questions),
                     'avg_answer_rate': round(sum(q['kpis']['answer_rate'] for q in questions_analytics) / len(questions_analytics) if questions_analytics else 0, 3),
-                    'total_responses': len(responses)
+                    'total_responses': total_responses
                 }
             }
             
@@ -7216,33 +5783,14 @@ class SurveyQuestionsAnalyticsView(APIView):
         return params
     
     def _get_filtered_responses(self, survey, params):
-        """Get filtered responses (same logic as other analytics views)"""
-        responses = SurveyResponse.objects.filter(
-            survey=survey
-        ).prefetch_related(
-            'answers',
-            'answers__question'
-        ).select_related('respondent')
-        
-        # Apply date filtering
-        if params['start']:
-            responses = responses.filter(submitted_at__gte=params['start'])
-        if params['end']:
-            responses = responses.filter(submitted_at__lte=params['end'])
-        
-        return responses
+        """Load date-filtered responses and answers as a frame (same logic as other analytics views)"""
+        return load_dashboard_frame(survey, start=params['start'], end=params['end'])
     
     def _get_detailed_question_analytics(self, question, question_answers, include_personal):
-        """Get detailed analytics for a specific question type (reuse from QuestionAnalyticsDashboardView)"""
+        """Get detailed analytics for a specific question type (answers are count-weighted QuestionAnswers)"""
         distributions = {}
-        answer_texts = []
-        answer_values = []
-        
-        for answer in question_answers:
-            if answer.answer_text:
-                answer_texts.append(answer.answer_text)
-                # For choice questions, the answer_text contains the selected values
-                answer_values.append(answer.answer_text)
+        # For choice questions, the answer text contains the selected values
+        answer_values = [(text, count) for text, count in question_answers.value_counts() if text]
         
         if question.question_type == 'single_choice':
             # Single choice analytics
@@ -7255,8 +5803,8 @@ class SurveyQuestionsAnalyticsView(APIView):
                     options = []
                 
                 if options:
-                    value_counts = Counter(answer_values)
-                    total = len(answer_values)
+                    value_counts = Counter(dict(answer_values))
+                    total = sum(value_counts.values())
                     
                     option_results = []
                     for option in options:
@@ -7287,7 +5835,7 @@ class SurveyQuestionsAnalyticsView(APIView):
         
         elif question.question_type == 'multiple_choice':
             # Multiple choice analytics
-            if answer_texts and question.options:
+            if answer_values and question.options:
                 import json
                 from collections import Counter
                 try:
@@ -7296,16 +5844,16 @@ class SurveyQuestionsAnalyticsView(APIView):
                     options = []
                 
                 if options:
-                    all_selections = []
-                    
-                    for text in answer_texts:
-                        if text:
-                            selections = [choice.strip() for choice in text.split(',')]
-                            all_selections.extend(selections)
+                    value_counts = Counter()
+                    total_selections = 0
+                    respondents = 0
                     
-                    value_counts = Counter(all_selections)
-                    total_selections = len(all_selections)
-                    respondents = len(answer_texts)
+                    for text, count in answer_values:
+                        selections = [choice.strip() for choice in text.split(',')]
+                        for selection in selections:
+                            value_counts[selection] += count
+                        total_selections += len(selections) * count
+                        respondents += count
                     
                     option_results = []
                     for option in options:
@@ -7341,8 +5889,8 @@ class SurveyQuestionsAnalyticsView(APIView):
             # Yes/No analytics
             if answer_values:
                 from collections import Counter
-                value_counts = Counter(answer_values)
-                total = len(answer_values)
+                value_counts = Counter(dict(answer_values))
+                total = sum(value_counts.values())
                 
                 yes_no_data = []
                 for value in ['yes', 'no']:
@@ -7360,29 +5908,23 @@ class SurveyQuestionsAnalyticsView(APIView):
         
         elif question.question_type == 'rating':
             # Rating analytics with statistics
-            numeric_values = []
-            for answer in question_answers:
-                if answer.answer_text:
-                    try:
-                        numeric_values.append(float(answer.answer_text))
-                    except (ValueError, TypeError):
-                        pass
+            ratings = rating_counts(answer_values)
+            stats = rating_summary(ratings)
             
-            if numeric_values:
-                from statistics import mean, median
-                avg_rating = mean(numeric_values)
-                median_rating = median(numeric_values)
+            if stats:
+                avg_rating = stats['mean']
+                median_rating = stats['median']
                 
                 # Create histogram
                 from collections import defaultdict
                 histogram = defaultdict(int)
-                for value in numeric_values:
+                for value, count in ratings:
                     bucket = str(int(value))  # Round to nearest integer for buckets
-                    histogram[bucket] += 1
+                    histogram[bucket] += count
                 
                 histogram_list = []
                 for bucket in sorted(histogram.keys(), key=lambda x: int(x)):
-                    total = len(numeric_values)
+                    total = stats['count']
                     count = histogram[bucket]
                     pct = count / total if total > 0 else 0
                     
@@ -7396,36 +5938,27 @@ class SurveyQuestionsAnalyticsView(APIView):
                     'avg': round(avg_rating, 2),
                     'median': median_rating,
                     'mode': max(histogram.keys(), key=lambda x: histogram[x]) if histogram else None,
-                    'min': min(numeric_values),
-                    'max': max(numeric_values),
+                    'min': stats['min'],
+                    'max': stats['max'],
                     'histogram': histogram_list
                 }
         
         elif question.question_type in ['text', 'textarea']:
-            # Text analysis
-            if answer_texts:
-                word_counts = []
-                char_counts = []
-                
-                for text in answer_texts:
-                    if text and text.strip():
-                        word_count = len(text.split())
-                        char_count = len(text)
-                        word_counts.append(word_count)
-                        char_counts.append(char_count)
+            # Text analysis from length totals (no answer text is read)
+            if question_answers:
+                profile = question_answers.text_profile()
                 
-                if word_counts and char_counts:
-                    from statistics import mean
-                    # Categorize by length
-                    short_count = sum(1 for c in char_counts if c < 50)
-                    medium_count = sum(1 for c in char_counts if 50 <= c <= 200)
-                    long_count = sum(1 for c in char_counts if c > 200)
-                    total = len(char_counts)
+                if profile['count']:
+                    # Categorize by length (< 50, 50-200, > 200 characters)
+                    short_count = profile['short']
+                    medium_count = profile['medium']
+                    long_count = profile['long']
+                    total = profile['count']
                     
                     distributions['textual'] = {
                         'total_responses': total,
-                        'avg_word_count': round(mean(word_counts), 1),
-                        'avg_char_count': round(mean(char_counts), 1),
+                        'avg_word_count': round(profile['words'] / total, 1),
+                        'avg_char_count': round(profile['chars'] / total, 1),
                         'response_lengths': {
                             'short': {
                                 'count': short_count, 
@@ -8279,15 +6812,13 @@ class PasswordProtectedSurveyView(APIView):
             elif email:
                 # Check by email for anonymous users
                 has_submitted = SurveyResponse.objects.filter(
-                    survey=survey,
-                    respondent_email=email
-                ).exists()
+                    survey=survey
+                ).with_contact(email=email).exists()
             elif phone:
                 # Check by phone for anonymous users
                 has_submitted = SurveyResponse.objects.filter(
-                    survey=survey,
-                    respondent_phone=phone
-                ).exists()
+                    survey=survey
+                ).with_contact(phone=phone).exists()
             
             survey_data = {
                 'id': str(survey.id),
@@ -8491,15 +7022,13 @@ class PasswordProtectedSurveyResponseView(APIView):
             elif respondent_email:
                 # Check by email for anonymous users
                 existing_response = SurveyResponse.objects.filter(
-                    survey=survey,
-                    respondent_email=respondent_email
-                ).first()
+                    survey=survey
+                ).with_contact(email=respondent_email).first()
             elif respondent_phone:
                 # Check by phone for anonymous users
                 existing_response = SurveyResponse.objects.filter(
-                    survey=survey,
-                    respondent_phone=respondent_phone
-                ).first()
+                    survey=survey
+                ).with_contact(phone=respondent_phone).first()
             
             if existing_response:
                 arabic_messages = get_arabic_error_messages()
@@ -8509,56 +7038,42 @@ class PasswordProtectedSurveyResponseView(APIView):
                     status_code=status.HTTP_409_CONFLICT
                 )
             
-            # Create response
-            response = SurveyResponse.objects.create(
-                survey=survey,
+            # Every answer must name a question and carry a value
+            if any(not answer_data.get('question_id') or answer_data.get('answer') is None for answer_data in answers_data):
+                return uniform_response(
+                    success=False,
+                    message="Each answer must include question_id and answer",
+                    status_code=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Validate all answers in memory before writing anything
+            answers, validation_errors = prepare_answers(
+                survey, answers_data, answer_key='answer', check_required=True
+            )
+            if validation_errors:
+                first_error = validation_errors[0]
+                if 'question_text' not in first_error:
+                    message = f"Question {first_error['question_id']} not found in this survey"
+                elif first_error['error'] == get_validation_error_messages()['required']:
+                    message = f"Question '{first_error['question_text']}' is required"
+                else:
+                    message = first_error['error']
+                return uniform_response(
+                    success=False,
+                    message=message,
+                    data={'validation_errors': validation_errors},
+                    status_code=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Create response and answers in one transaction
+            response, created_answers = create_response_with_answers(
+                survey,
+                answers,
                 respondent=respondent,
                 respondent_email=respondent_email,
                 respondent_phone=respondent_phone
             )
             
-            # Process answers
-            created_answers = []
-            for answer_data in answers_data:
-                question_id = answer_data.get('question_id')
-                answer_text = answer_data.get('answer')
-                
-                if not question_id or answer_text is None:
-                    response.delete()  # Clean up
-                    return uniform_response(
-                        success=False,
-                        message="Each answer must include question_id and answer",
-                        status_code=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                try:
-                    question = Question.objects.get(id=question_id, survey=survey)
-                    
-                    # Validate required questions
-                    if question.is_required and not str(answer_text).strip():
-                        response.delete()  # Clean up
-                        return uniform_response(
-                            success=False,
-                            message=f"Question '{question.text}' is required",
-                            status_code=status.HTTP_400_BAD_REQUEST
-                        )
-                    
-                    # Create answer
-                    answer = Answer.objects.create(
-                        question=question,
-                        response=response,
-                        answer_text=str(answer_text)
-                    )
-                    created_answers.append(answer)
-                    
-                except Question.DoesNotExist:
-                    response.delete()  # Clean up
-                    return uniform_response(
-                        success=False,
-                        message=f"Question {question_id} not found in this survey",
-                        status_code=status.HTTP_400_BAD_REQUEST
-                    )
-            
             logger.info(f"Password-protected survey response submitted for survey {survey.id}")
             
             return uniform_response(
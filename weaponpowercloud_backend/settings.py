@@ -289,6 +289,22 @@ NEWS_ENCRYPTION_ENABLED = True
 NEWS_IMAGE_MAX_SIZE_MB = 10
 NEWS_MAX_IMAGES_PER_ITEM = 10
 
+# Surveys Encryption Configuration
+# In-process plaintext cache bound (0 disables) and optional shared Redis tier TTL in seconds (0 disables)
+# Only survey and question text (fields with cache_plaintext=True) is cached; answers never are
+SURVEYS_DECRYPTION_CACHE_MAX_BYTES = int(os.getenv('SURVEYS_DECRYPTION_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+SURVEYS_DECRYPTION_CACHE_REDIS_TTL = int(os.getenv('SURVEYS_DECRYPTION_CACHE_REDIS_TTL', '0'))
+# Batch decryption (decrypt_many): thread pool size for large batches (0 or 1 keeps
+# decryption inline) and the batch size from which the pool is used
+SURVEYS_DECRYPTION_WORKERS = int(os.getenv('SURVEYS_DECRYPTION_WORKERS', '0'))
+SURVEYS_DECRYPTION_PARALLEL_THRESHOLD = int(os.getenv('SURVEYS_DECRYPTION_PARALLEL_THRESHOLD', '2000'))
+# HMAC key for respondent email/phone lookup hashes (falls back to SECRET_KEY when empty)
+SURVEYS_CONTACT_HASH_KEY = os.getenv('SURVEYS_CONTACT_HASH_KEY', '')
+# Distinct strings memoized per Arabic text parsing/classification function (0 disables)
+SURVEYS_ARABIC_TEXT_CACHE_SIZE = int(os.getenv('SURVEYS_ARABIC_TEXT_CACHE_SIZE', '65536'))
+# Lifetime in seconds of cached per-user accessible survey ID sets (also invalidated by signals)
+SURVEYS_ACCESS_CACHE_TTL = int(os.getenv('SURVEYS_ACCESS_CACHE_TTL', '300'))
+
 # CORS Configuration
 # Read CORS settings from environment variables
 CORS_ALLOWED_ORIGINS = [origin.strip() for origin in os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:5173,http://127.0.0.1:5173').split(',') if origin.strip()]
@@ -617,7 +633,59 @@ INTERNAL_CHAT_ALLOWED_CONTENT_TYPES = [
     'text/csv',
 ]
 
+# Attachment content storage (same shape as a STORAGES entry; any Django storage
+# backend works). Files are content-addressed by SHA256, so duplicates are stored once.
+# Keep the location outside any publicly served directory: downloads go through the API.
+INTERNAL_CHAT_ATTACHMENT_STORAGE = {
+    'BACKEND': os.getenv('INTERNAL_CHAT_ATTACHMENT_STORAGE_BACKEND', 'django.core.files.storage.FileSystemStorage'),
+    'OPTIONS': {
+        'location': os.getenv('INTERNAL_CHAT_ATTACHMENT_ROOT', str(BASE_DIR / 'private_media' / 'internal_chat')),
+    },
+}
+
 # Rate limiting for chat messages (API level)
 INTERNAL_CHAT_MESSAGE_RATE_LIMIT = os.getenv('INTERNAL_CHAT_MESSAGE_RATE_LIMIT', '60/minute')
 
-
+# Keep per-thread unread counters and sidebar totals in Redis (only when the
+# default cache is django_redis); the database copy is written by flush_unread_counters
+INTERNAL_CHAT_REDIS_UNREAD_COUNTERS = os.getenv('INTERNAL_CHAT_REDIS_UNREAD_COUNTERS', 'True').lower() == 'true'
+
+# Send chat WebSocket events from a background sender after commit (inline when off
+# or with the in-memory channel layer), waiting this many ms to coalesce bursts
+INTERNAL_CHAT_BROADCAST_ASYNC = os.getenv('INTERNAL_CHAT_BROADCAST_ASYNC', 'True').lower() == 'true'
+INTERNAL_CHAT_BROADCAST_COALESCE_MS = int(os.getenv('INTERNAL_CHAT_BROADCAST_COALESCE_MS', '0'))
+
+# Seconds a presence heartbeat keeps a socket online (clients heartbeat every TTL/3);
+# flush_presence writes batched is_online/last_seen changes to the users table
+INTERNAL_CHAT_PRESENCE_TTL = int(os.getenv('INTERNAL_CHAT_PRESENCE_TTL', '90'))
+
+# Read events for the same user and thread within this many ms are merged and
+# written in one batch (0 writes every read immediately)
+INTERNAL_CHAT_READ_RECEIPT_WINDOW_MS = int(os.getenv('INTERNAL_CHAT_READ_RECEIPT_WINDOW_MS', '2000'))
+
+# Background jobs (notifications.jobs): run by `python manage.py run_jobs`.
+# Failed jobs are retried with exponential backoff starting at
+# NOTIFICATION_JOB_RETRY_BACKOFF_SECONDS; jobs running longer than the lock
+# timeout are assumed abandoned and requeued. With NOTIFICATION_JOBS_EAGER,
+# jobs run in process after commit (development without a worker).
+NOTIFICATION_JOBS_EAGER = os.getenv('NOTIFICATION_JOBS_EAGER', 'False').lower() == 'true'
+NOTIFICATION_JOB_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_JOB_MAX_ATTEMPTS', '5'))
+NOTIFICATION_JOB_RETRY_BACKOFF_SECONDS = int(os.getenv('NOTIFICATION_JOB_RETRY_BACKOFF_SECONDS', '30'))
+NOTIFICATION_JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv('NOTIFICATION_JOB_LOCK_TIMEOUT_SECONDS', '900'))
+
+# Keep per-user unread notification counts in Redis (only when the default cache
+# is django_redis). Counters expire after the TTL and are corrected by
+# reconcile_notification_counters, run periodically.
+NOTIFICATION_REDIS_UNREAD_COUNTERS = os.getenv('NOTIFICATION_REDIS_UNREAD_COUNTERS', 'True').lower() == 'true'
+NOTIFICATION_UNREAD_COUNTER_TTL = int(os.getenv('NOTIFICATION_UNREAD_COUNTER_TTL', '3600'))
+
+# Notification statistics are cached per user for this many seconds (the
+# notification write paths drop the cache)
+NOTIFICATION_STATS_CACHE_TTL = int(os.getenv('NOTIFICATION_STATS_CACHE_TTL', '60'))
+
+# Retention (notifications.retention, run by `python manage.py cleanup_notifications`):
+# read notifications are removed this many days after they were read; unread ones
+# this many days after creation (0, the default, keeps them). Expired
+# notifications are only removed with `cleanup_notifications --expired`.
+NOTIFICATION_RETENTION_READ_DAYS = int(os.getenv('NOTIFICATION_RETENTION_READ_DAYS', '30'))
+NOTIFICATION_RETENTION_UNREAD_DAYS = int(os.getenv('NOTIFICATION_RETENTION_UNREAD_DAYS', '0'))